@@ -15,23 +15,19 @@ import os
 import threading
 import time
 import traceback
-import requests, json
-from io import BytesIO
-import noaa_coops as nc
-import matplotlib.pyplot as plt
-import numpy as np
+import json
 import datetime as dt
 import config
-import owlet_monitor
-import pandas as pd
-
-sys.path.append('lib')
-try:
-    from lib.waveshare_epd import epd7in5_V2
-except:
-    print("No EPD module found, falling back to console print")
+import metrics
+import refresh_policy
+import resilience
 from PIL import Image, ImageDraw, ImageFont
 
+# Heavy and hardware dependencies (requests, numpy, pandas, matplotlib, the
+# tide and Owlet modules, the EPD driver) are imported inside the functions
+# that use them, so importing this module is cheap and has no side effects;
+# run it with main().
+
 picdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'images')
 icondir = os.path.join(picdir, 'icon')
 fontdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'font')
@@ -53,7 +49,7 @@ StationID = 'KWO35'
 
 # For weather data
 # Create Account on openweathermap.com and get API key
-API_KEY = config.API_KEY
+API_KEY = getattr(config, 'API_KEY', '')
 # Get LATITUDE and LONGITUDE of location
 LATITUDE = '40.6415296'
 LONGITUDE = '-73.6656011'
@@ -72,207 +68,237 @@ Functions and defined variables
 ****************************************************************
 '''
 
-# Time intervals for updates
-WEATHER_UPDATE_INTERVAL = 600  # Update weather data every 10 minutes (in seconds)
-OWLET_CHECK_INTERVAL = 10  # Check owlet data transmission every 10 seconds (in seconds)
+# Time intervals for updates; OWM ('owm', every 10 minutes) and the screen
+# ('tidetracker', every minute) follow config's REFRESH_POLICY and QUIET_HOURS
+policy = refresh_policy.from_config(('owm', 'tidetracker'))
+OWLET_CHECK_INTERVAL = 10  # Longest wait for an Owlet sample before re-checking transmission (in seconds)
+
+# Panels; the tide and Owlet dependencies are only loaded when enabled
+TIDE_PANEL = getattr(config, 'TIDE_PANEL', False)
+OWLET_PANEL = getattr(config, 'OWLET_PANEL', True)
+
+owlet_stats = None  # Rolling vitals aggregates, see get_owlet_stats()
+owlet_stats_lock = threading.Lock()
+tide_series = None  # Water level ring buffer, see past24()
+tide_model = None  # (StationID, HarmonicModel), see get_tide_model()
+hilo_daily = None  # Last good high/low predictions, see main()
+epd = None  # EPD driver, see init_display()
+region = None  # The compositor's region instead, with COMPOSITOR
+template = draw = None  # Screen image being drawn, see main()
+fonts = {}  # Font.ttc by size, see get_font()
+
+
+# Fonts are loaded on first use rather than at import
+def get_font(size):
+    if size not in fonts:
+        fonts[size] = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), size)
+    return fonts[size]
 
 
 # define funciton for writing image and sleeping for specified time
 def write_to_screen(image, sleep_seconds):
     print('Writing to screen.') # for debugging
+    if region is not None:
+        # compositor.py owns the panel and shows the region when it is due;
+        # the region gets its own part of the panel (the tide and Owlet half
+        # by default), unscaled
+        x, y, width, height = region.box
+        with Image.open(os.path.join(picdir, image)) as screen_output_file:
+            region.write(screen_output_file.crop((x, y, x + width, y + height)))
+        metrics.export(upstreams=resilience.HEALTH.status())
+        time.sleep(sleep_seconds)
+        return
     # Create new blank image template matching screen resolution
     h_image = Image.new('1', (epd.width, epd.height), 255)
     # Open the template
-    screen_output_file = Image.open(os.path.join(picdir, image))
-    # Initialize the drawing context with template as background
-    h_image.paste(screen_output_file, (0, 0))
+    with Image.open(os.path.join(picdir, image)) as screen_output_file:
+        # Initialize the drawing context with template as background
+        h_image.paste(screen_output_file, (0, 0))
     epd.display(epd.getbuffer(h_image))
     # Sleep
     epd.sleep() # Put screen to sleep to prevent damage
+    metrics.export(upstreams=resilience.HEALTH.status())
     print('Sleeping for ' + str(sleep_seconds) +'.')
     time.sleep(sleep_seconds) # Determines refresh rate on data
     epd.init() # Re-Initialize screen
 
 
-# define function for displaying error
-def display_error(error_source):
-    # Display an error
-    print('Error in the', error_source, 'request.')
-    # Initialize drawing
-    error_image = Image.new('1', (epd.width, epd.height), 255)
-    # Initialize the drawing
-    draw = ImageDraw.Draw(error_image)
-    draw.text((100, 150), error_source +' ERROR', font=font50, fill=black)
-    draw.text((100, 300), 'Retrying in 30 seconds', font=font22, fill=black)
-    current_time = dt.datetime.now().strftime('%H:%M')
-    draw.text((300, 365), 'Last Refresh: ' + str(current_time), font = font50, fill=black)
-    # Save the error image
-    error_image_file = 'error.png'
-    error_image.save(os.path.join(picdir, error_image_file))
-    # Close error image
-    error_image.close()
-    # Write error to screen
-    write_to_screen(error_image_file, 30)
-
-
-# define function for getting weather data
-def getWeather(URL):
-    # Ensure there are no errors with connection
-    error_connect = True
-    while error_connect == True:
-        try:
-            # HTTP request
-            print('Attempting to connect to OWM.')
-            response = requests.get(URL)
-            print('Connection to OWM successful.')
-            error_connect = None
-        except:
-            # Call function to display connection error
-            print('Connection error.')
-            display_error('CONNECTION')
+def _owm_request(URL):
+    with metrics.span('owm_fetch'):
+        response = metrics.get(URL, timeout=10)
+    response.raise_for_status()
+    return response
 
-    # Check status of code request
-    if response.status_code == 200:
-        print('Connection to Open Weather successful.')
-        # get data in jason format
-        data = response.json()
 
-        with open('data.txt', 'w') as outfile:
-            json.dump(data, outfile)
+# define function for getting weather data; failures raise (CircuitOpen
+# while OWM is down) and update_weather_data backs off and retries
+def getWeather(URL):
+    print('Attempting to connect to OWM.')
+    response = resilience.breaker('OWM').call(_owm_request, URL)
+    print('Connection to Open Weather successful.')
+    # get data in jason format
+    data = response.json()
 
-        return data
+    with open('data.txt', 'w') as outfile:
+        json.dump(data, outfile)
 
-    else:
-        # Call function to display HTTP error
-        display_error('HTTP')
+    return data
 
 
-# last 24 hour data, add argument for start/end_date
+# last 24 hour data, kept in an incremental ring buffer
 def past24(StationID):
-    # Create Station Object
-    stationdata = nc.Station(StationID)
-
-    # Get today date string
-    today = dt.datetime.now()
-    todaystr = today.strftime("%Y%m%d %H:%M")
-    # Get yesterday date string
-    yesterday = today - dt.timedelta(days=1)
-    yesterdaystr = yesterday.strftime("%Y%m%d %H:%M")
-
-    # Get water level data
-    WaterLevel = stationdata.get_data(
-        begin_date=yesterdaystr,
-        end_date=todaystr,
-        product="water_level",
-        datum="MLLW",
-        time_zone="lst_ldt")
-
-    return WaterLevel
-
-def plotOwletData():
-    # Define the file pattern you're looking for
+    import tide_client
+    import tide_series as tide_series_module
+    # Create the series once, restoring the buffer saved by the last run
+    global tide_series
+    if tide_series is None or tide_series.station_id != StationID:
+        tide_series = tide_series_module.TideSeries(StationID)
+        tide_series.load()
+
+    # Only samples newer than the last stored one are requested
+    tide_series.refresh(tide_client.get_client(StationID))
+    print('Tide requests today: %d (%d bytes)' % (
+        tide_series.requests_today, tide_series.bytes_today))
+
+    return tide_series
+
+def load_owlet_stats():
+    import vitals_stats
     # Define the file pattern you're looking for
     file_pattern = 'owlet_data_*.csv'
 
     # Use glob to list files that match the pattern
     matching_files = glob.glob(file_pattern)
 
-    # Check if there are matching files
+    # Seed the rolling aggregates from the first matching file, once
     if len(matching_files) > 0:
-        # Read the first matching file and store its contents in a DataFrame named 'df'
         first_matching_file = matching_files[0]
-        df = pd.read_csv(first_matching_file)
         print(f'Reading file: {first_matching_file}')
-        # Perform your data analysis or processing here using 'df'
-        # Get data from csv
-        # Get last 24 hours of data
-        # Find the index where the session starts (assuming a session starts after a gap of at least one hour)
-        session_start_index = 0
-
-        for i in range(1, len(df)):
-            time_diff = (pd.to_datetime(df['timestamp'][i]) - pd.to_datetime(df['timestamp'][i - 1])).total_seconds()
-            if time_diff >= 3600:  # Check if the time difference is at least one hour
-                session_start_index = i
-
-        # Slice the DataFrame to get data only from the session
-        df = df.iloc[session_start_index:]
-
-        # Get time, heart rate, oxygen level, and movement
-        time = df['timestamp']
-        hr = df['hr']
-        ox = df['ox']
-        mv = df['mv']
-
-        # Create Plot
-        fig, axs = plt.subplots(1, 3, figsize=(12, 4))
-
-        # Plot Heart Rate
-        axs[0].plot(time, hr, color='black')
-        axs[0].set_ylabel('Heart Rate')
-        axs[0].set_xlabel('Time')
-
-        # Plot Oxygen Level
-        axs[1].plot(time, ox, color='black')
-        axs[1].set_ylabel('Oxygen Level')
-        axs[1].set_xlabel('Time')
-
-        # Plot Movement
-        axs[2].plot(time, mv, color='black')
-        axs[2].set_ylabel('Movement')
-        axs[2].set_xlabel('Time')
+        return vitals_stats.VitalsAggregator.from_csv(first_matching_file)
+    print('No matching files found.')
+    return vitals_stats.VitalsAggregator()
+
+
+def get_owlet_stats():
+    # Rolling vitals aggregates, seeded from disk on first use and then fed
+    # sample by sample from the vitals channel
+    global owlet_stats
+    with owlet_stats_lock:
+        if owlet_stats is None:
+            owlet_stats = load_owlet_stats()
+        return owlet_stats
+
+
+def plotOwletData(stats=None, now=None):
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    if stats is None:
+        stats = get_owlet_stats()
+
+    # Per-minute session series and 5 minute summaries from the aggregator,
+    # as of now; nothing here rescans the raw samples
+    now = time.time() if now is None else now
+    series = stats.series(now)
+    if len(series) == 0:
+        print('No Owlet session data to plot.')
+        return
+    times = [dt.datetime.fromtimestamp(ts) for ts, _ in series]
+    recent = stats.summary('5m', now)
 
+    # Create Plot
+    fig, axs = plt.subplots(1, 3, figsize=(12, 4))
+
+    panels = [('hr', 'Heart Rate'), ('ox', 'Oxygen Level'), ('mv', 'Movement')]
+    for ax, (field, label) in zip(axs, panels):
+        ax.plot(times, [values[field] for _, values in series], color='black')
+        ax.set_ylabel(label)
+        ax.set_xlabel('Time')
+        s = recent[field]
+        if s['count']:
+            ax.set_title('5m avg %.0f (%.0f-%.0f)' % (s['mean'], s['min'], s['max']))
+        else:
+            ax.set_title('stale: no sample in 5m')
         # Limit the number of time points displayed on the x-axis
-        num_displayed_ticks = 8  # Adjust this value as needed
-        tick_positions = range(0, len(time), len(time) // num_displayed_ticks)
-        tick_labels = [t.split()[1].rsplit(':', 1)[0] for i, t in enumerate(time) if
-                       i in tick_positions]  # Extract HH:MM
-        for ax in axs:
-            ax.set_xticks(tick_positions)
-            ax.set_xticklabels(tick_labels, rotation=45)  # Rotate x-axis labels for readability
-
-        # Adjust spacing between subplots
-        plt.tight_layout()
-
-        # Save the figure
-        plt.savefig('images/OwletData.png', dpi=60)
-    else:
-        print('No matching files found.')
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=8))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+        for tick in ax.get_xticklabels():
+            tick.set_rotation(45)  # Rotate x-axis labels for readability
 
-    #plt.show()
+    # Adjust spacing between subplots
+    plt.tight_layout()
+
+    # Save the figure
+    plt.savefig('images/OwletData.png', dpi=60)
+    plt.close(fig)
 
 # Plot last 24 hours of tide
 def plotTide(TideData):
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    import numpy as np
+    # Plot straight from the ring buffer arrays
+    times, levels = TideData.ordered(now=time.time())
+    if len(times) == 0:
+        print('No tide data to plot.')
+        return
     # Adjust data for negative values
-    minlevel = TideData['water_level'].min()
-    TideData['water_level'] = TideData['water_level'] - minlevel
+    levels = levels - np.nanmin(levels)
 
     # Create Plot
     fig, axs = plt.subplots(figsize=(12, 4))
-    TideData['water_level'].plot.area(ax=axs, color='black')
-    plt.title('Tide- Past 24 Hours', fontsize=20)
+    axs.fill_between([dt.datetime.fromtimestamp(t) for t in times], levels, color='black')
+    axs.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    plt.title('Tide- Past %d Hours' % (TideData.window // 3600), fontsize=20)
     #fontweight="bold",
     #axs.xaxis.set_tick_params(labelsize=20)
     #axs.yaxis.set_tick_params(labelsize=20)
     plt.savefig('images/TideLevel.png', dpi=60)
+    plt.close(fig)
     #plt.show()
 
 
+# Harmonic model for offline predictions, loaded once per station
+def get_tide_model(StationID):
+    import tide_client
+    import tide_harmonics
+    global tide_model
+    if tide_model is None or tide_model[0] != StationID:
+        model = tide_harmonics.HarmonicModel.from_client(tide_client.get_client(StationID))
+        tide_model = (StationID, model)
+    return tide_model[1]
+
+
 # Get High and Low tide info
 def HiLo(StationID):
-    # Create Station Object
-    stationdata = nc.Station(StationID)
-
-    # Get today date string
+    import requests
+    import tide_client
+    import tide_prefetch
+    # Get today and the end of tomorrow
     today = dt.datetime.now()
-    todaystr = today.strftime("%Y%m%d")
-    # Get yesterday date string
-    tomorrow = today + dt.timedelta(days=1)
-    tomorrowstr = tomorrow.strftime("%Y%m%d")
+    midnight = today.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = midnight + dt.timedelta(days=2) - dt.timedelta(minutes=1)
+
+    # Prefetched year of predictions (python3 tide_prefetch.py STATION)
+    index = tide_prefetch.TidePredictionIndex.for_station(StationID, today.year)
+    if index is not None and index.covers(midnight.date(), end.date()):
+        return index.hilo(midnight.date(), end.date())
+
+    # Compute locally from the station's harmonic constituents when possible
+    try:
+        model = get_tide_model(StationID)
+        if model.names:
+            return model.hilo(midnight.timestamp(), end.timestamp())
+    except (requests.RequestException, resilience.CircuitOpen, tide_client.TideAPIError,
+            KeyError) as e:
+        print('No harmonic constituents, using CO-OPS predictions:', e)
+
+    # Shared client: predictions are cached on disk for the day
+    stationdata = tide_client.get_client(StationID)
 
     # Get Hi and Lo Tide info
     TideHiLo = stationdata.get_data(
-        begin_date=todaystr,
-        end_date=tomorrowstr,
+        begin_date=midnight.strftime("%Y%m%d"),
+        end_date=end.strftime("%Y%m%d"),
         product="predictions",
         datum="MLLW",
         interval="hilo",
@@ -281,17 +307,6 @@ def HiLo(StationID):
     return TideHiLo
 
 
-# Set the font sizes
-font15 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 15)
-font20 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 20)
-font22 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 22)
-font30 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 30)
-font35 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 35)
-font50 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 50)
-font60 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 60)
-font100 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 100)
-font160 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 160)
-
 # Set the colors
 black = 'rgb(0,0,0)'
 white = 'rgb(255,255,255)'
@@ -299,37 +314,44 @@ grey = 'rgb(235,235,235)'
 
 # Function to update weather data
 def update_weather_data():
+    import weather_display
+    import weather_providers
+    # OWM unless config's WEATHER_PROVIDERS adds Open-Meteo as a hedge; both
+    # come back as Open-Meteo's format and are parsed by parse_weather
+    fetch = weather_providers.from_config(
+        ('owm',), location=(LATITUDE, LONGITUDE),
+        owm=weather_providers.OpenWeatherMap(URL, get=getWeather))
+    backoff = resilience.Backoff()
+    last_shown = None
     while True:
         try:
             # Get weather data
-            data = getWeather(URL)
+            raw = fetch()
+            weather_data = weather_display.parse_weather(raw)
 
             # get current dict block
-            current = data['current']
+            current = weather_data['current']
             # get current
-            temp_current = current['temp']
+            temp_current = current['temperature']
             # get feels like
             feels_like = current['feels_like']
             # get humidity
             humidity = current['humidity']
-            # get pressure
+            # get wind
             wind = current['wind_speed']
             # get description
-            weather = current['weather']
-            report = weather[0]['description']
-            # get icon url
-            icon_code = weather[0]['icon']
+            report = weather_display.wmo_description(current['weather_code'])
+            # get icon
+            icon_path = weather_display.get_icon_path(current['weather_code'], current['is_day'],
+                                                      icondir)
 
-            # get daily dict block
-            daily = data['daily']
+            # get today's block
+            today = weather_data['today']
             # get daily precip
-            daily_precip_float = daily[0]['pop']
-            # format daily precip
-            daily_precip_percent = daily_precip_float * 100
+            daily_precip_percent = today['precip_pct']
             # get min and max temp
-            daily_temp = daily[0]['temp']
-            temp_max = daily_temp['max']
-            temp_min = daily_temp['min']
+            temp_max = today['high']
+            temp_min = today['low']
 
             # Set strings to be printed to screen
             string_location = LOCATION
@@ -342,37 +364,24 @@ def update_weather_data():
             string_temp_min = 'Low:  ' + format(temp_min, '>.0f') + u'\N{DEGREE SIGN}F'
             string_precip_percent = 'Precip: ' + str(format(daily_precip_percent, '.0f')) + '%'
 
-            # get min and max temp
-            nx_daily_temp = daily[1]['temp']
-            nx_temp_max = nx_daily_temp['max']
-            nx_temp_min = nx_daily_temp['min']
-            # get daily precip
-            nx_daily_precip_float = daily[1]['pop']
-            # format daily precip
-            nx_daily_precip_percent = nx_daily_precip_float * 100
-
-            # get min and max temp
-            nx_nx_daily_temp = daily[2]['temp']
-            nx_nx_temp_max = nx_nx_daily_temp['max']
-            nx_nx_temp_min = nx_nx_daily_temp['min']
-            # get daily precip
-            nx_nx_daily_precip_float = daily[2]['pop']
-            # format daily precip
-            nx_nx_daily_precip_percent = nx_nx_daily_precip_float * 100
+            # Tomorrow and the day after
+            daily = weather_data['daily']
+            nx_temp_max, nx_temp_min = daily[1]['high'], daily[1]['low']
+            nx_daily_precip_percent = daily[1]['precip_pct']
+            nx_nx_temp_max, nx_nx_temp_min = daily[2]['high'], daily[2]['low']
+            nx_nx_daily_precip_percent = daily[2]['precip_pct']
 
             # Tomorrow Forcast Strings
             nx_day_high = 'High: ' + format(nx_temp_max, '>.0f') + u'\N{DEGREE SIGN}F'
             nx_day_low = 'Low: ' + format(nx_temp_min, '>.0f') + u'\N{DEGREE SIGN}F'
             nx_precip_percent = 'Precip: ' + str(format(nx_daily_precip_percent, '.0f')) + '%'
-            nx_weather_icon = daily[1]['weather']
-            nx_icon = nx_weather_icon[0]['icon']
+            nx_icon = weather_display.get_icon_path(daily[1]['weather_code'], 1, icondir)
 
             # Overmorrow Forcast Strings
             nx_nx_day_high = 'High: ' + format(nx_nx_temp_max, '>.0f') + u'\N{DEGREE SIGN}F'
             nx_nx_day_low = 'Low: ' + format(nx_nx_temp_min, '>.0f') + u'\N{DEGREE SIGN}F'
             nx_nx_precip_percent = 'Precip: ' + str(format(nx_nx_daily_precip_percent, '.0f')) + '%'
-            nx_nx_weather_icon = daily[2]['weather']
-            nx_nx_icon = nx_nx_weather_icon[0]['icon']
+            nx_nx_icon = weather_display.get_icon_path(daily[2]['weather_code'], 1, icondir)
 
             # Last updated time
             now = dt.datetime.now()
@@ -381,86 +390,123 @@ def update_weather_data():
 
             # Current weather
             ## Open icon file
-            icon_file = icon_code + '.png'
-            icon_image = Image.open(os.path.join(icondir, icon_file))
-            icon_image = icon_image.resize((130, 130))
-            template.paste(icon_image, (50, 50))
+            with Image.open(icon_path) as icon_image:
+                template.paste(icon_image.resize((130, 130)), (50, 50))
 
-            draw.text((25, 10), LOCATION, font=font35, fill=black)
+            draw.text((25, 10), LOCATION, font=get_font(35), fill=black)
 
             # Center current weather report
-            w, h = draw.textsize(string_report, font=font20)
+            w, h = draw.textsize(string_report, font=get_font(20))
             # print(w)
             if w > 250:
                 string_report = 'Now:\n' + report.title()
 
             center = int(120 - (w / 2))
-            draw.text((center, 175), string_report, font=font20, fill=black)
+            draw.text((center, 175), string_report, font=get_font(20), fill=black)
 
             # Data
-            draw.text((250, 55), string_temp_current, font=font35, fill=black)
+            draw.text((250, 55), string_temp_current, font=get_font(35), fill=black)
             y = 100
-            draw.text((250, y), string_feels_like, font=font15, fill=black)
-            draw.text((250, y + 20), string_wind, font=font15, fill=black)
-            draw.text((250, y + 40), string_precip_percent, font=font15, fill=black)
-            draw.text((250, y + 60), string_temp_max, font=font15, fill=black)
-            draw.text((250, y + 80), string_temp_min, font=font15, fill=black)
+            draw.text((250, y), string_feels_like, font=get_font(15), fill=black)
+            draw.text((250, y + 20), string_wind, font=get_font(15), fill=black)
+            draw.text((250, y + 40), string_precip_percent, font=get_font(15), fill=black)
+            draw.text((250, y + 60), string_temp_max, font=get_font(15), fill=black)
+            draw.text((250, y + 80), string_temp_min, font=get_font(15), fill=black)
 
-            draw.text((125, 218), last_update_string, font=font15, fill=black)
+            draw.text((125, 218), last_update_string, font=get_font(15), fill=black)
 
             # Weather Forcast
             # Tomorrow
-            icon_file = nx_icon + '.png'
-            icon_image = Image.open(os.path.join(icondir, icon_file))
-            icon_image = icon_image.resize((130, 130))
-            template.paste(icon_image, (435, 50))
-            draw.text((450, 20), 'Tomorrow', font=font22, fill=black)
-            draw.text((415, 180), nx_day_high, font=font15, fill=black)
-            draw.text((515, 180), nx_day_low, font=font15, fill=black)
-            draw.text((460, 200), nx_precip_percent, font=font15, fill=black)
+            with Image.open(nx_icon) as icon_image:
+                template.paste(icon_image.resize((130, 130)), (435, 50))
+            draw.text((450, 20), 'Tomorrow', font=get_font(22), fill=black)
+            draw.text((415, 180), nx_day_high, font=get_font(15), fill=black)
+            draw.text((515, 180), nx_day_low, font=get_font(15), fill=black)
+            draw.text((460, 200), nx_precip_percent, font=get_font(15), fill=black)
 
             # Next Next Day Forcast
-            icon_file = nx_nx_icon + '.png'
-            icon_image = Image.open(os.path.join(icondir, icon_file))
-            icon_image = icon_image.resize((130, 130))
-            template.paste(icon_image, (635, 50))
-            draw.text((625, 20), 'Next-Next Day', font=font22, fill=black)
-            draw.text((615, 180), nx_nx_day_high, font=font15, fill=black)
-            draw.text((715, 180), nx_nx_day_low, font=font15, fill=black)
-            draw.text((660, 200), nx_nx_precip_percent, font=font15, fill=black)
-
-            time.sleep(WEATHER_UPDATE_INTERVAL)  # Sleep for the update interval
+            with Image.open(nx_nx_icon) as icon_image:
+                template.paste(icon_image.resize((130, 130)), (635, 50))
+            draw.text((625, 20), 'Next-Next Day', font=get_font(22), fill=black)
+            draw.text((615, 180), nx_nx_day_high, font=get_font(15), fill=black)
+            draw.text((715, 180), nx_nx_day_low, font=get_font(15), fill=black)
+            draw.text((660, 200), nx_nx_precip_percent, font=get_font(15), fill=black)
+
+            backoff.reset()
+            # Sleep until the policy's next update, sooner if the data keeps changing
+            shown = (string_temp_current, string_feels_like, string_wind, string_report,
+                     string_precip_percent, string_temp_max, string_temp_min,
+                     nx_day_high, nx_day_low, nx_precip_percent, nx_icon,
+                     nx_nx_day_high, nx_nx_day_low, nx_nx_precip_percent, nx_nx_icon)
+            policy.set_daylight(refresh_policy.daylight(raw))
+            now = time.time()
+            policy.record('owm', now, changed=shown != last_shown)
+            last_shown = shown
+            time.sleep(max(0, policy.next_run('owm', now) - time.time()))
         except Exception as e:
-            print("Error updating weather data:", e)
-            time.sleep(WEATHER_UPDATE_INTERVAL)  # Sleep even if there is an error
+            # Back off; main() notes the failing upstream on the panel
+            now = time.time()
+            wait = policy.next_run('owm', now, due=now + resilience.wait_time(e, backoff)) - now
+            print("Error updating weather data:", e, "- retrying in %d s" % wait)
+            time.sleep(wait)
 
 # Function to check owlet data transmission
 def check_owlet_data():
+    import owlet_monitor
+    import vitals_channel
+    # Subscribe to vitals published by owlet_monitor; new samples wake this
+    # thread immediately instead of waiting out a polling interval.
+    subscriber = vitals_channel.VitalsSubscriber()
+    owlet_monitor.subscriber = subscriber
     while True:
         try:
-            # Check if owlet is transmitting data (you may need to modify this logic)
-            owlet_transmitting = owlet_monitor.check_transmission()
-
-            if owlet_transmitting:
-                print("Owlet is transmitting data, updating every 10 seconds...")
-                plotOwletData()
-                time.sleep(OWLET_CHECK_INTERVAL)
-            else:
-                print("Owlet is not transmitting data, checking again in 10 seconds...")
-                time.sleep(OWLET_CHECK_INTERVAL)
+            sample = subscriber.recv(timeout=OWLET_CHECK_INTERVAL)
+            if sample is not None:
+                stats = get_owlet_stats()
+                stats.add(sample)
+                # Collapse any backlog into one redraw
+                for queued in subscriber.drain():
+                    stats.add(queued)
+                print("Owlet sample received, updating plot...")
+                plotOwletData(stats)
+            elif not owlet_monitor.check_transmission():
+                print("Owlet is not transmitting data, waiting for the next sample...")
         except Exception as e:
             print("Error checking owlet data:", e)
             time.sleep(OWLET_CHECK_INTERVAL)  # Sleep even if there is an error
 
-# Start the weather data update thread
-weather_thread = threading.Thread(target=update_weather_data)
-weather_thread.daemon = True
-weather_thread.start()
+# Initialize and clear screen
+def init_display():
+    global epd, region
+    if getattr(config, 'COMPOSITOR', False):
+        import compositor
+        try:
+            region = compositor.connect('tidetracker')
+            print('Drawing into the compositor\'s tidetracker region.')
+            return
+        except (OSError, KeyError, ValueError) as e:
+            print('No compositor, driving the screen directly:', e)
+    print('Initializing and clearing screen.')
+    sys.path.append('lib')
+    try:
+        from lib.waveshare_epd import epd7in5_V2, epdconfig
+        epdconfig.set_backend(getattr(config, 'EPD_BACKEND', None))
+        epd = metrics.instrument_epd(epd7in5_V2.EPD()) # Create object for display functions
+        epd.init()
+        epd.Clear()
+    except:
+        print('No EPD module found, falling back to console print')
+
+
+# Start the background update threads for the enabled panels
+def start_threads():
+    threads = [threading.Thread(target=update_weather_data, daemon=True)]
+    if OWLET_PANEL:
+        threads.append(threading.Thread(target=check_owlet_data, daemon=True))
+    for thread in threads:
+        thread.start()
+    return threads
 
-# Start the owlet data check thread
-owlet_thread = threading.Thread(target=check_owlet_data)
-owlet_thread.daemon = True
-owlet_thread.start()
 
 '''
 ****************************************************************
@@ -470,92 +516,101 @@ Main Loop
 ****************************************************************
 '''
 
-# Initialize and clear screen
-print('Initializing and clearing screen.')
-try:
-    epd = epd7in5_V2.EPD() # Create object for display functions
-    epd.init()
-    epd.Clear()
-except:
-    print('No EPD module found, falling back to console print')
-
-while True:
-
-
-    # Tide Data
-    # Get water level
-    # wl_error = True
-    # while wl_error == True:
-    #     try:
-    #         WaterLevel = past24(StationID)
-    #         wl_error = False
-    #     except:
-    #         display_error('Tide Data')
-
-    plotOwletData()
-    # plotTide(WaterLevel)
-
-
-    # Open template file
-    template = Image.open(os.path.join(picdir, 'template.png'))
-    # Initialize the drawing context with template as background
-    draw = ImageDraw.Draw(template)
-
-
-
-
-    ## Dividing lines
-    draw.line((400,10,400,220), fill='black', width=3)
-    draw.line((600,20,600,210), fill='black', width=2)
-
-
-    # Owlet Info
-    # Graph
-    tidegraph = Image.open('images/OwletData.png')
-    template.paste(tidegraph, (25, 240))
-
-    # Large horizontal dividing line
-    h = 240
-    draw.line((25, h, 775, h), fill='black', width=3)
-
-    # Daily tide times
-    # draw.text((30,260), "Today's Tide", font=font22, fill=black)
-
-    # # Get tide time predictions
-    # hilo_error = True
-    # while hilo_error == True:
-    #     try:
-    #         hilo_daily = HiLo(StationID)
-    #         hilo_error = False
-    #     except:
-    #         display_error('Tide Prediction')
-    #
-    # # Display tide preditions
-    # y_loc = 300 # starting location of list
-    # # Iterate over preditions
-    # for index, row in hilo_daily.iterrows():
-    #     # For high tide
-    #     if row['hi_lo'] == 'H':
-    #         tide_time = index.strftime("%H:%M")
-    #         tidestr = "High: " + tide_time
-    #     # For low tide
-    #     elif row['hi_lo'] == 'L':
-    #         tide_time = index.strftime("%H:%M")
-    #         tidestr = "Low:  " + tide_time
-    #
-    #     # Draw to display image
-    #     draw.text((40,y_loc), tidestr, font=font15, fill=black)
-    #     y_loc += 25 # This bumps the next prediction down a line
-
-
-    # Save the image for display as PNG
-    screen_output_file = os.path.join(picdir, 'screen_output.png')
-    template.save(screen_output_file)
-    # Close the template file
-    template.close()
-
-    write_to_screen(screen_output_file, 60)
-    #epd.Clear()
+def main():
+    global template, draw, hilo_daily
+    import diagnostics
+    diagnostics.start('tidetracker')
+    start_threads()
+    init_display()
+
+    while True:
+
+        # Tide Data; on failure the last good graph (and tide times) stay
+        if TIDE_PANEL:
+            # Get water level
+            try:
+                plotTide(past24(StationID))
+            except Exception as e:
+                print('Error in the Tide Data request:', e)
+
+        if OWLET_PANEL:
+            try:
+                plotOwletData()
+            except Exception as e:
+                print('Error plotting the Owlet data:', e)
+
+
+        # Open template file
+        template = Image.open(os.path.join(picdir, 'template.png'))
+        # Initialize the drawing context with template as background
+        draw = ImageDraw.Draw(template)
+
+
+
+
+        ## Dividing lines
+        draw.line((400,10,400,220), fill='black', width=3)
+        draw.line((600,20,600,210), fill='black', width=2)
+
+
+        # Owlet Info, or the tide graph when the Owlet panel is off
+        # Graph
+        if OWLET_PANEL:
+            with Image.open('images/OwletData.png') as tidegraph:
+                template.paste(tidegraph, (25, 240))
+        elif TIDE_PANEL:
+            with Image.open('images/TideLevel.png') as tidegraph:
+                template.paste(tidegraph, (25, 240))
+
+        # Large horizontal dividing line
+        h = 240
+        draw.line((25, h, 775, h), fill='black', width=3)
+
+        if TIDE_PANEL:
+            # Daily tide times
+            draw.text((30,260), "Today's Tide", font=get_font(22), fill=black)
+
+            # Get tide time predictions
+            try:
+                hilo_daily = HiLo(StationID)
+            except Exception as e:
+                print('Error in the Tide Prediction request:', e)
+
+            # Display tide preditions
+            y_loc = 300 # starting location of list
+            # Iterate over preditions
+            for index, row in (hilo_daily.iterrows() if hilo_daily is not None else ()):
+                # For high tide
+                if row['hi_lo'] == 'H':
+                    tide_time = index.strftime("%H:%M")
+                    tidestr = "High: " + tide_time
+                # For low tide
+                elif row['hi_lo'] == 'L':
+                    tide_time = index.strftime("%H:%M")
+                    tidestr = "Low:  " + tide_time
+
+                # Draw to display image
+                draw.text((40,y_loc), tidestr, font=get_font(15), fill=black)
+                y_loc += 25 # This bumps the next prediction down a line
+
+
+        # Note failing upstreams in a corner rather than on an error screen
+        resilience.overlay(template, resilience.HEALTH.messages(), font=get_font(15))
+
+        # Save the image for display as PNG
+        screen_output_file = os.path.join(picdir, 'screen_output.png')
+        template.save(screen_output_file)
+        # Close the template file
+        template.close()
+
+        now = time.time()
+        policy.record('tidetracker', now)
+        write_to_screen(screen_output_file, max(0, policy.next_run('tidetracker', now) - now))
+        #epd.Clear()
+
+
+if __name__ == '__main__':
+    main()
 
 # TODO Every 10 minutes update weather
 # TODO Check if owlet is transmitting data, if yes then update every 10 seconds if no then check for update
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Panel refreshes and producer cost: each program on the panel versus the compositor.
+
+Replays a day of producer output at the default cadences: TideTracker draws
+every minute and its picture changes every CHANGE_MINUTES (the OWM cadence),
+the weather panel draws at each hour and after each of
+SCHEDULED_FETCHES_PER_DAY changed fetches. Driving the panel directly,
+every draw is a full refresh (and two programs would contend for SPI);
+through the compositor, unchanged draws are dropped and changes are held
+and shown together per compositor.HOLD.
+
+Producer cost is the time for one draw: EPD.getbuffer and display on the
+null backend for the direct path, compositor region.write for the shared
+framebuffer.
+
+    python3 benchmarks/bench_compositor.py [SCHEDULED_FETCHES_PER_DAY] [CHANGE_MINUTES]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from PIL import Image, ImageDraw
+from lib.waveshare_epd import epd7in5_V2, epdconfig
+import compositor
+
+SCHEDULED = int(sys.argv[1]) if len(sys.argv) > 1 else 28
+CHANGE_MINUTES = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+START = 1714190400          # 2024-04-27 00:00 EDT
+REPEAT = 20
+
+
+def picture(size, version):
+    image = Image.new('1', size, 255)
+    ImageDraw.Draw(image).text((10, 10), 'version %d' % version, fill=0)
+    return image
+
+
+def draws():
+    """(t, producer, version) for a day, in order."""
+    events = [(START + m * 60, 'tidetracker', m // CHANGE_MINUTES) for m in range(24 * 60)]
+    events += [(START + h * 3600, 'weather', h) for h in range(24)]
+    events += [(START + i * 86400 // SCHEDULED + 120, 'weather', 100 + i) for i in range(SCHEDULED)]
+    return sorted(events)
+
+
+def replay(directory):
+    epd = epd7in5_V2.EPD(backend=epdconfig.NullBackend())
+    clock = [START]
+    daemon = compositor.Compositor(epd, regions=compositor.REGIONS, directory=directory,
+                                   clock=lambda: clock[0])
+    regions = {name: compositor.connect(name, directory) for name in compositor.REGIONS}
+    writes = []
+    for t, name, version in draws():
+        due = daemon.due(t)
+        while due is not None and due <= t:
+            daemon.step(due)
+            due = daemon.due(t)
+        image = picture(regions[name].size, version)
+        started = time.perf_counter()
+        regions[name].write(image)
+        writes.append(time.perf_counter() - started)
+        daemon.step(t)
+    due = daemon.due(START + 86400)
+    while due is not None:
+        daemon.step(due)
+        due = daemon.due(due)
+    daemon.close()
+    return daemon.refreshes, writes
+
+
+def direct_draw():
+    epd = epd7in5_V2.EPD(backend=epdconfig.NullBackend())
+    image = picture((800, 480), 1)
+    samples = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        epd.init()
+        epd.display(epd.getbuffer(image))
+        epd.sleep()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    events = draws()
+    direct = len(events)
+    with tempfile.TemporaryDirectory() as directory:
+        refreshes, writes = replay(directory)
+    print('%d draws per day (%d TideTracker, %d weather)' % (
+        direct, sum(1 for e in events if e[1] == 'tidetracker'),
+        sum(1 for e in events if e[1] == 'weather')))
+    print('%-28s %8d' % ('refreshes, direct', direct))
+    print('%-28s %8d' % ('refreshes, compositor', refreshes))
+    print('%-28s %8.2f ms' % ('draw, direct (null SPI)', direct_draw() * 1e3))
+    print('%-28s %8.2f ms' % ('draw, region.write', statistics.median(writes) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Serial versus pipelined display updates at high cadence.
+
+Each frame is a simulated fetch (sleep), a small PIL render and the real
+epd.getbuffer() pack, written through the real driver to the recording
+backend with BUSY held low for a simulated refresh. The serial loop is the
+original fetch -> render -> pack -> display -> sleep sequence; the pipeline
+prepares the next frame while the panel is busy.
+
+    python3 benchmarks/bench_display_pipeline.py [FRAMES] [BUSY_MS] [FETCH_MS]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from PIL import Image, ImageDraw
+from display_pipeline import DisplayPipeline
+from lib.waveshare_epd import epd7in5_V2, epdconfig
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+BUSY_MS = int(sys.argv[2]) if len(sys.argv) > 2 else 1500
+FETCH_MS = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+
+
+def produce():
+    time.sleep(FETCH_MS / 1000)
+    image = Image.new('1', (800, 480), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100, 100, 300, 200), fill=0)
+    draw.text((400, 240), time.strftime('%H:%M:%S'), fill=0)
+    return image
+
+
+def write(epd, buffer):
+    epd.init()
+    epd.display(buffer)
+    epd.sleep()
+
+
+def serial(epd):
+    """(latency, completion time) per frame."""
+    shown = []
+    for _ in range(FRAMES):
+        started = time.monotonic()
+        write(epd, epd.getbuffer(produce()))
+        shown.append((time.monotonic() - started, time.monotonic()))
+    return shown
+
+
+def pipelined(epd):
+    shown = []
+
+    def show(frame):
+        write(epd, frame.buffer)
+        shown.append((time.monotonic() - frame.started, time.monotonic()))
+
+    pipeline = DisplayPipeline(produce, show, pack=epd.getbuffer, interval=0)
+    pipeline.start()
+    while len(shown) < FRAMES:
+        time.sleep(0.01)
+    pipeline.stop(timeout=30)
+    return shown[:FRAMES]
+
+
+def main():
+    print(f'{FRAMES} frames, fetch {FETCH_MS} ms, refresh BUSY {BUSY_MS} ms (x3 per write)')
+    print(f'{"mode":>10} {"s/frame":>8} {"frames/min":>11} {"latency s":>10}')
+    for name, run in (('serial', serial), ('pipelined', pipelined)):
+        epdconfig.set_backend(epdconfig.RecordingBackend(busy_ms=BUSY_MS // 3))
+        epd = epd7in5_V2.EPD()
+        started = time.monotonic()
+        shown = run(epd)
+        per_frame = (shown[-1][1] - started) / FRAMES
+        latency = sum(latency for latency, _ in shown) / FRAMES
+        print(f'{name:>10} {per_frame:>8.2f} {60 / per_frame:>11.1f} {latency:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""CPU time spent waiting for the e-Paper BUSY line per refresh.
+
+Runs a full display() against the recording backend with BUSY held low for
+a simulated refresh, comparing the original busy-poll (0x71 + read in a
+tight loop) with ReadBusy's polling backoff and edge wait.
+
+    python3 benchmarks/bench_epd_busy.py [BUSY_MS]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lib.waveshare_epd import epd7in5_V2, epdconfig
+
+BUSY_MS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+
+class SpinningEPD(epd7in5_V2.EPD):
+    """The driver's ReadBusy before the backoff."""
+
+    def ReadBusy(self, timeout=None):
+        self.send_command(0x71)
+        busy = epdconfig.digital_read(self.busy_pin)
+        while(busy == 0):
+            self.send_command(0x71)
+            busy = epdconfig.digital_read(self.busy_pin)
+        epdconfig.delay_ms(200)
+
+
+def refresh(epd_class, edge):
+    backend = epdconfig.set_backend(epdconfig.RecordingBackend(busy_ms=BUSY_MS, edge=edge))
+    epd = epd_class()
+    image = [0xFF] * (epd.width * epd.height // 8)
+    epd.display(image)                       # warm up
+    backend.busy_reads = 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    epd.display(image)
+    return time.perf_counter() - wall, time.process_time() - cpu, backend.busy_reads
+
+
+def main():
+    print(f'BUSY held low for {BUSY_MS} ms per refresh')
+    print(f'{"ReadBusy":>10} {"wall s":>8} {"CPU s":>8} {"BUSY reads":>11}')
+    for name, epd_class, edge in (('spin', SpinningEPD, False),
+                                  ('backoff', epd7in5_V2.EPD, False),
+                                  ('edge', epd7in5_V2.EPD, True)):
+        wall, cpu, reads = refresh(epd_class, edge)
+        print(f'{name:>10} {wall:>8.2f} {cpu:>8.2f} {reads:>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Open-Meteo bytes per day: the legacy request every 30 minutes versus the
+layout's fetch profile (a full request every DAILY_REFRESH, deltas between)
+at the scheduler's rate.
+
+Responses are cut from benchmarks/fixtures/open_meteo_forecast.json the way
+the API answers each query (only the requested variables, `forecast_hours`
+rows from the current hour, no daily block for a delta) and sized as JSON
+and gzipped, which is what requests negotiates by default.
+
+    python3 benchmarks/bench_fetch_profile.py [SCHEDULED_FETCHES_PER_DAY] [DAILY_REFRESH_H]
+"""
+import gzip
+import json
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+import weather_display
+
+SCHEDULED = int(sys.argv[1]) if len(sys.argv) > 1 else 28     # hourly runs + re-checks
+DAILY_REFRESH_H = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+LEGACY = 48                                                     # every 30 minutes
+
+
+def respond(fixture, params):
+    """The fixture cut down to what `params` asks for."""
+    def pick(block, names, rows=slice(None)):
+        return {k: v[rows] if isinstance(v, list) else v for k, v in fixture[block].items()
+                if k == 'time' or k in names}
+    raw = {k: v for k, v in fixture.items() if not isinstance(v, dict)}
+    for block in ('current', 'hourly', 'daily'):
+        if block not in params:
+            continue
+        names = params[block].split(',')
+        rows = slice(None)
+        if block == 'hourly' and 'forecast_hours' in params:
+            start = fixture['hourly']['time'].index(fixture['current']['time'][:13] + ':00')
+            rows = slice(start, start + params['forecast_hours'])
+        raw[block] = pick(block, names, rows)
+        raw[block + '_units'] = {k: v for k, v in fixture[block + '_units'].items()
+                                 if k in raw[block]}
+    return raw
+
+
+def sizes(raw):
+    body = json.dumps(raw, separators=(',', ':')).encode()
+    return len(body), len(gzip.compress(body))
+
+
+def main():
+    with open(os.path.join(BASE_DIR, 'benchmarks', 'fixtures', 'open_meteo_forecast.json')) as f:
+        fixture = json.load(f)
+    profile = weather_display.layout_profile()
+    legacy = sizes(respond(fixture, weather_display.FULL_PROFILE.params('full')))
+    full = sizes(respond(fixture, profile.params('full')))
+    delta = sizes(respond(fixture, profile.params('delta')))
+
+    print('%-28s %9s %9s' % ('request', 'json B', 'gzip B'))
+    for name, (plain, packed) in (('legacy (7 d hourly)', legacy),
+                                  ('profile full', full), ('profile delta', delta)):
+        print('%-28s %9d %9d' % (name, plain, packed))
+
+    fulls = 24 // DAILY_REFRESH_H
+    deltas = max(0, SCHEDULED - fulls)
+    before = [LEGACY * legacy[0], LEGACY * legacy[1]]
+    after = [fulls * full[0] + deltas * delta[0], fulls * full[1] + deltas * delta[1]]
+    print()
+    print('per day: legacy %d fetches, profile %d full + %d delta' % (LEGACY, fulls, deltas))
+    print('%-28s %9.1f %9.1f KiB' % ('before', before[0] / 1024, before[1] / 1024))
+    print('%-28s %9.1f %9.1f KiB' % ('after', after[0] / 1024, after[1] / 1024))
+    print('%-28s %8.1fx %8.1fx' % ('reduction', before[0] / after[0], before[1] / after[1]))
+
+
+if __name__ == '__main__':
+    main()
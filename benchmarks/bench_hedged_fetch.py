@@ -0,0 +1,109 @@
+"""Fetch latency from one provider versus hedged across two, under injected latency.
+
+Local stand-ins for Open-Meteo and OpenWeatherMap answer with the recorded
+forecast after an injected delay: Open-Meteo usually in FAST_MS but one
+request in TAIL_EVERY in TAIL_MS, OWM always in OWM_MS. Each mode makes
+FETCHES requests through weather_providers.HedgedFetch, with the learned
+hedge delay, and reports the latency percentiles and how many requests
+each upstream got.
+
+    python3 benchmarks/bench_hedged_fetch.py [FETCHES] [TAIL_MS]
+"""
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+os.environ.setdefault('TIDETRACKER_METRICS', '0')
+import weather_display
+import weather_providers
+
+FETCHES = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+TAIL_MS = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+FAST_MS = 80
+TAIL_EVERY = 20
+OWM_MS = 250
+
+FIXTURE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures',
+                       'open_meteo_forecast.json')
+
+
+def onecall(raw):
+    """The fixture's current conditions as a minimal One Call response."""
+    current = raw['current']
+    return {'timezone_offset': raw['utc_offset_seconds'],
+            'current': {'dt': int(time.time()), 'temp': current['temperature_2m'],
+                        'feels_like': current['apparent_temperature'],
+                        'humidity': current['relative_humidity_2m'],
+                        'wind_speed': current['wind_speed_10m'], 'weather': [{'id': 802}]},
+            'hourly': [], 'daily': []}
+
+
+def serve(rng):
+    with open(FIXTURE) as f:
+        raw = json.load(f)
+    counts = {'open-meteo': 0, 'owm': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            owm = self.path.startswith('/data/')
+            with lock:
+                name = 'owm' if owm else 'open-meteo'
+                counts[name] += 1
+                tail = not owm and rng.random() < 1 / TAIL_EVERY
+            time.sleep((OWM_MS if owm else TAIL_MS if tail else FAST_MS) / 1000)
+            body = json.dumps(onecall(raw) if owm else raw).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server, 'http://127.0.0.1:%d' % server.server_address[1], counts
+
+
+def run(providers):
+    server, base, counts = serve(random.Random(7))
+    weather_display.BASE_URL = base + '/v1/forecast'
+    owm = weather_providers.OpenWeatherMap(base + '/data/2.5/onecall?appid=x')
+    chosen = {'open-meteo': weather_providers.OpenMeteo(), 'owm': owm}
+    fetch = weather_providers.HedgedFetch([chosen[name] for name in providers])
+    samples = []
+    for _ in range(FETCHES):
+        started = time.perf_counter()
+        fetch()
+        samples.append(time.perf_counter() - started)
+    time.sleep(TAIL_MS / 1000)      # let dropped answers land
+    fetch.close()
+    server.shutdown()
+    samples.sort()
+    return samples, dict(counts), fetch.hedges
+
+
+def main():
+    logging.disable(logging.INFO)
+    print('%-22s %8s %8s %8s %8s %10s %6s' % (
+        'mode', 'p50 ms', 'p90 ms', 'max ms', 'total s', 'requests', 'hedges'))
+    for name, providers in (('open-meteo only', ('open-meteo',)),
+                            ('hedged with owm', ('open-meteo', 'owm'))):
+        samples, counts, hedges = run(providers)
+        print('%-22s %8.0f %8.0f %8.0f %8.1f %10s %6d' % (
+            name, statistics.median(samples) * 1e3, samples[int(0.9 * len(samples))] * 1e3,
+            samples[-1] * 1e3, sum(samples), '%d+%d' % (counts['open-meteo'], counts['owm']),
+            hedges))
+
+
+if __name__ == '__main__':
+    main()
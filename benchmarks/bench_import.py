@@ -0,0 +1,65 @@
+"""Import time of TideTracker, lazy versus eager dependencies.
+
+Times `import TideTracker` in a fresh interpreter, by wall clock and by
+`-X importtime`, against the same import followed by the dependencies the
+module used to load at the top (what every start paid before they were made
+lazy). The eager case is what a start with the tide and Owlet panels enabled
+still pays, just later and only for the panels in use.
+
+    python3 benchmarks/bench_import.py [RUNS]
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+EAGER = ('requests', 'numpy', 'pandas', 'matplotlib.pyplot', 'matplotlib.dates',
+         'owlet_monitor', 'tide_client', 'tide_harmonics', 'tide_prefetch',
+         'tide_series', 'vitals_channel', 'vitals_stats')
+
+CASES = {
+    'lazy': 'import TideTracker',
+    'eager': 'import TideTracker\n' + ''.join('import %s\n' % m for m in EAGER),
+}
+
+TIMER = 'import time\nt0 = time.perf_counter()\n%s\nprint(time.perf_counter() - t0)\n'
+IMPORTTIME = re.compile(r'import time:\s+\d+ \|\s+(\d+) \|\s?(\S.*)$')
+
+
+def wall_clock(code):
+    out = subprocess.run([sys.executable, '-c', TIMER % code], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.split()[-1])
+
+
+def import_profile(code):
+    """Top-level modules by cumulative import time (microseconds)."""
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stderr
+    top = {}
+    for line in err.splitlines():
+        m = IMPORTTIME.match(line)
+        if m and not m.group(2).startswith(' '):
+            top[m.group(2)] = int(m.group(1))
+    return top
+
+
+def main():
+    print(f'{"case":>6} {"median ms":>10} {"min ms":>8}')
+    for name, code in CASES.items():
+        times = [wall_clock(code) * 1000 for _ in range(RUNS)]
+        print(f'{name:>6} {statistics.median(times):>10.1f} {min(times):>8.1f}')
+    print()
+    for name, code in CASES.items():
+        top = sorted(import_profile(code).items(), key=lambda kv: -kv[1])[:8]
+        print(f'{name}: slowest top-level imports (-X importtime, cumulative)')
+        for module, us in top:
+            print(f'  {module:<24} {us / 1000:>8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Cost of a timed stage with metrics disabled and enabled.
+
+Times N calls of an empty function undecorated, through metrics.timed()
+and inside a metrics.span() block, with timing off and then on.
+
+    python3 benchmarks/bench_metrics.py [N]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import metrics
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+
+def work():
+    pass
+
+
+timed_work = metrics.timed('bench')(work)
+
+
+def with_span():
+    with metrics.span('bench'):
+        work()
+
+
+def per_call(func):
+    started = time.perf_counter()
+    for _ in range(N):
+        func()
+    return (time.perf_counter() - started) / N * 1e9
+
+
+def main():
+    print(f'{N} calls, ns per call')
+    print(f'{"metrics":>8} {"plain":>8} {"timed":>8} {"span":>8}')
+    for on in (False, True):
+        metrics.enable(on)
+        print(f'{"on" if on else "off":>8} {per_call(work):>8.0f} '
+              f'{per_call(timed_work):>8.0f} {per_call(with_span):>8.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""One-shot refreshes from a systemd timer versus the resident daemon.
+
+Each one-shot case runs `oneshot.run` in a fresh interpreter, as
+weather-oneshot.service does, from a copy of a prepared state directory,
+against a local stand-in for Open-Meteo serving the fixture with an ETag
+and the null EPD backend:
+
+    idle             nothing due (most timer runs)
+    boundary         show the prerendered frame for a new hour
+    fetch 304        conditional fetch, nothing changed
+    fetch+render     changed response: re-render the frames and show one
+
+Wall time and CPU time (user + sys, the energy proxy) include interpreter
+start-up, with -S as the unit runs it. The daemon's cases are the same work done warm in one resident
+process: a changed fetch with PrerenderQueue.refill, and writing a ready
+frame at a boundary. The per-day totals assume the timer every 5 minutes
+and SCHEDULED_FETCHES_PER_DAY fetches that all change the panel.
+
+    python3 benchmarks/bench_oneshot.py [RUNS] [SCHEDULED_FETCHES_PER_DAY]
+"""
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+SCHEDULED = int(sys.argv[2]) if len(sys.argv) > 2 else 28
+TIMER_RUNS = 24 * 60 // 5
+BOUNDARIES = 24
+
+T0 = 1714242000             # 2024-04-27 14:20 EDT, the fixture's current hour
+
+PREPARE = ('import weather_display\n'
+           'weather_display.BASE_URL = %(url)r\n'
+           'weather_display.FONTDIR = %(fontdir)r\n')
+# Peak RSS in KiB; ru_maxrss would carry over this process's through fork
+REPORT = ('import json\n'
+          'peak = [line.split()[1] for line in open("/proc/self/status") if line.startswith("VmHWM")]\n'
+          'print(json.dumps([done, int(peak[0])]))\n')
+SITE = 'import oneshot\noneshot._site()\n'
+ONESHOT = 'import oneshot\ndone = oneshot.run(%(now)r, state_dir=%(state_dir)r)\n'
+
+DAEMON = '''
+import time
+from fetch_profile import WeatherFetcher
+from fetch_scheduler import FetchScheduler
+from lib.waveshare_epd import epd7in5_V2, epdconfig
+from prerender import PrerenderQueue
+epd = epd7in5_V2.EPD(backend=epdconfig.NullBackend())
+profile = weather_display.layout_profile()
+fetch = WeatherFetcher(lambda part: weather_display.fetch_weather(profile, part))
+scheduler = FetchScheduler()
+frames = PrerenderQueue(weather_display.render_at, pack=epd.getbuffer,
+                        horizon=weather_display.PRERENDER_FRAMES, step=3600)
+
+def timed(fn):
+    wall, cpu = time.perf_counter(), time.process_time()
+    fn()
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+def refresh():
+    scheduler.record(fetch())
+    frames.refill(fetch.last)
+
+refresh()                   # warm: imports, fonts, the HTTP session
+done = {'fetch+render': [timed(refresh) for _ in range(%(runs)d)]}
+frame = frames.pop_due()
+done['boundary'] = [timed(lambda: weather_display.write_to_display(
+    frame.image, epd=epd, buffer=frame.buffer)) for _ in range(%(runs)d)]
+'''
+
+
+class Upstream:
+    """The fixture with an ETag; `changing` serves a new version each time."""
+
+    def __init__(self):
+        with open(os.path.join(BASE_DIR, 'benchmarks', 'fixtures', 'open_meteo_forecast.json')) as f:
+            self.raw = json.load(f)
+        self.version = 1
+        self.changing = False
+
+    def respond(self, handler):
+        if self.changing:
+            self.version += 1
+            self.raw['current']['temperature_2m'] += 0.1
+        etag = '"%d"' % self.version
+        if handler.headers.get('If-None-Match') == etag:
+            handler.send_response(304)
+            handler.end_headers()
+            return
+        body = json.dumps(self.raw).encode()
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.send_header('ETag', etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def serve(upstream):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            upstream.respond(self)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server, 'http://127.0.0.1:%d/v1/forecast' % server.server_address[1]
+
+
+def child(code, env):
+    """(result, wall s, cpu s, peak RSS KiB) of `code` in a fresh interpreter."""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-S', '-c', code], cwd=BASE_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    result, rss = json.loads(out.splitlines()[-1])
+    return result, wall, cpu, rss
+
+
+def set_state(state_dir, **changes):
+    path = os.path.join(state_dir, 'state.json')
+    with open(path) as f:
+        state = json.load(f)
+    state.update(changes)
+    with open(path, 'w') as f:
+        json.dump(state, f)
+    return state
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    fontdir = os.path.join(BASE_DIR, 'font')
+    if not os.path.exists(os.path.join(fontdir, 'Font.ttc')):
+        import matplotlib
+        fontdir = os.path.join(workdir, 'font')
+        os.makedirs(fontdir)
+        os.symlink(os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf'),
+                   os.path.join(fontdir, 'Font.ttc'))
+    env = dict(os.environ, EPD_BACKEND='null', TIDETRACKER_METRICS='0')
+    upstream = Upstream()
+    server, url = serve(upstream)
+    prepare = SITE + PREPARE % {'url': url, 'fontdir': fontdir}
+
+    # A full fetch, then a delta, so both parts have validators
+    base = os.path.join(workdir, 'base')
+    child(prepare + ONESHOT % {'now': T0, 'state_dir': base} + REPORT, env)
+    set_state(base, next_fetch=T0 + 300)
+    child(prepare + ONESHOT % {'now': T0 + 300, 'state_dir': base} + REPORT, env)
+    state = set_state(base, next_fetch=T0 + 86400)
+    boundary = state['frames'][1][0]
+
+    cases = [
+        ('idle', T0 + 600, {}, False, ()),
+        ('boundary', boundary, {}, False, ('show',)),
+        ('fetch 304', T0 + 600, {'next_fetch': T0 + 600}, False, ('fetch',)),
+        ('fetch+render', T0 + 600, {'next_fetch': T0 + 600}, True,
+         ('fetch', 'render', 'show')),
+    ]
+    oneshot = {}
+    for name, now, changes, changing, expected in cases:
+        samples = []
+        for _ in range(RUNS):
+            state_dir = os.path.join(workdir, 'run')
+            shutil.rmtree(state_dir, ignore_errors=True)
+            shutil.copytree(base, state_dir)
+            set_state(state_dir, **changes)
+            upstream.changing = changing
+            code = (prepare if 'fetch' in name else '') + \
+                ONESHOT % {'now': now, 'state_dir': state_dir} + REPORT
+            done, wall, cpu, rss = child(code, env)
+            assert tuple(done) == expected, (name, done)
+            samples.append((wall, cpu, rss))
+        oneshot[name] = [statistics.median(column) for column in zip(*samples)]
+
+    upstream.changing = True
+    daemon, _, _, daemon_rss = child(prepare + DAEMON % {'runs': RUNS} + REPORT, env)
+    daemon = {name: [statistics.median(column) for column in zip(*samples)]
+              for name, samples in daemon.items()}
+    server.shutdown()
+    shutil.rmtree(workdir)
+
+    print('%-22s %9s %9s %9s' % ('case', 'wall ms', 'cpu ms', 'rss MiB'))
+    for name, (wall, cpu, rss) in oneshot.items():
+        print('%-22s %9.1f %9.1f %9.1f' % ('one-shot ' + name, wall * 1e3, cpu * 1e3, rss / 1024))
+    for name, (wall, cpu) in daemon.items():
+        print('%-22s %9.1f %9.1f %9.1f' % ('daemon ' + name, wall * 1e3, cpu * 1e3,
+                                            daemon_rss / 1024))
+
+    idle = TIMER_RUNS - SCHEDULED - BOUNDARIES
+    per_day = {
+        'one-shot': [SCHEDULED * oneshot['fetch+render'][i] + BOUNDARIES * oneshot['boundary'][i]
+                     + idle * oneshot['idle'][i] for i in (0, 1)],
+        'daemon': [SCHEDULED * daemon['fetch+render'][i] + BOUNDARIES * daemon['boundary'][i]
+                   for i in (0, 1)],
+    }
+    print()
+    print('per day: %d timer runs (%d fetches, %d boundaries, %d idle) versus a resident '
+          'process holding %.1f MiB' % (TIMER_RUNS, SCHEDULED, BOUNDARIES, idle, daemon_rss / 1024))
+    for name, (wall, cpu) in per_day.items():
+        print('%-22s %9.1f s wall %9.1f s cpu' % (name, wall, cpu))
+
+
+if __name__ == '__main__':
+    main()
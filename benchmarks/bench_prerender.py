@@ -0,0 +1,78 @@
+"""How late a boundary frame reaches the panel: on demand versus pre-rendered.
+
+On demand is the original path: at the boundary, fetch (sleep), render and
+pack with the real epd.getbuffer(), then start the transfer. Pre-rendered
+packs the frames for the next boundaries right after a fetch, and the
+display loop only waits for the boundary and takes the ready buffer.
+Boundaries are STEP_MS apart instead of an hour.
+
+    python3 benchmarks/bench_prerender.py [FRAMES] [FETCH_MS] [STEP_MS]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from PIL import Image, ImageDraw
+from lib.waveshare_epd import epd7in5_V2, epdconfig
+from prerender import PrerenderQueue
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+FETCH_MS = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+STEP_MS = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+
+def fetch():
+    time.sleep(FETCH_MS / 1000)
+    return {'temperature': 71}
+
+
+def render_at(raw, when):
+    image = Image.new('1', (800, 480), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100, 100, 300, 200), fill=0)
+    draw.text((400, 240), '%s %d' % (time.strftime('%H:%M:%S', time.localtime(when)),
+                                      raw['temperature']), fill=0)
+    image.info['due'] = when
+    return image
+
+
+def on_demand(epd, step):
+    late = []
+    for _ in range(FRAMES):
+        due = (time.time() // step + 1) * step
+        time.sleep(max(0, due - time.time()))
+        buffer = epd.getbuffer(render_at(fetch(), due))
+        late.append(time.time() - due)
+        epd.display(buffer)
+    return late
+
+
+def prerendered(epd, step):
+    queue = PrerenderQueue(render_at, pack=epd.getbuffer, horizon=FRAMES, step=step)
+    raw = fetch()
+    now = time.time()
+    queue.refill(raw, now=now)
+    queue.pop_due(now)              # the frame for now
+    late = []
+    for _ in range(FRAMES):
+        frame = queue.wait_frame()
+        late.append(time.time() - frame.image.info['due'])
+        epd.display(frame.buffer)
+    return late
+
+
+def main():
+    step = STEP_MS / 1000
+    print(f'{FRAMES} boundaries {STEP_MS} ms apart, fetch {FETCH_MS} ms')
+    print(f'{"mode":>12} {"mean late ms":>13} {"max late ms":>12}')
+    for name, run in (('on demand', on_demand), ('prerendered', prerendered)):
+        epdconfig.set_backend(epdconfig.RecordingBackend())
+        epd = epd7in5_V2.EPD()
+        epd.init()
+        late = run(epd, step)
+        print(f'{name:>12} {1000 * sum(late) / len(late):>13.1f} {1000 * max(late):>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
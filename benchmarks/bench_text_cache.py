@@ -0,0 +1,94 @@
+"""render() time and text cache hit rate over a simulated day of frames.
+
+Renders one frame per CADENCE minutes for a day, with the clock, the hourly
+window and temperatures moving as they would, once drawing text straight
+through FreeType and once through weather_display.TEXT_CACHE. Uses
+font/Font.ttc if present, else matplotlib's DejaVuSans.
+
+    python3 benchmarks/bench_text_cache.py [CADENCE_MINUTES]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import weather_display
+from text_cache import TextCache
+
+CADENCE = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+START = datetime(2024, 4, 27)
+
+
+def api_response(now):
+    hours = [START + timedelta(hours=i) for i in range(72)]
+    temp = lambda t: 60 + 10 * ((t.hour - 4) % 24) / 24
+    return {
+        'utc_offset_seconds': -14400,
+        'current': {'time': now.strftime('%Y-%m-%dT%H:00'), 'temperature_2m': temp(now),
+                    'apparent_temperature': temp(now) - 3, 'relative_humidity_2m': 60 + now.hour,
+                    'wind_speed_10m': 5 + now.minute / 10, 'wind_direction_10m': 15 * now.hour,
+                    'weather_code': 2, 'is_day': int(6 <= now.hour < 20), 'uv_index': 3.0,
+                    'visibility': 16093.4, 'dew_point_2m': 55.0},
+        'hourly': {'time': [t.strftime('%Y-%m-%dT%H:00') for t in hours],
+                   'temperature_2m': [temp(t) for t in hours],
+                   'weather_code': [(0, 2, 3, 61)[t.hour % 4] for t in hours],
+                   'precipitation_probability': [(t.hour * 5) % 100 for t in hours],
+                   'wind_speed_10m': [5 + t.hour % 7 for t in hours]},
+        'daily': {'time': [(START + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)],
+                  'temperature_2m_max': [70, 72, 68, 65, 71, 74, 69],
+                  'temperature_2m_min': [55, 56, 54, 52, 57, 58, 55],
+                  'weather_code': [2, 3, 61, 3, 0, 0, 2],
+                  'precipitation_probability_max': [5, 20, 80, 30, 5, 0, 15],
+                  'sunrise': ['2024-04-27T06:05'] * 7, 'sunset': ['2024-04-27T19:45'] * 7},
+    }
+
+
+class Uncached:
+    hits = misses = 0
+
+    def text(self, draw, xy, text, font, fill=0):
+        draw.text(xy, text, font=font, fill=fill)
+
+    def bbox(self, text, font):
+        return font.getbbox(text)
+
+    def width(self, text, font):
+        bbox = font.getbbox(text)
+        return bbox[2] - bbox[0]
+
+
+def simulate(text_cache, fontdir):
+    weather_display.TEXT_CACHE = text_cache
+    picdir = weather_display.PICDIR
+    elapsed = 0.0
+    for minute in range(0, 24 * 60, CADENCE):
+        now = START + timedelta(minutes=minute)
+        weather = weather_display.parse_weather(api_response(now), now=now)
+        t0 = time.perf_counter()
+        weather_display.render(weather, picdir, weather_display.ICONDIR, fontdir)
+        elapsed += time.perf_counter() - t0
+    return elapsed / (24 * 60 // CADENCE)
+
+
+def main():
+    fontdir = weather_display.FONTDIR
+    with tempfile.TemporaryDirectory() as tmp:
+        if not os.path.exists(os.path.join(fontdir, 'Font.ttc')):
+            import matplotlib
+            os.symlink(os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf'),
+                       os.path.join(tmp, 'Font.ttc'))
+            fontdir = tmp
+        frames = 24 * 60 // CADENCE
+        print(f'{frames} frames, one every {CADENCE} min')
+        print(f'{"text":>9} {"ms/render":>10} {"hit rate":>9} {"entries":>8}')
+        for name, cache in (('freetype', Uncached()), ('cached', TextCache())):
+            per_frame = simulate(cache, fontdir)
+            rate = f'{cache.hit_rate():.1%}' if isinstance(cache, TextCache) else '-'
+            entries = len(cache) if isinstance(cache, TextCache) else '-'
+            print(f'{name:>9} {per_frame * 1000:>10.2f} {rate:>9} {entries:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Water level request volume and payload per day.
+
+Replays one day of TideTracker's 60-second main loop against an in-process
+fake of the CO-OPS datagetter and compares three strategies:
+
+- refetch:     the full 24 h window on every cycle (the original past24)
+- cached:      the full window through TideClient's 6-minute response cache
+- ring buffer: TideSeries topping up from the last stored sample
+
+    python3 benchmarks/bench_tide_series.py
+"""
+import calendar
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from tide_client import TideClient
+from tide_series import TideSeries
+
+DAY = 86400
+CYCLE = 60
+START = calendar.timegm(datetime(2024, 4, 27).timetuple())
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode()
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class FakeCoops:
+    """requests.Session stand-in serving 6-minute water levels up to `now`."""
+
+    def __init__(self):
+        self.now = START
+
+    def get(self, url, params=None, timeout=None):
+        fmt = '%Y%m%d %H:%M'
+        begin = datetime.strptime(params['begin_date'], fmt)
+        end = min(datetime.strptime(params['end_date'], fmt),
+                  datetime.fromtimestamp(self.now, timezone.utc).replace(tzinfo=None))
+        t = begin.replace(minute=begin.minute - begin.minute % 6)
+        if t < begin:
+            t += timedelta(minutes=6)
+        data = []
+        while t <= end:
+            data.append({'t': t.strftime('%Y-%m-%d %H:%M'), 'v': '1.234',
+                         's': '0.005', 'f': '0,0,0,0', 'q': 'p'})
+            t += timedelta(minutes=6)
+        return FakeResponse({'metadata': {'id': params['station']}, 'data': data})
+
+
+def _window(now):
+    fmt = '%Y%m%d %H:%M'
+    now -= now % 360   # past24 rounds to the sample grid
+    return (time.strftime(fmt, time.gmtime(now - DAY)), time.strftime(fmt, time.gmtime(now)))
+
+
+def simulate(strategy, cache_dir):
+    fake = FakeCoops()
+    client = TideClient('8516990', cache_dir=cache_dir, session=fake)
+    series = TideSeries('8516990', path=os.path.join(cache_dir, 'wl.npz'))
+    series.refresh(client, now=START)   # warm start: yesterday already stored
+    requests0, bytes0 = client.requests, client.bytes_received
+    for now in range(START + CYCLE, START + DAY + 1, CYCLE):
+        fake.now = now
+        if strategy == 'refetch':
+            client._memory.clear()
+            client.get_records(*_window(now), product='water_level', time_zone='gmt')
+        elif strategy == 'cached':
+            client.get_records(*_window(now), product='water_level', time_zone='gmt')
+        else:
+            series.refresh(client, now=now)
+    return client.requests - requests0, client.bytes_received - bytes0
+
+
+def main():
+    print(f'{"strategy":>12} {"requests/day":>13} {"KiB/day":>10}')
+    for strategy in ('refetch', 'cached', 'ring buffer'):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            n, nbytes = simulate(strategy, cache_dir)
+        print(f'{strategy:>12} {n:>13} {nbytes / 1024:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
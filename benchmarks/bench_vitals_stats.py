@@ -0,0 +1,45 @@
+"""Per-sample cost of the rolling vitals aggregator as a session grows.
+
+Feeds synthetic 10-second Owlet samples into one VitalsAggregator and
+reports the mean cost of `add()` over each successive block. A flat
+column means the cost does not depend on how long the session has run.
+
+    python3 benchmarks/bench_vitals_stats.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from vitals_stats import VitalsAggregator
+
+CHECKPOINTS_HOURS = [1, 6, 12, 24, 48, 96, 168]
+SAMPLE_PERIOD = 10
+
+
+def main():
+    rng = random.Random(0)
+    agg = VitalsAggregator()
+    ts = 1_700_000_000
+    done = 0
+    print(f'{"session":>9} {"samples":>8} {"us/sample":>10} {"summary us":>11}')
+    for hours in CHECKPOINTS_HOURS:
+        target = hours * 3600 // SAMPLE_PERIOD
+        block = target - done
+        start = time.perf_counter()
+        for _ in range(block):
+            agg.add({'ts': ts, 'hr': rng.randint(100, 160),
+                     'ox': rng.randint(90, 100), 'mv': rng.randint(0, 3)})
+            ts += SAMPLE_PERIOD
+        per_sample = (time.perf_counter() - start) / block * 1e6
+        done = target
+
+        start = time.perf_counter()
+        agg.summary(now=ts)
+        summary_us = (time.perf_counter() - start) * 1e6
+        print(f'{hours:>8}h {done:>8} {per_sample:>10.2f} {summary_us:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""Benchmark suite for the refresh path, with regression gates.
+
+Times each stage on the recorded payloads in benchmarks/fixtures/:
+parse_weather, render, EPD.getbuffer, EPD.display (on the null SPI backend),
+plotOwletData and plotTide. Every case runs two ways:
+
+- warm: in this process, after WARMUP untimed calls; the median and minimum
+  of REPEAT timed calls, each with the garbage collector off,
+- cold: the first call in a fresh interpreter (lazy imports, font loading,
+  layout compilation), repeated in COLD_REPEAT interpreters.
+
+Peak memory is the tracemalloc peak of one extra call (PIL image buffers
+are not traced), so tracing doesn't skew the timings.
+
+Each run is appended to benchmarks/history.jsonl. A case fails if its
+median exceeds its max_seconds, its peak exceeds max_peak_kib, or its
+median is more than `regression` (a fraction) above the median of the
+last BASELINE_RUNS passing runs on this host, per benchmarks/thresholds.json.
+Any failure makes the exit status 1.
+
+    python3 benchmarks/run.py [-k PATTERN] [--repeat N] [--cold-repeat N]
+                              [--no-cold] [--no-history] [--no-gate]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+FIXTURES = os.path.join(BENCH_DIR, 'fixtures')
+HISTORY = os.path.join(BENCH_DIR, 'history.jsonl')
+THRESHOLDS = os.path.join(BENCH_DIR, 'thresholds.json')
+
+WARMUP = 2
+REPEAT = 7
+COLD_REPEAT = 3
+BASELINE_RUNS = 5
+
+# The frame the weather fixture was recorded for
+NOW = datetime(2024, 4, 27, 14, 20)
+
+CASES = {}
+
+
+def case(name):
+    """Register `setup(env)`, which returns the zero-argument call to time."""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def fixture(name):
+    path = os.path.join(FIXTURES, name)
+    if name.endswith('.json'):
+        with open(path) as f:
+            return json.load(f)
+    return path
+
+
+class Env:
+    """Scratch working directory (plots write to images/) and a usable font dir."""
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+        os.makedirs(os.path.join(workdir, 'images'), exist_ok=True)
+        self.fontdir = os.path.join(BASE_DIR, 'font')
+        if not os.path.exists(os.path.join(self.fontdir, 'Font.ttc')):
+            import matplotlib
+            self.fontdir = os.path.join(workdir, 'font')
+            os.makedirs(self.fontdir, exist_ok=True)
+            os.symlink(os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf'),
+                       os.path.join(self.fontdir, 'Font.ttc'))
+        os.chdir(workdir)
+
+
+def _weather():
+    import weather_display
+    return weather_display.parse_weather(fixture('open_meteo_forecast.json'), now=NOW)
+
+
+def _frame(env):
+    import weather_display
+    return weather_display.render(_weather(), weather_display.PICDIR,
+                                  weather_display.ICONDIR, env.fontdir)
+
+
+def _epd():
+    from lib.waveshare_epd import epd7in5_V2, epdconfig
+    return epd7in5_V2.EPD(backend=epdconfig.NullBackend())
+
+
+@case('parse_weather')
+def parse_weather(env):
+    import weather_display
+    raw = fixture('open_meteo_forecast.json')
+    return lambda: weather_display.parse_weather(raw, now=NOW)
+
+
+@case('render')
+def render(env):
+    import weather_display
+    weather = _weather()
+    return lambda: weather_display.render(weather, weather_display.PICDIR,
+                                          weather_display.ICONDIR, env.fontdir)
+
+
+@case('getbuffer')
+def getbuffer(env):
+    image = _frame(env)
+    epd = _epd()
+    return lambda: epd.getbuffer(image)
+
+
+@case('display')
+def display(env):
+    epd = _epd()
+    buffer = epd.getbuffer(_frame(env))
+    epd.init()
+    return lambda: epd.display(buffer)
+
+
+@case('plot_owlet')
+def plot_owlet(env):
+    import TideTracker
+    import vitals_stats
+    stats = vitals_stats.VitalsAggregator.from_csv(fixture('owlet_data.csv'))
+    return lambda: TideTracker.plotOwletData(stats, now=stats.last_ts)
+
+
+@case('plot_tide')
+def plot_tide(env):
+    import calendar
+    import TideTracker
+    import tide_series
+    records = fixture('coops_water_level.json')['data']
+    series = tide_series.TideSeries('8516990', path=os.path.join(env.workdir, 'tide.npz'))
+    # Shift the recorded day to end now: plotTide shows the window ending now
+    times = [calendar.timegm(time.strptime(r['t'], '%Y-%m-%d %H:%M')) for r in records]
+    shift = (int(time.time()) - times[-1]) // 360 * 360
+    for ts, r in zip(times, records):
+        if r['v']:
+            series.append(ts + shift, float(r['v']))
+    return lambda: TideTracker.plotTide(series)
+
+
+# -- Measuring --------------------------------------------------------------
+
+def _timed(call):
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        call()
+        return time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def _peak_kib(call):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _summary(times, peak_kib):
+    return {'seconds': statistics.median(times), 'min': min(times), 'runs': len(times),
+            'peak_kib': round(peak_kib, 1)}
+
+
+def run_warm(name, env, repeat):
+    call = CASES[name](env)
+    for _ in range(WARMUP):
+        call()
+    times = [_timed(call) for _ in range(repeat)]
+    return _summary(times, _peak_kib(call))
+
+
+def run_child(name, memory):
+    """One cold call of `name` in this (fresh) process; prints the result as JSON."""
+    with tempfile.TemporaryDirectory() as workdir:
+        call = CASES[name](Env(workdir))
+        value = _peak_kib(call) if memory else _timed(call)
+    print(json.dumps({'value': value}))
+
+
+def _child(name, memory=False):
+    args = [sys.executable, os.path.realpath(__file__), '--child', name]
+    if memory:
+        args.append('--memory')
+    out = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])['value']
+
+
+def run_cold(name, repeat):
+    times = [_child(name) for _ in range(repeat)]
+    return _summary(times, _child(name, memory=True))
+
+
+# -- History and gates ------------------------------------------------------
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline(history, name, host, runs=BASELINE_RUNS):
+    """Median of `name` over the last `runs` passing runs on `host`, or None."""
+    values = [entry['results'][name]['seconds'] for entry in history
+              if entry.get('host') == host and name in entry.get('results', {})
+              and name not in entry.get('failed', [])]
+    return statistics.median(values[-runs:]) if values else None
+
+
+def limits(thresholds, name):
+    merged = dict(thresholds.get('default', {}))
+    merged.update(thresholds.get(name.split('.')[0] + '.*', {}))
+    merged.update(thresholds.get('*.' + name.split('.')[-1], {}))
+    merged.update(thresholds.get(name, {}))
+    return merged
+
+
+def check(name, result, base, limit):
+    """Reasons `result` fails its limits (an empty list if it passes)."""
+    reasons = []
+    if 'max_seconds' in limit and result['seconds'] > limit['max_seconds']:
+        reasons.append('%.1f ms > max %.1f ms' % (result['seconds'] * 1e3, limit['max_seconds'] * 1e3))
+    if 'max_peak_kib' in limit and result['peak_kib'] > limit['max_peak_kib']:
+        reasons.append('peak %.0f KiB > max %.0f KiB' % (result['peak_kib'], limit['max_peak_kib']))
+    if base and 'regression' in limit and result['seconds'] > base * (1 + limit['regression']):
+        reasons.append('%+.0f%% vs baseline (limit %+.0f%%)' % (
+            100 * (result['seconds'] / base - 1), 100 * limit['regression']))
+    return reasons
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh path benchmarks with regression gates.')
+    parser.add_argument('-k', dest='pattern', default='', help='only cases whose name contains this')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--cold-repeat', type=int, default=COLD_REPEAT)
+    parser.add_argument('--no-cold', action='store_true', help='skip the cold runs')
+    parser.add_argument('--history', default=HISTORY)
+    parser.add_argument('--thresholds', default=THRESHOLDS)
+    parser.add_argument('--no-history', action='store_true', help="don't record this run")
+    parser.add_argument('--no-gate', action='store_true', help='report only, always exit 0')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--memory', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child, args.memory)
+        return 0
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    history = load_history(args.history)
+    host = platform.node()
+    names = [name for name in CASES if args.pattern in name]
+
+    results, failed = {}, {}
+    print(f'{"case":<20} {"median ms":>10} {"min ms":>9} {"peak KiB":>9} {"base ms":>8} {"change":>7}')
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        env = Env(workdir)
+        try:
+            for name in names:
+                runs = [('warm', lambda: run_warm(name, env, args.repeat))]
+                if not args.no_cold:
+                    runs.append(('cold', lambda: run_cold(name, args.cold_repeat)))
+                for kind, run in runs:
+                    key = '%s.%s' % (name, kind)
+                    result = results[key] = run()
+                    base = baseline(history, key, host)
+                    reasons = check(key, result, base, limits(thresholds, key))
+                    if reasons:
+                        failed[key] = reasons
+                    change = '%+.0f%%' % (100 * (result['seconds'] / base - 1)) if base else '-'
+                    print(f'{key:<20} {result["seconds"] * 1e3:>10.2f} {result["min"] * 1e3:>9.2f} '
+                          f'{result["peak_kib"]:>9.0f} {base * 1e3 if base else float("nan"):>8.2f} '
+                          f'{change:>7}{"  FAIL: " + "; ".join(reasons) if reasons else ""}')
+        finally:
+            os.chdir(cwd)
+
+    if not args.no_history:
+        entry = {'time': datetime.now().isoformat(timespec='seconds'), 'commit': _commit(),
+                 'host': host, 'python': platform.python_version(),
+                 'results': results, 'failed': sorted(failed)}
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(entry, sort_keys=True) + '\n')
+
+    if failed and not args.no_gate:
+        print('%d of %d benchmarks failed their thresholds.' % (len(failed), len(results)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,415 @@
+"""One owner for the panel: producers draw into regions of a shared framebuffer.
+
+TideTracker and weather_display each drive the EPD themselves, so two of
+them on one panel fight over SPI and each clears the screen on start. With
+COMPOSITOR = True in config.py they leave the panel to this daemon:
+
+    python3 compositor.py                   # see compositor.service
+
+The daemon maps an 800x480 1-bit framebuffer in FRAMEBUFFER_DIR (tmpfs
+where there is one) and divides it into named REGIONS, each a box
+(x, y, width, height) plus a priority. A producer connects to its region by
+name and writes images into it: the packed rows go straight into the
+shared mapping and the region's sequence number is bumped (odd while the
+rows are being written, so the daemon never copies half a frame), then a
+datagram on the daemon's socket wakes it.
+
+    region = compositor.connect('weather')
+    region.write(image)                     # image.size must be region.size
+
+A write that changes no pixels is not a change. The daemon holds a change
+for HOLD[priority] seconds (0: show as soon as possible, 1: wait briefly
+for other producers, 2: wait long, usually riding along with another
+region's refresh) and any refresh policy for the region's name (see
+refresh_policy), then shows every pending region in one full refresh.
+
+Producers render at their region's size; an image of any other size is
+refused rather than scaled, since a shrunken, dithered panel is unreadable.
+weather_display has an 800x240 layout for its default region and
+TideTracker writes the half of its panel below the weather.
+
+config.py can set COMPOSITOR_REGIONS (name -> (x, y, width, height,
+priority)) and COMPOSITOR_HOLD. x and width must be multiples of 8 so
+regions are whole bytes of the panel's rows.
+"""
+import logging
+import mmap
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import refresh_policy
+
+WIDTH = 800
+HEIGHT = 480
+STRIDE = WIDTH // 8
+
+FRAMEBUFFER_DIR = os.environ.get(
+    'FRAMEBUFFER_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+FRAMEBUFFER = 'tidetracker.fb'
+SOCKET = 'tidetracker-fb.sock'
+
+# The weather panel above, TideTracker's below
+REGIONS = {
+    'weather': (0, 0, 800, 240, 2),
+    'tidetracker': (0, 240, 800, 240, 1),
+}
+HOLD = (0, 30, 600)         # seconds a change waits for others, by priority
+POLL = 60                   # longest sleep without a nudge, in seconds
+
+MAGIC = b'EPFB'
+VERSION = 1
+MAX_REGIONS = 16
+_HEADER = struct.Struct('<4sHHHH')          # magic, version, width, height, regions
+_ENTRY = struct.Struct('<16sHHHHB3xI')      # name, x, y, width, height, priority, seq
+_SEQ = struct.Struct('<I')
+_SEQ_OFFSET = _ENTRY.size - _SEQ.size
+_TABLE = _HEADER.size
+PIXELS = 4096               # page-aligned start of the packed rows
+SIZE = PIXELS + STRIDE * HEIGHT
+
+
+def _config(name, default):
+    try:
+        import config
+    except ImportError:
+        return default
+    return getattr(config, name, default)
+
+
+class Region:
+    """A producer's box in the framebuffer."""
+
+    def __init__(self, framebuffer, index, name, x, y, width, height, priority):
+        if x % 8 or width % 8:
+            raise ValueError(f'region {name}: x and width must be multiples of 8')
+        if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > WIDTH or y + height > HEIGHT:
+            raise ValueError(f'region {name}: {width}x{height}+{x}+{y} is off the panel')
+        if len(name.encode()) > 16:
+            raise ValueError(f'region {name}: names are at most 16 bytes')
+        if priority not in range(len(HOLD)):
+            raise ValueError(f'region {name}: priority must be 0 to {len(HOLD) - 1}')
+        self.framebuffer = framebuffer
+        self.index = index
+        self.name = name
+        self.box = (x, y, width, height)
+        self.priority = priority
+
+    @property
+    def size(self):
+        return self.box[2:]
+
+    def _rows(self):
+        x, y, width, height = self.box
+        start = PIXELS + y * STRIDE + x // 8
+        return [(start + row * STRIDE, start + row * STRIDE + width // 8) for row in range(height)]
+
+    def read(self):
+        """The region's packed rows (white is 1, MSB first), as one bytes object."""
+        mm = self.framebuffer.mm
+        return b''.join(mm[begin:end] for begin, end in self._rows())
+
+    def seq(self):
+        return _SEQ.unpack_from(self.framebuffer.mm, self._seq_offset())[0]
+
+    def _seq_offset(self):
+        return _TABLE + self.index * _ENTRY.size + _SEQ_OFFSET
+
+    def write(self, image):
+        """Show `image` (exactly the region's size) in this region; False if it
+        changed nothing. Raises ValueError for an image of another size."""
+        if image.size != self.size:
+            raise ValueError('region %s: image is %dx%d, the region %dx%d'
+                             % (self.name, *image.size, *self.size))
+        packed = _pack(image)
+        if packed == self.read():
+            return False
+        mm, offset = self.framebuffer.mm, self._seq_offset()
+        seq = self.seq()
+        _SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+        stride = self.box[2] // 8
+        for row, (begin, end) in enumerate(self._rows()):
+            mm[begin:end] = packed[row * stride:(row + 1) * stride]
+        _SEQ.pack_into(mm, offset, (seq + 2) & 0xFFFFFFFF)
+        self.framebuffer.nudge()
+        return True
+
+
+def _pack(image):
+    """`image` packed 1 bit per pixel."""
+    # Mode '1' rows are packed MSB first with white as 1, as EPD.getbuffer does
+    return image.convert('1').tobytes()
+
+
+class Framebuffer:
+    """The shared mapping: header, region table and packed rows."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or FRAMEBUFFER_DIR
+        self.path = os.path.join(self.directory, FRAMEBUFFER)
+        self.socket_path = os.path.join(self.directory, SOCKET)
+        self.mm = None
+        self.inode = None
+        self.regions = {}
+        self._sock = None
+
+    @classmethod
+    def create(cls, regions, directory=None):
+        """A fresh, white framebuffer with `regions` (name -> (x, y, width, height,
+        priority)), replacing any earlier one."""
+        framebuffer = cls(directory)
+        if len(regions) > MAX_REGIONS:
+            raise ValueError(f'at most {MAX_REGIONS} regions')
+        table = bytearray(SIZE)
+        _HEADER.pack_into(table, 0, MAGIC, VERSION, WIDTH, HEIGHT, len(regions))
+        for index, (name, spec) in enumerate(regions.items()):
+            Region(framebuffer, index, name, *spec)     # validates
+            _ENTRY.pack_into(table, _TABLE + index * _ENTRY.size, name.encode(), *spec, 0)
+        table[PIXELS:] = b'\xff' * (STRIDE * HEIGHT)
+        os.makedirs(framebuffer.directory, exist_ok=True)
+        # Renamed into place, so producers see either the old file or the whole new one
+        temp = framebuffer.path + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(table)
+        os.replace(temp, framebuffer.path)
+        framebuffer.open()
+        return framebuffer
+
+    def open(self):
+        with open(self.path, 'r+b') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            mm = mmap.mmap(f.fileno(), SIZE)
+        magic, version, width, height, count = _HEADER.unpack_from(mm, 0)
+        if (magic, version, width, height) != (MAGIC, VERSION, WIDTH, HEIGHT):
+            mm.close()
+            raise ValueError(f'{self.path} is not a {WIDTH}x{HEIGHT} framebuffer')
+        if self.mm is not None:
+            self.mm.close()
+        self.mm = mm
+        self.regions = {}
+        for index in range(count):
+            name, *spec, _ = _ENTRY.unpack_from(mm, _TABLE + index * _ENTRY.size)
+            name = name.rstrip(b'\0').decode()
+            self.regions[name] = Region(self, index, name, *spec)
+        return self
+
+    def check(self):
+        """Map the daemon's framebuffer again if it was restarted since."""
+        if os.stat(self.path).st_ino != self.inode:
+            self.open()
+
+    def nudge(self):
+        """Wake the daemon; if it isn't listening it finds the change when it polls."""
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+        try:
+            self._sock.sendto(b'dirty', self.socket_path)
+        except OSError:
+            pass
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+
+def connect(name, directory=None):
+    """The running compositor's region `name`.
+
+    Raises OSError if no compositor has created the framebuffer and
+    KeyError if it has no such region.
+    """
+    framebuffer = Framebuffer(directory).open()
+    region = framebuffer.regions.get(name)
+    if region is None:
+        framebuffer.close()
+        raise KeyError(f'compositor has no region {name!r}')
+    return _Connection(framebuffer, name)
+
+
+class _Connection:
+    """A region by name, followed across compositor restarts."""
+
+    def __init__(self, framebuffer, name):
+        self.framebuffer = framebuffer
+        self.name = name
+
+    @property
+    def region(self):
+        self.framebuffer.check()
+        return self.framebuffer.regions[self.name]
+
+    @property
+    def box(self):
+        return self.region.box
+
+    @property
+    def size(self):
+        return self.region.size
+
+    def write(self, image):
+        return self.region.write(image)
+
+
+class Compositor:
+    """Own the EPD and show producers' regions as they change.
+
+    `epd` is the panel driver (init/display/sleep); `clock` returns epoch
+    seconds. step(now) is one round of the loop run() drives: it notes
+    changed regions and, once one is due, refreshes the panel with all of
+    them.
+    """
+
+    def __init__(self, epd, regions=None, directory=None, policy=None, hold=None,
+                 clock=time.time):
+        regions = regions or _config('COMPOSITOR_REGIONS', REGIONS)
+        self.epd = epd
+        self.framebuffer = Framebuffer.create(regions, directory)
+        self.policy = policy or refresh_policy.from_config(
+            tuple(regions), defaults={name: {'interval': 0} for name in regions})
+        self.hold = tuple(hold or _config('COMPOSITOR_HOLD', HOLD))
+        self.clock = clock
+        self.frame = bytearray(self.framebuffer.mm[PIXELS:SIZE])
+        self.shown = {name: region.seq() for name, region in self.framebuffer.regions.items()}
+        self.dirty = {}             # region name -> when its change was first seen
+        self.refreshes = 0
+        self.torn = 0               # copies retried because a producer was mid-write
+        self._stop = threading.Event()
+        # Listening from the start, so no nudge is lost
+        path = self.framebuffer.socket_path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(path)
+
+    def scan(self, now):
+        """Note regions whose sequence number moved since they were shown."""
+        for name, region in self.framebuffer.regions.items():
+            if region.seq() != self.shown[name]:
+                self.dirty.setdefault(name, now)
+        return sorted(self.dirty)
+
+    def due(self, now):
+        """When the next refresh is due, or None with nothing pending."""
+        times = [self.policy.next_run(name, now, due=since + self.hold[
+                     self.framebuffer.regions[name].priority])
+                 for name, since in self.dirty.items()]
+        return min(times) if times else None
+
+    def _copy(self, region):
+        # Seqlock read: a copy counts only if the sequence was even and
+        # unchanged throughout
+        for _ in range(3):
+            before = region.seq()
+            if before % 2 == 0:
+                rows = region.read()
+                if region.seq() == before:
+                    break
+            self.torn += 1
+            time.sleep(0.001)
+        else:
+            return None
+        x, y, width, height = region.box
+        stride = width // 8
+        for row in range(height):
+            begin = (y + row) * STRIDE + x // 8
+            self.frame[begin:begin + stride] = rows[row * stride:(row + 1) * stride]
+        return before
+
+    def step(self, now=None):
+        """Refresh the panel if a change is due; returns the regions shown."""
+        now = self.clock() if now is None else now
+        self.scan(now)
+        due = self.due(now)
+        if due is None or due > now:
+            return ()
+        shown = []
+        for name in sorted(self.dirty):
+            seq = self._copy(self.framebuffer.regions[name])
+            if seq is not None:
+                self.shown[name] = seq
+                shown.append(name)
+        if not shown:
+            return ()
+        self.epd.init()
+        self.epd.display(self.frame)
+        self.epd.sleep()
+        self.refreshes += 1
+        for name in shown:
+            del self.dirty[name]
+            self.policy.record(name, now)
+        logging.info('Panel refreshed: %s.', ', '.join(shown))
+        return tuple(shown)
+
+    def wait(self, timeout):
+        """Sleep until a producer nudges or `timeout` seconds pass; True if nudged."""
+        self._sock.settimeout(max(0.0, timeout))
+        try:
+            self._sock.recv(64)
+        except (socket.timeout, BlockingIOError):
+            return False
+        # Several nudges wake the loop once
+        self._sock.setblocking(False)
+        try:
+            while self._sock.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def run(self):
+        """Refresh the panel as regions change, until stop()."""
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as exc:
+                logging.error(f'Panel refresh failed: {exc}')
+            now = self.clock()
+            due = self.due(now)
+            self.wait(POLL if due is None else min(POLL, due - now))
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.framebuffer.nudge()
+        except OSError:
+            pass
+
+    def close(self):
+        self._sock.close()
+        try:
+            os.unlink(self.framebuffer.socket_path)
+        except OSError:
+            pass
+        self.framebuffer.close()
+
+
+def main():
+    import diagnostics
+    import metrics
+    from lib.waveshare_epd import epd7in5_V2, epdconfig
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    diagnostics.start('compositor')
+    epdconfig.set_backend(_config('EPD_BACKEND', None))
+    epd = metrics.instrument_epd(epd7in5_V2.EPD())
+    # The only full-screen init and clear, whatever runs on top
+    epd.init()
+    epd.Clear()
+    epd.sleep()
+    compositor = Compositor(epd)
+    logging.info('Compositor serving %s from %s.', ', '.join(compositor.framebuffer.regions),
+                 compositor.framebuffer.path)
+    try:
+        compositor.run()
+    finally:
+        compositor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""Resource sampling for the long-running daemons.
+
+Diagnostics samples, every `interval` seconds:
+- RSS,
+- open file descriptors and threads,
+- live matplotlib figures and PIL images (only if those modules are loaded),
+- with tracemalloc on, traced memory and the top allocating lines.
+
+It appends each sample as one compact JSON line to cache/diagnostics_<name>.jsonl,
+and flags a quantity that has grown at every sample across the last `window`
+samples.
+
+SIGUSR1 (or `python3 diagnostics.py dump PID`) makes the running process
+write a detailed snapshot next to it: every thread's stack, gc counts, the
+most common live object types and a deeper tracemalloc listing. start()
+installs that handler even when sampling is off, and leaves a marker file
+for it; `dump` refuses a PID without one, since SIGUSR1's default action
+would terminate the process.
+
+    diagnostics.start('weather')            # in a daemon's main()
+    python3 diagnostics.py show weather     # recent samples and growth flags
+"""
+import atexit
+import gc
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.realpath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+INTERVAL = 300          # seconds between samples
+WINDOW = 12             # samples that must all grow to flag a leak
+MAX_LINES = 2000        # snapshot file is trimmed to the newest half beyond this
+TOP = 5                 # tracemalloc lines per sample
+
+# Smallest increase over the window that counts as growth
+MIN_GROWTH = {'rss_kib': 1024, 'traced_kib': 512, 'fds': 1, 'threads': 1,
+              'mpl_figures': 1, 'pil_images': 1}
+
+
+def snapshot_path(name, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, 'diagnostics_%s.jsonl' % name)
+
+
+def handler_path(pid, cache_dir=None):
+    """Marker a process writes once its SIGUSR1 handler is installed."""
+    return os.path.join(cache_dir or CACHE_DIR, 'diagnostics_%d.handler' % pid)
+
+
+def rss_kib():
+    """Resident set size in KiB (peak RSS where /proc isn't available)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def open_fds():
+    for path in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(path)) - 1   # the listing's own descriptor
+        except OSError:
+            continue
+    return None
+
+
+def _mpl_figures():
+    # Never import matplotlib just to count: only if the process uses it
+    pyplot = sys.modules.get('matplotlib.pyplot')
+    return len(pyplot.get_fignums()) if pyplot else None
+
+
+def _pil_images():
+    image = sys.modules.get('PIL.Image')
+    if image is None:
+        return None
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, image.Image))
+
+
+def _top_allocations(limit, key='lineno'):
+    import tracemalloc
+    stats = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    )).statistics(key)
+    return [{'where': '%s:%d' % (s.traceback[0].filename, s.traceback[0].lineno),
+             'kib': round(s.size / 1024, 1), 'count': s.count} for s in stats[:limit]]
+
+
+def sample(top=TOP):
+    """One compact sample of the process's resources."""
+    import tracemalloc
+    data = {'time': round(time.time(), 1), 'rss_kib': rss_kib(), 'fds': open_fds(),
+            'threads': threading.active_count(), 'mpl_figures': _mpl_figures(),
+            'pil_images': _pil_images()}
+    if tracemalloc.is_tracing():
+        data['traced_kib'] = round(tracemalloc.get_traced_memory()[0] / 1024, 1)
+        data['top'] = _top_allocations(top)
+    return data
+
+
+def growing(samples, window=WINDOW):
+    """Names of quantities that rose at every one of the last `window` samples'
+    steps (never falling) by at least their MIN_GROWTH overall."""
+    recent = samples[-window:]
+    if len(recent) < window:
+        return []
+    flagged = []
+    for key, minimum in MIN_GROWTH.items():
+        values = [s.get(key) for s in recent]
+        if any(v is None for v in values):
+            continue
+        steady = all(b >= a for a, b in zip(values, values[1:]))
+        if steady and values[-1] - values[0] >= minimum:
+            flagged.append(key)
+    return flagged
+
+
+def detailed(limit=25):
+    """Everything sample() has plus thread stacks, gc state and object type counts."""
+    import tracemalloc
+    data = sample(top=limit)
+    names = {t.ident: t.name for t in threading.enumerate()}
+    data['stacks'] = {names.get(ident, str(ident)): traceback.format_stack(frame)
+                      for ident, frame in sys._current_frames().items()}
+    data['gc'] = {'counts': gc.get_count(), 'garbage': len(gc.garbage)}
+    data['types'] = Counter(type(obj).__name__ for obj in gc.get_objects()).most_common(limit)
+    if tracemalloc.is_tracing():
+        data['top_files'] = _top_allocations(limit, key='filename')
+    return data
+
+
+class Diagnostics:
+    """Samples resources on a background thread into a JSON lines file."""
+
+    def __init__(self, name, interval=INTERVAL, window=WINDOW, cache_dir=None,
+                 tracemalloc_frames=0, sampling=True):
+        self.name = name
+        self.interval = interval
+        self.sampling = sampling    # False: the thread only writes requested dumps
+        self.window = window
+        self.path = snapshot_path(name, cache_dir)
+        self.tracemalloc_frames = tracemalloc_frames
+        self.samples = []           # the last `window` samples
+        self.flagged = set()
+        self._wake = threading.Event()
+        self._dump_requested = False
+        self._stopping = False
+        self._thread = None
+        self._marker = None
+
+    def record(self):
+        """Take a sample, append it to the file and update the growth flags."""
+        data = sample()
+        self.samples = (self.samples + [data])[-self.window:]
+        flags = growing(self.samples, self.window)
+        for key in set(flags) - self.flagged:
+            logging.warning('%s: %s has grown at every sample for %d samples (%s -> %s)',
+                            self.name, key, self.window, self.samples[0][key], data[key])
+        self.flagged = set(flags)
+        if flags:
+            data['growing'] = flags
+        self._append(data)
+        return data
+
+    def _append(self, data):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(data, separators=(',', ':')) + '\n')
+            size = f.tell()
+        # Only read the file back once it could hold more than MAX_LINES
+        if size > MAX_LINES * 200:
+            with open(self.path) as f:
+                lines = f.readlines()
+            if len(lines) > MAX_LINES:
+                tmp = self.path + '.tmp'
+                with open(tmp, 'w') as f:
+                    f.writelines(lines[-MAX_LINES // 2:])
+                os.replace(tmp, self.path)
+
+    def dump(self, path=None):
+        """Write a detailed snapshot; returns its path."""
+        path = path or os.path.join(os.path.dirname(self.path), 'diagnostics_%s_%d_%d.json' % (
+            self.name, os.getpid(), int(time.time())))
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(detailed(), f, indent=1, default=str)
+        logging.info('Wrote diagnostics snapshot to %s', path)
+        return path
+
+    def request_dump(self):
+        """Have the sampler thread write a detailed snapshot now."""
+        self._dump_requested = True
+        self._wake.set()
+
+    def install_signal(self, signum=signal.SIGUSR1):
+        # The handler only wakes the sampler thread: dumping from inside a
+        # signal handler could deadlock on locks the main thread holds
+        signal.signal(signum, lambda *_: self.request_dump())
+        self._marker = handler_path(os.getpid(), os.path.dirname(self.path))
+        os.makedirs(os.path.dirname(self._marker), exist_ok=True)
+        with open(self._marker, 'w') as f:
+            f.write(self.name + '\n')
+        atexit.register(self._remove_marker)
+
+    def _remove_marker(self):
+        if self._marker is not None:
+            try:
+                os.unlink(self._marker)
+            except OSError:
+                pass
+            self._marker = None
+
+    def _run(self):
+        next_sample = time.monotonic()
+        while not self._stopping:
+            try:
+                if self._dump_requested:
+                    self._dump_requested = False
+                    self.dump()
+                if self.sampling and time.monotonic() >= next_sample:
+                    next_sample += self.interval
+                    self.record()
+            except Exception as exc:
+                logging.error(f'Diagnostics sample failed: {exc}')
+            self._wake.wait(max(0, next_sample - time.monotonic()) if self.sampling else None)
+            self._wake.clear()
+
+    def start(self):
+        if self.tracemalloc_frames:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.tracemalloc_frames)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='diagnostics', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopping = True
+        self._wake.set()
+        self._remove_marker()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def start(name):
+    """Install the SIGUSR1 dump handler for daemon `name`, and sample (with
+    tracemalloc if configured) only if config.DIAGNOSTICS is set. Returns the
+    Diagnostics, or None if there is nothing to do off the main thread."""
+    import config
+    sampling = getattr(config, 'DIAGNOSTICS', False)
+    main_thread = threading.current_thread() is threading.main_thread()
+    if not sampling and not main_thread:
+        return None
+    diagnostics = Diagnostics(name, interval=getattr(config, 'DIAGNOSTICS_INTERVAL', INTERVAL),
+                              tracemalloc_frames=getattr(config, 'DIAGNOSTICS_TRACEMALLOC', 0)
+                              if sampling else 0, sampling=sampling)
+    if main_thread:
+        diagnostics.install_signal()
+    return diagnostics.start()
+
+
+def request_dump(pid, cache_dir=None):
+    """Send SIGUSR1 to `pid` if it has the dump handler installed; returns
+    False (sending nothing) if it doesn't."""
+    if not os.path.exists(handler_path(pid, cache_dir)):
+        return False
+    os.kill(pid, signal.SIGUSR1)
+    return True
+
+
+def show(name, count=WINDOW, cache_dir=None):
+    with open(snapshot_path(name, cache_dir)) as f:
+        samples = [json.loads(line) for line in f.readlines()[-count:]]
+    for s in samples:
+        print('%s rss %6s KiB  fds %4s  threads %3s  figures %4s  images %5s%s' % (
+            time.strftime('%Y-%m-%d %H:%M', time.localtime(s['time'])), s['rss_kib'], s['fds'],
+            s['threads'], s['mpl_figures'], s['pil_images'],
+            '  GROWING: ' + ', '.join(s['growing']) if s.get('growing') else ''))
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('dump', 'show'):
+        sys.stderr.write('usage: diagnostics.py dump PID | show NAME\n')
+        sys.exit(2)
+    if sys.argv[1] == 'dump':
+        pid = int(sys.argv[2])
+        if not request_dump(pid):
+            sys.stderr.write('Process %d has no diagnostics handler (no %s); not signalling it\n'
+                             % (pid, handler_path(pid)))
+            sys.exit(1)
+        print('Snapshot requested; it is written to %s' % CACHE_DIR)
+    else:
+        show(sys.argv[2])
+
+
+if __name__ == '__main__':
+    main()
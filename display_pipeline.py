@@ -0,0 +1,233 @@
+"""Double-buffered display path: prepare the next frame while the panel refreshes.
+
+An e-ink refresh spends seconds with the panel BUSY, during which the serial
+loop (fetch -> render -> pack -> display -> sleep) does nothing else. Here a
+producer thread fetches, renders and packs frames on a fixed cadence and
+hands them to the display thread through a LatestSlot, which keeps only the
+newest frame: if the panel is still busy when a second frame is ready, the
+stale one is dropped rather than queued.
+
+The producer starts each frame so that it is ready about when the panel
+frees up (from the recent produce and write durations; until the first
+write has been timed, once it returns), so frames are as fresh as in the
+serial loop while updates come max(produce, write) apart
+instead of produce + write.
+
+    pipeline = DisplayPipeline(produce, write, pack=epd.getbuffer, interval=60)
+    pipeline.run()
+"""
+import logging
+import threading
+import time
+
+
+def _ewma(average, value, alpha=0.5):
+    return value if not average else average + alpha * (value - average)
+
+
+class LatestSlot:
+    """Single-slot hand-off between threads that always keeps the newest item."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._full = False
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """Store `item`, replacing (and counting) any item not yet taken."""
+        with self._cond:
+            if self._full:
+                self.dropped += 1
+            self._item = item
+            self._full = True
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Take the newest item, or None on timeout or once closed."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._full or self._closed, timeout)
+            if not self._full:
+                return None
+            item, self._item, self._full = self._item, None, False
+            self._cond.notify_all()
+            return item
+
+    def wait_empty(self, timeout=None):
+        """Block until the item has been taken (or the slot closed); True if empty."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._full or self._closed, timeout) \
+                and not self._full
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class Frame:
+    """A rendered image, its packed panel buffer and when work on it started."""
+
+    __slots__ = ('image', 'buffer', 'started', 'ready')
+
+    def __init__(self, image, buffer, started, ready):
+        self.image = image
+        self.buffer = buffer
+        self.started = started
+        self.ready = ready
+
+
+class DisplayPipeline:
+    """Produce frames on one thread and write them to the panel on another.
+
+    produce() returns an image (or None to skip a cycle), or a Frame already
+    packed ahead of time, which is passed on as is; pack(image), if given,
+    turns an image into the panel buffer on the producer thread; write(frame)
+    puts a Frame on the panel and may block for the whole refresh. A new
+    frame is started every `interval` seconds, or `retry_interval` seconds
+    after produce() raised, but not before the display has taken the previous
+    frame and not so early that it would wait long in the slot.
+    """
+
+    def __init__(self, produce, write, pack=None, interval=60, retry_interval=None):
+        self.produce = produce
+        self.write = write
+        self.pack = pack
+        self.interval = interval
+        self.retry_interval = interval if retry_interval is None else retry_interval
+        self.slot = LatestSlot()
+        self._stop = threading.Event()
+        self._threads = []
+        self.produced = 0
+        self.shown = 0
+        self.last_latency = None    # produce() start to write() return, in seconds
+        # Recent durations, in seconds, used to time the next frame
+        self.produce_seconds = 0.0
+        self.write_seconds = 0.0
+        self._write_started = 0.0
+        self._writes = 0            # write() calls returned, failed or not
+        self._written = threading.Condition()
+
+    def _next_start(self, started, delay):
+        # Wait until the display takes the frame just produced, then aim to
+        # finish the next one as the current write ends.
+        while not self._stop.is_set() and not self.slot.wait_empty(timeout=1):
+            pass
+        if not self.write_seconds:
+            # No write timed yet: let it finish rather than start now and
+            # leave the next frame waiting in the slot for a whole refresh
+            with self._written:
+                while not self._stop.is_set() and self._writes < self.produced:
+                    self._written.wait(timeout=1)
+        just_in_time = self._write_started + self.write_seconds - self.produce_seconds
+        return max(started + delay, just_in_time)
+
+    def _produce_loop(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                image = self.produce()
+                if isinstance(image, Frame):
+                    # Made ahead: the time spent waiting for it is not work
+                    started = time.monotonic()
+                    frame, image = Frame(image.image, image.buffer, started, started), image.image
+                else:
+                    buffer = self.pack(image) if self.pack and image is not None else None
+                    frame = None
+            except Exception as exc:
+                logging.error(f'Frame failed: {exc} — retrying in {self.retry_interval} s.')
+                delay = self.retry_interval
+            else:
+                delay = self.interval
+                ready = time.monotonic()
+                if frame is None:
+                    self.produce_seconds = _ewma(self.produce_seconds, ready - started)
+                if image is not None:
+                    self.slot.put(frame or Frame(image, buffer, started, ready))
+                    self.produced += 1
+                    delay = self._next_start(started, delay) - started
+            self._stop.wait(max(0, delay - (time.monotonic() - started)))
+
+    def _display_loop(self):
+        while not self._stop.is_set():
+            frame = self.slot.get(timeout=1)
+            if frame is None:
+                continue
+            self._write_started = time.monotonic()
+            try:
+                self.write(frame)
+            except Exception as exc:
+                logging.error(f'Display write failed: {exc}')
+            else:
+                done = time.monotonic()
+                self.write_seconds = _ewma(self.write_seconds, done - self._write_started)
+                self.shown += 1
+                self.last_latency = done - frame.started
+            finally:
+                with self._written:
+                    self._writes += 1
+                    self._written.notify_all()
+
+    def start(self):
+        """Run both loops on background threads."""
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._produce_loop, daemon=True),
+                         threading.Thread(target=self._display_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def run(self):
+        """Run the producer in the background and the display loop here, until stop()."""
+        self._stop.clear()
+        producer = threading.Thread(target=self._produce_loop, daemon=True)
+        self._threads = [producer]
+        producer.start()
+        self._display_loop()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self.slot.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+
+class PanelScheduler:
+    """Update several panels on one host, overlapping their refreshes.
+
+    `panels` maps a name to an EPD, each with its own backend (pins and chip
+    select). Every panel is updated on its own thread: image transfers take
+    the shared SPI bus lock in turn, while the seconds each panel spends
+    BUSY refreshing overlap, so N panels cost about one refresh plus N
+    transfers.
+    """
+
+    def __init__(self, panels):
+        self.panels = dict(panels)
+        self.last_seconds = {}      # per panel, init to sleep
+
+    def _update(self, name, buffer, errors):
+        epd = self.panels[name]
+        started = time.monotonic()
+        try:
+            epd.init()
+            epd.display(buffer)
+            epd.sleep()
+        except Exception as exc:
+            errors[name] = exc
+        self.last_seconds[name] = time.monotonic() - started
+
+    def show(self, buffers):
+        """Write packed `buffers` (name -> buffer) to their panels and wait for all."""
+        errors = {}
+        threads = [threading.Thread(target=self._update, args=(name, buffer, errors), daemon=True)
+                   for name, buffer in buffers.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for name, exc in errors.items():
+            logging.error(f'Panel {name} update failed: {exc}')
+        if errors:
+            raise next(iter(errors.values()))
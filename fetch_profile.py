@@ -0,0 +1,123 @@
+"""The smallest Open-Meteo request that still fills the panel.
+
+The legacy request asked for 7 days of every hourly variable (168 rows) and
+ten current fields, for a panel that shows six hours and one row per day.
+A FetchProfile lists only the variables a layout binds and how many hourly
+rows it needs:
+
+    profile = derive(weather_layout(), sample_weather(), SOURCES, extra_hours=6)
+    params = profile.params('full')     # or 'delta'
+
+derive() traces the layout (see layout.trace) against a sample of the parsed
+data, maps each field it reads to the API variable it is parsed from, and
+sizes `forecast_hours` (which counts from the current hour) to the hourly
+items used, plus the in-progress hour and `extra_hours` for frames rendered
+ahead from the same response.
+
+WeatherFetcher alternates two requests: a 'full' one with the daily block,
+and a 'delta' one with only `current` and the near-term hours, merged into
+the last full response. The daily block is refetched every `daily_every`
+seconds and when the local date rolls over.
+
+Compression needs nothing here: requests already sends Accept-Encoding
+with gzip and deflate (and br when the brotli package is installed).
+"""
+import time
+from datetime import datetime, timedelta
+
+from layout import trace
+
+DAILY_EVERY = 6 * 3600
+
+
+class FetchProfile:
+    def __init__(self, current=(), hourly=(), daily=(), forecast_hours=None, forecast_days=7):
+        self.current = list(current)
+        self.hourly = list(hourly)
+        self.daily = list(daily)
+        self.forecast_hours = forecast_hours
+        self.forecast_days = forecast_days
+
+    def params(self, part='full'):
+        """Query parameters for a 'full' or a 'delta' (no daily block) request."""
+        params = {'forecast_days': self.forecast_days}
+        if self.current:
+            params['current'] = ','.join(self.current)
+        if self.hourly:
+            params['hourly'] = ','.join(self.hourly)
+            if self.forecast_hours is not None:
+                params['forecast_hours'] = self.forecast_hours
+        if part == 'full' and self.daily:
+            params['daily'] = ','.join(self.daily)
+        return params
+
+    def __repr__(self):
+        return 'FetchProfile(current=%r, hourly=%r, daily=%r, forecast_hours=%r, forecast_days=%r)' % (
+            self.current, self.hourly, self.daily, self.forecast_hours, self.forecast_days)
+
+
+def derive(spec, sample, sources, extra_hours=0):
+    """The FetchProfile for layout `spec`.
+
+    `sources` maps paths into the parsed data, as layout.trace reports them
+    (e.g. ('hourly', '*', 'temp')), to (block, variable) in the API response
+    (e.g. ('hourly', 'temperature_2m')); paths it doesn't list, like the
+    wall clock, need nothing fetched.
+    """
+    reads = trace(spec, sample)
+    variables = {'current': [], 'hourly': [], 'daily': []}
+    for path, (block, variable) in sources.items():
+        if path in reads.paths and variable not in variables[block]:
+            variables[block].append(variable)
+    hours = reads.extents.get(('hourly',))
+    days = reads.extents.get(('daily',))
+    return FetchProfile(
+        current=variables['current'], hourly=variables['hourly'], daily=variables['daily'],
+        # the in-progress hour comes first and isn't shown
+        forecast_hours=1 + hours + extra_hours if hours else None,
+        forecast_days=max(1, days or 1))
+
+
+def local_date(raw, now):
+    """The API's local date at epoch time `now`, as 'YYYY-MM-DD'."""
+    local = datetime(1970, 1, 1) + timedelta(seconds=now + raw.get('utc_offset_seconds', 0))
+    return local.strftime('%Y-%m-%d')
+
+
+class WeatherFetcher:
+    """Calls `fetch(part)` for a 'full' response every `daily_every` seconds
+    (and on a new local day), otherwise for a 'delta' merged into it.
+
+    `fetch` may return None for a response that hasn't changed since the
+    last one for that part; the last result is returned again.
+    """
+
+    def __init__(self, fetch, daily_every=DAILY_EVERY, clock=time.time):
+        self.fetch = fetch
+        self.daily_every = daily_every
+        self.clock = clock
+        self.base = None            # last full response
+        self.full_at = None
+        self.last = None            # last merged response
+
+    def needs_full(self, now):
+        if self.base is None or now - self.full_at >= self.daily_every:
+            return True
+        days = (self.base.get('daily') or {}).get('time') or []
+        return bool(days) and days[0] != local_date(self.base, now)
+
+    def __call__(self):
+        now = self.clock()
+        if self.needs_full(now):
+            # None: not modified since the last one (a conditional request)
+            raw = self.fetch('full') or self.base
+            self.base, self.full_at = raw, now
+            self.last = raw
+            return raw
+        delta = self.fetch('delta')
+        if delta is None:
+            return self.last
+        merged = dict(self.base)
+        merged.update(delta)
+        self.last = merged
+        return merged
@@ -0,0 +1,269 @@
+"""When to fetch the Open-Meteo forecast next, from when it has been seen to change.
+
+A blind 30-minute timer mostly refetches unchanged model output and can sit
+on a new model run for up to half an hour. FetchScheduler instead:
+
+- compares the forecast (hourly and daily blocks) of each response with
+  the last one, row by row where their times overlap, so a window that
+  slides with the clock (see fetch_profile) isn't a change;
+  `generationtime_ms` is the server's compute time, not a data version, and
+  the current observation has its own clock, so neither is part of it,
+- records, for each forecast change, the window between the last fetch that
+  still had the old data and the one that saw the new,
+- learns the update period (median gap between changes) and phase (where
+  those windows overlap, modulo the period), and fetches `lag` seconds after
+  the next expected update, probing with growing gaps if a run is late,
+- while a change window is still wide, first tries its middle, so the
+  phase is narrowed down rather than only ever confirmed late,
+- also fetches just after the observation in `current` has aged past
+  `observation_max_age` (its time + interval say when the next one lands).
+
+Fetches stay between `min_gap` and `max_gap` apart. Redraws between fetches
+(the clock, the hourly window) are rendered locally, see prerender.
+
+    scheduler = FetchScheduler()
+    changed = scheduler.record(raw)        # after each fetch
+    stop.wait(scheduler.next_fetch() - time.time())
+"""
+import calendar
+import hashlib
+import json
+import time
+from datetime import datetime
+
+PERIOD = 3600               # assumed update period until enough changes are seen
+MIN_PERIOD = 900
+MAX_PERIOD = 6 * 3600
+LAG = 120                   # fetch this long after an expected update
+PROBE = 300                 # first re-check after an expected update didn't show
+MIN_GAP = 120
+MAX_GAP = 3600
+# Open-Meteo's `current` block moves on every 15 minutes; it is refetched
+# once older than this, or up to one interval later to share a model fetch
+OBSERVATION_MAX_AGE = 3600
+HISTORY = 12                # forecast changes remembered
+VERIFY = 6                  # periods before a learned phase is re-checked
+LEARN_STEPS = 4             # fetches per period until a change window is narrow enough
+
+
+def fingerprint(raw, keys=('hourly', 'daily')):
+    """Hash of the given blocks of a response."""
+    parts = {key: raw.get(key) for key in keys}
+    return hashlib.md5(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def _rows(block):
+    """time -> that row's values, for an hourly or daily block."""
+    if not block or 'time' not in block:
+        return {}
+    names = sorted(name for name in block if name != 'time')
+    return {t: tuple((name, block[name][i]) for name in names)
+            for i, t in enumerate(block['time'])}
+
+
+def forecast_changed(old, new, keys=('hourly', 'daily')):
+    """Whether `new` forecasts differently from `old` for any time both cover
+    (or shares no time with it at all)."""
+    for key in keys:
+        before, after = _rows(old.get(key)), _rows(new.get(key))
+        if not before or not after:
+            continue                # e.g. a delta without the daily block
+        shared = before.keys() & after.keys()
+        if not shared or any(before[t] != after[t] for t in shared):
+            return True
+    return False
+
+
+def observation_time(raw):
+    """(epoch of the `current` observation, its interval in seconds), or None."""
+    current = raw.get('current') or {}
+    try:
+        local = datetime.strptime(current['time'], '%Y-%m-%dT%H:%M')
+    except (KeyError, TypeError, ValueError):
+        return None
+    epoch = calendar.timegm(local.timetuple()) - raw.get('utc_offset_seconds', 0)
+    return epoch, current.get('interval') or 900
+
+
+class FetchScheduler:
+    def __init__(self, period=PERIOD, lag=LAG, probe=PROBE, min_gap=MIN_GAP, max_gap=MAX_GAP,
+                 observation_max_age=OBSERVATION_MAX_AGE, verify=VERIFY, clock=time.time):
+        self.default_period = period
+        self.lag = lag
+        self.probe = probe
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.observation_max_age = observation_max_age
+        self.verify = verify
+        self.clock = clock
+        self.last_fetch = None
+        self.last_forecast = None
+        self.last_content = None
+        self.unchanged_since = None     # first fetch that had the current forecast
+        self.changes = []               # (lo, hi]: windows a forecast change landed in
+        self.windows = []               # those narrower than the period
+        self.observation = None         # (epoch, interval)
+        self.requests = 0
+        self.forecast_changes = 0
+
+    # -- Persistence ----------------------------------------------------------
+
+    STATE = ('last_fetch', 'last_content', 'unchanged_since', 'changes', 'windows',
+             'observation', 'requests', 'forecast_changes')
+
+    def state(self):
+        """What has been learned, as JSON-friendly values (see restore)."""
+        return {name: getattr(self, name) for name in self.STATE}
+
+    def restore(self, state, raw=None):
+        """Pick up from state(); `raw` is the response last recorded, whose
+        forecast later responses are compared with."""
+        for name in self.STATE:
+            if name in state:
+                setattr(self, name, state[name])
+        self.changes = [tuple(window) for window in self.changes]
+        self.windows = [tuple(window) for window in self.windows]
+        self.observation = tuple(self.observation) if self.observation else None
+        if raw is not None:
+            self.last_forecast = {key: raw.get(key) for key in ('hourly', 'daily')}
+
+    # -- Learning -------------------------------------------------------------
+
+    def record(self, raw, fetched_at=None):
+        """Note a fetched response; True if anything shown on the panel changed."""
+        now = self.clock() if fetched_at is None else fetched_at
+        self.requests += 1
+        forecast = {key: raw.get(key) for key in ('hourly', 'daily')}
+        content = fingerprint(raw, keys=('current', 'hourly', 'daily'))
+        new_forecast = self.last_forecast is None or forecast_changed(self.last_forecast, forecast)
+        if self.last_forecast is not None and new_forecast:
+            self.forecast_changes += 1
+            self.changes = (self.changes + [(self.last_fetch, now)])[-HISTORY:]
+            if now - self.last_fetch < self.period():
+                # A window a whole period wide says nothing about the phase
+                self.windows = (self.windows + [(self.last_fetch, now)])[-HISTORY:]
+        if new_forecast:
+            self.unchanged_since = now
+        changed = content != self.last_content
+        self.last_forecast, self.last_content = forecast, content
+        self.last_fetch = now
+        self.observation = observation_time(raw) or self.observation
+        return changed
+
+    def period(self):
+        """Update period: median gap between seen changes, to 15 minutes."""
+        if len(self.changes) < 3:
+            return self.default_period
+        gaps = sorted(b[1] - a[1] for a, b in zip(self.changes, self.changes[1:]))
+        # statistics.median, without its import on every cold start
+        middle = len(gaps) // 2
+        median = gaps[middle] if len(gaps) % 2 else (gaps[middle - 1] + gaps[middle]) / 2
+        period = round(median / MIN_PERIOD) * MIN_PERIOD
+        return min(MAX_PERIOD, max(MIN_PERIOD, period))
+
+    def _agree(self, a, b, period):
+        """The overlap of window a with b shifted by whole periods, or None."""
+        shift = round((a[0] + a[1] - b[0] - b[1]) / 2 / period) * period
+        lo, hi = max(a[0], b[0] + shift), min(a[1], b[1] + shift)
+        return (lo, hi) if lo < hi else None
+
+    def _learn(self, period):
+        """(start, end, confirmed): where changes land, as absolute times in
+        the newest agreeing window, and when that was last seen to hold.
+
+        Windows are folded oldest first, each narrowing the estimate it
+        agrees with. One that doesn't is held back: alone it is a late run
+        and dropped, but if the next agrees with it the upstream schedule
+        has moved and the two replace the estimate.
+        """
+        estimate = pending = None
+        for window in self.windows:
+            overlap = estimate and self._agree(window, estimate, period)
+            if estimate is None or overlap:
+                estimate, pending = overlap or window, None
+                confirmed = window[1]
+                continue
+            overlap = pending and self._agree(window, pending, period)
+            if overlap:
+                estimate, pending, confirmed = overlap, None, window[1]
+            else:
+                pending = window
+        return estimate and (estimate[0], estimate[1], confirmed)
+
+    def phase(self):
+        """(start, end) offsets into the period where changes land, or None."""
+        period = self.period()
+        learned = self._learn(period)
+        if learned is None:
+            return None
+        start, end, _ = learned
+        return start % period, start % period + (end - start)
+
+    def confirmed(self):
+        """When the learned phase was last seen to hold, or None."""
+        learned = self._learn(self.period())
+        return learned and learned[2]
+
+    def expected_update(self, now):
+        """(earliest, sure): the first window starting after the current
+        forecast was first seen, in which it should change; None until a
+        change is seen."""
+        phase = self.phase()
+        if phase is None:
+            return None
+        period = self.period()
+        start, end = phase
+        base = self.unchanged_since if self.unchanged_since is not None else now
+        earliest = (base - start) // period * period + start
+        while earliest <= base:
+            earliest += period
+        return earliest, earliest + (end - start)
+
+    # -- Scheduling -----------------------------------------------------------
+
+    def next_fetch(self, now=None):
+        """Epoch time of the next fetch."""
+        now = self.clock() if now is None else now
+        if self.last_fetch is None:
+            return now
+        candidates = [self.last_fetch + self.max_gap]
+
+        target = None
+        window = self.expected_update(now)
+        if window is None:
+            # Nothing learned yet: a window as wide as the period says
+            # nothing about the phase, so sample more finely until one lands
+            candidates.append(self.last_fetch + self.period() / LEARN_STEPS)
+        else:
+            earliest, sure = window
+            middle = (earliest + sure) / 2
+            confirmed = self.confirmed()
+            if sure - earliest > 2 * self.lag and middle > self.last_fetch:
+                target = middle
+            elif (self.last_fetch - confirmed > self.verify * self.period()
+                  and earliest - self.lag > self.last_fetch):
+                # Fetches only just after expected updates can't tell if
+                # upstream started landing earlier: now and then look just
+                # before the window too
+                target = earliest - self.lag
+            else:
+                target = sure + self.lag
+            if target <= self.last_fetch:
+                # The expected run hasn't shown up: back off from when it was
+                # due, but still try just after the one after it
+                late = self.last_fetch - target
+                period = self.period()
+                following = target + (late // period + 1) * period
+                target = min(self.last_fetch + max(self.probe, late), following)
+            candidates.append(target)
+
+        if self.observation and self.observation_max_age:
+            observed, interval = self.observation
+            steps = -(-self.observation_max_age // interval)
+            due = observed + steps * interval + self.lag
+            if due <= self.last_fetch:
+                due = self.last_fetch + max(self.probe, self.last_fetch - due)
+            if target is None or not 0 <= target - due <= interval:
+                candidates.append(due)
+
+        return max(min(candidates), self.last_fetch + self.min_gap)
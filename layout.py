@@ -0,0 +1,289 @@
+"""Declarative panel layouts, compiled once into a flat list of draw ops.
+
+A layout is a list of elements (Text, Icon, Line, Repeat, Region) with fixed
+positions, alignment, font size and a binding: either a constant or a
+function of the frame's data. compile_layout() resolves region offsets and
+repeats into absolute anchors, draws everything constant into a background
+image, and keeps only the data-bound elements as ops, so a frame is a copy
+of the background plus those ops.
+
+    layout = compile_layout(spec, fonts)
+    image = layout.render(weather, icondir)
+
+trace(spec, sample) evaluates every binding against `sample` and reports
+which parts of the data the layout reads, e.g. to request only those.
+
+Icons are pasted as opaque squares, so constant elements must not overlap
+them (they would be hidden on the background, not drawn over the icon).
+"""
+from PIL import Image, ImageDraw
+
+from text_cache import TextCache
+
+BLACK = 0
+WHITE = 255
+
+
+class Text:
+    """Text at `xy`; align 'left' anchors its left edge at x, 'center' its
+    middle and 'right' its right edge. `value` is a string or a function of
+    the data returning one (None draws nothing). `underline` is (y, value):
+    a line under the text at y when value (or value(data)) is true."""
+
+    def __init__(self, xy, value, font, align='left', underline=None):
+        self.xy = xy
+        self.value = value
+        self.font = font
+        self.align = align
+        self.underline = underline
+
+
+class Icon:
+    """size x size icon centred on cx with its top at y. `path` is a
+    function of (data, icondir) returning the icon file, or None."""
+
+    def __init__(self, cx, y, size, path):
+        self.cx = cx
+        self.y = y
+        self.size = size
+        self.path = path
+
+
+class Line:
+    def __init__(self, points, width=1):
+        self.points = points
+        self.width = width
+
+
+class Region:
+    """Children positioned relative to `origin`."""
+
+    def __init__(self, origin, children):
+        self.origin = origin
+        self.children = children
+
+
+class Repeat:
+    """`count` copies of children, `step` (dx, dy) apart, bound to the items
+    returned by `items(data)`; copies past the end of the items are skipped."""
+
+    def __init__(self, items, count, step, children):
+        self.items = items
+        self.count = count
+        self.step = step
+        self.children = children
+
+
+def _item(items, i, scope):
+    def item(data):
+        outer = scope(data)
+        if outer is None:
+            return None
+        sequence = items(outer)
+        return sequence[i] if i < len(sequence) else None
+    return item
+
+
+def _x(x, align, width):
+    if align == 'center':
+        return x - width // 2
+    if align == 'right':
+        return x - width
+    return x
+
+
+class CompiledLayout:
+    def __init__(self, size, background, ops, text_cache):
+        self.size = size
+        self.background = background
+        self.ops = ops
+        self.text_cache = text_cache
+
+    def render(self, data, icondir=None, text_cache=None):
+        """Draw a frame for `data` on a copy of the background."""
+        texts = self.text_cache if text_cache is None else text_cache
+        image = self.background.copy()
+        draw = ImageDraw.Draw(image)
+        for op in self.ops:
+            op(draw, image, data, icondir, texts)
+        return image
+
+
+def _draw_text(draw, texts, element, x, y, line_y, text, underline):
+    font = element.font
+    width = texts.width(text, font)
+    x0 = _x(x, element.align, width)
+    texts.text(draw, (x0, y), text, font, fill=BLACK)
+    if underline:
+        draw.line([(x0, line_y), (x0 + width, line_y)], fill=BLACK, width=1)
+
+
+def _text_op(element, x, y, line_y, scope):
+    value = element.value
+    flag = element.underline[1] if element.underline else False
+
+    def op(draw, image, data, icondir, texts):
+        inner = scope(data)
+        if inner is None:
+            return
+        text = value(inner) if callable(value) else value
+        if text is not None:
+            underline = flag(inner) if callable(flag) else flag
+            _draw_text(draw, texts, element, x, y, line_y, text, underline)
+
+    return op
+
+
+def _icon_op(element, cx, y, scope):
+    size = element.size
+    path = element.path
+
+    def op(draw, image, data, icondir, texts):
+        inner = scope(data)
+        if inner is None:
+            return
+        icon_path = path(inner, icondir)
+        if icon_path is None:
+            return
+        icon = Image.open(icon_path).resize((size, size)).convert('1')
+        image.paste(icon, (cx - size // 2, y))
+
+    return op
+
+
+def _line_op(points, width):
+    def op(draw, image, data, icondir, texts):
+        draw.line(points, fill=BLACK, width=width)
+    return op
+
+
+def _identity(data):
+    return data
+
+
+def _compile(elements, offset, scope, fonts, background, texts, ops):
+    ox, oy = offset
+    for element in elements:
+        if isinstance(element, Region):
+            _compile(element.children, (ox + element.origin[0], oy + element.origin[1]),
+                     scope, fonts, background, texts, ops)
+        elif isinstance(element, Repeat):
+            dx, dy = element.step
+            for i in range(element.count):
+                _compile(element.children, (ox + i * dx, oy + i * dy),
+                         _item(element.items, i, scope), fonts, background, texts, ops)
+        elif isinstance(element, Line):
+            points = [(x + ox, y + oy) for x, y in element.points]
+            if background is not None:
+                background.line(points, fill=BLACK, width=element.width)
+            else:
+                ops.append(_line_op(points, element.width))
+        elif isinstance(element, Text):
+            resolved = Text(element.xy, element.value, fonts[element.font],
+                            element.align, element.underline)
+            x, y = element.xy[0] + ox, element.xy[1] + oy
+            line_y = element.underline[0] + oy if element.underline else None
+            flag = element.underline[1] if element.underline else False
+            if background is not None and scope is _identity \
+                    and not callable(element.value) and not callable(flag):
+                _draw_text(background, texts, resolved, x, y, line_y, element.value, flag)
+            else:
+                ops.append(_text_op(resolved, x, y, line_y, scope))
+        elif isinstance(element, Icon):
+            ops.append(_icon_op(element, element.cx + ox, element.y + oy, scope))
+        else:
+            raise TypeError('Unknown layout element %r' % (element,))
+
+
+def compile_layout(spec, fonts, size=(800, 480), prerender=True, text_cache=None):
+    """Compile `spec` (a list of elements) against `fonts` (size -> font).
+
+    With prerender=False nothing is hoisted into the background and every
+    element is an op, run in spec order; the output is the same, only slower.
+    """
+    texts = TextCache() if text_cache is None else text_cache
+    background = Image.new('1', size, WHITE)
+    ops = []
+    _compile(spec, (0, 0), _identity, fonts,
+             ImageDraw.Draw(background) if prerender else None, texts, ops)
+    return CompiledLayout(size, background, ops, texts)
+
+
+class _Traced:
+    """Wraps a dict or list from the traced data, recording each access."""
+
+    def __init__(self, data, path, reads, offset=0):
+        self._data = data
+        self._path = path
+        self._reads = reads
+        self._offset = offset       # of a slice, into the list it was taken from
+
+    def _wrap(self, value, path):
+        if isinstance(value, (dict, list, tuple)):
+            return _Traced(value, path, self._reads)
+        self._reads.paths.add(path)
+        return value
+
+    def _extent(self, stop):
+        extents = self._reads.extents
+        extents[self._path] = max(extents.get(self._path, 0), self._offset + stop)
+
+    def __getitem__(self, key):
+        if isinstance(self._data, dict):
+            return self._wrap(self._data[key], self._path + (key,))
+        if isinstance(key, slice):
+            start, stop, _ = key.indices(len(self._data))
+            self._extent(stop)
+            return _Traced(self._data[key], self._path, self._reads, self._offset + start)
+        index = key if key >= 0 else len(self._data) + key
+        self._extent(index + 1)
+        return self._wrap(self._data[key], self._path + ('*',))
+
+    def get(self, key, default=None):
+        return self[key] if key in self._data else default
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self._data)))
+
+
+class Reads:
+    """What trace() saw a layout read: `paths` of the leaf values (list
+    indices as '*'), and `extents`, the number of items used of each list."""
+
+    def __init__(self):
+        self.paths = set()
+        self.extents = {}
+
+
+def _trace(elements, scope, data, reads):
+    for element in elements:
+        if isinstance(element, Region):
+            _trace(element.children, scope, data, reads)
+        elif isinstance(element, Repeat):
+            for i in range(element.count):
+                _trace(element.children, _item(element.items, i, scope), data, reads)
+        elif isinstance(element, (Text, Icon)):
+            inner = scope(data)
+            if inner is None:
+                continue
+            if isinstance(element, Icon):
+                element.path(inner, '')
+                continue
+            if callable(element.value):
+                element.value(inner)
+            if element.underline and callable(element.underline[1]):
+                element.underline[1](inner)
+
+
+def trace(spec, sample):
+    """Run every binding in `spec` against `sample` (a dict of dicts and
+    lists shaped like real data) and return the Reads."""
+    reads = Reads()
+    _trace(spec, _identity, _Traced(sample, (), reads), reads)
+    return reads
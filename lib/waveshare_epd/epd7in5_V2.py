@@ -29,53 +29,98 @@
 
 
 import logging
+import time
 from . import epdconfig
 
 # Display resolution
 EPD_WIDTH       = 800
 EPD_HEIGHT      = 480
 
+# Longest wait for BUSY (a full refresh takes a few seconds), in seconds
+BUSY_TIMEOUT    = 30
+# Polling interval bounds when the backend can't wait for an edge, in seconds
+BUSY_POLL_MIN   = 0.001
+BUSY_POLL_MAX   = 0.05
+
+class EPDBusyTimeout(TimeoutError):
+    """The panel held BUSY low for longer than the timeout."""
+
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, busy_timeout=BUSY_TIMEOUT, backend=None):
+        # Per-panel backend (its own pins and SPI device), or the module-wide
+        # one from epdconfig
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
+        # Panels sharing an SPI bus take turns clocking out bytes
+        self.bus_lock = epdconfig.bus_lock(self.backend.SPI_BUS)
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout = busy_timeout
+        # Time spent waiting for BUSY, in seconds
+        self.busy_seconds = 0.0
+        self.last_busy_seconds = 0.0
+        self.busy_waits = 0
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        with self.bus_lock:
+            self.backend.digital_write(self.dc_pin, 0)
+            self.backend.digital_write(self.cs_pin, 0)
+            self.backend.spi_writebyte([command])
+            self.backend.digital_write(self.cs_pin, 1)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        with self.bus_lock:
+            self.backend.digital_write(self.dc_pin, 1)
+            self.backend.digital_write(self.cs_pin, 0)
+            self.backend.spi_writebyte([data])
+            self.backend.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, timeout=None):
+        # Wait for BUSY to go high: on the rising edge where the backend
+        # supports it, otherwise polling with a growing interval, instead of
+        # spinning a core for the whole refresh.
         logging.debug("e-Paper busy")
+        timeout = self.busy_timeout if timeout is None else timeout
+        wait_for_edge = getattr(self.backend, 'wait_for_edge', None)
+        start = time.monotonic()
+        interval = BUSY_POLL_MIN
         self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
+        busy = self.backend.digital_read(self.busy_pin)
         while(busy == 0):
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                self._busy_done(start)
+                raise EPDBusyTimeout('e-Paper still busy after %.1f s' % timeout)
+            if wait_for_edge is not None:
+                wait_for_edge(self.busy_pin, min(remaining, BUSY_POLL_MAX * 20) * 1000)
+            else:
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, BUSY_POLL_MAX)
             self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(200)
+            busy = self.backend.digital_read(self.busy_pin)
+        self._busy_done(start)
+        self.backend.delay_ms(200)
+
+    def _busy_done(self, start):
+        self.last_busy_seconds = time.monotonic() - start
+        self.busy_seconds += self.last_busy_seconds
+        self.busy_waits += 1
+        logging.debug("e-Paper busy for %.3f s", self.last_busy_seconds)
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -87,7 +132,7 @@ class EPD:
         self.send_data(0x3f)		#VDL=-15V
 
         self.send_command(0x04) #POWER ON
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
         self.send_command(0X00)			#PANNEL SETTING
@@ -119,6 +164,10 @@ class EPD:
         imwidth, imheight = image_monocolor.size
         pixels = image_monocolor.load()
         # logging.debug("imwidth = %d, imheight = %d",imwidth,imheight)
+        if(imwidth == self.width and imheight == self.height and self.width % 8 == 0):
+            # PIL packs mode '1' rows MSB first with white as 1, which is
+            # exactly this buffer; ~100x faster than the loop below
+            return list(image_monocolor.tobytes())
         if(imwidth == self.width and imheight == self.height):
             logging.debug("Vertical")
             for y in range(imheight):
@@ -137,26 +186,33 @@ class EPD:
         return buf
         
     def display(self, image):
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(~image[i])
-                
+        self.transfer(image)
+        self.refresh()
+
+    # Clock the image into the panel's RAM, holding the SPI bus throughout
+    def transfer(self, image):
+        with self.bus_lock:
+            self.send_command(0x13)
+            for i in range(0, int(self.width * self.height / 8)):
+                self.send_data(~image[i])
+
+    # Refresh from RAM; the bus is free while the panel is busy
+    def refresh(self):
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
         
     def Clear(self):
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
-            
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
-                
-        self.send_command(0x12)
-        epdconfig.delay_ms(100)
-        self.ReadBusy()
+        with self.bus_lock:
+            self.send_command(0x10)
+            for i in range(0, int(self.width * self.height / 8)):
+                self.send_data(0x00)
+
+            self.send_command(0x13)
+            for i in range(0, int(self.width * self.height / 8)):
+                self.send_data(0x00)
+
+        self.refresh()
 
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
@@ -166,6 +222,6 @@ class EPD:
         self.send_data(0XA5)
         
     def Dev_exit(self):
-        epdconfig.module_exit()
+        self.backend.module_exit()
 ### END OF FILE ###
 
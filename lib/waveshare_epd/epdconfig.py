@@ -30,8 +30,33 @@
 import os
 import logging
 import sys
+import threading
 import time
 
+# Pin definition, the default for every backend
+RST_PIN         = 17
+DC_PIN          = 25
+CS_PIN          = 8
+BUSY_PIN        = 24
+# SPI bus the default panel is on
+SPI_BUS         = 0
+
+_bus_locks = {}
+_bus_locks_lock = threading.Lock()
+
+
+def bus_lock(bus=SPI_BUS):
+    """The lock serialising transfers on SPI bus `bus`, shared by every panel on it."""
+    with _bus_locks_lock:
+        return _bus_locks.setdefault(bus, threading.RLock())
+
+
+def _set_pins(backend, rst_pin, dc_pin, cs_pin, busy_pin):
+    backend.RST_PIN = rst_pin
+    backend.DC_PIN = dc_pin
+    backend.CS_PIN = cs_pin
+    backend.BUSY_PIN = busy_pin
+
 
 class RaspberryPi:
     # Pin definition
@@ -39,15 +64,19 @@ class RaspberryPi:
     DC_PIN          = 25
     CS_PIN          = 8
     BUSY_PIN        = 24
+    SPI_BUS         = 0
 
-    def __init__(self):
+    def __init__(self, bus=0, device=0, rst_pin=RST_PIN, dc_pin=DC_PIN,
+                 cs_pin=CS_PIN, busy_pin=BUSY_PIN):
         import spidev
         import RPi.GPIO
 
         self.GPIO = RPi.GPIO
+        _set_pins(self, rst_pin, dc_pin, cs_pin, busy_pin)
 
-        # SPI device, bus = 0, device = 0
-        self.SPI = spidev.SpiDev(0, 0)
+        # SPI device, bus = 0, device = 0 for the default panel
+        self.SPI_BUS = bus
+        self.SPI = spidev.SpiDev(bus, device)
 
     def digital_write(self, pin, value):
         self.GPIO.output(pin, value)
@@ -61,6 +90,9 @@ class RaspberryPi:
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
+    def wait_for_edge(self, pin, timeout_ms):
+        return self.GPIO.wait_for_edge(pin, self.GPIO.RISING, timeout=max(1, int(timeout_ms))) is not None
+
     def spi_writebyte2(self, data):
         self.SPI.writebytes2(data)
 
@@ -83,7 +115,8 @@ class RaspberryPi:
         self.GPIO.output(self.RST_PIN, 0)
         self.GPIO.output(self.DC_PIN, 0)
 
-        self.GPIO.cleanup()
+        # Only this panel's pins, other panels may still be in use
+        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN])
 
 
 class JetsonNano:
@@ -92,8 +125,10 @@ class JetsonNano:
     DC_PIN          = 25
     CS_PIN          = 8
     BUSY_PIN        = 24
+    SPI_BUS         = 0
 
-    def __init__(self):
+    def __init__(self, rst_pin=RST_PIN, dc_pin=DC_PIN, cs_pin=CS_PIN, busy_pin=BUSY_PIN):
+        _set_pins(self, rst_pin, dc_pin, cs_pin, busy_pin)
         import ctypes
         find_dirs = [
             os.path.dirname(os.path.realpath(__file__)),
@@ -124,6 +159,9 @@ class JetsonNano:
     def spi_writebyte(self, data):
         self.SPI.SYSFS_software_spi_transfer(data[0])
 
+    def wait_for_edge(self, pin, timeout_ms):
+        return self.GPIO.wait_for_edge(pin, self.GPIO.RISING, timeout=max(1, int(timeout_ms))) is not None
+
     def module_init(self):
         self.GPIO.setmode(self.GPIO.BCM)
         self.GPIO.setwarnings(False)
@@ -142,16 +180,230 @@ class JetsonNano:
         self.GPIO.output(self.RST_PIN, 0)
         self.GPIO.output(self.DC_PIN, 0)
 
-        self.GPIO.cleanup()
+        # Only this panel's pins, other panels may still be in use
+        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN])
+
+
+class NullBackend:
+    """Pure-Python backend with no hardware: writes go nowhere.
+
+    With realtime=False (the default) delays are only added up in
+    `delayed_ms`, so driver code paths run at full speed on any machine.
+    BUSY reads idle unless busy_ms is set, in which case it stays low for
+    that long (real time) after each power on, refresh and power off, like
+    the panel does. edge=True also offers wait_for_edge(), as the GPIO
+    backends do. Several instances can share a FakeSPIBus, with their own
+    pins, to stand in for panels on one host.
+    """
+    # Pin definition
+    RST_PIN         = 17
+    DC_PIN          = 25
+    CS_PIN          = 8
+    BUSY_PIN        = 24
+    SPI_BUS         = 0
+
+    # Commands after which the panel holds BUSY low
+    BUSY_COMMANDS   = (0x02, 0x04, 0x12)
+
+    def __init__(self, realtime=False, busy_ms=0, edge=False, bus=None, rst_pin=RST_PIN,
+                 dc_pin=DC_PIN, cs_pin=CS_PIN, busy_pin=BUSY_PIN):
+        _set_pins(self, rst_pin, dc_pin, cs_pin, busy_pin)
+        self.bus = bus
+        if bus is not None:
+            self.SPI_BUS = bus.number
+        self.realtime = realtime
+        self.busy_ms = busy_ms
+        self.busy_until = 0.0
+        self.busy_reads = 0
+        self.pins = {}
+        self.delayed_ms = 0
+        if edge:
+            self.wait_for_edge = self._wait_for_edge
+
+    def digital_write(self, pin, value):
+        self.pins[pin] = value
+        if pin == self.CS_PIN and self.bus is not None:
+            self.bus.chip_select(self, value == 0)
+
+    def digital_read(self, pin):
+        if pin == self.BUSY_PIN:
+            self.busy_reads += 1
+            return 0 if time.monotonic() < self.busy_until else 1
+        return self.pins.get(pin, 0)
+
+    def _wait_for_edge(self, pin, timeout_ms):
+        wait = min(self.busy_until - time.monotonic(), timeout_ms / 1000.0)
+        if wait > 0:
+            time.sleep(wait)
+        return time.monotonic() >= self.busy_until
+
+    def delay_ms(self, delaytime):
+        self.delayed_ms += delaytime
+        if self.realtime:
+            time.sleep(delaytime / 1000.0)
+
+    def spi_writebyte(self, data):
+        if self.bus is not None:
+            self.bus.transfer(self, len(data))
+        if self.busy_ms and not self.pins.get(self.DC_PIN, 0):
+            if any(command in self.BUSY_COMMANDS for command in data):
+                self.busy_until = time.monotonic() + self.busy_ms / 1000.0
+
+    def spi_writebyte2(self, data):
+        self.spi_writebyte(data)
+
+    def module_init(self):
+        return 0
+
+    def module_exit(self):
+        pass
 
 
-if os.path.exists('/sys/bus/platform/drivers/gpiomem-bcm2835'):
-    implementation = RaspberryPi()
-else:
-    implementation = JetsonNano()
+class RecordingBackend(NullBackend):
+    """NullBackend that records what the driver sent, for tests and benchmarks.
 
-for func in [x for x in dir(implementation) if not x.startswith('_')]:
-    setattr(sys.modules[__name__], func, getattr(implementation, func))
+    Bytes clocked out with DC high are data, with DC low a command; they are
+    grouped per command in `transactions` as [command, bytearray]. Each
+    display refresh (0x12) appends the image last written with 0x13 to
+    `frames` and its time to `refresh_times`.
+    """
+
+    def __init__(self, realtime=False, busy_ms=0, edge=False, **kwargs):
+        super().__init__(realtime, busy_ms, edge, **kwargs)
+        self.transactions = []
+        self.frames = []
+        self.refresh_times = []
+        self.spi_bytes = 0
+        self.started = time.perf_counter()
+
+    def spi_writebyte(self, data):
+        super().spi_writebyte(data)
+        self.spi_bytes += len(data)
+        if self.pins.get(self.DC_PIN, 0):
+            if self.transactions:
+                # spidev truncates to a byte, so ~x from the driver is fine
+                self.transactions[-1][1].extend(b & 0xFF for b in data)
+            return
+        for command in data:
+            if command == 0x12:
+                self.refresh()
+            self.transactions.append([command, bytearray()])
+
+    def refresh(self):
+        for command, data in reversed(self.transactions):
+            if command == 0x13:
+                self.frames.append(bytes(data))
+                break
+        self.refresh_times.append(time.perf_counter() - self.started)
+
+    def commands(self):
+        return [command for command, _ in self.transactions]
+
+
+class FakeSPIBus:
+    """Shared SPI bus for several fake backends that flags overlapping transfers.
+
+    A transfer from a backend whose chip select is not the only one asserted
+    is a collision: on real hardware both panels would latch the bytes.
+    """
+
+    def __init__(self, number=0):
+        self.number = number
+        self.selected = set()
+        self.bytes = {}
+        self.collisions = 0
+        self._lock = threading.Lock()
+
+    def chip_select(self, backend, selected):
+        with self._lock:
+            if selected:
+                self.selected.add(backend)
+            else:
+                self.selected.discard(backend)
+
+    def transfer(self, backend, nbytes):
+        with self._lock:
+            if self.selected != {backend}:
+                self.collisions += 1
+            self.bytes[backend] = self.bytes.get(backend, 0) + nbytes
+
+
+# Backend registry: name -> factory, constructed on first use
+BACKENDS = {
+    'rpi': RaspberryPi,
+    'jetson': JetsonNano,
+    'null': NullBackend,
+    'recording': RecordingBackend,
+}
+
+_implementation = None
+_bound = []
+_lock = threading.Lock()
+
+
+def register_backend(name, factory):
+    BACKENDS[name] = factory
+
+
+def detect_backend():
+    if os.path.exists('/sys/bus/platform/drivers/gpiomem-bcm2835'):
+        return 'rpi'
+    return 'jetson'
+
+
+def set_backend(backend=None):
+    """Select the backend by registry name or instance and bind its functions.
+
+    None takes the EPD_BACKEND environment variable, falling back to
+    detecting the board. Returns the backend.
+    """
+    global _implementation
+    if backend is None:
+        backend = os.environ.get('EPD_BACKEND') or detect_backend()
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError('Unknown EPD backend %r (one of %s)' % (backend, ', '.join(BACKENDS)))
+        backend = BACKENDS[backend]()
+    module = sys.modules[__name__]
+    with _lock:
+        for func in _bound:
+            delattr(module, func)
+        _bound.clear()
+        for func in [x for x in dir(backend) if not x.startswith('_')]:
+            if callable(getattr(backend, func)):
+                setattr(module, func, getattr(backend, func))
+                _bound.append(func)
+        _implementation = backend
+    return backend
+
+
+def get_backend():
+    return _implementation or set_backend()
+
+
+def reset_backend():
+    """Forget the current backend; the next use selects one again."""
+    global _implementation
+    module = sys.modules[__name__]
+    with _lock:
+        for func in _bound:
+            delattr(module, func)
+        _bound.clear()
+        _implementation = None
+
+
+def __getattr__(name):
+    # First use of digital_write() and friends constructs the backend, which
+    # binds them onto the module so later calls don't come back here.
+    if name.startswith('_'):
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    backend = get_backend()
+    if name == 'implementation':
+        return backend
+    try:
+        return getattr(backend, name)
+    except AttributeError:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name)) from None
 
 
 ### END OF FILE ###
@@ -0,0 +1,361 @@
+"""Per-stage timers with in-process histograms, exported for Prometheus and as JSON.
+
+Spans time the refresh path (fetch, parse, render, pack, SPI transfer,
+BUSY waits, sleep) and the Owlet and NOAA requests:
+
+    with metrics.span('render'):
+        image = render(...)
+
+    @metrics.timed('parse_weather')
+    def parse_weather(raw): ...
+
+instrument(session) splits each HTTP request of a requests.Session into DNS
+lookup, connect (TCP and TLS), time to first byte and body, per host, and
+instrument_epd(epd) times the driver's getbuffer, transfer, ReadBusy, init
+and sleep. export() writes a Prometheus textfile (for node_exporter's
+textfile collector) and a JSON status file.
+
+Timing is off unless config.METRICS or $TIDETRACKER_METRICS is set; while
+off, span() hands back a shared no-op and nothing is instrumented.
+"""
+import bisect
+import functools
+import json
+import os
+import socket
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.realpath(__file__))
+TEXTFILE = os.path.join(BASE_DIR, 'cache', 'tidetracker.prom')
+STATUS_FILE = os.path.join(BASE_DIR, 'cache', 'status.json')
+PREFIX = 'tidetracker_'
+
+# Histogram upper bounds, in seconds: from a text render to a full refresh
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HELP = {
+    'stage_seconds': 'Time spent in each stage of a refresh.',
+    'http_seconds': 'HTTP request time by host and phase (dns, connect, ttfb, body).',
+}
+
+
+def _default_enabled():
+    if os.environ.get('TIDETRACKER_METRICS'):
+        return os.environ['TIDETRACKER_METRICS'] not in ('0', 'false', 'no')
+    try:
+        import config
+    except ImportError:
+        return False
+    return bool(getattr(config, 'METRICS', False))
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed durations."""
+
+    __slots__ = ('counts', 'count', 'sum', 'min', 'max', 'last')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)      # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None if empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+                'last': self.last, 'mean': self.sum / self.count if self.count else None,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95)}
+
+
+class Registry:
+    """Histograms keyed on (metric name, sorted label items)."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def get(self, name, **labels):
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def items(self):
+        with self._lock:
+            return sorted(self._histograms.items())
+
+    def prometheus(self):
+        """The histograms in the Prometheus text exposition format."""
+        lines = []
+        described = set()
+        for (name, labels), histogram in self.items():
+            metric = PREFIX + name
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append('# HELP %s %s' % (metric, HELP[name]))
+                lines.append('# TYPE %s histogram' % metric)
+            label_text = ','.join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in labels)
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += n
+                lines.append('%s_bucket{%s} %d' % (
+                    metric, ','.join(filter(None, (label_text, 'le="%s"' % bound))), cumulative))
+            suffix = '{%s}' % label_text if label_text else ''
+            lines.append('%s_sum%s %.6f' % (metric, suffix, histogram.sum))
+            lines.append('%s_count%s %d' % (metric, suffix, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def status(self):
+        """JSON-ready summary: {name: {label string: histogram summary}}."""
+        status = {}
+        for (name, labels), histogram in self.items():
+            key = ','.join('%s=%s' % item for item in labels) or name
+            status.setdefault(name, {})[key] = histogram.as_dict()
+        return status
+
+
+REGISTRY = Registry()
+_enabled = _default_enabled()
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    """Turn timing on or off; instrument() and instrument_epd() only act while on."""
+    global _enabled
+    _enabled = bool(on)
+
+
+def observe(name, seconds, **labels):
+    if _enabled:
+        REGISTRY.observe(name, seconds, **labels)
+
+
+class _Span:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        REGISTRY.observe('stage_seconds', time.perf_counter() - self.started, stage=self.stage)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    """Context manager timing a block as `stage` (a no-op while disabled)."""
+    return _Span(stage) if _enabled else _NULL_SPAN
+
+
+def timed(stage):
+    """Decorator timing each call of a function as `stage`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# -- HTTP -------------------------------------------------------------------
+
+def _timed_connection(base):
+    from urllib3.exceptions import NewConnectionError
+
+    class TimedConnection(base):
+        def connect(self):
+            # Resolve here so DNS and connect are timed apart, then connect to
+            # the resolved addresses in turn; TLS still uses the host name
+            host = self._dns_host
+            if getattr(self, '_tunnel_host', None):
+                started = time.perf_counter()
+                super().connect()
+                observe('http_seconds', time.perf_counter() - started, host=host, phase='connect')
+                return
+            started = time.perf_counter()
+            try:
+                infos = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)
+                addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            except OSError:
+                addresses = [host]  # let the connection report the failure
+            resolved = time.perf_counter()
+            observe('http_seconds', resolved - started, host=host, phase='dns')
+            tls_name = getattr(self, 'server_hostname', False)
+            if tls_name is None:
+                self.server_hostname = host.rstrip('.')
+            try:
+                for i, address in enumerate(addresses):
+                    self._dns_host = address
+                    try:
+                        super().connect()
+                        break
+                    except NewConnectionError:
+                        if i == len(addresses) - 1:
+                            raise
+            finally:
+                self._dns_host = host
+                if tls_name is None:
+                    self.server_hostname = None
+            observe('http_seconds', time.perf_counter() - resolved, host=host, phase='connect')
+    TimedConnection.__name__ = 'Timed' + base.__name__
+    return TimedConnection
+
+
+def _adapter_class():
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class TimedHTTPPool(HTTPConnectionPool):
+        ConnectionCls = _timed_connection(HTTPConnection)
+
+    class TimedHTTPSPool(HTTPSConnectionPool):
+        ConnectionCls = _timed_connection(HTTPSConnection)
+
+    class TimedAdapter(HTTPAdapter):
+        """HTTPAdapter recording dns/connect/ttfb/body times per host."""
+
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPPool,
+                                                       'https': TimedHTTPSPool}
+
+        def send(self, request, stream=False, **kwargs):
+            host = request.url.split('/')[2].rsplit('@', 1)[-1].split(':')[0]
+            started = time.perf_counter()
+            response = super().send(request, stream=True, **kwargs)
+            # Headers are in: includes dns and connect when a new connection was opened
+            headers = time.perf_counter()
+            observe('http_seconds', headers - started, host=host, phase='ttfb')
+            if not stream:
+                response.content
+                observe('http_seconds', time.perf_counter() - headers, host=host, phase='body')
+            return response
+
+    return TimedAdapter
+
+
+_adapter = None
+
+
+def instrument(session):
+    """Mount timing adapters on a requests.Session while enabled; returns the session."""
+    global _adapter
+    if not _enabled:
+        return session
+    if _adapter is None:
+        _adapter = _adapter_class()
+    session.mount('https://', _adapter())
+    session.mount('http://', _adapter())
+    return session
+
+
+_session = None
+
+
+def get(url, **kwargs):
+    """requests.get(url, ...), through a shared instrumented session while enabled."""
+    import requests
+    global _session
+    if not _enabled:
+        return requests.get(url, **kwargs)
+    if _session is None:
+        _session = instrument(requests.Session())
+    return _session.get(url, **kwargs)
+
+
+# -- e-Paper ----------------------------------------------------------------
+
+EPD_STAGES = {'getbuffer': 'getbuffer', 'transfer': 'spi_transfer', 'ReadBusy': 'busy',
+              'init': 'epd_init', 'sleep': 'epd_sleep'}
+
+
+def instrument_epd(epd):
+    """Time an EPD's driver calls (see EPD_STAGES) while enabled; returns the EPD.
+
+    Wraps the instance's methods, so calls the driver makes internally (e.g.
+    ReadBusy from refresh) are timed too.
+    """
+    if not _enabled:
+        return epd
+    for method, stage in EPD_STAGES.items():
+        func = getattr(epd, method, None)
+        if func is not None:
+            setattr(epd, method, timed(stage)(func))
+    return epd
+
+
+# -- Export -----------------------------------------------------------------
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def export(textfile=None, status_file=None, **status):
+    """Write the Prometheus textfile and the JSON status file (if enabled).
+
+    Extra keyword arguments are added to the top level of the status file.
+    """
+    if not _enabled:
+        return
+    _write(textfile or TEXTFILE, REGISTRY.prometheus())
+    document = dict(status, updated=time.time(), metrics=REGISTRY.status())
+    _write(status_file or STATUS_FILE, json.dumps(document, indent=1, sort_keys=True, default=str))
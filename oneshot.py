@@ -0,0 +1,252 @@
+"""One refresh of the weather panel per run, for a systemd timer.
+
+weather_display.main() keeps a process resident between refreshes that
+happen once an hour. Run from weather-oneshot.timer instead, this restores
+what a correct and cheap refresh needs from STATE_DIR, does at most one
+refresh and exits:
+
+- the last response and FetchScheduler's learned state, so the network is
+  only touched when a fetch is due, and then conditionally on the
+  ETag / Last-Modified of the last response for that part,
+- frames rendered and packed for now and the boundaries up to the next
+  fetch, one file each, named by a hash of the buffer, so comparing names
+  with the one shown tells whether the panel needs refreshing,
+- the panel refresh counter, failing upstreams and the backoff after a
+  failed fetch (one call per process never trips a circuit breaker),
+- what refresh_policy needs for quiet hours and daily budgets.
+
+Most runs only read the state file and exit, importing nothing but json.
+Started with `python3 -S`, they skip site-packages too; it is set up when
+a frame has to be shown (the panel driver needs spidev) or fetched. A run
+at a boundary writes the ready buffer to the panel without importing PIL,
+requests or the renderer; only a due fetch or a re-render loads
+weather_display.
+
+    python3 -S oneshot.py       # from weather-oneshot.service
+"""
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.realpath(__file__))
+STATE_DIR = os.path.join(BASE_DIR, 'cache', 'oneshot')
+STATE_FILE = 'state.json'
+
+
+def _site():
+    """Set up site-packages if started with -S."""
+    if sys.flags.no_site:
+        import site
+        site.main()
+
+
+def _logging():
+    """logging, configured as weather_display does on first use."""
+    import logging
+    if not logging.root.handlers:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    return logging
+
+
+def load_state(state_dir=STATE_DIR):
+    try:
+        with open(os.path.join(state_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, state_dir=STATE_DIR):
+    """Write the state atomically and drop frame files it no longer lists."""
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+    keep = {name for _, name in state.get('frames', [])}
+    for name in os.listdir(state_dir):
+        if name.startswith('frame_') and name not in keep:
+            os.remove(os.path.join(state_dir, name))
+
+
+def current_frame(state, now):
+    """(due, file name) of the frame to show at `now`, or None once the
+    prerendered frames have run out."""
+    frames = [frame for frame in state.get('frames', []) if frame[0] <= now]
+    if not frames or now >= state['frames'][-1][0] + state.get('step', 3600):
+        return None
+    return frames[-1]
+
+
+def open_panel():
+    """The EPD, or None in dev mode (frames are saved as PNG instead)."""
+    import config
+    import metrics
+    try:
+        from lib.waveshare_epd import epd7in5_V2, epdconfig
+        epdconfig.set_backend(getattr(config, 'EPD_BACKEND', None))
+        return metrics.instrument_epd(epd7in5_V2.EPD())
+    except (ImportError, RuntimeError, OSError) as exc:
+        _logging().info(f'No e-ink hardware ({exc}) — running in dev mode (saves PNG).')
+        return None
+
+
+def show(buffer, panel):
+    if panel is None:
+        from PIL import Image
+        path = os.path.join(BASE_DIR, 'images', 'screen_output.png')
+        Image.frombytes('1', (800, 480), buffer).save(path)
+        _logging().info(f'Dev mode: saved to {path}')
+        return
+    panel.init()
+    panel.display(buffer)
+    panel.sleep()
+
+
+def update(state, now, state_dir=STATE_DIR, fetch=True):
+    """Fetch if `fetch`, and re-render the frames if the response or the
+    failing upstreams changed or they have run out; returns the number of
+    frames rendered."""
+    _site()
+    import hashlib
+    import resilience
+    import weather_display as wd
+    from fetch_profile import WeatherFetcher
+    from fetch_scheduler import FetchScheduler
+
+    resilience.HEALTH.restore(state.get('health', {}))
+    raw = state.get('raw')
+    if raw is None:
+        state['validators'] = {}    # a 304 would leave nothing to show
+    validators = state.setdefault('validators', {})
+    changed = False
+    if fetch:
+        scheduler = FetchScheduler(clock=lambda: now)
+        scheduler.restore(state.get('scheduler', {}), raw)
+        if wd.FETCH_PROFILE == 'full':
+            fetcher = None
+            get = lambda: wd.fetch_weather(validators=validators.setdefault('full', {})) or raw
+        else:
+            profile = wd.layout_profile()
+            fetcher = WeatherFetcher(
+                lambda part: wd.fetch_weather(profile, part, validators.setdefault(part, {})),
+                daily_every=wd.DAILY_REFRESH, clock=lambda: now)
+            fetcher.base = fetcher.last = raw
+            fetcher.full_at = state.get('full_at')
+            get = fetcher
+        try:
+            fetched = resilience.breaker('Open-Meteo').call(get)
+        except Exception as exc:
+            backoff = resilience.Backoff(cap=wd.RETRY_INTERVAL)
+            backoff.attempt = state.get('failures', 0)
+            wait = max(backoff.next(), resilience.retry_after(exc) or 0)
+            state['failures'] = backoff.attempt
+            state['next_fetch'] = now + wait
+            _logging().error(f'Fetch failed: {exc} — retrying in {wait:.0f} s.')
+        else:
+            changed = scheduler.record(fetched)
+            raw = state['raw'] = fetched
+            state['full_at'] = fetcher.full_at if fetcher else now
+            state['failures'] = 0
+            state['scheduler'] = scheduler.state()
+            state['next_fetch'] = scheduler.next_fetch(now)
+            _logging().info('Fetched weather (%s); next fetch in %d s.',
+                            'changed' if changed else 'unchanged', state['next_fetch'] - now)
+    messages = resilience.HEALTH.messages()
+    state['health'] = resilience.HEALTH.status()
+    stale = changed or messages != state.get('overlay') or current_frame(state, now) is None
+    if raw is None or not stale:
+        return 0
+
+    # The frame for now and one per boundary until the first at or after
+    # the next fetch (which re-renders if anything changed); up to the
+    # PrerenderQueue's horizon
+    step = 60 if wd.MINUTE_CLOCK else 3600
+    first = (now // step + 1) * step
+    until = state.get('next_fetch', now) + step
+    boundaries = [first + i * step for i in range(wd.PRERENDER_FRAMES)]
+    frames = []
+    for due in [now] + [due for due in boundaries if due < until]:
+        image = resilience.overlay(wd.render_at(raw, due), messages)
+        buffer = image.convert('1').tobytes()       # what epd.getbuffer() packs
+        name = 'frame_%s.bin' % hashlib.sha1(buffer).hexdigest()[:16]
+        path = os.path.join(state_dir, name)
+        if not os.path.exists(path):
+            os.makedirs(state_dir, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(buffer)
+        frames.append([due, name])
+    state.update(frames=frames, step=step, overlay=messages)
+    return len(frames)
+
+
+def _policy(state):
+    import refresh_policy
+    policy = refresh_policy.from_config(('open-meteo', 'weather'))
+    policy.restore(state.get('policy', {}))
+    if state.get('raw'):
+        policy.set_daylight(refresh_policy.daylight(state['raw']))
+    return policy
+
+
+def run(now=None, state_dir=STATE_DIR, panel=open_panel):
+    """One refresh at epoch time `now`; returns what it did, e.g.
+    ('fetch', 'render', 'show'), or () if nothing was due. Fetches and
+    refreshes follow refresh_policy's 'open-meteo' and 'weather' cadences.
+
+    `panel` is called for the EPD (None for dev mode) only when a frame
+    has to be shown.
+    """
+    now = time.time() if now is None else now
+    state = load_state(state_dir)
+    done = []
+    fetch = now >= state.get('next_fetch', 0)
+    frame = current_frame(state, now)
+    if not (fetch or frame is None or frame[1] != state.get('shown')):
+        return ()
+    policy = _policy(state)
+    if fetch:
+        deferred = policy.next_run('open-meteo', now, due=state.get('next_fetch', now))
+        if deferred > now:
+            # Quiet hours or budget; later runs stay idle until then
+            state['next_fetch'] = deferred
+            fetch = False
+            done.append('defer')
+    if fetch or frame is None:
+        if fetch:
+            done.append('fetch')
+        if update(state, now, state_dir, fetch=fetch):
+            done.append('render')
+        if fetch and not state.get('failures'):
+            policy.record('open-meteo', now)    # retries follow the backoff
+        frame = current_frame(state, now)
+    if frame is not None and frame[1] != state.get('shown') and \
+            policy.next_run('weather', now, due=now) <= now:
+        with open(os.path.join(state_dir, frame[1]), 'rb') as f:
+            buffer = f.read()
+        _site()
+        show(buffer, panel())
+        policy.record('weather', now)
+        state['shown'] = frame[1]
+        state['refreshes'] = state.get('refreshes', 0) + 1
+        done.append('show')
+        import metrics
+        metrics.export(panel_refreshes=state['refreshes'],
+                       upstreams=state.get('health', {}))
+    if done:
+        state['policy'] = policy.state()
+        save_state(state, state_dir)
+    return tuple(done)
+
+
+def main():
+    started = time.monotonic()
+    done = run()
+    if done:
+        _logging().info('One-shot refresh: %s in %.2f s.', ', '.join(done),
+                        time.monotonic() - started)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,12 @@
 
 import sys, csv, os, time, requests, json
 import config
+import diagnostics
+import metrics
+import refresh_policy
+import resilience
+import vitals_channel
+import vitals_retention
 
 sess = None
 url_props = None
@@ -17,6 +23,16 @@ headers = {}
 auth_token = None
 expire_time = 0
 dsn = None
+publisher = None
+subscriber = None       # a reader's own subscriber (TideTracker's), never drained here
+own_subscriber = None   # check_transmission's, when there is no reader
+last_sample_time = 0
+last_compaction = 0
+# Roll up and expire old vitals once an hour, see vitals_retention
+COMPACTION_INTERVAL = 3600
+# A sample older than this means the sock has stopped transmitting
+# (three missed polls of the 10 second loop).
+TRANSMISSION_TIMEOUT = 30
 owlet_region = 'world'
 region_config = {
     'world': {
@@ -68,6 +84,39 @@ def save_dict_to_csv(vitals, device):
         writer.writerow(vitals)
 
 
+def publish_vitals(vitals, device):
+    global publisher, last_sample_time
+    last_sample_time = time.time()
+    sample = dict(vitals, DSN=device, ts=last_sample_time)
+    try:
+        if publisher is None:
+            publisher = vitals_channel.VitalsPublisher()
+        publisher.publish(sample)
+    except OSError as e:
+        log('Unable to publish vitals: %s' % e)
+
+
+def check_transmission(max_age=TRANSMISSION_TIMEOUT):
+    """Return True if a vitals sample was recorded in the last `max_age` seconds.
+
+    Answered from the last sample timestamp, either recorded by this process
+    or received over the vitals channel, without reading the CSV. A
+    `subscriber` installed by a reader is only asked for its last timestamp:
+    its queued samples are the reader's to consume.
+    """
+    global own_subscriber
+    now = time.time()
+    if now - last_sample_time < max_age:
+        return True
+    if subscriber is not None:
+        return subscriber.is_transmitting(max_age, now=now)
+    if own_subscriber is None:
+        own_subscriber = vitals_channel.VitalsSubscriber()
+    own_subscriber.drain()
+    return own_subscriber.is_transmitting(max_age, now=now)
+
+
+@metrics.timed('owlet_login')
 def login():
     global auth_token, expire_time, owlet_region
     try:
@@ -153,6 +202,7 @@ def reactivate(url_activate):
     r.raise_for_status()
 
 
+@metrics.timed('owlet_props')
 def fetch_props():
     # Ayla cloud API data is updated only when APP_ACTIVE periodically reset to 1.
     my_props = []
@@ -192,6 +242,7 @@ def record_vitals(p):
             # baby is wearing the sock
             disp += "HR: " + heart + " | OXY: " + oxy + " | State: " + mov
             save_dict_to_csv(vitals, device_sn)
+            publish_vitals(vitals, device_sn)
         elif sock_off == 1:
             disp += "sock not on"
         else:
@@ -199,23 +250,58 @@ def record_vitals(p):
     # log(disp)
 
 
+def compact_history(now=None):
+    global last_compaction
+    now = time.time() if now is None else now
+    if dsn is None or now - last_compaction < COMPACTION_INTERVAL:
+        return
+    last_compaction = now
+    for device_sn in dsn:
+        try:
+            vitals_retention.compact(device_sn, now=now)
+        except OSError as e:
+            log('Unable to compact vitals history for %s: %s' % (device_sn, e))
+
+
+def poll():
+    login()
+    fetch_dsn()
+    for prop in fetch_props():
+        record_vitals(prop)
+
+
 def loop():
     global sess
-    sess = requests.session()
+    sess = metrics.instrument(requests.session())
+    backoff = resilience.Backoff()
+    ayla = resilience.breaker('Owlet')
+    # Every 10 seconds unless config's REFRESH_POLICY says otherwise for 'owlet'
+    policy = refresh_policy.from_config(('owlet',))
+
+    def retry(e):
+        now = time.time()
+        time.sleep(policy.next_run('owlet', now, due=now + resilience.wait_time(e, backoff)) - now)
+
     while True:
         try:
-            login()
-            fetch_dsn()
-            for prop in fetch_props():
-                record_vitals(prop)
-            time.sleep(10)
+            ayla.call(poll)
+            backoff.reset()
+            compact_history()
+            now = time.time()
+            policy.record('owlet', now)
+            time.sleep(max(0, policy.next_run('owlet', now) - time.time()))
+        except resilience.CircuitOpen as e:
+            retry(e)
         except requests.exceptions.RequestException as e:
             # log('Network error: %s' % e)
-            time.sleep(1)
-            sess = requests.session()
+            retry(e)
+            # Close the old session's pooled connections rather than leak them
+            sess.close()
+            sess = metrics.instrument(requests.session())
 
 
 def main():
+    diagnostics.start('owlet')
     try:
         loop()
     except FatalError as e:
@@ -0,0 +1,129 @@
+"""Frames rendered ahead of time for the next hour (or minute) boundaries.
+
+What the panel shows changes predictably between fetches: parse_weather's
+hourly slice moves on at each hour and the header clock is just the time.
+After each fetch, PrerenderQueue renders and packs a frame for now and for
+each of the next few boundaries into a bounded queue, off the display path.
+At a boundary the display loop takes the ready buffer, so transitions land
+on time however slow the network is.
+
+    queue = PrerenderQueue(render_at, pack=epd.getbuffer)
+    queue.refill(raw)                 # after each fetch
+    frame = queue.wait_frame()        # in the display loop
+
+Fetches can be hours apart (quiet hours, an unchanged forecast), longer
+than the frames queued: refill_due() says when to re-render from the last
+response so the queue never runs dry between fetches.
+"""
+import threading
+import time
+
+from display_pipeline import Frame
+
+HORIZON = 6     # boundaries rendered ahead
+STEP = 3600     # seconds between boundaries
+LOW_WATER = 2   # refill once fewer frames than this are still to come
+
+
+class PrerenderQueue:
+    """Bounded queue of (due time, Frame) for the upcoming boundaries.
+
+    render_at(raw, when) renders the API data `raw` as it should look at
+    epoch time `when`; pack(image), if given, packs it for the panel.
+    Buffers are kept as bytes, 1/8 the size of getbuffer()'s list.
+    """
+
+    def __init__(self, render_at, pack=None, horizon=HORIZON, step=STEP, clock=time.time):
+        self.render_at = render_at
+        self.pack = pack
+        self.horizon = horizon
+        self.step = step
+        self.clock = clock
+        self._frames = []           # (due, Frame), sorted by due
+        self._cond = threading.Condition()
+        self._generation = 0
+        self.rendered = 0
+        self.on_time = 0            # frames taken within a second of being due
+
+    def boundaries(self, now):
+        first = (now // self.step + 1) * self.step
+        return [first + i * self.step for i in range(self.horizon)]
+
+    def _frame(self, raw, when):
+        started = time.monotonic()
+        image = self.render_at(raw, when)
+        buffer = bytes(self.pack(image)) if self.pack else None
+        self.rendered += 1
+        return Frame(image, buffer, started, time.monotonic())
+
+    def refill(self, raw, now=None):
+        """Replace the queue with frames for `raw`: one due now, then one per boundary.
+
+        The frame for now is published first; later frames are added as they
+        are rendered. A newer refill supersedes one still in progress.
+        """
+        now = self.clock() if now is None else now
+        with self._cond:
+            self._generation += 1
+            generation = self._generation
+        frames = [(now, self._frame(raw, now))]
+        self._publish(generation, frames, replace=True)
+        for due in self.boundaries(now):
+            if not self._publish(generation, [(due, self._frame(raw, due))]):
+                return False
+        return True
+
+    def _publish(self, generation, frames, replace=False):
+        with self._cond:
+            if generation != self._generation:
+                return False
+            if replace:
+                self._frames = []
+            self._frames.extend(frames)
+            self._cond.notify_all()
+            return True
+
+    def refill_due(self, low_water=LOW_WATER):
+        """Epoch time from which fewer than `low_water` frames are still to come."""
+        low_water = min(low_water, self.horizon)
+        with self._cond:
+            if len(self._frames) < low_water:
+                return 0
+            return self._frames[-low_water][0]
+
+    def next_due(self):
+        with self._cond:
+            return self._frames[0][0] if self._frames else None
+
+    def pop_due(self, now=None):
+        """The newest frame due by `now`, dropping older ones; None if none is due."""
+        now = self.clock() if now is None else now
+        with self._cond:
+            due = [i for i, (when, _) in enumerate(self._frames) if when <= now]
+            if not due:
+                return None
+            when, frame = self._frames[due[-1]]
+            del self._frames[:due[-1] + 1]
+        if now - when < 1:
+            self.on_time += 1
+        return frame
+
+    def wait_frame(self, timeout=None):
+        """Block until a frame is due (or `timeout` seconds pass) and take it."""
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while True:
+                now = self.clock()
+                if self._frames and self._frames[0][0] <= now:
+                    break
+                waits = [self._frames[0][0] - now] if self._frames else []
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+                    waits.append(deadline - now)
+                self._cond.wait(min(waits) if waits else None)
+        return self.pop_due()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._frames)
@@ -0,0 +1,333 @@
+"""When each data source is fetched and each panel redrawn.
+
+The daemons had fixed cadences: OpenWeatherMap every 10 minutes and the
+TideTracker panel every minute, Owlet's cloud every 10 seconds, around the
+clock. A RefreshPolicy gives each source and panel (a key, e.g. 'owm' or
+'tidetracker') a Cadence and says when it should next run:
+
+    policy = refresh_policy.from_config()
+    time.sleep(policy.next_run('owm', time.time()) - time.time())
+    ...fetch...
+    policy.record('owm', time.time(), changed=data != last)
+
+A Cadence's base `interval` is:
+- stretched by `night` between sunset and sunrise (see set_daylight; fixed
+  NIGHT_HOURS until the forecast gives them),
+- stretched by `quiet` during the policy's quiet hours, or suspended until
+  they end if `quiet` is None,
+- if `adaptive`, halved for data that changed at every recent run and
+  doubled for data that never did (an average over the last few runs),
+  within `min_interval` and `max_interval`,
+- if it has a daily `budget` of runs, spaced so the rest of the budget
+  lasts the rest of the day's waking (non-quiet) hours; once spent, the
+  key waits for local midnight.
+
+A caller that has its own idea of when to run (FetchScheduler's learned
+model-run times, the prerendered frames' boundaries) passes it as `due`,
+and the policy only ever defers it.
+
+The defaults keep today's cadences. config.py can set QUIET_HOURS and
+override any key in REFRESH_POLICY:
+
+    QUIET_HOURS = (23, 6)                   # local hours, end exclusive
+    REFRESH_POLICY = {
+        'tidetracker': {'night': 5, 'quiet': None, 'budget': 300},
+        'owm': {'night': 3, 'adaptive': True},
+    }
+
+simulate() replays a day under a policy and reports how often each key
+ran and how many times the process had to wake:
+
+    python3 refresh_policy.py simulate [YYYY-MM-DD [FORECAST.json]]
+"""
+import calendar
+import heapq
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+
+DAY = 86400
+NIGHT_HOURS = (20, 6)       # until sunrise and sunset are known
+ALPHA = 0.3                 # weight of the latest run in the change average
+WAKE_MERGE = 1.0            # runs this close together share one wake-up
+
+
+def _config(name, default):
+    try:
+        import config
+    except ImportError:
+        return default
+    return getattr(config, name, default)
+
+
+class Cadence:
+    def __init__(self, interval, night=1.0, quiet=1.0, adaptive=False, min_interval=None,
+                 max_interval=None, budget=None):
+        self.interval = interval
+        self.night = night
+        self.quiet = quiet              # None: nothing during quiet hours
+        self.adaptive = adaptive
+        self.min_interval = min_interval if min_interval is not None else interval / 4
+        self.max_interval = max_interval if max_interval is not None else interval * 4
+        self.budget = budget            # runs per local day
+
+    def __repr__(self):
+        return 'Cadence(%r, night=%r, quiet=%r, adaptive=%r, budget=%r)' % (
+            self.interval, self.night, self.quiet, self.adaptive, self.budget)
+
+
+# Today's cadences; 'open-meteo' and 'weather' only space out what the
+# FetchScheduler and the prerendered frames propose
+DEFAULTS = {
+    'open-meteo': {'interval': 120},
+    'weather': {'interval': 0},
+    'owm': {'interval': 600},
+    'tidetracker': {'interval': 60},
+    'owlet': {'interval': 10},
+}
+
+
+class RefreshPolicy:
+    def __init__(self, cadences, quiet_hours=None, utc_offset=None):
+        self.cadences = dict(cadences)
+        self.quiet_hours = quiet_hours
+        self.utc_offset = utc_offset    # None: the system's local time
+        self.daylight = []              # (sunrise, sunset) epochs
+        self._last = {}
+        self._volatility = {}
+        self._runs = {}                 # key -> (local day, runs that day)
+        self._lock = threading.Lock()
+
+    # -- Local time -----------------------------------------------------------
+
+    def _offset(self, t):
+        return self.utc_offset if self.utc_offset is not None else time.localtime(t).tm_gmtoff
+
+    def _midnight(self, t):
+        """Epoch of the local midnight starting the day `t` falls in."""
+        offset = self._offset(t)
+        return (t + offset) // DAY * DAY - offset
+
+    def _hours(self, t, hours):
+        """Whether `t` falls in the local (start, end) hours, which may wrap midnight."""
+        if not hours:
+            return False
+        start, end = hours
+        hour = (t - self._midnight(t)) / 3600
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def _quiet_spans(self, start, end):
+        """Quiet hours between epochs `start` and `end`, as (from, to) spans."""
+        spans = []
+        if not self.quiet_hours:
+            return spans
+        quiet_start, quiet_end = self.quiet_hours
+        midnight = self._midnight(start) - DAY
+        while midnight < end:
+            if quiet_start <= quiet_end:
+                windows = [(quiet_start, quiet_end)]
+            else:
+                windows = [(0, quiet_end), (quiet_start, 24)]
+            for a, b in windows:
+                a, b = max(start, midnight + a * 3600), min(end, midnight + b * 3600)
+                if a < b:
+                    spans.append((a, b))
+            midnight += DAY
+        return spans
+
+    def quiet(self, t):
+        return self._hours(t, self.quiet_hours)
+
+    def quiet_end(self, t):
+        """When the quiet hours `t` falls in end (`t` if it doesn't)."""
+        for a, b in self._quiet_spans(t, t + DAY):
+            if a <= t < b:
+                return self.quiet_end(b) if b < t + DAY and self.quiet(b) else b
+        return t
+
+    def set_daylight(self, spans):
+        """Sunrise and sunset epochs, e.g. from a forecast (see daylight())."""
+        with self._lock:
+            self.daylight = sorted(spans)
+
+    def night(self, t):
+        if self.daylight and self.daylight[0][0] - DAY <= t < self.daylight[-1][1] + DAY:
+            return not any(rise <= t < sunset for rise, sunset in self.daylight)
+        return self._hours(t, NIGHT_HOURS)
+
+    # -- Cadence --------------------------------------------------------------
+
+    def record(self, key, t, changed=None):
+        """Note that `key` ran at epoch `t`; `changed` says if its data did."""
+        with self._lock:
+            self._last[key] = t
+            day = self._midnight(t)
+            runs_day, runs = self._runs.get(key, (day, 0))
+            self._runs[key] = (day, runs + 1 if runs_day == day else 1)
+            if changed is not None:
+                v = self._volatility.get(key, 0.5)
+                self._volatility[key] = v + ALPHA * (float(changed) - v)
+
+    def state(self):
+        """What record() has noted, as JSON-friendly values (see restore)."""
+        with self._lock:
+            return {'last': dict(self._last), 'volatility': dict(self._volatility),
+                    'runs': {key: list(runs) for key, runs in self._runs.items()}}
+
+    def restore(self, state):
+        with self._lock:
+            self._last = dict(state.get('last', {}))
+            self._volatility = dict(state.get('volatility', {}))
+            self._runs = {key: tuple(runs) for key, runs in state.get('runs', {}).items()}
+
+    def runs_today(self, key, t):
+        day, runs = self._runs.get(key, (None, 0))
+        return runs if day == self._midnight(t) else 0
+
+    def interval(self, key, t):
+        """Seconds from `t` to the next run of `key`, before quiet hours and budget."""
+        cadence = self.cadences[key]
+        interval = cadence.interval
+        if cadence.adaptive:
+            v = self._volatility.get(key, 0.5)
+            interval *= 2 ** (1 - 2 * v)
+            interval = min(cadence.max_interval, max(cadence.min_interval, interval))
+        if self.night(t):
+            interval *= cadence.night
+        if cadence.quiet is not None and self.quiet(t):
+            interval *= cadence.quiet
+        return interval
+
+    def next_run(self, key, now, due=None):
+        """Epoch when `key` should next run, no earlier than `due` if given."""
+        cadence = self.cadences[key]
+        with self._lock:
+            last = self._last.get(key)
+            t = now if last is None else max(now, last + self.interval(key, last))
+            if due is not None:
+                t = max(t, due)
+            if cadence.quiet is None:
+                t = self.quiet_end(t)
+            if cadence.budget is not None:
+                left = cadence.budget - self.runs_today(key, now)
+                tomorrow = self._midnight(now) + DAY
+                if left <= 0:
+                    t = max(t, tomorrow)
+                else:
+                    # Spread what's left over the waking rest of the day
+                    awake = tomorrow - now - sum(b - a for a, b in self._quiet_spans(now, tomorrow))
+                    if last is not None:
+                        t = max(t, last + awake / left)
+                if cadence.quiet is None:
+                    t = self.quiet_end(t)
+            return t
+
+
+def daylight(raw):
+    """(sunrise, sunset) epochs from an Open-Meteo response's daily block."""
+    daily = raw.get('daily') or {}
+    offset = raw.get('utc_offset_seconds', 0)
+
+    def epoch(local):
+        return calendar.timegm(datetime.fromisoformat(local).timetuple()) - offset
+    return [(epoch(rise), epoch(sunset))
+            for rise, sunset in zip(daily.get('sunrise') or [], daily.get('sunset') or [])
+            if rise and sunset]
+
+
+def from_config(keys=None, defaults=None):
+    """The policy config.py asks for, for `keys` (default: all known).
+
+    `defaults` adds or replaces cadences for keys DEFAULTS doesn't know.
+    """
+    defaults = dict(DEFAULTS, **(defaults or {}))
+    overrides = _config('REFRESH_POLICY', {})
+    cadences = {}
+    for key in set(defaults) | set(overrides):
+        if keys is None or key in keys:
+            cadences[key] = Cadence(**dict(defaults.get(key, {}), **overrides.get(key, {})))
+    return RefreshPolicy(cadences, quiet_hours=_config('QUIET_HOURS', None))
+
+
+# -- Simulation --------------------------------------------------------------
+
+class Report:
+    def __init__(self):
+        self.runs = {}
+        self.night_runs = {}
+        self.quiet_runs = {}
+        self.wakeups = 0
+
+    def __repr__(self):
+        return 'Report(runs=%r, wakeups=%r)' % (self.runs, self.wakeups)
+
+
+def simulate(policy, start, hours=24, due=None, changed=None, keys=None):
+    """Replay `hours` from epoch `start` under `policy` (which it records into),
+    for `keys` (default: all its cadences).
+
+    `due` maps keys to due(t) -> the time the caller would like to run next
+    after a run at t; `changed(key, t)` says whether a run found new data
+    (always, by default). Runs within WAKE_MERGE of one another count as one
+    wake-up of the process.
+    """
+    due = due or {}
+    end = start + hours * 3600
+    report = Report()
+    queue = [(policy.next_run(key, start, due[key](start) if key in due else None), key)
+             for key in keys or policy.cadences]
+    heapq.heapify(queue)
+    awake_until = None
+    while queue and queue[0][0] < end:
+        t, key = heapq.heappop(queue)
+        if awake_until is None or t > awake_until:
+            report.wakeups += 1
+            awake_until = t + WAKE_MERGE
+        report.runs[key] = report.runs.get(key, 0) + 1
+        if policy.night(t):
+            report.night_runs[key] = report.night_runs.get(key, 0) + 1
+        if policy.quiet(t):
+            report.quiet_runs[key] = report.quiet_runs.get(key, 0) + 1
+        policy.record(key, t, changed(key, t) if changed else True)
+        later = policy.next_run(key, t, due[key](t) if key in due else None)
+        heapq.heappush(queue, (max(later, t + 1), key))
+    return report
+
+
+def _boundary(step):
+    return lambda t: (t // step + 1) * step
+
+
+# The daemons' own schedules: the weather panel's frames at each hour, and
+# a fetch after each 15-minute observation (see fetch_scheduler)
+SCHEDULES = {'weather': _boundary(3600), 'open-meteo': lambda t: _boundary(900)(t) + 120}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'simulate':
+        sys.stderr.write('usage: refresh_policy.py simulate [YYYY-MM-DD [FORECAST.json]]\n')
+        sys.exit(2)
+    day = datetime.strptime(sys.argv[2], '%Y-%m-%d') if len(sys.argv) > 2 else \
+        datetime.combine(datetime.now().date(), datetime.min.time())
+    start = time.mktime(day.timetuple())
+    policies = {'fixed': RefreshPolicy({key: Cadence(**c) for key, c in DEFAULTS.items()}),
+                'configured': from_config()}
+    if len(sys.argv) > 3:
+        with open(sys.argv[3]) as f:
+            spans = daylight(json.load(f))
+        for policy in policies.values():
+            policy.set_daylight(spans)
+    reports = {name: simulate(policy, start, due=SCHEDULES) for name, policy in policies.items()}
+
+    print('%s, quiet hours %s' % (day.date(), policies['configured'].quiet_hours or 'none'))
+    print('%-14s %22s %22s' % ('runs', 'fixed', 'configured'))
+    for key in sorted(set(reports['fixed'].runs) | set(reports['configured'].runs)):
+        print('%-14s %22s %22s' % (key, *('%d (%d at night)' % (
+            report.runs.get(key, 0), report.night_runs.get(key, 0)) for report in reports.values())))
+    print('%-14s %22d %22d' % ('wake-ups', *(r.wakeups for r in reports.values())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Backoff, per-upstream circuit breakers and an error overlay for the panels.
+
+Every upstream (Open-Meteo, OpenWeatherMap, NOAA CO-OPS, Owlet's Ayla
+cloud) has one shared CircuitBreaker:
+
+    data = resilience.breaker('Open-Meteo').call(fetch_weather)
+
+After `failures` consecutive failures the circuit opens and calls fail fast
+with CircuitOpen, without touching the network, until `retry_at`. Then one
+trial call is let through (half-open): success closes the circuit, failure
+opens it again for twice as long, up to `max_open`, with jitter so panels
+that lost the network together don't all retry together. A Retry-After
+header on a 429 or 503 keeps it open at least that long. Client errors
+(other 4xx) are raised and shown but don't count: the upstream is up.
+
+Callers retry on their own loop, sleeping Backoff.next() between failed
+attempts, and show HEALTH.messages() over the last good frame with
+overlay() instead of replacing the screen with an error.
+"""
+import random
+import threading
+import time
+
+FAILURES = 3            # consecutive failures that open a circuit
+OPEN_SECONDS = 60       # first time open; doubles each time it reopens
+MAX_OPEN_SECONDS = 1800
+BACKOFF_BASE = 5
+BACKOFF_CAP = 600
+
+
+def _config(name, default):
+    try:
+        import config
+    except ImportError:
+        return default
+    return getattr(config, name, default)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, upstream, retry_at):
+        super().__init__('%s unavailable, retrying in %d s' % (
+            upstream, max(0, retry_at - time.monotonic())))
+        self.upstream = upstream
+        self.retry_at = retry_at        # time.monotonic()
+
+
+def status_code(exc):
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def retry_after(exc):
+    """Seconds from a Retry-After header on the exception's response, or None."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None         # absent, or an HTTP date: not worth parsing
+
+
+def counts_as_failure(exc):
+    """False for client errors, which say nothing about the upstream's health."""
+    code = status_code(exc)
+    return code is None or code >= 500 or code in (408, 429)
+
+
+class Backoff:
+    """Exponential backoff with full jitter: the n-th delay is uniform in
+    [0, min(cap, base * 2**n)]."""
+
+    def __init__(self, base=BACKOFF_BASE, cap=BACKOFF_CAP, rng=random.random):
+        self.base = base
+        self.cap = cap
+        self.rng = rng
+        self.attempt = 0
+
+    def next(self):
+        delay = min(self.cap, self.base * 2 ** self.attempt) * self.rng()
+        self.attempt += 1
+        return delay
+
+    def reset(self):
+        self.attempt = 0
+
+
+class Health:
+    """Failing upstreams, for the overlay and the status file."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._failing = {}          # upstream -> (since, message)
+        self._lock = threading.Lock()
+
+    def failed(self, upstream, exc):
+        with self._lock:
+            since = self._failing.get(upstream, (self.clock(), None))[0]
+            self._failing[upstream] = (since, str(exc) or type(exc).__name__)
+
+    def ok(self, upstream):
+        with self._lock:
+            self._failing.pop(upstream, None)
+
+    def messages(self):
+        """One short line per failing upstream, oldest first."""
+        with self._lock:
+            failing = sorted(self._failing.items(), key=lambda item: item[1][0])
+        return ['%s failing since %s' % (upstream, time.strftime('%H:%M', time.localtime(since)))
+                for upstream, (since, _) in failing]
+
+    def status(self):
+        with self._lock:
+            return {upstream: {'since': since, 'error': message}
+                    for upstream, (since, message) in self._failing.items()}
+
+    def restore(self, status):
+        """Pick up from status(), e.g. in a process started by a timer."""
+        with self._lock:
+            self._failing = {upstream: (entry['since'], entry['error'])
+                             for upstream, entry in status.items()}
+
+
+HEALTH = Health()
+
+
+class CircuitBreaker:
+    def __init__(self, name, failures=FAILURES, open_seconds=OPEN_SECONDS,
+                 max_open=MAX_OPEN_SECONDS, health=HEALTH, clock=time.monotonic,
+                 rng=random.random):
+        self.name = name
+        self.failures = failures
+        self.open_seconds = open_seconds
+        self.max_open = max_open
+        self.health = health
+        self.clock = clock
+        self.rng = rng
+        self.consecutive = 0
+        self.opened = 0             # times opened since it last closed
+        self.retry_at = None        # set while open
+        self._trial = False         # a half-open call is in flight
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.retry_at is None:
+            return 'closed'
+        return 'open' if self.clock() < self.retry_at else 'half-open'
+
+    def _admit(self):
+        with self._lock:
+            if self.retry_at is None:
+                return
+            if self.clock() < self.retry_at or self._trial:
+                raise CircuitOpen(self.name, max(self.retry_at, self.clock()))
+            self._trial = True
+
+    def _close(self):
+        with self._lock:
+            self.consecutive = self.opened = 0
+            self.retry_at = None
+            self._trial = False
+
+    def success(self):
+        self._close()
+        if self.health is not None:
+            self.health.ok(self.name)
+
+    def failure(self, exc):
+        with self._lock:
+            self._trial = False
+            self.consecutive += 1
+            if self.retry_at is not None or self.consecutive >= self.failures:
+                seconds = min(self.max_open, self.open_seconds * 2 ** self.opened)
+                # Up to a quarter either way
+                seconds *= 0.75 + self.rng() / 2
+                seconds = max(seconds, retry_after(exc) or 0)
+                self.retry_at = self.clock() + seconds
+                self.opened += 1
+        if self.health is not None:
+            self.health.failed(self.name, exc)
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) through the breaker; raises CircuitOpen while open."""
+        self._admit()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as exc:
+            if counts_as_failure(exc):
+                self.failure(exc)
+            else:
+                # The upstream answered, so it's up; the request was wrong
+                self._close()
+                if self.health is not None:
+                    self.health.failed(self.name, exc)
+            raise
+        self.success()
+        return result
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name):
+    """The shared CircuitBreaker for upstream `name`."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name, failures=_config('CIRCUIT_FAILURES', FAILURES),
+                open_seconds=_config('CIRCUIT_OPEN_SECONDS', OPEN_SECONDS), health=HEALTH)
+        return _breakers[name]
+
+
+def wait_time(exc, backoff):
+    """Seconds to wait before retrying after `exc`: until the circuit's
+    trial call for CircuitOpen, else the next backoff delay."""
+    if isinstance(exc, CircuitOpen):
+        return max(0, exc.retry_at - time.monotonic())
+    return backoff.next()
+
+
+def overlay(image, messages, font=None, margin=4):
+    """Draw `messages` in a small boxed note at the bottom right of `image`
+    (in place) and return it; the rest of the frame is left as it was."""
+    if not messages:
+        return image
+    from PIL import ImageDraw, ImageFont
+    font = font or ImageFont.load_default()
+    draw = ImageDraw.Draw(image)
+    text = '\n'.join(messages)
+    left, top, right, bottom = draw.multiline_textbbox((0, 0), text, font=font)
+    width, height = right - left + 2 * margin, bottom - top + 2 * margin
+    x, y = image.width - width - margin, image.height - height - margin
+    white, black = (255, 0) if image.mode in ('1', 'L') else ('white', 'black')
+    draw.rectangle((x, y, x + width, y + height), fill=white, outline=black)
+    draw.multiline_text((x + margin - left, y + margin - top), text, font=font, fill=black)
+    return image
@@ -0,0 +1,95 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+
+class CoopsStub:
+    """Local stand-in for the CO-OPS datagetter and metadata APIs.
+
+    Serves a synthetic 6-minute water level series and records every
+    request, so tests can count what a client actually sent.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.responses = {}      # path -> payload override
+        self.harcon = []
+        self.datums = [{'name': 'MLLW', 'value': 0.0}, {'name': 'MSL', 'value': 2.5}]
+
+    def water_level(self, begin, end):
+        records = []
+        t = begin.replace(minute=begin.minute - begin.minute % 6, second=0)
+        if t < begin:
+            t += timedelta(minutes=6)
+        while t <= end:
+            minutes = (t - datetime(2024, 1, 1)).total_seconds() / 60
+            records.append({'t': t.strftime('%Y-%m-%d %H:%M'),
+                            'v': '%.3f' % (2.5 + 2.0 * ((minutes % 745) / 745 - 0.5)),
+                            's': '0.010', 'f': '0,0,0,0', 'q': 'p'})
+            t += timedelta(minutes=6)
+        return records
+
+    def handle(self, path, query):
+        self.requests.append((path, query))
+        if path in self.responses:
+            return self.responses[path]
+        if path.endswith('/datagetter'):
+            fmt = '%Y%m%d %H:%M'
+            begin = datetime.strptime(query['begin_date'], fmt if ' ' in query['begin_date'] else '%Y%m%d')
+            end = datetime.strptime(query['end_date'], fmt if ' ' in query['end_date'] else '%Y%m%d')
+            if query['product'] == 'water_level':
+                return {'data': self.water_level(begin, end)}
+            if query['product'] == 'predictions':
+                if query.get('interval') == 'hilo':
+                    return {'predictions': [
+                        {'t': begin.strftime('%Y-%m-%d') + ' 04:12', 'v': '0.120', 'type': 'L'},
+                        {'t': begin.strftime('%Y-%m-%d') + ' 10:30', 'v': '4.870', 'type': 'H'},
+                    ]}
+                return {'predictions': [{'t': r['t'], 'v': r['v']}
+                                        for r in self.water_level(begin, end)]}
+            return {'error': {'message': 'No data was found.'}}
+        if path.endswith('/harcon.json'):
+            return {'HarmonicConstituents': self.harcon}
+        if path.endswith('/datums.json'):
+            return {'datums': self.datums}
+        if path.endswith('.json'):
+            return {'stations': [{'id': path.rsplit('/', 1)[-1][:-5], 'name': 'Stub Station'}]}
+        return None
+
+
+@pytest.fixture
+def coops_stub():
+    stub = CoopsStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            payload = stub.handle(url.path, query)
+            if payload is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    base = 'http://127.0.0.1:%d' % server.server_address[1]
+    stub.data_url = base + '/api/prod/datagetter'
+    stub.metadata_url = base + '/mdapi/prod/webapi/stations'
+    yield stub
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,60 @@
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+@pytest.fixture
+def suite(monkeypatch):
+    monkeypatch.chdir(BASE_DIR)
+    spec = importlib.util.spec_from_file_location(
+        'bench_run', os.path.join(BASE_DIR, 'benchmarks', 'run.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _entry(host, seconds, failed=()):
+    return {'host': host, 'results': {'render.warm': {'seconds': seconds}}, 'failed': list(failed)}
+
+
+def test_baseline_uses_recent_passing_runs_on_this_host(suite):
+    history = [_entry('pi', 9.0)] + [_entry('pi', s) for s in (1.0, 2.0, 3.0, 4.0, 5.0)] \
+        + [_entry('pi', 50.0, failed=['render.warm']), _entry('laptop', 0.1)]
+    assert suite.baseline(history, 'render.warm', 'pi', runs=5) == 3.0
+    assert suite.baseline(history, 'render.warm', 'desktop') is None
+
+
+def test_limits_and_checks(suite):
+    thresholds = {'default': {'regression': 0.25}, '*.cold': {'regression': 0.5},
+                  'render.*': {'max_seconds': 0.1}, 'render.cold': {'max_peak_kib': 100}}
+    limit = suite.limits(thresholds, 'render.cold')
+    assert limit == {'regression': 0.5, 'max_seconds': 0.1, 'max_peak_kib': 100}
+    result = {'seconds': 0.05, 'peak_kib': 50}
+    assert suite.check('render.cold', result, 0.04, limit) == []
+    assert len(suite.check('render.cold', result, 0.03, limit)) == 1      # +67%
+    slow = {'seconds': 0.2, 'peak_kib': 500}
+    assert len(suite.check('render.cold', slow, None, limit)) == 2
+
+
+def test_run_records_history_and_gates(suite, tmp_path, capsys):
+    history = tmp_path / 'history.jsonl'
+    thresholds = tmp_path / 'thresholds.json'
+    thresholds.write_text(json.dumps({'default': {'regression': 10.0}}))
+    args = ['-k', 'parse_weather', '--no-cold', '--repeat', '2',
+            '--history', str(history), '--thresholds', str(thresholds)]
+    assert suite.main(args) == 0
+    entry = json.loads(history.read_text())
+    assert set(entry['results']) == {'parse_weather.warm'}
+    assert entry['results']['parse_weather.warm']['runs'] == 2
+    assert entry['failed'] == []
+
+    thresholds.write_text(json.dumps({'parse_weather.warm': {'max_seconds': 1e-9}}))
+    assert suite.main(args) == 1
+    assert 'FAIL' in capsys.readouterr().out
+    assert json.loads(history.read_text().splitlines()[-1])['failed'] == ['parse_weather.warm']
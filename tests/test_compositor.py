@@ -0,0 +1,161 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+NOW = 1714190400 + 12 * 3600
+REGIONS = {'weather': (0, 0, 800, 240, 2), 'tidetracker': (0, 240, 800, 240, 1),
+           'alarm': (400, 440, 400, 40, 0)}
+
+
+@pytest.fixture
+def compositor(tmp_path):
+    from compositor import Compositor
+    from lib.waveshare_epd import epd7in5_V2, epdconfig
+    epd = epd7in5_V2.EPD(backend=epdconfig.RecordingBackend())
+    daemon = Compositor(epd, regions=REGIONS, directory=str(tmp_path), hold=(0, 30, 600),
+                        clock=lambda: NOW)
+    yield daemon
+    daemon.close()
+
+
+def _black(size):
+    from PIL import Image
+    return Image.new('1', size, 0)
+
+
+def _panel_row(compositor, y):
+    # The backend records what reached the panel, which inverts the buffer
+    frame = compositor.epd.backend.frames[-1]
+    return bytes(~b & 0xFF for b in frame[y * 100:(y + 1) * 100])
+
+
+def test_regions_must_be_whole_bytes_on_the_panel(tmp_path):
+    from compositor import Framebuffer
+    with pytest.raises(ValueError):
+        Framebuffer.create({'a': (4, 0, 800, 480, 1)}, str(tmp_path))
+    with pytest.raises(ValueError):
+        Framebuffer.create({'a': (0, 400, 800, 240, 1)}, str(tmp_path))
+
+
+def test_producer_writes_land_in_the_panel_frame(tmp_path, compositor):
+    import compositor as module
+    region = module.connect('tidetracker', str(tmp_path))
+    assert region.size == (800, 240)
+    assert region.write(_black((800, 240)))
+    assert compositor.step(NOW) == ()                      # held for others
+    assert compositor.step(NOW + 30) == ('tidetracker',)
+    assert _panel_row(compositor, 239) == b'\xff' * 100    # weather still white
+    assert _panel_row(compositor, 240) == b'\x00' * 100
+    assert compositor.refreshes == 1 and compositor.dirty == {}
+
+
+def test_changes_are_coalesced_into_one_refresh(tmp_path, compositor):
+    import compositor as module
+    module.connect('weather', str(tmp_path)).write(_black((800, 240)))
+    module.connect('tidetracker', str(tmp_path)).write(_black((800, 240)))
+    assert compositor.due(NOW) is None
+    compositor.scan(NOW)
+    assert compositor.due(NOW) == NOW + 30
+    assert compositor.step(NOW + 30) == ('tidetracker', 'weather')    # weather rides along
+    assert compositor.refreshes == 1
+    assert _panel_row(compositor, 0) == _panel_row(compositor, 479) == b'\x00' * 100
+
+
+def test_frames_reach_the_panel_pixel_for_pixel(tmp_path, compositor):
+    import random
+    import compositor as module
+    from PIL import Image
+    rng = random.Random(3)
+    image = Image.frombytes('1', (400, 40), bytes(rng.getrandbits(8) for _ in range(50 * 40)))
+    assert module.connect('alarm', str(tmp_path)).write(image)
+    assert compositor.step(NOW) == ('alarm',)
+    expected = Image.new('1', (800, 480), 255)
+    expected.paste(image, (400, 440))
+    panel = bytes(~b & 0xFF for b in compositor.epd.backend.frames[-1])
+    assert panel == expected.tobytes()
+
+
+def test_a_frame_of_the_wrong_size_is_refused(tmp_path, compositor):
+    import compositor as module
+    region = module.connect('weather', str(tmp_path))
+    with pytest.raises(ValueError, match='800x480'):
+        region.write(_black((800, 480)))
+    assert region.region.seq() == 0 and compositor.scan(NOW) == []
+
+
+def test_priority_sets_how_long_a_change_waits(tmp_path, compositor):
+    import compositor as module
+    module.connect('alarm', str(tmp_path)).write(_black((400, 40)))
+    assert compositor.step(NOW) == ('alarm',)
+    assert _panel_row(compositor, 460) == b'\xff' * 50 + b'\x00' * 50
+    module.connect('weather', str(tmp_path)).write(_black((800, 240)))
+    compositor.scan(NOW)
+    assert compositor.step(NOW + 599) == ()
+    assert compositor.step(NOW + 600) == ('weather',)
+
+
+def test_unchanged_writes_are_not_changes(tmp_path, compositor):
+    import compositor as module
+    region = module.connect('tidetracker', str(tmp_path))
+    assert region.write(_black((800, 240)))
+    assert compositor.step(NOW) == () and compositor.step(NOW + 30) == ('tidetracker',)
+    assert not region.write(_black((800, 240)))
+    assert compositor.step(NOW + 3600) == () and compositor.refreshes == 1
+
+
+def test_half_written_regions_wait_for_the_producer(tmp_path, compositor):
+    import compositor as module
+    region = module.connect('alarm', str(tmp_path)).region
+    module._SEQ.pack_into(region.framebuffer.mm, region._seq_offset(), 1)     # mid-write
+    assert compositor.step(NOW) == ()
+    assert compositor.torn == 3 and 'alarm' in compositor.dirty
+    module._SEQ.pack_into(region.framebuffer.mm, region._seq_offset(), 2)
+    assert compositor.step(NOW) == ('alarm',)
+
+
+def test_quiet_hours_defer_a_region(tmp_path):
+    from compositor import Compositor
+    from lib.waveshare_epd import epd7in5_V2, epdconfig
+    from refresh_policy import Cadence, RefreshPolicy
+    import compositor as module
+    policy = RefreshPolicy({'weather': Cadence(0, quiet=None), 'tidetracker': Cadence(0),
+                            'alarm': Cadence(0)}, quiet_hours=(23, 6), utc_offset=0)
+    epd = epd7in5_V2.EPD(backend=epdconfig.RecordingBackend())
+    night = 1714176000 + 23.5 * 3600
+    daemon = Compositor(epd, regions=REGIONS, directory=str(tmp_path), policy=policy,
+                        hold=(0, 30, 0))
+    try:
+        module.connect('weather', str(tmp_path)).write(_black((800, 240)))
+        assert daemon.step(night) == ()
+        assert daemon.due(night) == 1714176000 + 30 * 3600
+    finally:
+        daemon.close()
+
+
+def test_producers_follow_a_restarted_compositor(tmp_path, compositor):
+    from compositor import Compositor
+    import compositor as module
+    region = module.connect('alarm', str(tmp_path))
+    compositor.close()
+    restarted = Compositor(compositor.epd, regions=REGIONS, directory=str(tmp_path),
+                           clock=lambda: NOW)
+    try:
+        assert region.write(_black((400, 40)))
+        assert restarted.step(NOW) == ('alarm',)
+    finally:
+        restarted.close()
+
+
+def test_a_write_wakes_the_daemon(tmp_path, compositor):
+    import compositor as module
+    region = module.connect('alarm', str(tmp_path))
+    assert not compositor.wait(0)
+    threading.Timer(0.05, region.write, args=(_black((400, 40)),)).start()
+    started = time.monotonic()
+    assert compositor.wait(5)
+    assert time.monotonic() - started < 2
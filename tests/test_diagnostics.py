@@ -0,0 +1,151 @@
+import glob
+import json
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+def test_sample_counts_resources():
+    import gc
+    import diagnostics
+    from PIL import Image
+    gc.collect()        # other tests' garbage images must not vanish in between
+    before = diagnostics.sample()
+    assert before['rss_kib'] > 0 and before['fds'] > 0 and before['threads'] >= 1
+    images = [Image.new('1', (8, 8)) for _ in range(3)]
+    with open(__file__):
+        after = diagnostics.sample()
+    assert after['pil_images'] >= before['pil_images'] + len(images)
+    assert after['fds'] == before['fds'] + 1
+
+
+def test_figures_counted_only_when_pyplot_is_loaded():
+    import diagnostics
+    plt = pytest.importorskip('matplotlib.pyplot')
+    fig = plt.figure()
+    try:
+        assert diagnostics.sample()['mpl_figures'] >= 1
+    finally:
+        plt.close(fig)
+
+
+def test_growing_needs_steady_growth_across_the_window():
+    import diagnostics
+    steady = [{'fds': 10 + i, 'rss_kib': 50000} for i in range(4)]
+    assert diagnostics.growing(steady, window=4) == ['fds']
+    assert diagnostics.growing(steady[:3], window=4) == []
+    dip = steady[:2] + [{'fds': 9, 'rss_kib': 50000}] + steady[3:]
+    assert diagnostics.growing(dip, window=4) == []
+    small = [{'rss_kib': 50000 + i} for i in range(4)]      # under MIN_GROWTH
+    assert diagnostics.growing(small, window=4) == []
+
+
+def test_record_flags_a_descriptor_leak(tmp_path, caplog):
+    import diagnostics
+    d = diagnostics.Diagnostics('test', window=4, cache_dir=str(tmp_path))
+    leaked = []
+    try:
+        for _ in range(5):
+            leaked.append(open(__file__))
+            data = d.record()
+    finally:
+        for f in leaked:
+            f.close()
+    assert 'fds' in data['growing']
+    assert 'fds has grown' in caplog.text
+    lines = open(d.path).read().splitlines()
+    assert len(lines) == 5
+    assert 'growing' not in json.loads(lines[0])
+
+
+def test_snapshot_file_is_trimmed(tmp_path, monkeypatch):
+    import diagnostics
+    monkeypatch.setattr(diagnostics, 'MAX_LINES', 10)
+    d = diagnostics.Diagnostics('test', cache_dir=str(tmp_path))
+    for _ in range(25):
+        d.record()
+    assert len(open(d.path).read().splitlines()) <= 10
+
+
+def test_signal_dumps_detailed_snapshot(tmp_path):
+    import diagnostics
+    d = diagnostics.Diagnostics('test', interval=3600, cache_dir=str(tmp_path))
+    previous = signal.getsignal(signal.SIGUSR1)
+    d.install_signal()
+    d.start()
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        deadline = time.monotonic() + 5
+        while not glob.glob(str(tmp_path / 'diagnostics_test_*.json')) and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        d.stop(timeout=5)
+        signal.signal(signal.SIGUSR1, previous)
+    dumps = glob.glob(str(tmp_path / 'diagnostics_test_*.json'))
+    assert len(dumps) == 1
+    snapshot = json.load(open(dumps[0]))
+    assert 'diagnostics' in snapshot['stacks']
+    assert snapshot['types'] and snapshot['rss_kib'] > 0
+
+
+def test_tracemalloc_top_allocations(tmp_path):
+    import tracemalloc
+    import diagnostics
+    if tracemalloc.is_tracing():
+        pytest.skip('tracemalloc already running')
+    d = diagnostics.Diagnostics('test', cache_dir=str(tmp_path), tracemalloc_frames=1)
+    d.start()
+    try:
+        blob = [bytearray(1024) for _ in range(1000)]
+        data = d.record()
+    finally:
+        d.stop(timeout=5)
+        tracemalloc.stop()
+    assert data['traced_kib'] >= 1000
+    assert any('test_diagnostics.py' in entry['where'] for entry in data['top'])
+    del blob
+
+
+def test_start_installs_the_dump_handler_with_sampling_off(tmp_path, monkeypatch):
+    import config
+    import diagnostics
+    monkeypatch.setattr(config, 'DIAGNOSTICS', False, raising=False)
+    monkeypatch.setattr(diagnostics, 'CACHE_DIR', str(tmp_path))
+    previous = signal.getsignal(signal.SIGUSR1)
+    d = diagnostics.start('test')
+    try:
+        assert d is not None and not d.sampling
+        assert os.path.exists(diagnostics.handler_path(os.getpid()))
+        assert diagnostics.request_dump(os.getpid())
+        deadline = time.monotonic() + 5
+        while not glob.glob(str(tmp_path / 'diagnostics_test_*.json')) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert glob.glob(str(tmp_path / 'diagnostics_test_*.json'))
+        assert not os.path.exists(d.path)                   # nothing sampled
+    finally:
+        d.stop(timeout=5)
+        signal.signal(signal.SIGUSR1, previous)
+    assert not os.path.exists(diagnostics.handler_path(os.getpid()))
+
+
+def test_dump_refuses_a_process_without_the_handler(tmp_path, monkeypatch, capsys):
+    import subprocess
+    import diagnostics
+    monkeypatch.setattr(diagnostics, 'CACHE_DIR', str(tmp_path))
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        monkeypatch.setattr(sys, 'argv', ['diagnostics.py', 'dump', str(child.pid)])
+        with pytest.raises(SystemExit) as exit:
+            diagnostics.main()
+        assert exit.value.code == 1
+        assert 'no diagnostics handler' in capsys.readouterr().err
+        time.sleep(0.1)
+        assert child.poll() is None                         # SIGUSR1 would have killed it
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+def test_latest_slot_keeps_newest():
+    from display_pipeline import LatestSlot
+    slot = LatestSlot()
+    slot.put(1)
+    slot.put(2)
+    assert slot.get(timeout=0) == 2
+    assert slot.dropped == 1
+    assert slot.get(timeout=0.01) is None
+
+
+def test_latest_slot_close_wakes_getter():
+    from display_pipeline import LatestSlot
+    slot = LatestSlot()
+    threading.Timer(0.05, slot.close).start()
+    assert slot.get(timeout=5) is None
+
+
+def _run(pipeline, frames, limit=5):
+    pipeline.start()
+    deadline = time.monotonic() + limit
+    while pipeline.shown < frames and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pipeline.stop(timeout=2)
+
+
+def test_next_frame_prepared_during_refresh():
+    from display_pipeline import DisplayPipeline
+    produces, writes = [], []
+
+    def produce():
+        started = time.monotonic()
+        time.sleep(0.1)
+        produces.append((started, time.monotonic()))
+        return len(produces)
+
+    def write(frame):
+        started = time.monotonic()
+        time.sleep(0.1)             # panel BUSY
+        writes.append((started, time.monotonic()))
+
+    pipeline = DisplayPipeline(produce, write, pack=lambda image: [image], interval=0)
+    _run(pipeline, frames=4)
+    assert pipeline.shown >= 4
+    # Until a write has been timed the next frame waits for it, rather than
+    # sit in the slot for a whole refresh...
+    assert produces[1][0] >= writes[0][1]
+    # ...then frames are prepared while the panel is busy
+    assert any(p_start < w_end and w_start < p_end
+               for w_start, w_end in writes[1:] for p_start, p_end in produces[2:])
+
+
+def test_packed_buffer_reaches_writer_and_errors_retry():
+    from display_pipeline import DisplayPipeline
+    calls = []
+    written = []
+
+    def produce():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('fetch failed')
+        return 'image'
+
+    pipeline = DisplayPipeline(produce, written.append, pack=str.upper,
+                               interval=10, retry_interval=0.01)
+    _run(pipeline, frames=1)
+    assert len(calls) == 2
+    frame = written[0]
+    assert (frame.image, frame.buffer) == ('image', 'IMAGE')
+    assert frame.started <= frame.ready
+    assert pipeline.last_latency >= 0
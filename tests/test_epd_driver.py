@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+@pytest.fixture
+def make_epd():
+    from lib.waveshare_epd import epd7in5_V2, epdconfig
+
+    def make(**backend_args):
+        backend = epdconfig.set_backend(epdconfig.RecordingBackend(**backend_args))
+        return epd7in5_V2.EPD(), backend
+
+    yield make
+    epdconfig.reset_backend()
+
+
+def _wait(epd, backend, **kwargs):
+    backend.busy_until = time.monotonic() + backend.busy_ms / 1000.0
+    cpu = time.process_time()
+    epd.ReadBusy(**kwargs)
+    return time.process_time() - cpu
+
+
+def test_polling_backs_off_instead_of_spinning(make_epd):
+    epd, backend = make_epd(busy_ms=300)
+    cpu = _wait(epd, backend)
+    assert epd.last_busy_seconds >= 0.3
+    assert backend.busy_reads < 30          # a tight loop does tens of thousands
+    assert cpu < 0.1
+
+
+def test_edge_wait_returns_on_rising_edge(make_epd):
+    epd, backend = make_epd(busy_ms=200, edge=True)
+    _wait(epd, backend)
+    assert 0.2 <= epd.last_busy_seconds < 0.3
+    assert backend.busy_reads <= 3
+
+
+def test_timeout_raises_and_is_accounted(make_epd):
+    from lib.waveshare_epd.epd7in5_V2 import EPDBusyTimeout
+    epd, backend = make_epd(busy_ms=5000)
+    with pytest.raises(EPDBusyTimeout, match='still busy'):
+        _wait(epd, backend, timeout=0.1)
+    assert 0.1 <= epd.last_busy_seconds < 0.5
+    assert epd.busy_waits == 1
+
+
+def test_busy_time_accumulates_over_a_refresh(make_epd):
+    epd, backend = make_epd(busy_ms=50)
+    epd.init()
+    epd.display([0xFF] * (epd.width * epd.height // 8))
+    epd.sleep()
+    assert epd.busy_waits == 3               # power on, refresh, power off
+    assert epd.busy_seconds >= 0.15
+    assert epd.busy_seconds >= epd.last_busy_seconds >= 0.05
+
+
+def test_getbuffer_packs_like_the_pixel_loop(make_epd):
+    from PIL import Image, ImageDraw
+    epd, _ = make_epd()
+    image = Image.new('L', (epd.width, epd.height), 255)
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((13, 7, 411, 333), fill=0)
+    draw.text((500, 200), 'TideTracker', fill=96)
+    mono = image.convert('1')
+    loop = [0xFF] * (epd.width * epd.height // 8)
+    pixels = mono.load()
+    for y in range(epd.height):
+        for x in range(epd.width):
+            if pixels[x, y] == 0:
+                loop[(x + y * epd.width) // 8] &= ~(0x80 >> (x % 8))
+    assert epd.getbuffer(image) == loop
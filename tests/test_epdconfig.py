@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def epdconfig():
+    from lib.waveshare_epd import epdconfig
+    epdconfig.reset_backend()
+    yield epdconfig
+    epdconfig.reset_backend()
+
+
+def test_importing_driver_constructs_no_backend():
+    probe = ('import sys\n'
+             'from lib.waveshare_epd import epd7in5_V2, epdconfig\n'
+             'epd = epd7in5_V2.EPD()\n'
+             'assert epdconfig._implementation is None\n'
+             'assert not {"spidev", "RPi", "Jetson", "ctypes"} & set(sys.modules)\n')
+    result = subprocess.run([sys.executable, '-c', probe], cwd=ROOT,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+
+def test_backend_selected_from_environment(epdconfig, monkeypatch):
+    monkeypatch.setenv('EPD_BACKEND', 'null')
+    assert isinstance(epdconfig.implementation, epdconfig.NullBackend)
+    assert epdconfig.digital_read(epdconfig.BUSY_PIN) == 1
+    # Bound onto the module, so later calls skip the lazy lookup
+    assert 'digital_write' in vars(epdconfig)
+
+
+def test_unknown_backend_is_rejected(epdconfig):
+    with pytest.raises(ValueError, match='one of'):
+        epdconfig.set_backend('nope')
+
+
+def test_registered_backend_replaces_bindings(epdconfig):
+    class Probe(epdconfig.NullBackend):
+        def digital_read(self, pin):
+            return 7
+
+    epdconfig.register_backend('probe', Probe)
+    try:
+        epdconfig.set_backend('recording')
+        assert 'commands' in vars(epdconfig)
+        epdconfig.set_backend('probe')
+        assert epdconfig.digital_read(epdconfig.BUSY_PIN) == 7
+        assert 'commands' not in vars(epdconfig)
+    finally:
+        del epdconfig.BACKENDS['probe']
+
+
+def test_recording_backend_captures_frames(epdconfig):
+    from lib.waveshare_epd import epd7in5_V2
+    backend = epdconfig.set_backend('recording')
+    epd = epd7in5_V2.EPD()
+    assert epd.init() == 0
+    buf = [0xFF] * (epd.width * epd.height // 8)
+    buf[0] = 0x0F
+    epd.display(buf)
+    epd.sleep()
+    assert len(backend.frames) == 1
+    frame = backend.frames[0]
+    assert len(frame) == 48000
+    assert frame[0] == 0xF0 and frame[1] == 0x00       # the driver inverts the buffer
+    assert backend.commands()[:2] == [0x01, 0x04]
+    assert backend.commands()[-1] == 0x07              # deep sleep last
+    assert backend.delayed_ms > 0
+    assert len(backend.refresh_times) == 1
@@ -0,0 +1,107 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+T0 = 1714190400          # 2024-04-27 00:00 EDT
+
+
+def _minimal_response(profile, full):
+    """What Open-Meteo returns for `profile`: only its variables, hourly
+    rows from the current hour (14:00 in the sample)."""
+    start = full['hourly']['time'].index('2024-04-27T14:00')
+    stop = start + profile.forecast_hours
+    return {
+        'utc_offset_seconds': full['utc_offset_seconds'],
+        'current': {k: v for k, v in full['current'].items()
+                    if k == 'time' or k in profile.current},
+        'hourly': {k: v[start:stop] for k, v in full['hourly'].items()
+                   if k == 'time' or k in profile.hourly},
+        'daily': {k: v for k, v in full['daily'].items() if k == 'time' or k in profile.daily},
+    }
+
+
+def test_trace_records_paths_and_list_extents():
+    from layout import Repeat, Text, trace
+    spec = [
+        Text((0, 0), lambda w: str(w['current']['temp']), 15),
+        Text((0, 0), 'constant', 15),
+        Repeat(lambda w: w['hourly'][:2], 3, (10, 0), [
+            Text((0, 20), lambda h: str(h['temp']), 15),
+        ]),
+    ]
+    sample = {'current': {'temp': 1, 'unused': 2},
+              'hourly': [{'temp': i, 'wind': i} for i in range(8)]}
+    reads = trace(spec, sample)
+    assert reads.paths == {('current', 'temp'), ('hourly', '*', 'temp')}
+    assert reads.extents == {('hourly',): 2}
+
+
+def test_layout_profile_requests_only_what_the_panel_binds():
+    import weather_display
+    profile = weather_display.layout_profile()
+    assert 'uv_index' not in profile.current and 'visibility' not in profile.current
+    assert 'dew_point_2m' not in profile.current
+    assert set(profile.hourly) == set(weather_display.FULL_PROFILE.hourly)
+    ahead = -(-weather_display.PRERENDER_FRAMES * (60 if weather_display.MINUTE_CLOCK else 3600)
+              // 3600)
+    assert profile.forecast_hours == 1 + 6 + ahead
+    assert profile.forecast_days == 7
+    assert 'daily' in profile.params('full')
+    assert 'daily' not in profile.params('delta')
+    assert profile.params('delta')['forecast_hours'] == profile.forecast_hours
+
+
+def test_parse_weather_tolerates_dropped_variables():
+    import weather_display
+    from test_weather_display import SAMPLE_RESPONSE
+    raw = _minimal_response(weather_display.layout_profile(), SAMPLE_RESPONSE)
+    now = datetime(2024, 4, 27, 14, 30)
+    minimal = weather_display.parse_weather(raw, now=now)
+    full = weather_display.parse_weather(SAMPLE_RESPONSE, now=now)
+    assert minimal['current']['uv_index'] is None and minimal['current']['visibility_mi'] is None
+    assert minimal['hourly'][:6] == full['hourly'][:6]
+    assert minimal['daily'] == full['daily'] and minimal['today'] == full['today']
+    # Frames rendered ahead from the same response still get six hours
+    later = weather_display.parse_weather(raw, now=datetime(2024, 4, 27, 20, 0))
+    assert len(later['hourly']) >= 6
+
+
+def test_fetcher_refreshes_daily_block_less_often():
+    from fetch_profile import WeatherFetcher
+    clock = [T0 + 10 * 3600]
+    calls = []
+
+    def fetch(part):
+        calls.append(part)
+        raw = {'utc_offset_seconds': -14400, 'current': {'n': len(calls)}}
+        if part == 'full':
+            raw['daily'] = {'time': ['2024-04-27'], 'temperature_2m_max': [len(calls)]}
+        return raw
+
+    fetcher = WeatherFetcher(fetch, daily_every=3 * 3600, clock=lambda: clock[0])
+    for _ in range(4):
+        fetcher()
+        clock[0] += 3600
+    assert calls == ['full', 'delta', 'delta', 'full']
+    clock[0] -= 3600
+    assert fetcher()['daily']['temperature_2m_max'] == [4]     # kept from the full one
+    assert fetcher()['current'] == {'n': 6}
+
+    fetcher = WeatherFetcher(fetch, daily_every=24 * 3600, clock=lambda: clock[0])
+    clock[0] = T0 + 23 * 3600
+    fetcher()
+    clock[0] = T0 + 24 * 3600 + 60                              # just past midnight
+    fetcher()
+    assert calls[-2:] == ['full', 'full']
+
+
+def test_sliding_hourly_window_is_not_a_forecast_change():
+    from fetch_scheduler import forecast_changed
+    old = {'hourly': {'time': ['13', '14', '15'], 'temperature_2m': [1, 2, 3]}}
+    slid = {'hourly': {'time': ['14', '15', '16'], 'temperature_2m': [2, 3, 4]}}
+    assert not forecast_changed(old, slid)
+    assert forecast_changed(old, {'hourly': {'time': ['14', '15'], 'temperature_2m': [2, 9]}})
+    assert forecast_changed(old, {'hourly': {'time': ['20'], 'temperature_2m': [2]}})
+    assert not forecast_changed(dict(old, daily={'time': ['d'], 'x': [1]}), old)
@@ -0,0 +1,174 @@
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+T0 = 1714190400          # 2024-04-27 04:00 UTC, midnight EDT
+OFFSET = -14400
+
+
+class Clock:
+    def __init__(self, now=T0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class OpenMeteoStub:
+    """Forecast that changes when a model run lands (every hour at `minute`
+    past, `late` runs a further 10 minutes later) and a `current` block that
+    moves on every 15 minutes, both by the fake clock."""
+
+    def __init__(self, clock, minute=40, late=()):
+        self.clock = clock
+        self.minute = minute
+        self.late = set(late)
+        self.requests = 0
+
+    def landed(self, hour):
+        return T0 + hour * 3600 + self.minute * 60 + (600 if hour in self.late else 0)
+
+    def run(self, now):
+        hour = int(now - T0) // 3600
+        return hour if now >= self.landed(hour) else hour - 1
+
+    def payload(self):
+        now = self.clock()
+        run = self.run(now)
+        observed = now // 900 * 900
+        local = lambda t: datetime.fromtimestamp(t + OFFSET, timezone.utc).strftime('%Y-%m-%dT%H:%M')
+        return {
+            'utc_offset_seconds': OFFSET,
+            'generationtime_ms': 0.1 + self.requests % 7,
+            'current': {'time': local(observed), 'interval': 900, 'temperature_2m': 60 + observed % 7},
+            'hourly': {'time': [local(T0 + h * 3600) for h in range(48)],
+                       'temperature_2m': [60 + run + h for h in range(48)]},
+            'daily': {'time': ['2024-04-27'], 'temperature_2m_max': [70 + run]},
+        }
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    servers = []
+
+    def start(stub):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                body = json.dumps(stub.payload()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        import weather_display
+        monkeypatch.setattr(weather_display, 'BASE_URL',
+                            'http://127.0.0.1:%d/v1/forecast' % server.server_address[1])
+        return stub
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def simulate(stub, clock, next_fetch, record, hours=24):
+    """Fetch through weather_display until `hours` have passed; returns the
+    seconds each model run went unseen after landing."""
+    import weather_display
+    seen = {}
+    end = T0 + hours * 3600
+    while clock.now < end:
+        raw = weather_display.fetch_weather()
+        record(raw)
+        seen.setdefault(stub.run(clock.now), clock.now)
+        clock.now = next_fetch()
+    return [seen[h] - stub.landed(h) for h in range(1, hours - 1) if h in seen]
+
+
+def test_learns_model_runs_and_beats_a_fixed_timer(stub_server):
+    from fetch_scheduler import FetchScheduler
+
+    clock = Clock()
+    blind = stub_server(OpenMeteoStub(clock))
+    last = {}
+    blind_delays = simulate(blind, clock, lambda: last['t'] + 1800,
+                            lambda raw: last.update(t=clock.now))
+
+    clock = Clock()
+    stub = stub_server(OpenMeteoStub(clock))
+    scheduler = FetchScheduler(clock=clock)
+    delays = simulate(stub, clock, scheduler.next_fetch, scheduler.record)
+
+    assert scheduler.period() == 3600
+    start, end = scheduler.phase()
+    assert 39 * 60 <= end and start <= 40 * 60 and end - start <= 600
+    assert stub.requests < blind.requests
+    # Once learned, each run is picked up within minutes of landing
+    assert max(delays[6:]) <= 5 * 60
+    assert sum(delays) / len(delays) < sum(blind_delays) / len(blind_delays) / 2
+
+
+def test_late_run_is_probed_not_missed(stub_server):
+    from fetch_scheduler import FetchScheduler
+    clock = Clock()
+    stub = stub_server(OpenMeteoStub(clock, late={12}))
+    scheduler = FetchScheduler(clock=clock)
+    delays = simulate(stub, clock, scheduler.next_fetch, scheduler.record)
+    late = delays[12 - 1]
+    assert late <= 10 * 60
+    assert max(delays[13:]) <= 5 * 60      # the late run doesn't move the schedule
+
+
+def test_schedule_moves_with_upstream(stub_server):
+    from fetch_scheduler import FetchScheduler
+    clock = Clock()
+    stub = stub_server(OpenMeteoStub(clock, minute=40))
+    scheduler = FetchScheduler(clock=clock)
+    simulate(stub, clock, scheduler.next_fetch, scheduler.record, hours=10)
+    stub.minute = 10
+    end = clock.now + 14 * 3600
+    import weather_display
+    while clock.now < end:
+        scheduler.record(weather_display.fetch_weather())
+        clock.now = scheduler.next_fetch()
+    start, finish = scheduler.phase()
+    assert start <= 10 * 60 <= finish + 120
+
+
+def test_fingerprint_ignores_generation_time_and_current():
+    from fetch_scheduler import fingerprint
+    a = {'generationtime_ms': 0.2, 'current': {'temperature_2m': 60}, 'hourly': {'x': [1]}}
+    b = dict(a, generationtime_ms=0.9, current={'temperature_2m': 61})
+    assert fingerprint(a) == fingerprint(b)
+    assert fingerprint(a) != fingerprint(dict(a, hourly={'x': [2]}))
+
+
+def test_record_reports_panel_changes():
+    from fetch_scheduler import FetchScheduler
+    clock = Clock()
+    scheduler = FetchScheduler(clock=clock, max_gap=7200)
+    raw = {'current': {'time': '2024-04-27T00:00', 'interval': 900}, 'hourly': {'x': [1]},
+           'utc_offset_seconds': OFFSET}
+    assert scheduler.record(raw)
+    assert not scheduler.record(dict(raw, generationtime_ms=3))
+    assert scheduler.record(dict(raw, current={'time': '2024-04-27T00:15', 'interval': 900}))
+    assert scheduler.observation == (T0 + 900, 900)
+    assert scheduler.forecast_changes == 0
+    # Nothing learned yet, so sampling for the phase comes before the
+    # observation (T0 + 900 + an hour + lag) is due
+    assert scheduler.next_fetch() == T0 + 3600 / 4
@@ -0,0 +1,95 @@
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+FONTS = {15: ImageFont.load_default(15), 22: ImageFont.load_default(22)}
+
+
+def _spec():
+    from layout import Line, Region, Repeat, Text
+    return [
+        Line([(100, 0), (100, 99)], width=2),
+        Text((4, 4), 'HEADER', 15),
+        Text((196, 4), lambda d: d['right'], 15, align='right'),
+        Region((0, 30), [
+            Repeat(lambda d: d['items'], 3, (60, 0), [
+                Text((30, 0), lambda item: item['label'], 22, align='center',
+                     underline=(26, lambda item: item['today'])),
+            ]),
+        ]),
+    ]
+
+
+DATA = {'right': '12:05 PM',
+        'items': [{'label': 'Mon', 'today': True}, {'label': 'Tue', 'today': False}]}
+
+
+def test_only_data_bound_elements_become_ops():
+    from layout import compile_layout
+    layout = compile_layout(_spec(), FONTS, size=(200, 100))
+    # right-aligned time + one op per repeated slot
+    assert len(layout.ops) == 1 + 3
+    assert layout.background.getpixel((100, 50)) == 0        # divider prerendered
+
+
+def test_prerendered_matches_op_by_op():
+    from layout import compile_layout
+    fast = compile_layout(_spec(), FONTS, size=(200, 100)).render(DATA)
+    slow = compile_layout(_spec(), FONTS, size=(200, 100), prerender=False).render(DATA)
+    assert fast.tobytes() == slow.tobytes()
+
+
+def test_alignment_and_underline_match_hand_drawn():
+    from layout import compile_layout
+    image = compile_layout(_spec(), FONTS, size=(200, 100)).render(DATA)
+
+    expected = Image.new('1', (200, 100), 255)
+    draw = ImageDraw.Draw(expected)
+    draw.line([(100, 0), (100, 99)], fill=0, width=2)
+    draw.text((4, 4), 'HEADER', font=FONTS[15], fill=0)
+    bbox = FONTS[15].getbbox(DATA['right'])
+    draw.text((196 - (bbox[2] - bbox[0]), 4), DATA['right'], font=FONTS[15], fill=0)
+    for i, item in enumerate(DATA['items']):
+        bbox = FONTS[22].getbbox(item['label'])
+        w = bbox[2] - bbox[0]
+        x = 30 + i * 60 - w // 2
+        draw.text((x, 30), item['label'], font=FONTS[22], fill=0)
+        if item['today']:
+            draw.line([(x, 56), (x + w, 56)], fill=0, width=1)
+    assert image.tobytes() == expected.tobytes()
+
+
+def test_unknown_element_rejected():
+    from layout import compile_layout
+    with pytest.raises(TypeError):
+        compile_layout([object()], FONTS)
+
+
+@pytest.mark.parametrize('size', [(800, 480), (800, 240)])
+def test_weather_layout_prerender_is_lossless(tmp_path, size):
+    matplotlib = pytest.importorskip('matplotlib')
+    import weather_display
+    from datetime import datetime
+    from layout import compile_layout
+    from test_weather_display import SAMPLE_RESPONSE
+    os.symlink(os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf'),
+               tmp_path / 'Font.ttc')
+    fonts = weather_display._load_fonts(str(tmp_path))
+    weather = weather_display.parse_weather(SAMPLE_RESPONSE, now=datetime(2024, 4, 27, 14, 30))
+    spec = weather_display.layout_for(size)
+    fast = compile_layout(spec(), fonts, size=size)
+    slow = compile_layout(spec(), fonts, size=size, prerender=False)
+    assert len(fast.ops) < len(slow.ops)
+    assert fast.render(weather, weather_display.ICONDIR).tobytes() == \
+        slow.render(weather, weather_display.ICONDIR).tobytes()
+
+
+def test_weather_layouts_only_for_known_sizes():
+    import weather_display
+    assert weather_display.layout_for((800, 240)) is weather_display.half_layout
+    with pytest.raises(ValueError):
+        weather_display.layout_for((400, 240))
@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+@pytest.fixture
+def metrics_on():
+    import metrics
+    was = metrics.enabled()
+    metrics.REGISTRY.clear()
+    metrics.enable()
+    yield metrics
+    metrics.enable(was)
+    metrics.REGISTRY.clear()
+
+
+def _stages(metrics):
+    return {dict(labels)['stage'] for (name, labels), _ in metrics.REGISTRY.items()
+            if name == 'stage_seconds'}
+
+
+def test_disabled_is_a_no_op():
+    import metrics
+    import requests
+    was = metrics.enabled()
+    metrics.enable(False)
+    try:
+        metrics.REGISTRY.clear()
+        assert metrics.span('render') is metrics.span('fetch')
+        with metrics.span('render'):
+            pass
+        assert metrics.timed('parse')(lambda x: x + 1)(1) == 2
+        session = requests.Session()
+        adapter = session.get_adapter('https://example.com')
+        assert metrics.instrument(session).get_adapter('https://example.com') is adapter
+        metrics.export(textfile='/nonexistent/x.prom')
+        assert metrics.REGISTRY.items() == []
+    finally:
+        metrics.enable(was)
+
+
+def test_spans_and_histograms(metrics_on):
+    metrics = metrics_on
+
+    @metrics.timed('parse_weather')
+    def parse(x):
+        return x * 2
+
+    with metrics.span('render'):
+        assert parse(2) == 4
+    for seconds in (0.002, 0.02, 0.2, 2.0):
+        metrics.observe('stage_seconds', seconds, stage='fetch')
+    assert _stages(metrics) == {'render', 'parse_weather', 'fetch'}
+    fetch = metrics.REGISTRY.get('stage_seconds', stage='fetch')
+    assert fetch.count == 4
+    assert fetch.max == 2.0 and fetch.last == 2.0
+    assert fetch.quantile(0.5) == 0.025
+    assert fetch.quantile(1.0) == 2.5
+
+
+def test_prometheus_textfile_and_json_status(metrics_on, tmp_path):
+    metrics = metrics_on
+    metrics.observe('stage_seconds', 0.3, stage='render')
+    metrics.observe('http_seconds', 0.04, host='api.open-meteo.com', phase='ttfb')
+    textfile, status_file = tmp_path / 'm.prom', tmp_path / 'status.json'
+    metrics.export(textfile=str(textfile), status_file=str(status_file), frames_rendered=3)
+
+    text = textfile.read_text()
+    assert '# TYPE tidetracker_stage_seconds histogram' in text
+    assert 'tidetracker_stage_seconds_bucket{stage="render",le="0.25"} 0' in text
+    assert 'tidetracker_stage_seconds_bucket{stage="render",le="0.5"} 1' in text
+    assert 'tidetracker_stage_seconds_bucket{stage="render",le="+Inf"} 1' in text
+    assert 'tidetracker_stage_seconds_count{stage="render"} 1' in text
+    assert 'tidetracker_http_seconds_sum{host="api.open-meteo.com",phase="ttfb"} 0.040000' in text
+
+    status = json.loads(status_file.read_text())
+    assert status['frames_rendered'] == 3
+    assert status['metrics']['stage_seconds']['stage=render']['count'] == 1
+    assert status['metrics']['http_seconds']['host=api.open-meteo.com,phase=ttfb']['last'] == 0.04
+
+
+def test_epd_stages_with_fake_backend(metrics_on):
+    from PIL import Image
+    from lib.waveshare_epd import epd7in5_V2, epdconfig
+    metrics = metrics_on
+    epdconfig.set_backend(epdconfig.RecordingBackend(busy_ms=5))
+    try:
+        epd = metrics.instrument_epd(epd7in5_V2.EPD())
+        epd.init()
+        epd.display(epd.getbuffer(Image.new('1', (800, 480), 255)))
+        epd.sleep()
+    finally:
+        epdconfig.reset_backend()
+    assert _stages(metrics) == {'epd_init', 'getbuffer', 'spi_transfer', 'busy', 'epd_sleep'}
+    # ReadBusy called from inside the driver is timed too
+    assert metrics.REGISTRY.get('stage_seconds', stage='busy').count == epd.busy_waits
+
+
+def test_http_phases_per_host(metrics_on, coops_stub):
+    import tide_client
+    metrics = metrics_on
+    url = coops_stub.data_url.replace('127.0.0.1', 'localhost')
+    client = tide_client.TideClient('8516990', cache_dir='/nonexistent', data_url=url)
+    client.get_records('20240101', '20240102', 'water_level', cache=False)
+    client.get_records('20240103', '20240104', 'water_level', cache=False)
+    phases = {dict(labels)['phase']: histogram.count
+              for (name, labels), histogram in metrics.REGISTRY.items() if name == 'http_seconds'}
+    # The stub speaks HTTP/1.0, so each request opens a connection
+    assert phases == {'dns': 2, 'connect': 2, 'ttfb': 2, 'body': 2}
+    assert metrics.REGISTRY.get('stage_seconds', stage='noaa_request').count == 2
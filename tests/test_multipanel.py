@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+BUSY_MS = 150
+# (cs, rst, dc, busy) for three panels sharing SPI bus 0
+PINS = {'weather': (8, 17, 25, 24), 'tide': (7, 5, 6, 13), 'owlet': (16, 20, 21, 26)}
+
+
+def _panels(bus, **backend_args):
+    from lib.waveshare_epd import epd7in5_V2, epdconfig
+    panels = {}
+    for name, (cs, rst, dc, busy) in PINS.items():
+        backend = epdconfig.RecordingBackend(busy_ms=BUSY_MS, bus=bus, cs_pin=cs, rst_pin=rst,
+                                             dc_pin=dc, busy_pin=busy, **backend_args)
+        panels[name] = epd7in5_V2.EPD(backend=backend)
+    return panels
+
+
+def _buffers(panels):
+    return {name: [i] * (epd.width * epd.height // 8)
+            for i, (name, epd) in enumerate(panels.items())}
+
+
+def test_panels_have_their_own_pins_and_frames():
+    from lib.waveshare_epd import epdconfig
+    from display_pipeline import PanelScheduler
+    bus = epdconfig.FakeSPIBus()
+    panels = _panels(bus)
+    assert panels['tide'].cs_pin == 7 and panels['owlet'].busy_pin == 26
+    assert epdconfig._implementation is None       # module-wide backend untouched
+    PanelScheduler(panels).show(_buffers(panels))
+    for i, epd in enumerate(panels.values()):
+        assert epd.backend.frames == [bytes([~i & 0xFF]) * 48000]
+        assert epd.busy_waits == 3
+    assert bus.collisions == 0
+
+
+def _record_intervals(panels):
+    """Wrap each panel's transfer() and refresh() to log (start, end) times."""
+    intervals = {name: {} for name in panels}
+    for name, epd in panels.items():
+        for step in ('transfer', 'refresh'):
+            def timed(*args, run=getattr(epd, step), name=name, step=step):
+                started = time.monotonic()
+                run(*args)
+                intervals[name][step] = (started, time.monotonic())
+            setattr(epd, step, timed)
+    return intervals
+
+
+def test_refreshes_overlap_and_transfers_serialise():
+    from lib.waveshare_epd import epdconfig
+    from display_pipeline import PanelScheduler
+    bus = epdconfig.FakeSPIBus()
+    panels = _panels(bus)
+    intervals = _record_intervals(panels)
+    PanelScheduler(panels).show(_buffers(panels))
+    order = sorted(intervals.values(), key=lambda steps: steps['transfer'])
+    for before, after in zip(order, order[1:]):
+        # One transfer at a time on the shared bus...
+        assert before['transfer'][1] <= after['transfer'][0]
+        # ...each clocked in while the previous panel is still refreshing
+        assert after['transfer'][0] < before['refresh'][1]
+    assert bus.collisions == 0
+
+
+def test_fake_bus_detects_unserialised_transfers():
+    from lib.waveshare_epd import epdconfig
+    bus = epdconfig.FakeSPIBus()
+    panels = _panels(bus)
+    for epd in panels.values():
+        epd.bus_lock = threading.RLock()           # pretend each had its own bus
+    buffers = _buffers(panels)
+    threads = [threading.Thread(target=epd.transfer, args=(buffers[name],))
+               for name, epd in panels.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert bus.collisions > 0
+
+
+def test_failed_panel_is_reported_after_others_finish():
+    from lib.waveshare_epd import epdconfig
+    from lib.waveshare_epd.epd7in5_V2 import EPDBusyTimeout
+    from display_pipeline import PanelScheduler
+    panels = _panels(epdconfig.FakeSPIBus())
+    panels['tide'].busy_timeout = 0.01
+    with pytest.raises(EPDBusyTimeout):
+        PanelScheduler(panels).show(_buffers(panels))
+    assert len(panels['weather'].backend.frames) == 1
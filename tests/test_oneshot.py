@@ -0,0 +1,206 @@
+import copy
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+NOW = 1714190400 + 14 * 3600 + 1800     # 2024-04-27 14:30 EDT
+
+
+class Upstream:
+    """Open-Meteo as metrics.get sees it: answers 304 to a matching ETag."""
+
+    def __init__(self):
+        from test_weather_display import SAMPLE_RESPONSE
+        self.raw = copy.deepcopy(SAMPLE_RESPONSE)
+        self.etag = '"v1"'
+        self.down = False
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None, headers=None):
+        self.requests.append(headers or {})
+        if self.down:
+            raise ConnectionError('unreachable')
+        status = 304 if (headers or {}).get('If-None-Match') == self.etag else 200
+        raw, etag = self.raw, self.etag
+
+        class Response:
+            status_code = status
+            headers = {'ETag': etag}
+
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return copy.deepcopy(raw)
+        return Response()
+
+
+class Panel:
+    def __init__(self):
+        self.shown = []
+
+    def init(self):
+        pass
+
+    def display(self, buffer):
+        self.shown.append(buffer)
+
+    def sleep(self):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    from PIL import Image, ImageDraw
+    import metrics
+    import resilience
+    import weather_display
+    stub = Upstream()
+    monkeypatch.setattr(metrics, 'get', stub.get)
+    monkeypatch.setattr(resilience, '_breakers', {})
+    monkeypatch.setattr(resilience, 'HEALTH', resilience.Health())
+
+    def render_at(raw, when):
+        image = Image.new('1', (800, 480), 255)
+        ImageDraw.Draw(image).text((10, 10), '%s %d' % (raw['current']['temperature_2m'],
+                                                        when // 3600), fill=0)
+        return image
+    monkeypatch.setattr(weather_display, 'render_at', render_at)
+    return stub
+
+
+def _run(tmp_path, now, panel=None):
+    import oneshot
+    panel = panel or Panel()
+    return oneshot.run(now, state_dir=str(tmp_path), panel=lambda: panel), panel
+
+
+def test_first_run_fetches_renders_and_shows(tmp_path, upstream):
+    import oneshot
+    import weather_display
+    done, panel = _run(tmp_path, NOW)
+    assert done == ('fetch', 'render', 'show')
+    assert len(panel.shown) == 1 and len(panel.shown[0]) == 800 * 480 // 8
+    state = oneshot.load_state(str(tmp_path))
+    assert state['refreshes'] == 1 and state['next_fetch'] > NOW
+    # Up to the first boundary at or after the next fetch
+    assert 2 <= len(state['frames']) <= 1 + weather_display.PRERENDER_FRAMES
+    assert state['frames'][-2][0] < state['next_fetch'] <= state['frames'][-1][0]
+    assert state['validators']['full']['etag'] == '"v1"'
+    assert sorted(f for f in os.listdir(tmp_path) if f.startswith('frame_')) == \
+        sorted(name for _, name in state['frames'])
+
+
+def test_idle_run_reads_only_the_state(tmp_path, upstream):
+    _run(tmp_path, NOW)
+    path = tmp_path / 'state.json'
+    before = path.stat().st_mtime_ns
+    done, panel = _run(tmp_path, NOW + 60)
+    assert done == () and panel.shown == []
+    assert len(upstream.requests) == 1
+    assert path.stat().st_mtime_ns == before
+
+
+def test_boundary_shows_the_prerendered_frame_without_the_renderer(tmp_path, upstream):
+    import oneshot
+    _run(tmp_path, NOW)
+    state = oneshot.load_state(str(tmp_path))
+    state['next_fetch'] = NOW + 86400
+    oneshot.save_state(state, str(tmp_path))
+    boundary = state['frames'][1][0]
+    code = ('import json, sys, oneshot\n'
+            'class Panel:\n'
+            '    init = sleep = lambda self: None\n'
+            '    def display(self, buffer): self.size = len(buffer)\n'
+            'panel = Panel()\n'
+            'done = oneshot.run(%r, state_dir=%r, panel=lambda: panel)\n'
+            'print(json.dumps([done, panel.size, sorted(m for m in sys.modules\n'
+            '                  if m in ("PIL", "requests", "weather_display"))]))\n'
+            % (boundary, str(tmp_path)))
+    out = subprocess.run([sys.executable, '-S', '-c', code], cwd=ROOT, capture_output=True,
+                         text=True, check=True).stdout
+    done, size, heavy = json.loads(out.splitlines()[-1])
+    assert done == ['show'] and size == 800 * 480 // 8
+    assert heavy == []
+    state = oneshot.load_state(str(tmp_path))
+    assert state['refreshes'] == 2 and state['shown'] == state['frames'][1][1]
+
+
+def test_frames_are_rendered_again_once_they_run_out(tmp_path, upstream):
+    import oneshot
+    _run(tmp_path, NOW)
+    state = oneshot.load_state(str(tmp_path))
+    state['next_fetch'] = NOW + 86400
+    oneshot.save_state(state, str(tmp_path))
+    done, panel = _run(tmp_path, state['frames'][-1][0] + 3600)
+    assert done == ('render', 'show') and len(panel.shown) == 1
+    assert len(upstream.requests) == 1
+
+
+def _fetch_at(tmp_path, when):
+    """Run at `when` with a fetch due then."""
+    import oneshot
+    state = oneshot.load_state(str(tmp_path))
+    state['next_fetch'] = when
+    oneshot.save_state(state, str(tmp_path))
+    return _run(tmp_path, when)
+
+
+def test_unchanged_response_is_neither_rerendered_nor_reshown(tmp_path, upstream):
+    import oneshot
+    _run(tmp_path, NOW)
+    for minutes in (5, 10):                                 # a delta, then the same again
+        done, panel = _fetch_at(tmp_path, NOW + minutes * 60)
+        assert done == ('fetch',) and panel.shown == []
+    assert upstream.requests == [{}, {}, {'If-None-Match': '"v1"'}]
+    assert set(oneshot.load_state(str(tmp_path))['validators']) == {'full', 'delta'}
+
+    upstream.etag = '"v2"'
+    upstream.raw['current']['temperature_2m'] = 50.0
+    done, panel = _fetch_at(tmp_path, NOW + 15 * 60)
+    assert done == ('fetch', 'render', 'show')
+    assert oneshot.load_state(str(tmp_path))['refreshes'] == 2
+
+
+def test_failed_fetch_backs_off_and_overlays_the_last_frames(tmp_path, upstream):
+    import oneshot
+    _run(tmp_path, NOW)
+    first = oneshot.load_state(str(tmp_path))
+    upstream.down = True
+    done, panel = _run(tmp_path, first['next_fetch'])
+    state = oneshot.load_state(str(tmp_path))
+    assert done == ('fetch', 'render', 'show')
+    assert first['next_fetch'] < state['next_fetch'] <= first['next_fetch'] + 5
+    assert state['failures'] == 1 and 'Open-Meteo' in state['health']
+    assert state['raw'] == first['raw']
+    since = time.localtime(state['health']['Open-Meteo']['since'])
+    assert state['overlay'] == ['Open-Meteo failing since ' + time.strftime('%H:%M', since)]
+
+    upstream.down = False
+    done, _ = _run(tmp_path, state['next_fetch'])
+    state = oneshot.load_state(str(tmp_path))
+    assert state['failures'] == 0 and state['health'] == {} and state['overlay'] == []
+
+
+def test_scheduler_state_survives_a_round_trip():
+    from fetch_scheduler import FetchScheduler
+    from test_weather_display import SAMPLE_RESPONSE
+    clock = [NOW]
+    scheduler = FetchScheduler(clock=lambda: clock[0])
+    for hour in range(8):
+        raw = copy.deepcopy(SAMPLE_RESPONSE)
+        raw['hourly']['temperature_2m'][0] = hour
+        clock[0] = NOW + hour * 3600 + 40 * 60 + (hour % 2) * 900
+        scheduler.record(raw)
+    restored = FetchScheduler(clock=lambda: clock[0])
+    restored.restore(json.loads(json.dumps(scheduler.state())), raw)
+    assert restored.phase() == scheduler.phase()
+    assert restored.next_fetch() == scheduler.next_fetch()
+    assert not restored.record(raw)
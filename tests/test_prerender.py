@@ -0,0 +1,148 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _queue(clock, **kwargs):
+    from prerender import PrerenderQueue
+    calls = []
+
+    def render_at(raw, when):
+        calls.append((raw, when))
+        return ('image', raw, when)
+
+    queue = PrerenderQueue(render_at, pack=lambda image: [1, 2, 3], clock=clock, **kwargs)
+    return queue, calls
+
+
+def test_refill_renders_now_and_next_boundaries():
+    clock = _Clock(10 * 3600 + 1234)
+    queue, calls = _queue(clock, horizon=3)
+    assert queue.refill('raw')
+    assert [when for _, when in calls] == [clock.now, 11 * 3600, 12 * 3600, 13 * 3600]
+    assert len(queue) == 4
+    assert queue.rendered == 4
+    frame = queue.pop_due()
+    assert frame.image == ('image', 'raw', clock.now)
+    assert frame.buffer == b'\x01\x02\x03'
+    assert queue.on_time == 1
+    assert queue.next_due() == 11 * 3600
+
+
+def test_pop_due_takes_newest_due_and_drops_older():
+    clock = _Clock(3600 - 5)
+    queue, _ = _queue(clock, horizon=3)
+    queue.refill('raw')
+    assert queue.pop_due(3600 - 1).image[2] == 3600 - 5
+    assert queue.pop_due(3600 - 1) is None
+    clock.now = 3 * 3600 + 10       # missed two boundaries
+    assert queue.pop_due().image[2] == 3 * 3600
+    assert len(queue) == 0
+    assert queue.on_time == 0       # both taken late
+
+
+def test_minute_step():
+    clock = _Clock(600 + 30)
+    queue, calls = _queue(clock, horizon=2, step=60)
+    queue.refill('raw')
+    assert [when for _, when in calls][1:] == [660, 720]
+
+
+def test_refill_due_at_low_water():
+    clock = _Clock(600 + 30)
+    queue, _ = _queue(clock, horizon=3, step=60)
+    assert queue.refill_due() == 0                  # nothing queued yet
+    queue.refill('raw')                             # now, 660, 720, 780
+    assert queue.refill_due() == 720                # then only 780 is left
+    assert queue.refill_due(low_water=1) == 780
+    single, _ = _queue(clock, horizon=1, step=60)
+    single.refill('raw')
+    assert single.refill_due() == 660               # not now: never busy-loops
+
+
+def test_refill_replaces_older_data():
+    clock = _Clock(100)
+    queue, _ = _queue(clock, horizon=2)
+    queue.refill('old')
+    queue.refill('new')
+    assert len(queue) == 3
+    assert queue.pop_due().image[1] == 'new'
+    clock.now = 3600
+    assert queue.pop_due().image[1] == 'new'
+
+
+def test_newer_refill_supersedes_one_in_progress():
+    from prerender import PrerenderQueue
+    started = threading.Event()
+    release = threading.Event()
+
+    def render_at(raw, when):
+        if raw == 'slow' and when > 100:
+            started.set()
+            release.wait(5)
+        return (raw, when)
+
+    queue = PrerenderQueue(render_at, horizon=2, clock=lambda: 100)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(queue.refill('slow')))
+    thread.start()
+    assert started.wait(5)
+    assert queue.refill('fresh')
+    release.set()
+    thread.join(5)
+    assert results == [False]
+    assert [frame.image[0] for _, frame in queue._frames] == ['fresh'] * 3
+
+
+def test_wait_frame_blocks_until_due():
+    from prerender import PrerenderQueue
+    step = 0.05
+    queue = PrerenderQueue(lambda raw, when: when, horizon=2, step=step)
+    assert queue.wait_frame(timeout=0.01) is None
+    now = time.time()
+    queue.refill('raw', now=now)
+    assert queue.wait_frame(timeout=0).image == now
+    frame = queue.wait_frame(timeout=1)
+    assert frame.image > now
+    assert time.time() >= frame.image
+
+
+def test_pipeline_passes_prerendered_frames_through():
+    from display_pipeline import DisplayPipeline
+    from prerender import PrerenderQueue
+    queue = PrerenderQueue(lambda raw, when: when, pack=lambda image: [7], horizon=3, step=0.05)
+    queue.refill('raw')
+    written = []
+    packed = []
+    pipeline = DisplayPipeline(lambda: queue.wait_frame(timeout=0.1), written.append,
+                               pack=packed.append, interval=0)
+    pipeline.start()
+    deadline = time.monotonic() + 5
+    while len(written) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pipeline.stop(timeout=2)
+    assert len(written) >= 3
+    assert all(frame.buffer == b'\x07' for frame in written)
+    assert packed == []             # packed ahead, not by the pipeline
+    assert pipeline.produce_seconds == 0.0
+
+
+def test_render_at_uses_api_local_time(monkeypatch):
+    import weather_display
+    from datetime import datetime
+    seen = []
+    monkeypatch.setattr(weather_display, 'render', lambda weather, *dirs, **kwargs: seen.append(weather))
+    monkeypatch.setattr(weather_display, 'parse_weather', lambda raw, now: {'now': now})
+    weather_display.render_at({'utc_offset_seconds': -4 * 3600}, 1700000000)
+    assert seen == [{'now': datetime(2023, 11, 14, 18, 13, 20)}]
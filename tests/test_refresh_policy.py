@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+DAY0 = 1714176000           # 2024-04-27 00:00 UTC; the policies below run on UTC
+
+
+def _policy(quiet_hours=None, **cadences):
+    from refresh_policy import DEFAULTS, Cadence, RefreshPolicy
+    merged = {key: Cadence(**c) for key, c in DEFAULTS.items()}
+    merged.update({key: Cadence(**c) for key, c in cadences.items()})
+    return RefreshPolicy(merged, quiet_hours=quiet_hours, utc_offset=0)
+
+
+def test_defaults_keep_the_fixed_cadences():
+    from refresh_policy import SCHEDULES, simulate
+    report = simulate(_policy(), DAY0, due=SCHEDULES)
+    assert report.runs['weather'] == 23 and report.runs['open-meteo'] == 95
+    assert report.runs['owm'] == 144
+    assert report.runs['tidetracker'] == 1440
+    assert report.runs['owlet'] == 8640
+    assert report.wakeups == 8640           # everything else lands on an Owlet wake-up
+
+
+def test_quiet_hours_suspend_until_they_end():
+    from refresh_policy import simulate
+    policy = _policy(quiet_hours=(23, 6), tidetracker={'interval': 60, 'quiet': None})
+    assert policy.quiet_end(DAY0 + 23.5 * 3600) == DAY0 + 30 * 3600   # across midnight
+    assert policy.quiet_end(DAY0 + 12 * 3600) == DAY0 + 12 * 3600
+    report = simulate(policy, DAY0, keys=('tidetracker',))
+    assert report.runs['tidetracker'] == 17 * 60
+    assert report.quiet_runs == {}
+    assert policy.next_run('tidetracker', DAY0 + 23 * 3600 + 30) == DAY0 + 30 * 3600
+
+
+def test_night_follows_the_forecast():
+    from refresh_policy import daylight, simulate
+    raw = {'utc_offset_seconds': -14400,
+           'daily': {'sunrise': ['2024-04-27T06:00'], 'sunset': ['2024-04-27T20:00']}}
+    assert daylight(raw) == [(DAY0 + 10 * 3600, DAY0 + 24 * 3600)]
+    policy = _policy(owm={'interval': 600, 'night': 6})
+    policy.set_daylight(daylight(raw))
+    assert policy.night(DAY0 + 9 * 3600) and not policy.night(DAY0 + 10 * 3600)
+    report = simulate(policy, DAY0, keys=('owm',))
+    assert report.runs['owm'] == 84 + 10         # 14 h of day, 10 h of night
+    assert report.night_runs['owm'] == 10
+
+
+def test_adaptive_cadence_follows_how_often_data_changes():
+    policy = _policy(owm={'interval': 600, 'adaptive': True, 'max_interval': 1000})
+    t = DAY0 + 12 * 3600
+    for _ in range(20):
+        policy.record('owm', t, changed=False)
+    assert policy.next_run('owm', t) == t + 1000
+    for _ in range(20):
+        policy.record('owm', t, changed=True)
+    assert 300 <= policy.next_run('owm', t) - t < 330
+
+
+def test_budget_spreads_runs_over_the_waking_day():
+    from refresh_policy import simulate
+    policy = _policy(quiet_hours=(0, 6),
+                     tidetracker={'interval': 60, 'quiet': None, 'budget': 100})
+    report = simulate(policy, DAY0, keys=('tidetracker',))
+    assert 90 <= report.runs['tidetracker'] <= 100
+    assert policy._last['tidetracker'] > DAY0 + 23 * 3600      # not spent by morning
+    policy.record('tidetracker', DAY0 + 23.9 * 3600)
+    for _ in range(100):
+        policy.record('tidetracker', DAY0 + 23.9 * 3600)
+    assert policy.next_run('tidetracker', DAY0 + 23.95 * 3600) == DAY0 + 30 * 3600
+
+
+def test_due_times_are_only_ever_deferred():
+    policy = _policy(quiet_hours=(23, 6), **{'open-meteo': {'interval': 120, 'quiet': None}})
+    t = DAY0 + 12 * 3600
+    assert policy.next_run('open-meteo', t, due=t + 900) == t + 900
+    policy.record('open-meteo', t)
+    assert policy.next_run('open-meteo', t, due=t + 30) == t + 120
+    assert policy.next_run('open-meteo', DAY0 + 22.99 * 3600,
+                           due=DAY0 + 23.5 * 3600) == DAY0 + 30 * 3600
+
+
+def test_state_survives_a_round_trip():
+    policy = _policy(owm={'interval': 600, 'adaptive': True, 'budget': 10})
+    for i in range(5):
+        policy.record('owm', DAY0 + i * 600, changed=i % 2 == 0)
+    restored = _policy(owm={'interval': 600, 'adaptive': True, 'budget': 10})
+    restored.restore(json.loads(json.dumps(policy.state())))
+    t = DAY0 + 3600
+    assert restored.next_run('owm', t) == policy.next_run('owm', t)
+    assert restored.runs_today('owm', t) == 5
@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__('HTTP %d' % status)
+        self.response = type('Response', (), {'status_code': status, 'headers': headers or {}})()
+
+
+def _breaker(**kw):
+    from resilience import CircuitBreaker, Health
+    clock = Clock()
+    health = Health(clock=lambda: 0)
+    breaker = CircuitBreaker('NOAA', failures=2, open_seconds=60, health=health,
+                             clock=clock, rng=lambda: 0.5, **kw)
+    return breaker, clock, health
+
+
+def _fail(exc):
+    def fn():
+        fn.calls += 1
+        raise exc
+    fn.calls = 0
+    return fn
+
+
+def test_backoff_doubles_up_to_the_cap_with_full_jitter():
+    from resilience import Backoff
+    backoff = Backoff(base=5, cap=30, rng=lambda: 1.0)
+    assert [backoff.next() for _ in range(5)] == [5, 10, 20, 30, 30]
+    backoff.reset()
+    assert backoff.next() == 5
+    assert Backoff(base=5, rng=lambda: 0.25).next() == 1.25
+
+
+def test_circuit_opens_and_fails_fast():
+    from resilience import CircuitOpen
+    breaker, clock, health = _breaker()
+    fn = _fail(ConnectionError('refused'))
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fn)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.call(fn)
+    assert fn.calls == 2                    # no request while open
+    assert raised.value.retry_at == clock.now + 60
+    assert health.messages() == ['NOAA failing since ' + time.strftime('%H:%M', time.localtime(0))]
+
+
+def test_half_open_lets_one_trial_through():
+    from resilience import CircuitOpen
+    breaker, clock, health = _breaker()
+    fn = _fail(ConnectionError('refused'))
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fn)
+    clock.now += 60
+    assert breaker.state == 'half-open'
+
+    def trial():
+        # A second caller during the trial still fails fast
+        with pytest.raises(CircuitOpen):
+            breaker.call(lambda: None)
+        raise ConnectionError('still down')
+    with pytest.raises(ConnectionError):
+        breaker.call(trial)
+    assert breaker.state == 'open'
+    assert breaker.retry_at == clock.now + 120      # reopened for twice as long
+
+    clock.now += 120
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == 'closed' and breaker.opened == 0
+    assert health.messages() == []
+
+
+def test_client_errors_do_not_trip_but_are_shown():
+    breaker, clock, health = _breaker()
+    fn = _fail(HTTPError(404))
+    for _ in range(5):
+        with pytest.raises(HTTPError):
+            breaker.call(fn)
+    assert fn.calls == 5 and breaker.state == 'closed'
+    assert health.status()['NOAA']['error'] == 'HTTP 404'
+
+
+def test_retry_after_keeps_the_circuit_open():
+    breaker, clock, health = _breaker()
+    fn = _fail(HTTPError(503, {'Retry-After': '900'}))
+    for _ in range(2):
+        with pytest.raises(HTTPError):
+            breaker.call(fn)
+    assert breaker.retry_at == clock.now + 900
+
+
+def test_overlay_only_touches_its_corner():
+    from PIL import Image
+    from resilience import overlay
+    image = Image.new('1', (200, 100), 255)
+    assert overlay(image, []).tobytes() == Image.new('1', (200, 100), 255).tobytes()
+    overlay(image, ['NOAA failing since 10:15'])
+    inverted = Image.eval(image.convert('L'), lambda v: 255 - v)
+    left, top, right, bottom = inverted.getbbox()
+    assert right <= 200 and bottom <= 100
+    assert left > 20 and top > 50
+
+
+def test_tide_client_fails_fast_while_noaa_is_down(tmp_path):
+    from resilience import CircuitBreaker, CircuitOpen, Health
+    from tide_client import TideClient
+
+    class Session:
+        calls = 0
+
+        def get(self, url, params=None, timeout=None):
+            Session.calls += 1
+            raise ConnectionError('unreachable')
+
+    breaker = CircuitBreaker('NOAA', failures=1, health=Health())
+    client = TideClient('8516990', cache_dir=str(tmp_path), session=Session(), breaker=breaker)
+    with pytest.raises(ConnectionError):
+        client.get_data('20240427', '20240428', product='predictions', interval='hilo')
+    with pytest.raises(CircuitOpen):
+        client.get_data('20240427', '20240428', product='predictions', interval='hilo')
+    assert Session.calls == 1
+
+
+def test_owm_http_error_raises_instead_of_an_error_screen(monkeypatch):
+    import metrics
+    import resilience
+    import TideTracker
+    monkeypatch.setattr(resilience, '_breakers', {})
+    monkeypatch.setattr(resilience, 'HEALTH', resilience.Health())
+
+    class Response:
+        status_code = 500
+        headers = {}
+
+        def raise_for_status(self):
+            raise HTTPError(500)
+
+    monkeypatch.setattr(metrics, 'get', lambda url, **kw: Response())
+    with pytest.raises(HTTPError):
+        TideTracker.getWeather('http://owm.invalid/')
+    assert resilience.breaker('OWM').consecutive == 1
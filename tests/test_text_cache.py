@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+STRINGS = ['72°F', '3 PM', '12 mph', 'Mon', '45%', '↑ 6:12a  ↓ 7:40p', 'j', '', '-3°']
+
+
+def _draw_both(draw_cached, text, font, xy=(7, 5)):
+    a = Image.new('1', (300, 100), 255)
+    ImageDraw.Draw(a).text(xy, text, font=font, fill=0)
+    b = Image.new('1', (300, 100), 255)
+    draw_cached(ImageDraw.Draw(b), xy, text, font)
+    return a, b
+
+
+@pytest.mark.parametrize('size', [15, 22, 40])
+def test_cached_text_is_pixel_identical(size):
+    from text_cache import TextCache
+    cache = TextCache()
+    font = ImageFont.load_default(size)
+    for text in STRINGS:
+        for _ in range(2):              # miss, then hit
+            a, b = _draw_both(lambda d, xy, t, f: cache.text(d, xy, t, f), text, font)
+            assert a.tobytes() == b.tobytes(), text
+        assert cache.bbox(text, font) == font.getbbox(text)
+    assert (cache.hits, cache.misses) == (2 * len(STRINGS), len(STRINGS))
+
+
+def test_lru_is_bounded():
+    from text_cache import TextCache
+    cache = TextCache(max_entries=3)
+    font = ImageFont.load_default(15)
+    for text in ['a', 'b', 'c', 'a', 'd']:
+        cache.width(text, font)
+    assert len(cache) == 3
+    cache.width('a', font)               # most recently used survives
+    cache.width('b', font)               # least recently used was evicted
+    assert (cache.hits, cache.misses) == (2, 5)
+    assert cache.hit_rate() == pytest.approx(2 / 7)
+
+
+def test_render_unchanged_by_cache(tmp_path, monkeypatch):
+    matplotlib = pytest.importorskip('matplotlib')
+    import weather_display
+    from test_weather_display import SAMPLE_RESPONSE
+    from datetime import datetime
+    os.symlink(os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf'),
+               tmp_path / 'Font.ttc')
+    picdir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'images')
+    weather = weather_display.parse_weather(SAMPLE_RESPONSE, now=datetime(2024, 4, 27, 14, 30))
+
+    class Uncached:
+        def text(self, draw, xy, text, font, fill=0):
+            draw.text(xy, text, font=font, fill=fill)
+
+        def bbox(self, text, font):
+            return font.getbbox(text)
+
+        def width(self, text, font):
+            bbox = font.getbbox(text)
+            return bbox[2] - bbox[0]
+
+    cached = weather_display.render(weather, picdir, os.path.join(picdir, 'icon'), str(tmp_path))
+    again = weather_display.render(weather, picdir, os.path.join(picdir, 'icon'), str(tmp_path))
+    monkeypatch.setattr(weather_display, 'TEXT_CACHE', Uncached())
+    plain = weather_display.render(weather, picdir, os.path.join(picdir, 'icon'), str(tmp_path))
+    assert cached.tobytes() == again.tobytes() == plain.tobytes()
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+def _client(stub, tmp_path):
+    from tide_client import TideClient
+    return TideClient('8516990', cache_dir=str(tmp_path),
+                      data_url=stub.data_url, metadata_url=stub.metadata_url)
+
+
+def test_water_level_frame_uses_tidetracker_columns(coops_stub, tmp_path):
+    client = _client(coops_stub, tmp_path)
+    df = client.get_data('20240427 00:00', '20240428 00:00', product='water_level')
+    assert 'water_level' in df.columns
+    assert len(df) == 241
+    assert df['water_level'].dtype.kind == 'f'
+    assert client.requests == 1
+
+
+def test_repeated_refresh_is_served_from_cache(coops_stub, tmp_path):
+    client = _client(coops_stub, tmp_path)
+    for _ in range(5):
+        client.get_data('20240427 00:00', '20240428 00:00', product='water_level')
+    assert client.requests == 1
+    assert len(coops_stub.requests) == 1
+
+
+def test_data_request_does_not_fetch_station_metadata(coops_stub, tmp_path):
+    client = _client(coops_stub, tmp_path)
+    client.get_data('20240427', '20240428', product='predictions', interval='hilo')
+    assert [path for path, _ in coops_stub.requests] == ['/api/prod/datagetter']
+
+
+def test_predictions_cached_on_disk_across_clients(coops_stub, tmp_path):
+    first = _client(coops_stub, tmp_path)
+    df = first.get_data('20240427', '20240428', product='predictions', interval='hilo')
+    assert list(df['hi_lo']) == ['L', 'H']
+
+    second = _client(coops_stub, tmp_path)
+    df = second.get_data('20240427', '20240428', product='predictions', interval='hilo')
+    assert second.requests == 0
+    assert list(df['hi_lo']) == ['L', 'H']
+
+
+def test_metadata_and_datums_cached_on_disk(coops_stub, tmp_path):
+    first = _client(coops_stub, tmp_path)
+    assert first.metadata()['name'] == 'Stub Station'
+    assert first.datums()['MSL'] == 2.5
+    second = _client(coops_stub, tmp_path)
+    second.metadata()
+    second.datums()
+    assert second.requests == 0
+    assert len(coops_stub.requests) == 2
+
+
+def test_long_ranges_are_split_per_product_limit(coops_stub, tmp_path):
+    client = _client(coops_stub, tmp_path)
+    df = client.get_data('20240101 00:00', '20240301 00:00', product='water_level')
+    assert client.requests == 2
+    assert df.index.is_monotonic_increasing
+    assert not df.index.duplicated().any()
+
+
+def test_api_error_payload_raises(coops_stub, tmp_path):
+    from tide_client import TideAPIError
+    client = _client(coops_stub, tmp_path)
+    with pytest.raises(TideAPIError):
+        client.get_data('20240427', '20240428', product='wind')
+
+
+def test_get_client_is_shared():
+    from tide_client import get_client
+    assert get_client('8516990') is get_client('8516990')
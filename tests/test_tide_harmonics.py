@@ -0,0 +1,151 @@
+import os
+import sys
+import calendar
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+# Published CO-OPS constituent speeds (degrees per hour)
+NOAA_SPEEDS = {
+    'M2': 28.9841042, 'S2': 30.0, 'N2': 28.4397295, 'K1': 15.0410686,
+    'M4': 57.9682084, 'O1': 13.9430356, 'M6': 86.9523127, 'MK3': 44.0251729,
+    'S4': 60.0, 'MN4': 57.4238337, 'NU2': 28.5125831, 'S6': 90.0,
+    'MU2': 27.9682084, '2N2': 27.8953548, 'OO1': 16.1391017, 'LAM2': 29.4556253,
+    'S1': 15.0, 'M1': 14.4966939, 'J1': 15.5854433, 'MM': 0.5443747,
+    'SSA': 0.0821373, 'SA': 0.0410686, 'MSF': 1.0158958, 'MF': 1.0980331,
+    'RHO': 13.4715145, 'Q1': 13.3986609, 'T2': 29.9589333, 'R2': 30.0410667,
+    '2Q1': 12.8542862, 'P1': 14.9589314, '2SM2': 31.0158958, 'M3': 43.4761563,
+    'L2': 29.5284789, '2MK3': 42.9271398, 'K2': 30.0821373, 'M8': 115.9364166,
+    'MS4': 58.9841042,
+}
+
+
+def _epoch(*args):
+    return calendar.timegm(datetime(*args).timetuple())
+
+
+@pytest.mark.parametrize('name', sorted(NOAA_SPEEDS))
+def test_constituent_speeds_match_coops(name):
+    from tide_harmonics import speed
+    # The nodal angle u is held for the year, so speeds are those of V alone
+    assert speed(name) == pytest.approx(NOAA_SPEEDS[name], abs=1e-5)
+
+
+def test_nodal_factors_at_lunar_node_extremes():
+    from tide_harmonics import astro, _nodal
+    # Ascending node at the vernal equinox (N = 0) in mid 2006,
+    # and at N = 180 in late 2015.
+    a = astro(np.array([_epoch(2006, 6, 20), _epoch(2015, 9, 20)]))
+    np.testing.assert_allclose(_nodal('M2', a)[0], [0.963, 1.038], atol=2e-3)
+    np.testing.assert_allclose(_nodal('K1', a)[0], [1.113, 0.881], atol=2e-3)
+    np.testing.assert_allclose(_nodal('O1', a)[0], [1.183, 0.806], atol=2e-3)
+
+
+def _m2_model(z0=2.5):
+    from tide_harmonics import HarmonicModel
+    return HarmonicModel([{'name': 'M2', 'amplitude': 2.0, 'phase_GMT': 123.4},
+                          {'name': 'XX9', 'amplitude': 1.0, 'phase_GMT': 0.0},
+                          {'name': 'K1', 'amplitude': 0.0, 'phase_GMT': 0.0}], z0=z0)
+
+
+def test_unsupported_and_zero_constituents_are_skipped():
+    assert _m2_model().names == ['M2']
+
+
+def test_prediction_is_vectorised_and_bounded():
+    model = _m2_model()
+    times, levels = model.curve(_epoch(2024, 4, 27), _epoch(2024, 5, 27))
+    assert levels.shape == times.shape == (7201,)
+    assert levels.max() <= 2.5 + 2.0 * 1.04
+    assert levels.min() >= 2.5 - 2.0 * 1.04
+    assert abs(levels.mean() - 2.5) < 0.05
+
+
+def test_extrema_refined_to_sub_minute():
+    model = _m2_model()
+    start = _epoch(2024, 4, 27)
+    t, levels, is_high = model.extrema(start, start + 2 * 86400)
+    assert len(t) in (7, 8)
+    assert np.all(np.diff(is_high.astype(int)) != 0)      # highs and lows alternate
+    # Compare with a brute-force 1-second search around each extremum
+    for ti, hi in zip(t, is_high):
+        fine = np.arange(ti - 600, ti + 600)
+        y = model.predict(fine)
+        best = fine[np.argmax(y) if hi else np.argmin(y)]
+        assert abs(best - ti) < 30
+
+
+def test_hilo_frame_matches_api_shape():
+    model = _m2_model()
+    df = model.hilo(_epoch(2024, 4, 27), _epoch(2024, 4, 28))
+    assert set(df['hi_lo']) == {'H', 'L'}
+    assert df['predicted_wl'].dtype.kind == 'f'
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures')
+
+
+def _fixture(name):
+    import json
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def seattle(coops_stub, tmp_path):
+    """Model and CO-OPS high/low predictions for Seattle (9447130), 2015-01-01..03 GMT.
+
+    Recorded CO-OPS responses in metres: the station's harcon and datums
+    from the metadata API and the MLLW `predictions` with interval=hilo.
+    """
+    import pandas as pd
+    from tide_client import TideClient
+    from tide_harmonics import HarmonicModel
+    coops_stub.harcon = _fixture('coops_9447130_harcon.json')['HarmonicConstituents']
+    coops_stub.datums = _fixture('coops_9447130_datums.json')['datums']
+    client = TideClient('9447130', cache_dir=str(tmp_path),
+                        data_url=coops_stub.data_url, metadata_url=coops_stub.metadata_url)
+    model = HarmonicModel.from_client(client)
+    records = _fixture('coops_9447130_hilo.json')['predictions']
+    noaa = pd.DataFrame({'predicted_wl': [float(r['v']) for r in records],
+                         'hi_lo': [r['type'] for r in records]},
+                        index=pd.to_datetime([r['t'] for r in records]))
+    return model, noaa
+
+
+def test_validate_against_recorded_coops_predictions(seattle):
+    from tide_harmonics import HILO_HEIGHT_TOLERANCE, validate
+    model, noaa = seattle
+    assert len(model.names) == 34
+    ok, max_err, rms = validate(model, noaa, tolerance=HILO_HEIGHT_TOLERANCE)
+    assert ok and rms < HILO_HEIGHT_TOLERANCE
+
+    shifted = noaa.assign(predicted_wl=noaa['predicted_wl'] + 0.5)
+    ok, max_err, _ = validate(model, shifted, tolerance=0.1)
+    assert not ok and max_err > 0.45
+
+
+def test_highs_and_lows_match_recorded_coops_predictions(seattle):
+    from tide_harmonics import HILO_HEIGHT_TOLERANCE, HILO_TIME_TOLERANCE
+    model, noaa = seattle
+    t, levels, is_high = model.extrema(_epoch(2015, 1, 1), _epoch(2015, 1, 3))
+    expected = (noaa.index - datetime(1970, 1, 1)).total_seconds().to_numpy()
+    assert list(np.where(is_high, 'H', 'L')) == list(noaa['hi_lo'])
+    # CO-OPS reports times to the minute
+    assert np.max(np.abs(t - expected)) <= HILO_TIME_TOLERANCE
+    assert np.max(np.abs(levels - noaa['predicted_wl'].to_numpy())) <= HILO_HEIGHT_TOLERANCE
+
+
+def test_model_from_client_uses_datums(coops_stub, tmp_path):
+    from tide_client import TideClient
+    from tide_harmonics import HarmonicModel
+    coops_stub.harcon = [{'number': 1, 'name': 'M2', 'amplitude': 2.0,
+                          'phase_GMT': 10.0, 'speed': 28.984104}]
+    client = TideClient('8516990', cache_dir=str(tmp_path),
+                        data_url=coops_stub.data_url, metadata_url=coops_stub.metadata_url)
+    model = HarmonicModel.from_client(client)
+    assert model.z0 == 2.5
+    assert model.names == ['M2']
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+def _prefetch(stub, tmp_path, year=2024):
+    from tide_client import TideClient
+    from tide_prefetch import prefetch, TidePredictionIndex
+    client = TideClient('8516990', cache_dir=str(tmp_path),
+                        data_url=stub.data_url, metadata_url=stub.metadata_url)
+    path = prefetch(client, year, path=str(tmp_path / 'pred.npz'))
+    return client, TidePredictionIndex(path)
+
+
+def test_year_fetched_in_bulk_chunks(coops_stub, tmp_path):
+    client, index = _prefetch(coops_stub, tmp_path)
+    hilo = [q for _, q in coops_stub.requests if q.get('interval') == 'hilo']
+    curve = [q for _, q in coops_stub.requests if q.get('product') == 'predictions'
+             and 'interval' not in q]
+    assert len(hilo) == 2                  # 367 days at 365 per request
+    assert len(curve) == 12                # 31 days per 6-minute request
+    assert all(q['time_zone'] == 'gmt' for _, q in coops_stub.requests)
+    assert client.requests == 14
+    assert index.covers(date(2024, 1, 1), date(2024, 12, 31))
+    assert not index.covers(date(2024, 12, 31), date(2025, 1, 1))
+
+
+def test_prefetch_bypasses_response_cache(coops_stub, tmp_path):
+    client, _ = _prefetch(coops_stub, tmp_path)
+    assert not client._memory
+
+
+def test_hilo_lookup_by_local_day(coops_stub, tmp_path):
+    _, index = _prefetch(coops_stub, tmp_path)
+    # The stub returns one L and one H at the start of each request range
+    t, v, h = index.hilo_range(0, 2 ** 40)
+    assert len(t) == 4 and np.all(np.diff(t) > 0)
+    start = time.mktime(datetime(2024, 1, 1).timetuple())
+    end = time.mktime(datetime(2025, 1, 1).timetuple())
+    expected = index.hilo_range(start, end)[0]
+    np.testing.assert_array_equal(index.hilo_days(date(2024, 1, 1), date(2024, 12, 31))[0],
+                                  expected)
+    df = index.hilo(date(2024, 1, 1), date(2024, 12, 31))
+    assert list(df.columns) == ['predicted_wl', 'hi_lo']
+    assert len(df) == len(expected)
+    assert set(df['hi_lo']) <= {'H', 'L'}
+
+
+def test_curve_is_a_regular_grid(coops_stub, tmp_path):
+    from tide_prefetch import CURVE_STEP
+    _, index = _prefetch(coops_stub, tmp_path)
+    start = time.mktime(datetime(2024, 3, 10).timetuple())
+    times, levels = index.curve(start, start + 86400)
+    assert len(times) == 241
+    assert np.all(np.diff(times) == CURVE_STEP)
+    assert not np.isnan(levels).any()
+    assert os.path.getsize(str(tmp_path / 'pred.npz')) < 500 * 1024
@@ -0,0 +1,89 @@
+import os
+import sys
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+NOW = calendar.timegm(datetime(2024, 4, 27, 12, 0).timetuple())
+
+
+def _setup(stub, tmp_path, window=24 * 3600):
+    from tide_client import TideClient
+    from tide_series import TideSeries
+    client = TideClient('8516990', cache_dir=str(tmp_path),
+                        data_url=stub.data_url, metadata_url=stub.metadata_url)
+    series = TideSeries('8516990', window=window, path=str(tmp_path / 'wl.npz'))
+    return client, series
+
+
+def test_first_refresh_fills_window(coops_stub, tmp_path):
+    client, series = _setup(coops_stub, tmp_path)
+    assert series.refresh(client, now=NOW) == 241
+    times, levels = series.ordered()
+    assert times[0] == NOW - 24 * 3600
+    assert times[-1] == NOW
+    assert np.all(np.diff(times) == 360)
+    assert client.requests == 1
+
+
+def test_top_up_requests_from_last_sample(coops_stub, tmp_path):
+    client, series = _setup(coops_stub, tmp_path)
+    series.refresh(client, now=NOW)
+    assert series.refresh(client, now=NOW + 60) == 0      # next sample not due
+    assert client.requests == 1
+    assert series.refresh(client, now=NOW + 720) == 2
+    _, query = coops_stub.requests[-1]
+    assert query['begin_date'] == '20240427 12:00'
+    assert query['time_zone'] == 'gmt'
+    times, _ = series.ordered()
+    assert len(times) == 241                                # ring buffer stays full
+    assert times[-1] == NOW + 720
+
+
+def test_buffer_persists_across_restarts(coops_stub, tmp_path):
+    from tide_series import TideSeries
+    client, series = _setup(coops_stub, tmp_path)
+    series.refresh(client, now=NOW)
+    restored = TideSeries('8516990', path=str(tmp_path / 'wl.npz'))
+    assert restored.load()
+    assert restored.last_time() == NOW
+    np.testing.assert_array_equal(restored.ordered()[1], series.ordered()[1])
+    restored.refresh(client, now=NOW + 360)
+    _, query = coops_stub.requests[-1]
+    assert query['begin_date'] == '20240427 12:00'
+
+
+def test_load_rejects_different_window(coops_stub, tmp_path):
+    from tide_series import TideSeries
+    client, series = _setup(coops_stub, tmp_path)
+    series.refresh(client, now=NOW)
+    longer = TideSeries('8516990', window=72 * 3600, path=str(tmp_path / 'wl.npz'))
+    assert not longer.load()
+
+
+def test_longer_window_fills_in_range_limited_chunks(coops_stub, tmp_path):
+    client, series = _setup(coops_stub, tmp_path, window=40 * 86400)
+    series.refresh(client, now=NOW)
+    assert client.requests == 2
+    assert series.count == series.capacity
+
+
+def test_request_accounting_per_day(coops_stub, tmp_path):
+    client, series = _setup(coops_stub, tmp_path)
+    series.refresh(client, now=NOW)
+    series.refresh(client, now=NOW + 360)
+    assert series.requests_today == 2
+    assert series.bytes_today == client.bytes_received
+    series.refresh(client, now=NOW + 86400)
+    assert series.requests_today == 1
+
+
+def test_as_frame_matches_past24_shape(coops_stub, tmp_path):
+    client, series = _setup(coops_stub, tmp_path)
+    series.refresh(client, now=NOW)
+    df = series.as_frame()
+    assert list(df.columns) == ['water_level']
+    assert len(df) == 241
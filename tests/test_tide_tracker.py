@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+HEAVY = ('requests', 'numpy', 'pandas', 'matplotlib', 'tide_client',
+         'owlet_monitor', 'lib.waveshare_epd')
+
+
+def _import_in_subprocess(code):
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_import_has_no_side_effects():
+    probe = (
+        'import sys, threading\n'
+        'path = list(sys.path)\n'
+        'import TideTracker\n'
+        'assert threading.active_count() == 1, threading.enumerate()\n'
+        'assert sys.path == path\n'
+        'assert TideTracker.epd is None and not TideTracker.fonts\n'
+        'loaded = [m for m in %r if m in sys.modules]\n'
+        'assert not loaded, loaded\n' % (HEAVY,))
+    result = _import_in_subprocess(probe)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ''
+
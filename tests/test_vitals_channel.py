@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+def _sample(hr=120, ts=None):
+    return {'hr': hr, 'ox': 98, 'mv': 0, 'DSN': 'AC000W000000000',
+            'ts': time.time() if ts is None else ts}
+
+
+def test_subscriber_receives_published_sample(tmp_path):
+    from vitals_channel import VitalsPublisher, VitalsSubscriber
+    sub = VitalsSubscriber(channel_dir=str(tmp_path), name='display')
+    pub = VitalsPublisher(channel_dir=str(tmp_path))
+    try:
+        assert pub.publish(_sample(hr=131)) == 1
+        sample = sub.recv(timeout=1)
+        assert sample['hr'] == 131
+        assert sub.last_sample == sample
+    finally:
+        pub.close()
+        sub.close()
+
+
+def test_fan_out_to_multiple_subscribers(tmp_path):
+    from vitals_channel import VitalsPublisher, VitalsSubscriber
+    subs = [VitalsSubscriber(channel_dir=str(tmp_path), name=n) for n in ('a', 'b')]
+    pub = VitalsPublisher(channel_dir=str(tmp_path))
+    try:
+        assert pub.publish(_sample()) == 2
+        assert all(s.recv(timeout=1) is not None for s in subs)
+    finally:
+        pub.close()
+        for s in subs:
+            s.close()
+
+
+def test_recv_times_out_without_publisher(tmp_path):
+    from vitals_channel import VitalsSubscriber
+    sub = VitalsSubscriber(channel_dir=str(tmp_path), name='display')
+    try:
+        assert sub.recv(timeout=0.01) is None
+        assert sub.recv(timeout=0) is None
+        assert not sub.is_transmitting(30)
+    finally:
+        sub.close()
+
+
+def test_publisher_removes_stale_subscriber_sockets(tmp_path):
+    import socket
+    from vitals_channel import VitalsPublisher
+    # A socket file whose owner has gone away
+    stale = os.path.join(str(tmp_path), 'gone.sock')
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    s.bind(stale)
+    s.close()
+    pub = VitalsPublisher(channel_dir=str(tmp_path))
+    try:
+        assert pub.publish(_sample()) == 0
+        assert not os.path.exists(stale)
+    finally:
+        pub.close()
+
+
+def test_is_transmitting_uses_last_sample_timestamp(tmp_path):
+    from vitals_channel import VitalsPublisher, VitalsSubscriber
+    sub = VitalsSubscriber(channel_dir=str(tmp_path), name='display')
+    pub = VitalsPublisher(channel_dir=str(tmp_path))
+    try:
+        pub.publish(_sample(ts=1000.0))
+        pub.publish(_sample(ts=1010.0))
+        assert len(sub.drain()) == 2
+        assert sub.is_transmitting(30, now=1020.0)
+        assert not sub.is_transmitting(30, now=1041.0)
+    finally:
+        pub.close()
+        sub.close()
+
+
+def test_sample_reaches_blocked_subscriber_quickly(tmp_path):
+    from vitals_channel import VitalsPublisher, VitalsSubscriber
+    sub = VitalsSubscriber(channel_dir=str(tmp_path), name='display')
+    pub = VitalsPublisher(channel_dir=str(tmp_path))
+    received = {}
+
+    def wait():
+        sample = sub.recv(timeout=5)
+        received['latency'] = time.time() - sample['ts']
+
+    t = threading.Thread(target=wait)
+    t.start()
+    time.sleep(0.05)
+    pub.publish(_sample())
+    t.join(5)
+    try:
+        assert received['latency'] < 0.5
+    finally:
+        pub.close()
+        sub.close()
+
+
+def test_check_transmission_reads_channel(tmp_path, monkeypatch):
+    import owlet_monitor
+    from vitals_channel import VitalsPublisher, VitalsSubscriber
+    sub = VitalsSubscriber(channel_dir=str(tmp_path), name='display')
+    monkeypatch.setattr(owlet_monitor, 'subscriber', None)
+    monkeypatch.setattr(owlet_monitor, 'own_subscriber', sub)
+    monkeypatch.setattr(owlet_monitor, 'last_sample_time', 0)
+    pub = VitalsPublisher(channel_dir=str(tmp_path))
+    try:
+        assert owlet_monitor.check_transmission() is False
+        pub.publish(_sample())
+        assert owlet_monitor.check_transmission() is True
+        pub.publish(_sample(ts=time.time() - 120))
+        assert owlet_monitor.check_transmission() is False
+    finally:
+        pub.close()
+        sub.close()
+
+
+def test_check_transmission_leaves_a_readers_samples(tmp_path, monkeypatch):
+    import owlet_monitor
+    from vitals_channel import VitalsPublisher, VitalsSubscriber
+    sub = VitalsSubscriber(channel_dir=str(tmp_path), name='display')
+    monkeypatch.setattr(owlet_monitor, 'subscriber', sub)
+    monkeypatch.setattr(owlet_monitor, 'last_sample_time', 0)
+    pub = VitalsPublisher(channel_dir=str(tmp_path))
+    try:
+        pub.publish(_sample(hr=131))
+        assert owlet_monitor.check_transmission() is False     # not received yet
+        assert sub.recv(timeout=1)['hr'] == 131                # still queued
+        assert owlet_monitor.check_transmission() is True
+    finally:
+        pub.close()
+        sub.close()
+
+
+def test_record_vitals_publishes_sample(tmp_path, monkeypatch):
+    import json
+    import owlet_monitor
+    from vitals_channel import VitalsPublisher, VitalsSubscriber
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(owlet_monitor, 'last_sample_time', 0)
+    sub = VitalsSubscriber(channel_dir=str(tmp_path), name='display')
+    monkeypatch.setattr(owlet_monitor, 'publisher',
+                        VitalsPublisher(channel_dir=str(tmp_path)))
+    prop = {
+        'DSN': 'AC000W000000000',
+        'REAL_TIME_VITALS': {'value': json.dumps({'hr': 125, 'ox': 97, 'mv': 1, 'chg': 0})},
+        'SOCK_OFF': {'value': 0},
+    }
+    try:
+        owlet_monitor.record_vitals(prop)
+        sample = sub.recv(timeout=1)
+        assert sample['hr'] == 125
+        assert sample['DSN'] == 'AC000W000000000'
+        assert owlet_monitor.check_transmission()
+    finally:
+        owlet_monitor.publisher.close()
+        sub.close()
+
+
+def test_drain_skips_malformed_datagrams(tmp_path):
+    import socket
+    from vitals_channel import VitalsPublisher, VitalsSubscriber
+    sub = VitalsSubscriber(channel_dir=str(tmp_path), name='display')
+    pub = VitalsPublisher(channel_dir=str(tmp_path))
+    raw = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        pub.publish(_sample(hr=120))
+        raw.sendto(b'{not json', sub.path)
+        raw.sendto(b'[1, 2]', sub.path)
+        pub.publish(_sample(hr=121))
+        assert [s['hr'] for s in sub.drain()] == [120, 121]
+        assert sub.malformed == 2
+        raw.sendto(b'\xff', sub.path)
+        assert sub.recv(timeout=0) is None and sub.malformed == 3
+    finally:
+        raw.close()
+        pub.close()
+        sub.close()
@@ -0,0 +1,100 @@
+import os
+import sys
+import csv
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+DSN = 'AC000W000000000'
+NOW = 1_700_006_400.0   # an hour boundary
+
+
+def _write_raw(directory, start, count, step=10):
+    path = os.path.join(str(directory), 'owlet_data_%s.csv' % DSN)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['hr', 'ox', 'mv', 'chg', 'timestamp'])
+        writer.writeheader()
+        for i in range(count):
+            ts = start + i * step
+            writer.writerow({'hr': 100 + i % 60, 'ox': 95 + i % 5, 'mv': i % 2, 'chg': 0,
+                             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S',
+                                                        time.localtime(ts))})
+    return path
+
+
+def _rows(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_compact_moves_old_raw_samples_to_minute_rollups(tmp_path):
+    from vitals_retention import compact, rollup_path
+    raw = _write_raw(tmp_path, NOW - 7200, 720)   # two hours of samples
+    moved = compact(DSN, now=NOW, directory=str(tmp_path),
+                    raw_retention=3600, minute_retention=86400)
+    assert moved['raw'] == 360
+    assert len(_rows(raw)) == 360
+    minutes = _rows(rollup_path(DSN, 'minute', str(tmp_path)))
+    assert len(minutes) == 60
+    assert all(int(r['count']) == 6 for r in minutes)
+    assert float(minutes[0]['hr_min']) == 100
+    assert float(minutes[0]['hr_max']) == 105
+    assert float(minutes[0]['hr_mean']) == 102.5
+
+
+def test_compact_is_idempotent(tmp_path):
+    from vitals_retention import compact
+    _write_raw(tmp_path, NOW - 7200, 720)
+    compact(DSN, now=NOW, directory=str(tmp_path), raw_retention=3600, minute_retention=86400)
+    moved = compact(DSN, now=NOW, directory=str(tmp_path),
+                    raw_retention=3600, minute_retention=86400)
+    assert moved == {'raw': 0, 'minute': 0, 'hour': 0}
+
+
+def test_compact_rolls_minutes_into_hours_and_expires_hours(tmp_path):
+    from vitals_retention import compact, rollup_path
+    _write_raw(tmp_path, NOW - 3 * 3600, 3 * 360)
+    compact(DSN, now=NOW, directory=str(tmp_path), raw_retention=0, minute_retention=86400)
+    moved = compact(DSN, now=NOW, directory=str(tmp_path),
+                    raw_retention=0, minute_retention=3600, hour_retention=2 * 3600 + 1)
+    hours = _rows(rollup_path(DSN, 'hour', str(tmp_path)))
+    assert moved['minute'] == 120
+    assert moved['hour'] == 1
+    assert len(hours) == 1
+    assert int(hours[0]['count']) == 360
+    assert len(_rows(rollup_path(DSN, 'minute', str(tmp_path)))) == 60
+
+
+def test_pick_tier_by_age():
+    from vitals_retention import pick_tier
+    kwargs = dict(now=NOW, raw_retention=3600, minute_retention=86400)
+    assert pick_tier(NOW - 600, **kwargs) == 'raw'
+    assert pick_tier(NOW - 7200, **kwargs) == 'minute'
+    assert pick_tier(NOW - 7 * 86400, **kwargs) == 'hour'
+
+
+def test_query_combines_tiers_at_one_resolution(tmp_path):
+    from vitals_retention import compact, query
+    _write_raw(tmp_path, NOW - 7200, 720)
+    retention = dict(raw_retention=3600, minute_retention=86400)
+    compact(DSN, now=NOW, directory=str(tmp_path), **retention)
+
+    tier, buckets = query(DSN, NOW - 7200, NOW, now=NOW, directory=str(tmp_path), **retention)
+    assert tier == 'minute'
+    # 60 compacted minutes plus 60 minutes re-bucketed from raw
+    assert len(buckets) == 120
+    assert sum(b['count'] for b in buckets) == 720
+
+    tier, buckets = query(DSN, NOW - 600, NOW, now=NOW, directory=str(tmp_path), **retention)
+    assert tier == 'raw'
+    assert len(buckets) == 60
+
+
+def test_query_hour_tier_matches_raw_totals(tmp_path):
+    from vitals_retention import query
+    _write_raw(tmp_path, NOW - 7200, 720)
+    tier, buckets = query(DSN, NOW - 7200, NOW, now=NOW, directory=str(tmp_path), tier='hour')
+    assert tier == 'hour'
+    assert [b['count'] for b in buckets] == [360, 360]
+    assert buckets[0]['hr_min'] == 100
+    assert buckets[0]['hr_max'] == 159
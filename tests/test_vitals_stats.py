@@ -0,0 +1,153 @@
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+def _samples(n, start=1_700_000_000, step=10, seed=1):
+    rng = random.Random(seed)
+    return [{'ts': start + i * step,
+             'hr': rng.randint(100, 160),
+             'ox': rng.randint(90, 100),
+             'mv': rng.randint(0, 3)} for i in range(n)]
+
+
+def _brute(values):
+    values = sorted(values)
+    return {'mean': sum(values) / len(values), 'min': values[0], 'max': values[-1]}
+
+
+def test_rolling_window_matches_brute_force():
+    from vitals_stats import RollingStat
+    stat = RollingStat(span=300)
+    samples = _samples(500)
+    for i, s in enumerate(samples):
+        stat.add(s['ts'], s['hr'])
+        window = [x['hr'] for x in samples[:i + 1] if x['ts'] > s['ts'] - 300]
+        expected = _brute(window)
+        assert stat.count == len(window)
+        assert stat.min() == expected['min']
+        assert stat.max() == expected['max']
+        assert abs(stat.mean() - expected['mean']) < 1e-9
+
+
+def test_percentiles_are_exact_for_integer_vitals():
+    from vitals_stats import RollingStat
+    stat = RollingStat(span=None)
+    for i, v in enumerate(range(1, 101)):
+        stat.add(i, v)
+    assert stat.percentile(50) == 50
+    assert stat.percentile(90) == 90
+    assert stat.percentile(100) == 100
+
+
+def test_session_window_never_evicts():
+    from vitals_stats import VitalsAggregator
+    agg = VitalsAggregator()
+    for s in _samples(1000):
+        agg.add(s)
+    summary = agg.summary(now=agg.last_ts)
+    assert summary['session']['hr']['count'] == 1000
+    assert summary['1h']['hr']['count'] == 360
+    assert summary['5m']['hr']['count'] == 30
+
+
+def test_gap_starts_new_session():
+    from vitals_stats import VitalsAggregator
+    agg = VitalsAggregator()
+    first = _samples(10)
+    later = _samples(5, start=first[-1]['ts'] + 3600)
+    for s in first + later:
+        agg.add(s)
+    assert agg.session_start == later[0]['ts']
+    assert agg.summary('session', now=agg.last_ts)['ox']['count'] == 5
+
+
+def test_minute_series_downsamples_session():
+    from vitals_stats import VitalsAggregator
+    agg = VitalsAggregator()
+    samples = _samples(60, start=1_700_000_030)   # 10 minutes at 10 s, mid-minute start
+    for s in samples:
+        agg.add(s)
+    series = agg.series(now=agg.last_ts)
+    assert len(series) == 11
+    first_minute = [s['hr'] for s in samples if s['ts'] < series[1][0]]
+    assert abs(series[0][1]['hr'] - sum(first_minute) / len(first_minute)) < 1e-9
+
+
+def test_from_csv_reads_owlet_file(tmp_path):
+    import csv
+    import time
+    from vitals_stats import VitalsAggregator
+    path = tmp_path / 'owlet_data_TEST.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['hr', 'ox', 'mv', 'chg', 'timestamp'])
+        writer.writeheader()
+        for s in _samples(20):
+            writer.writerow({'hr': s['hr'], 'ox': s['ox'], 'mv': s['mv'], 'chg': 0,
+                             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S',
+                                                        time.localtime(s['ts']))})
+    agg = VitalsAggregator.from_csv(str(path))
+    assert agg.summary('session', now=agg.last_ts)['hr']['count'] == 20
+
+
+def test_summary_goes_empty_when_the_owlet_stops_sending():
+    from vitals_stats import VitalsAggregator
+    agg = VitalsAggregator()
+    for s in _samples(100):
+        agg.add(s)
+    last = agg.last_ts
+    assert agg.summary('5m', now=last + 200)['hr']['count'] == 10
+    stale = agg.summary(now=last + 300)
+    assert stale['5m']['hr'] == {'count': 0, 'mean': None, 'min': None, 'max': None,
+                                 'p50': None, 'p90': None}
+    assert stale['1h']['hr']['count'] == 100 and stale['session']['hr']['count'] == 100
+    assert agg.summary('1h', now=last + 3599)['ox']['count'] == 1        # the last sample
+    assert agg.summary('session', now=last + 3600)['mv']['count'] == 0
+    assert agg.series(now=last + 3600) == [] and agg.last_ts is None
+
+
+def test_minute_series_keeps_only_the_plotted_span():
+    from vitals_stats import VitalsAggregator
+    agg = VitalsAggregator(series_span=3600)
+    samples = _samples(6 * 360, step=10)            # six hours
+    for s in samples:
+        agg.add(s)
+    series = agg.series(now=agg.last_ts)
+    assert len(agg.minutes) == 59 and len(series) == 60
+    assert series[-1][0] - series[0][0] == 59 * 60
+    assert agg.summary('session', now=agg.last_ts)['hr']['count'] == len(samples)
+
+
+def test_add_and_summary_from_two_threads():
+    import threading
+    from vitals_stats import VitalsAggregator
+    agg = VitalsAggregator(session_gap=10 ** 6)     # reads run ahead of the feed
+    samples = _samples(20000, step=1)
+    now = samples[-1]['ts']
+    done = threading.Event()
+    errors = []
+
+    def feed():
+        for s in samples:
+            agg.add(s)
+        done.set()
+
+    def read():
+        try:
+            while not done.is_set():
+                session = agg.summary('session', now=now)
+                # Every field sees the same samples
+                assert len({stat['count'] for stat in session.values()}) == 1
+                agg.series(now=now)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=feed), threading.Thread(target=read)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert errors == []
+    assert agg.summary('session', now=now)['hr']['count'] == len(samples)
@@ -343,3 +343,53 @@ def test_write_to_display_dev_mode_saves_file(tmp_path):
     img = PILImage.new('1', (800, 480), 255)
     write_to_display(img, epd=None, picdir=str(tmp_path))
     assert (tmp_path / 'screen_output.png').exists()
+
+
+def test_fetch_loop_keeps_frames_coming_past_the_horizon():
+    import weather_display as wd
+    from prerender import PrerenderQueue
+    T0 = 1_714_240_800              # 2024-04-27 18:00 UTC
+    clock = [T0]
+    fetches = []
+    shown = []
+
+    class Scheduler:
+        def record(self, raw):
+            return False
+
+        def next_fetch(self):
+            return clock[0] + 3 * 3600      # e.g. quiet hours: no fetch for 3 h
+
+    class Policy:
+        def next_run(self, key, now, due=None):
+            return now if due is None else due
+
+        def record(self, key, now, changed=None):
+            pass
+
+        def set_daylight(self, spans):
+            pass
+
+    class Stop:
+        # The display loop: takes each minute's frame as the clock moves on
+        def is_set(self):
+            return clock[0] >= T0 + 3 * 3600
+
+        def wait(self, seconds):
+            end = clock[0] + seconds
+            while clock[0] < end and not self.is_set():
+                clock[0] = min(end, (clock[0] // 60 + 1) * 60)
+                frame = frames.pop_due(clock[0])
+                if frame is not None:
+                    shown.append(frame.image)
+
+    def fetch():
+        fetches.append(clock[0])
+        return {}
+
+    frames = PrerenderQueue(lambda raw, when: when, horizon=30, step=60,
+                            clock=lambda: clock[0])
+    wd.fetch_loop(fetch, frames, Scheduler(), Policy(), Stop(), clock=lambda: clock[0])
+    assert fetches == [T0]
+    # Every minute of the three hours, six times the 30 minute horizon
+    assert shown == list(range(T0 + 60, T0 + 3 * 3600 + 1, 60))
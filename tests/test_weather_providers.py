@@ -0,0 +1,209 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+T0 = 1714242000             # 2024-04-27 14:20 EDT
+OFFSET = -14400
+
+
+def _onecall():
+    """A One Call response for T0 in imperial units."""
+    midnight = T0 - (T0 + OFFSET) % 86400
+    return {
+        'timezone_offset': OFFSET,
+        'current': {'dt': T0, 'sunrise': midnight + 6 * 3600, 'sunset': midnight + 20 * 3600,
+                    'temp': 69.4, 'feels_like': 67.0, 'humidity': 58, 'dew_point': 53.9,
+                    'uvi': 5.35, 'visibility': 10000, 'wind_speed': 9.7, 'wind_deg': 207,
+                    'weather': [{'id': 802, 'icon': '03d'}]},
+        'hourly': [{'dt': T0 - 20 * 60 + h * 3600, 'temp': 69 - h, 'pop': 0.1 * (h % 10),
+                    'wind_speed': 8.0, 'weather': [{'id': 500 if h % 2 else 800}]}
+                   for h in range(48)],
+        'daily': [{'dt': midnight + 12 * 3600 + d * 86400,
+                   'sunrise': midnight + 6 * 3600 + d * 86400,
+                   'sunset': midnight + 20 * 3600 + d * 86400,
+                   'temp': {'min': 50 + d, 'max': 70 + d}, 'pop': 0.2,
+                   'weather': [{'id': 211 if d == 1 else 601}]}
+                  for d in range(8)],
+    }
+
+
+def test_onecall_parses_like_open_meteo():
+    from weather_display import parse_weather
+    from weather_providers import from_onecall
+    from test_weather_display import SAMPLE_RESPONSE
+    now = datetime(2024, 4, 27, 14, 30)
+    owm = parse_weather(from_onecall(_onecall()), now=now)
+    open_meteo = parse_weather(SAMPLE_RESPONSE, now=now)
+    assert owm.keys() == open_meteo.keys()
+    assert owm['current'].keys() == open_meteo['current'].keys()
+    assert owm['today'].keys() == open_meteo['today'].keys()
+    assert [h.keys() for h in owm['hourly']] == [h.keys() for h in open_meteo['hourly']]
+    assert owm['current']['temperature'] == 69.4 and owm['current']['weather_code'] == 2
+    assert owm['current']['is_day'] == 1
+    assert owm['today'] == {'high': 70, 'low': 50, 'precip_pct': 20,
+                            'sunrise': '6:00 AM', 'sunset': '8:00 PM'}
+    assert owm['hourly'][0]['time'] == '3 PM' and owm['hourly'][0]['weather_code'] == 61
+    assert [d['weather_code'] for d in owm['daily'][:3]] == [73, 95, 73]
+
+
+def test_owm_daylight_feeds_the_refresh_policy():
+    from refresh_policy import daylight
+    from weather_providers import from_onecall
+    data = _onecall()
+    spans = daylight(from_onecall(data))
+    assert spans[0] == (data['current']['sunrise'], data['current']['sunset'])
+
+
+class Stub:
+    """A provider answering after `latency` seconds, or raising `error`."""
+
+    def __init__(self, name, latency=0.0, error=None):
+        self.name = name
+        self.latency = latency
+        self.error = error
+        self.calls = []
+        self.discarded = 0
+
+    def fetch(self, part='full'):
+        self.calls.append(part)
+        time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return {'provider': self.name, 'part': part}
+
+    def discard(self):
+        self.discarded += 1
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    import resilience
+    monkeypatch.setattr(resilience, '_breakers', {})
+    monkeypatch.setattr(resilience, 'HEALTH', resilience.Health())
+
+
+def test_fast_primary_is_not_hedged():
+    from weather_providers import HedgedFetch
+    primary, secondary = Stub('a', 0.01), Stub('b')
+    fetch = HedgedFetch([primary, secondary], hedge_after=0.5)
+    assert fetch('delta') == {'provider': 'a', 'part': 'delta'}
+    assert secondary.calls == [] and fetch.hedges == 0
+    fetch.close()
+
+
+def test_slow_primary_is_hedged_and_the_late_answer_dropped():
+    from weather_providers import HedgedFetch
+    primary, secondary = Stub('a', 0.5), Stub('b', 0.01)
+    fetch = HedgedFetch([primary, secondary], hedge_after=0.05)
+    started = time.monotonic()
+    assert fetch()['provider'] == 'b'
+    assert time.monotonic() - started < 0.3
+    assert fetch.hedges == 1 and fetch.last_provider == 'b'
+    time.sleep(0.6)
+    assert primary.discarded == 1                           # timed, then thrown away
+    assert fetch.stats['a'].quantile(0.5) >= 0.5
+    assert fetch.primary is secondary                       # faster lately
+    fetch.close()
+
+
+def test_failed_primary_asks_the_next_at_once():
+    from weather_providers import HedgedFetch
+    primary, secondary = Stub('a', error=ConnectionError('down')), Stub('b')
+    fetch = HedgedFetch([primary, secondary], hedge_after=5)
+    started = time.monotonic()
+    assert fetch()['provider'] == 'b'
+    assert time.monotonic() - started < 1
+    assert fetch.hedges == 0 and fetch.stats['a'].failures == 1
+    fetch.close()
+
+
+def test_all_failing_raises_the_primarys_error():
+    from weather_providers import HedgedFetch
+    fetch = HedgedFetch([Stub('a', error=ConnectionError('a down')),
+                         Stub('b', 0.05, error=TimeoutError('b down'))], hedge_after=0.01)
+    with pytest.raises(ConnectionError):
+        fetch()
+    fetch.close()
+
+
+def test_open_circuit_goes_last():
+    import resilience
+    from weather_providers import HedgedFetch
+    primary, secondary = Stub('a'), Stub('b')
+    fetch = HedgedFetch([primary, secondary])
+    breaker = resilience.breaker('a')
+    for _ in range(resilience.FAILURES):
+        breaker.failure(ConnectionError('down'))
+    assert fetch.ranked() == [secondary, primary]
+
+
+def test_hedge_delay_follows_the_primarys_latency():
+    from weather_providers import DEFAULT_HEDGE, MAX_HEDGE, HedgedFetch
+    primary = Stub('a')
+    fetch = HedgedFetch([primary, Stub('b')])
+    assert fetch.delay(primary) == DEFAULT_HEDGE
+    for seconds in [0.6] * 9 + [1.2]:
+        fetch.stats['a'].observe(seconds)
+    assert fetch.delay(primary) == 1.2
+    fetch.stats['a'].observe(0, ok=False)
+    fetch.stats['a'].observe(0, ok=False)
+    assert fetch.delay(primary) == MAX_HEDGE
+
+
+@pytest.fixture
+def upstreams(monkeypatch):
+    """Local Open-Meteo and OWM stand-ins; `delay[name]` injects latency."""
+    import weather_display
+    from test_weather_display import SAMPLE_RESPONSE
+    delay = {'open-meteo': 0.0, 'owm': 0.0}
+    payloads = {'/v1/forecast': ('open-meteo', SAMPLE_RESPONSE),
+                '/data/2.5/onecall': ('owm', _onecall())}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            name, payload = payloads[self.path.split('?')[0]]
+            time.sleep(delay[name])
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    base = 'http://127.0.0.1:%d' % server.server_address[1]
+    monkeypatch.setattr(weather_display, 'BASE_URL', base + '/v1/forecast')
+    yield base, delay
+    server.shutdown()
+    server.server_close()
+
+
+def test_hedged_fetch_over_http_under_injected_latency(monkeypatch, upstreams):
+    import config
+    import weather_providers
+    base, delay = upstreams
+    monkeypatch.setattr(config, 'WEATHER_PROVIDERS', ('open-meteo', 'owm'), raising=False)
+    monkeypatch.setattr(config, 'HEDGE_AFTER', 0.1, raising=False)
+    monkeypatch.setattr(weather_providers, 'ONECALL_URL', base + '/data/2.5/onecall')
+    fetch = weather_providers.from_config(('open-meteo',))
+    assert [p.name for p in fetch.providers] == ['Open-Meteo', 'OWM']
+    assert fetch()['current']['temperature_2m'] == 72.1    # Open-Meteo's response
+    delay['open-meteo'] = 1.0
+    started = time.monotonic()
+    raw = fetch()
+    assert time.monotonic() - started < 0.8
+    assert raw['current']['temperature_2m'] == 69.4         # OWM's, normalised
+    assert fetch.hedges == 1 and fetch.status()['OWM']['wins'] == 1
+    fetch.close()
@@ -0,0 +1,70 @@
+"""Pre-rasterized text for the panel renderers.
+
+The same few strings (hour labels, temperatures, "12 mph", day names) are
+drawn every frame, and FreeType rasterization is a large share of render()
+on the Pi. TextCache rasterizes each (string, font, size) once into a mask
+plus its bounding box, keeps it in a bounded LRU, and draws it with a bitmap
+paste, pixel-identical to draw.text().
+"""
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw
+
+MAX_ENTRIES = 512
+
+
+def _font_key(font):
+    path = getattr(font, 'path', None)
+    return (path if isinstance(path, str) else id(font), getattr(font, 'size', None),
+            getattr(font, 'index', 0))
+
+
+class TextCache:
+    """Bounded LRU of text rasters keyed on (text, font file, size, font mode)."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, text, font, mode):
+        key = (text, _font_key(font), mode)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        # Hinting differs by mode: the raster box is for the mode drawn in,
+        # the layout box is what font.getbbox(text) returns
+        x0, y0, x1, y1 = font.getbbox(text, mode)
+        mask = Image.new('L', (max(1, x1 - x0), max(1, y1 - y0)), 0)
+        mask_draw = ImageDraw.Draw(mask)
+        mask_draw.fontmode = mode
+        mask_draw.text((-x0, -y0), text, font=font, fill=255)
+        entry = (mask, (x0, y0), font.getbbox(text))
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def bbox(self, text, font, mode='1'):
+        """Same as font.getbbox(text), from the cache."""
+        return self._entry(text, font, mode)[2]
+
+    def width(self, text, font, mode='1'):
+        x0, _, x1, _ = self.bbox(text, font, mode)
+        return x1 - x0
+
+    def text(self, draw, xy, text, font, fill=0):
+        """Draw like draw.text(xy, text, font=font, fill=fill) for single-line text."""
+        mask, (x0, y0), _ = self._entry(text, font, draw.fontmode)
+        draw.bitmap((xy[0] + x0, xy[1] + y0), mask, fill=fill)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._entries)
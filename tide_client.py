@@ -0,0 +1,253 @@
+"""Pooled, cached client for the NOAA CO-OPS tide APIs.
+
+`noaa_coops.Station(StationID)` downloads station metadata every time it
+is constructed, before any data request. This client instead keeps one
+long-lived HTTP session per station, caches station metadata and datums on
+disk for METADATA_TTL, and caches data responses keyed on
+(station, product, datum, interval, range), so a tide refresh costs at most
+one data request.
+
+Frames use the column names TideTracker was written against:
+`water_level` for observations, `predicted_wl`/`hi_lo` for predictions.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+import metrics
+import resilience
+
+BASE_DIR = os.path.dirname(os.path.realpath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'tide')
+
+DATA_URL = 'https://api.tidesandcurrents.noaa.gov/api/prod/datagetter'
+METADATA_URL = 'https://api.tidesandcurrents.noaa.gov/mdapi/prod/webapi/stations'
+
+# Station metadata and datums practically never change.
+METADATA_TTL = 30 * 86400
+
+# How long a data response stays fresh, per product. Observations gain a
+# sample every 6 minutes; predictions are deterministic.
+RESPONSE_TTL = {
+    'water_level': 360,
+    'predictions': 30 * 86400,
+}
+DEFAULT_RESPONSE_TTL = 600
+
+# Longest range CO-OPS serves in one request, per product or
+# (product, interval) (days).
+MAX_RANGE_DAYS = {
+    'water_level': 31,
+    'one_minute_water_level': 4,
+    'hourly_height': 365,
+    'high_low': 365,
+    'predictions': 31,
+    ('predictions', 'hilo'): 365,
+    ('predictions', 'h'): 365,
+}
+
+COLUMNS = {
+    'water_level': {'v': 'water_level', 's': 'sigma', 'f': 'flags', 'q': 'QC'},
+    'predictions': {'v': 'predicted_wl', 'type': 'hi_lo'},
+}
+
+TIMEOUT = 15
+
+
+class TideAPIError(Exception):
+    pass
+
+
+class TideClient:
+    """CO-OPS client bound to one station."""
+
+    def __init__(self, station_id, cache_dir=None, session=None,
+                 data_url=DATA_URL, metadata_url=METADATA_URL, breaker=None):
+        self.station_id = station_id
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.session = session or metrics.instrument(requests.Session())
+        self.data_url = data_url
+        self.metadata_url = metadata_url.rstrip('/')
+        self.breaker = breaker or resilience.breaker('NOAA')
+        self.requests = 0            # HTTP requests actually sent
+        self.bytes_received = 0      # response body bytes received
+        self._memory = {}            # key -> (expires, payload)
+        self._lock = threading.Lock()
+
+    # -- HTTP and caching ---------------------------------------------------
+
+    def _request(self, url, params):
+        with metrics.span('noaa_request'):
+            resp = self.session.get(url, params=params, timeout=TIMEOUT)
+        resp.raise_for_status()
+        return resp
+
+    def _get(self, url, params=None):
+        # Fails fast with resilience.CircuitOpen while NOAA is down
+        resp = self.breaker.call(self._request, url, params)
+        self.requests += 1
+        self.bytes_received += len(resp.content)
+        payload = resp.json()
+        if isinstance(payload, dict) and 'error' in payload:
+            raise TideAPIError(payload['error'].get('message', payload['error']))
+        return payload
+
+    def _cache_path(self, key):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.cache_dir, self.station_id, digest + '.json')
+
+    def _cached(self, key, ttl, fetch, persist=True):
+        """Return the payload for `key`, from memory, disk, or `fetch()`."""
+        now = time.time()
+        mkey = json.dumps(key, sort_keys=True)
+        with self._lock:
+            hit = self._memory.get(mkey)
+            if hit and hit[0] > now:
+                return hit[1]
+
+            path = self._cache_path(key)
+            if persist and os.path.exists(path) and now - os.path.getmtime(path) < ttl:
+                try:
+                    with open(path) as f:
+                        payload = json.load(f)
+                    self._memory[mkey] = (os.path.getmtime(path) + ttl, payload)
+                    return payload
+                except ValueError:
+                    pass
+
+            payload = fetch()
+            # Drop expired entries so rolling observation ranges don't pile up
+            self._memory = {k: v for k, v in self._memory.items() if v[0] > now}
+            self._memory[mkey] = (now + ttl, payload)
+            if persist:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = path + '.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump(payload, f)
+                os.replace(tmp, path)
+            return payload
+
+    # -- Metadata -----------------------------------------------------------
+
+    def metadata(self):
+        """Station details (name, lat/lng, timezone...) from the metadata API."""
+        url = '%s/%s.json' % (self.metadata_url, self.station_id)
+        payload = self._cached(('metadata', self.station_id), METADATA_TTL,
+                               lambda: self._get(url, {'expand': 'details'}))
+        stations = payload.get('stations') or [{}]
+        return stations[0]
+
+    def datums(self, units='english'):
+        """{datum name: value} for the station, e.g. {'MLLW': 0.0, 'MSL': 2.4}."""
+        url = '%s/%s/datums.json' % (self.metadata_url, self.station_id)
+        payload = self._cached(('datums', self.station_id, units), METADATA_TTL,
+                               lambda: self._get(url, {'units': units}))
+        return {d['name']: d['value'] for d in payload.get('datums', [])}
+
+    def harmonic_constituents(self, units='english'):
+        """Harmonic constituents (name, amplitude, phase_GMT, speed) for the station."""
+        url = '%s/%s/harcon.json' % (self.metadata_url, self.station_id)
+        payload = self._cached(('harcon', self.station_id, units), METADATA_TTL,
+                               lambda: self._get(url, {'units': units}))
+        return payload.get('HarmonicConstituents', [])
+
+    # -- Data ---------------------------------------------------------------
+
+    def get_data(self, begin_date, end_date, product, datum='MLLW', interval=None,
+                 time_zone='lst_ldt', units='english'):
+        """Same arguments as `noaa_coops.Station.get_data`; returns a DataFrame.
+
+        `begin_date`/`end_date` are 'YYYYMMDD' or 'YYYYMMDD HH:MM' strings.
+        Ranges longer than CO-OPS allows are split into several requests.
+        """
+        return to_frame(self.get_records(begin_date, end_date, product, datum,
+                                         interval, time_zone, units), product)
+
+    def get_records(self, begin_date, end_date, product, datum='MLLW', interval=None,
+                    time_zone='lst_ldt', units='english', cache=True):
+        """Raw CO-OPS records ({'t': ..., 'v': ...} dicts) for a date range.
+
+        `cache=False` bypasses the response cache, for bulk downloads that
+        are stored elsewhere.
+        """
+        records = []
+        for begin, end in split_range(begin_date, end_date, product, interval):
+            key = ('data', self.station_id, product, datum, interval, begin, end,
+                   time_zone, units)
+            params = {
+                'station': self.station_id,
+                'begin_date': begin,
+                'end_date': end,
+                'product': product,
+                'datum': datum,
+                'time_zone': time_zone,
+                'units': units,
+                'format': 'json',
+                'application': 'TideTracker',
+            }
+            if interval is not None:
+                params['interval'] = interval
+            if not cache:
+                payload = self._get(self.data_url, params)
+                records.extend(payload.get('data') or payload.get('predictions') or [])
+                continue
+            ttl = RESPONSE_TTL.get(product, DEFAULT_RESPONSE_TTL)
+            # Only long-lived responses are worth keeping across restarts
+            payload = self._cached(key, ttl, lambda: self._get(self.data_url, params),
+                                   persist=ttl >= 86400)
+            records.extend(payload.get('data') or payload.get('predictions') or [])
+        return records
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def parse_date(s):
+    return datetime.strptime(s, '%Y%m%d %H:%M' if ' ' in s else '%Y%m%d')
+
+
+def split_range(begin_date, end_date, product, interval=None):
+    """Yield (begin, end) date strings no longer than CO-OPS allows for `product`."""
+    max_days = MAX_RANGE_DAYS.get((product, interval), MAX_RANGE_DAYS.get(product))
+    begin, end = parse_date(begin_date), parse_date(end_date)
+    if max_days is None or end - begin <= timedelta(days=max_days):
+        yield begin_date, end_date
+        return
+    fmt = '%Y%m%d %H:%M'
+    while begin < end:
+        chunk_end = min(begin + timedelta(days=max_days), end)
+        yield begin.strftime(fmt), chunk_end.strftime(fmt)
+        begin = chunk_end + timedelta(minutes=1)
+
+
+def to_frame(records, product):
+    """CO-OPS records as a time-indexed DataFrame with TideTracker's column names."""
+    import pandas as pd
+    df = pd.DataFrame.from_records(records)
+    if df.empty:
+        return df
+    df.index = pd.to_datetime(df.pop('t'))
+    df.index.name = 'date_time'
+    df = df.rename(columns=COLUMNS.get(product, {'v': product}))
+    for col in ('water_level', 'sigma', 'predicted_wl'):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df[~df.index.duplicated(keep='first')]
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(station_id):
+    """Shared TideClient for `station_id`, so every caller reuses one session."""
+    with _clients_lock:
+        if station_id not in _clients:
+            _clients[station_id] = TideClient(station_id)
+        return _clients[station_id]
@@ -0,0 +1,304 @@
+"""Offline harmonic tide prediction.
+
+Tide predictions are deterministic given a station's harmonic
+constituents, so instead of asking the CO-OPS `predictions` API on every
+refresh, HarmonicModel loads the constituents once and evaluates
+
+    h(t) = Z0 + sum_i f_i(t) * A_i * cos(V_i(t) + u_i(t) - kappa_i)
+
+for any range of times, vectorised over time and constituents with NumPy.
+A_i and kappa_i (phase_GMT) come from CO-OPS; the equilibrium arguments V,
+nodal factors f and nodal angles u follow Schureman's *Manual of Harmonic
+Analysis and Prediction of Tides* (SP 98), with mean longitudes from Meeus.
+Like CO-OPS, f and u are held at their values for the middle of each
+calendar year. Against recorded CO-OPS predictions (tests/fixtures), highs
+and lows come out within HILO_HEIGHT_TOLERANCE and HILO_TIME_TOLERANCE.
+
+High and low tides are found by vectorised sign changes of the sampled
+curve's slope, refined to sub-minute precision with two rounds of parabolic
+interpolation.
+"""
+from datetime import datetime
+
+import numpy as np
+
+D2R = np.pi / 180.0
+
+# Agreement with CO-OPS high/low predictions, checked by the test suite:
+# metres (0.1 ft) and seconds.
+HILO_HEIGHT_TOLERANCE = 0.03
+HILO_TIME_TOLERANCE = 180
+
+# Coefficients over (tau, s, h, p, N, p1, 90 deg) where tau = T + h - s is
+# the mean lunar time. Together with the nodal correction below they define
+# each base constituent (Schureman table 2).
+_BASE = {
+    'Z0':   ((0, 0, 0, 0, 0, 0, 0), 'zero'),
+    'SA':   ((0, 0, 1, 0, 0, 0, 0), 'zero'),
+    'SSA':  ((0, 0, 2, 0, 0, 0, 0), 'zero'),
+    'MM':   ((0, 1, 0, -1, 0, 0, 0), 'Mm'),
+    'MF':   ((0, 2, 0, 0, 0, 0, 0), 'Mf'),
+    'Q1':   ((1, -2, 0, 1, 0, 0, 1), 'O1'),
+    'O1':   ((1, -1, 0, 0, 0, 0, 1), 'O1'),
+    'M1':   ((1, 0, 0, 1, 0, 0, -1), 'M1'),
+    'P1':   ((1, 1, -2, 0, 0, 0, 1), 'zero'),
+    'S1':   ((1, 1, -1, 0, 0, 0, 0), 'zero'),
+    'K1':   ((1, 1, 0, 0, 0, 0, -1), 'K1'),
+    'J1':   ((1, 2, 0, -1, 0, 0, -1), 'J1'),
+    'OO1':  ((1, 3, 0, 0, 0, 0, -1), 'OO1'),
+    '2N2':  ((2, -2, 0, 2, 0, 0, 0), 'M2'),
+    'N2':   ((2, -1, 0, 1, 0, 0, 0), 'M2'),
+    'NU2':  ((2, -1, 2, -1, 0, 0, 0), 'M2'),
+    'M2':   ((2, 0, 0, 0, 0, 0, 0), 'M2'),
+    'LAM2': ((2, 1, -2, 1, 0, 0, 2), 'M2'),
+    'L2':   ((2, 1, 0, -1, 0, 0, 2), 'L2'),
+    'T2':   ((2, 2, -3, 0, 0, 1, 0), 'zero'),
+    'S2':   ((2, 2, -2, 0, 0, 0, 0), 'zero'),
+    'R2':   ((2, 2, -1, 0, 0, -1, 2), 'zero'),
+    'K2':   ((2, 2, 0, 0, 0, 0, 0), 'K2'),
+    'M3':   ((3, 0, 0, 0, 0, 0, 0), 'M3'),
+}
+
+# Shallow-water and compound constituents as integer combinations of base ones.
+_COMPOUND = {
+    'MSF': {'S2': 1, 'M2': -1},
+    '2Q1': {'N2': 1, 'J1': -1},
+    'RHO': {'NU2': 1, 'K1': -1},
+    'MU2': {'M2': 2, 'S2': -1},
+    '2SM2': {'S2': 2, 'M2': -1},
+    '2MK3': {'M2': 2, 'K1': -1},
+    'MK3': {'M2': 1, 'K1': 1},
+    'MN4': {'M2': 1, 'N2': 1},
+    'M4': {'M2': 2},
+    'MS4': {'M2': 1, 'S2': 1},
+    'S4': {'S2': 2},
+    'M6': {'M2': 3},
+    'S6': {'S2': 3},
+    'M8': {'M2': 4},
+}
+
+# CO-OPS spells a few names differently.
+_ALIASES = {'RHO1': 'RHO', 'LAMBDA2': 'LAM2'}
+
+
+# ---------------------------------------------------------------------------
+# Astronomy
+# ---------------------------------------------------------------------------
+
+def astro(epoch):
+    """Astronomical arguments (degrees) at UTC epoch seconds (array)."""
+    epoch = np.asarray(epoch, dtype=np.float64)
+    T = (epoch / 86400.0 + 2440587.5 - 2451545.0) / 36525.0   # Julian centuries
+    s = 218.3164477 + 481267.88123421 * T - 0.0015786 * T**2 + T**3 / 538841
+    h = 280.46646 + 36000.76983 * T + 0.0003032 * T**2
+    p = 83.3532465 + 4069.0137287 * T - 0.0103200 * T**2 - T**3 / 80053
+    N = 125.04452 - 1934.136261 * T + 0.0020708 * T**2 + T**3 / 450000
+    p1 = 282.94 + 1.7192 * T
+    hour_angle = 180.0 + (epoch % 86400.0) / 3600.0 * 15.0
+    tau = hour_angle + h - s
+
+    # Lunar orbit relative to the equator (Schureman eqs. 191-198)
+    omega = (23.4392911 - 0.0130042 * T) * D2R
+    i = 5.145 * D2R
+    Nr = N * D2R
+    I = np.arccos(np.cos(i) * np.cos(omega) - np.sin(i) * np.sin(omega) * np.cos(Nr))
+    e1 = np.arctan(np.cos(0.5 * (omega - i)) / np.cos(0.5 * (omega + i)) * np.tan(0.5 * Nr))
+    e2 = np.arctan(np.sin(0.5 * (omega - i)) / np.sin(0.5 * (omega + i)) * np.tan(0.5 * Nr))
+    e1, e2 = e1 - 0.5 * Nr, e2 - 0.5 * Nr
+    xi = _wrap(-(e1 + e2))
+    nu = _wrap(e1 - e2)
+    nup = np.arctan2(np.sin(2 * I) * np.sin(nu), np.sin(2 * I) * np.cos(nu) + 0.3347)
+    nupp = 0.5 * np.arctan2(np.sin(I)**2 * np.sin(2 * nu), np.sin(I)**2 * np.cos(2 * nu) + 0.0727)
+    P = p * D2R - xi
+
+    return {
+        'args': np.stack([tau, s, h, p, N, p1, np.full_like(T, 90.0)]),
+        'I': I, 'xi': xi, 'nu': nu, 'nup': nup, 'nupp': nupp, 'P': P,
+    }
+
+
+def _mid_year(epoch):
+    """UTC epoch seconds of the middle of the calendar year of each `epoch`."""
+    year = np.asarray(epoch, dtype=np.float64).astype('datetime64[s]').astype('datetime64[Y]')
+    start = year.astype('datetime64[s]').astype(np.float64)
+    end = (year + 1).astype('datetime64[s]').astype(np.float64)
+    return (start + end) / 2
+
+
+def _wrap(a):
+    return (a + np.pi) % (2 * np.pi) - np.pi
+
+
+def _nodal(kind, a):
+    """(f, u in radians) for a nodal correction family (Schureman table 14)."""
+    I, xi, nu, P = a['I'], a['xi'], a['nu'], a['P']
+    if kind == 'zero':
+        return np.ones_like(I), np.zeros_like(I)
+    if kind == 'Mm':
+        return (2 / 3 - np.sin(I)**2) / 0.5021, np.zeros_like(I)
+    if kind == 'Mf':
+        return np.sin(I)**2 / 0.1578, -2 * xi
+    if kind == 'O1':
+        return np.sin(I) * np.cos(I / 2)**2 / 0.3800, 2 * xi - nu
+    if kind == 'J1':
+        return np.sin(2 * I) / 0.7214, -nu
+    if kind == 'OO1':
+        return np.sin(I) * np.sin(I / 2)**2 / 0.0164, -2 * xi - nu
+    if kind == 'M2':
+        return np.cos(I / 2)**4 / 0.9154, 2 * xi - 2 * nu
+    if kind == 'K1':
+        f = np.sqrt(0.8965 * np.sin(2 * I)**2 + 0.6001 * np.sin(2 * I) * np.cos(nu) + 0.1006)
+        return f, -a['nup']
+    if kind == 'K2':
+        f = np.sqrt(19.0444 * np.sin(I)**4 + 2.7702 * np.sin(I)**2 * np.cos(2 * nu) + 0.0981)
+        return f, -2 * a['nupp']
+    if kind == 'L2':
+        f_m2, u_m2 = _nodal('M2', a)
+        tan2 = np.tan(I / 2)**2
+        R = np.arctan2(np.sin(2 * P), 1 / (6 * tan2) - np.cos(2 * P))
+        return f_m2 * np.sqrt(1 - 12 * tan2 * np.cos(2 * P) + 36 * tan2**2), u_m2 - R
+    if kind == 'M1':
+        f_o1, _ = _nodal('O1', a)
+        Q = np.arctan2((5 * np.cos(I) - 1) * np.sin(P), (7 * np.cos(I) + 1) * np.cos(P))
+        qa = np.sqrt(0.25 + 1.5 * np.cos(I) * np.cos(2 * P) / np.cos(I / 2)**0.5
+                     + 2.25 * np.cos(I)**2 / np.cos(I / 2)**4)
+        return f_o1 * qa, xi - nu + Q
+    if kind == 'M3':
+        f_m2, u_m2 = _nodal('M2', a)
+        return f_m2**1.5, 1.5 * u_m2
+    raise ValueError('Unknown nodal correction %r' % kind)
+
+
+def constituent_terms(names, epoch):
+    """V + u (radians) and f for each constituent at each time.
+
+    Returns two arrays shaped (len(names), len(epoch)).
+    """
+    a = astro(epoch)
+    # Nodal terms for the middle of each year the times fall in
+    years, which = np.unique(_mid_year(epoch), return_inverse=True)
+    nodal = astro(years)
+    for key in ('I', 'xi', 'nu', 'nup', 'nupp', 'P'):
+        a[key] = nodal[key][which.reshape(np.shape(epoch))]
+    base_cache = {}
+
+    def base(name):
+        if name not in base_cache:
+            coefs, kind = _BASE[name]
+            V = np.tensordot(np.array(coefs, dtype=np.float64), a['args'], axes=1) * D2R
+            f, u = _nodal(kind, a)
+            base_cache[name] = (V + u, f)
+        return base_cache[name]
+
+    phases, factors = [], []
+    for name in names:
+        key = _ALIASES.get(name.upper(), name.upper())
+        if key in _BASE:
+            phase, f = base(key)
+        elif key in _COMPOUND:
+            phase, f = 0.0, 1.0
+            for part, k in _COMPOUND[key].items():
+                p_phase, p_f = base(part)
+                phase = phase + k * p_phase
+                f = f * p_f**abs(k)
+        else:
+            raise KeyError('Unsupported constituent %r' % name)
+        phases.append(phase)
+        factors.append(f)
+    return np.array(phases), np.array(factors)
+
+
+def speed(name, epoch=946728000.0):
+    """Constituent speed in degrees per hour (numerical derivative of V)."""
+    ph, _ = constituent_terms([name], np.array([epoch, epoch + 3600.0]))
+    return float(np.diff(np.degrees(np.unwrap(ph[0])))[0])
+
+
+# ---------------------------------------------------------------------------
+# Model
+# ---------------------------------------------------------------------------
+
+class HarmonicModel:
+    """Tide predictions for one station from its harmonic constituents."""
+
+    def __init__(self, constituents, z0=0.0):
+        """`constituents` are CO-OPS harcon dicts (name, amplitude, phase_GMT).
+
+        `z0` is the mean level above the chart datum (MSL - MLLW).
+        Constituents with zero amplitude or unsupported names are skipped.
+        """
+        usable = [c for c in constituents
+                  if float(c.get('amplitude', 0)) > 0
+                  and _ALIASES.get(c['name'].upper(), c['name'].upper()) in _BASE.keys() | _COMPOUND.keys()]
+        self.names = [c['name'] for c in usable]
+        self.amplitudes = np.array([float(c['amplitude']) for c in usable])[:, None]
+        self.phases = np.radians(np.array([float(c['phase_GMT']) for c in usable]))[:, None]
+        self.z0 = float(z0)
+
+    @classmethod
+    def from_client(cls, client, datum='MLLW'):
+        """Load constituents and datums once through a TideClient (disk cached)."""
+        constituents = client.harmonic_constituents()
+        datums = client.datums()
+        return cls(constituents, z0=datums['MSL'] - datums.get(datum, 0.0))
+
+    def predict(self, epoch):
+        """Water level (datum units) at UTC epoch seconds (scalar or array)."""
+        epoch = np.atleast_1d(np.asarray(epoch, dtype=np.float64))
+        if not self.names:
+            return np.full(epoch.shape, self.z0)
+        phase, f = constituent_terms(self.names, epoch)
+        return self.z0 + np.sum(f * self.amplitudes * np.cos(phase - self.phases), axis=0)
+
+    def curve(self, start, end, step=360):
+        """(times, levels) from `start` to `end` epoch seconds every `step` seconds."""
+        times = np.arange(start, end + step / 2, step, dtype=np.float64)
+        return times, self.predict(times)
+
+    def extrema(self, start, end, step=360):
+        """(times, levels, is_high) of every high and low tide in [start, end]."""
+        times, levels = self.curve(start - step, end + step, step)
+        slope = np.sign(np.diff(levels))
+        turns = np.nonzero(slope[:-1] != slope[1:])[0] + 1
+        turns = turns[(slope[turns - 1] != 0)]
+        is_high = slope[turns - 1] > 0
+
+        # Coarse parabolic vertex on the sampled curve, then a second fit on
+        # a 60 s stencil around it for sub-minute precision.
+        t = times[turns] + step * _vertex(levels[turns - 1], levels[turns], levels[turns + 1])
+        fine = 60.0
+        y = self.predict(np.concatenate([t - fine, t, t + fine])).reshape(3, -1)
+        t = t + fine * _vertex(y[0], y[1], y[2])
+
+        keep = (t >= start) & (t <= end)
+        return t[keep], self.predict(t[keep]), is_high[keep]
+
+    def hilo(self, start, end):
+        """HiLo-compatible DataFrame: local-time index, `predicted_wl`, `hi_lo`."""
+        import pandas as pd
+        t, levels, is_high = self.extrema(start, end)
+        index = pd.DatetimeIndex([datetime.fromtimestamp(x) for x in t], name='date_time')
+        return pd.DataFrame({'predicted_wl': np.round(levels, 3),
+                             'hi_lo': np.where(is_high, 'H', 'L')}, index=index)
+
+
+def _vertex(y0, y1, y2):
+    """Offset (in sample steps, within +/-1) of the parabola vertex through 3 points."""
+    denom = y0 - 2 * y1 + y2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offset = np.where(denom != 0, 0.5 * (y0 - y2) / denom, 0.0)
+    return np.clip(offset, -1.0, 1.0)
+
+
+def validate(model, frame, tolerance=0.1):
+    """Compare the model with cached API predictions.
+
+    `frame` is a 6-minute `predictions` DataFrame (e.g. from TideClient,
+    requested with time_zone='gmt'). Returns (ok, max_abs_error, rms_error).
+    """
+    import pandas as pd
+    epoch = (frame.index - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1)
+    error = model.predict(np.asarray(epoch, dtype=np.float64)) - frame['predicted_wl'].to_numpy()
+    max_err = float(np.max(np.abs(error)))
+    rms = float(np.sqrt(np.mean(error**2)))
+    return max_err <= tolerance, max_err, rms
@@ -0,0 +1,150 @@
+"""Bulk prefetch of a year of tide predictions into a compact local index.
+
+Downloads hi/lo and 6-minute predictions for a whole year per station in a
+few bulk requests (CO-OPS serves a year of hi/lo per request and a month of
+6-minute predictions), and stores them in one .npz file:
+
+- hi/lo times (UTC epoch seconds), levels and H/L flags, sorted by time,
+- day_offsets: index of the first hi/lo of each local calendar day, so a
+  day's tides are a slice,
+- the 6-minute curve on a regular grid (only the start time is stored).
+
+TidePredictionIndex serves HiLo-equivalent lookups from that file with a
+binary search, so the display path never touches the network.
+
+    python3 tide_prefetch.py STATION_ID [YEAR]
+"""
+import calendar
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from tide_client import CACHE_DIR, get_client
+
+CURVE_STEP = 360
+GMT_FORMAT = '%Y%m%d %H:%M'
+
+
+def index_path(station_id, year, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, '%s_predictions_%d.npz' % (station_id, year))
+
+
+def _local_midnight(d):
+    return time.mktime(datetime(d.year, d.month, d.day).timetuple())
+
+
+def _epoch(t):
+    return calendar.timegm(time.strptime(t, '%Y-%m-%d %H:%M'))
+
+
+def prefetch(client, year, path=None, datum='MLLW'):
+    """Download `year` of predictions for `client`'s station and write the index.
+
+    Requests cover the year plus a day either side (in GMT), so every local
+    calendar day of the year is complete. Returns the path written.
+    """
+    path = path or index_path(client.station_id, year)
+    begin = datetime(year, 1, 1) - timedelta(days=1)
+    end = datetime(year + 1, 1, 1) + timedelta(days=1)
+    span = dict(begin_date=begin.strftime(GMT_FORMAT), end_date=end.strftime(GMT_FORMAT),
+                product='predictions', datum=datum, time_zone='gmt', cache=False)
+
+    hilo = client.get_records(interval='hilo', **span)
+    hilo_t = np.array([_epoch(r['t']) for r in hilo], dtype=np.int64)
+    order = np.argsort(hilo_t, kind='stable')
+    hilo_t = hilo_t[order]
+    hilo_v = np.array([float(r['v']) for r in hilo], dtype=np.float32)[order]
+    hilo_h = np.array([r.get('type') == 'H' for r in hilo], dtype=bool)[order]
+
+    curve = client.get_records(**span)
+    t0 = calendar.timegm(begin.timetuple())
+    n = int((calendar.timegm(end.timetuple()) - t0) // CURVE_STEP) + 1
+    curve_v = np.full(n, np.nan, dtype=np.float32)
+    for r in curve:
+        i = (_epoch(r['t']) - t0) // CURVE_STEP
+        if 0 <= i < n and r.get('v') not in (None, ''):
+            curve_v[i] = float(r['v'])
+
+    first_day = date(year, 1, 1)
+    days = (date(year + 1, 1, 1) - first_day).days
+    midnights = [_local_midnight(first_day + timedelta(days=d)) for d in range(days + 1)]
+    day_offsets = np.searchsorted(hilo_t, midnights).astype(np.int32)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, hilo_t=hilo_t, hilo_v=hilo_v, hilo_h=hilo_h,
+             day0=np.int64(first_day.toordinal()), day_offsets=day_offsets,
+             curve_t0=np.int64(t0), curve_v=curve_v)
+    os.replace(tmp, path)
+    return path
+
+
+class TidePredictionIndex:
+    """Read-only lookups into a file written by `prefetch`."""
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.hilo_t = data['hilo_t']
+            self.hilo_v = data['hilo_v']
+            self.hilo_h = data['hilo_h']
+            self.day0 = int(data['day0'])
+            self.day_offsets = data['day_offsets']
+            self.curve_t0 = int(data['curve_t0'])
+            self.curve_v = data['curve_v']
+        self.first_day = date.fromordinal(self.day0)
+        self.last_day = self.first_day + timedelta(days=len(self.day_offsets) - 2)
+
+    @classmethod
+    def for_station(cls, station_id, year, cache_dir=None):
+        """The index for `year`, or None if it hasn't been prefetched."""
+        path = index_path(station_id, year, cache_dir)
+        return cls(path) if os.path.exists(path) else None
+
+    def covers(self, first, last):
+        """True if local days `first`..`last` (dates) are all in the index."""
+        return self.first_day <= first and last <= self.last_day
+
+    def hilo_range(self, start, end):
+        """(times, levels, is_high) with start <= time < end, by binary search."""
+        lo, hi = np.searchsorted(self.hilo_t, [start, end])
+        return self.hilo_t[lo:hi], self.hilo_v[lo:hi], self.hilo_h[lo:hi]
+
+    def hilo_days(self, first, last):
+        """(times, levels, is_high) for local days `first`..`last` inclusive."""
+        lo = self.day_offsets[first.toordinal() - self.day0]
+        hi = self.day_offsets[last.toordinal() - self.day0 + 1]
+        return self.hilo_t[lo:hi], self.hilo_v[lo:hi], self.hilo_h[lo:hi]
+
+    def hilo(self, first, last):
+        """HiLo-compatible DataFrame for local days `first`..`last` inclusive."""
+        import pandas as pd
+        t, v, h = self.hilo_days(first, last)
+        index = pd.DatetimeIndex([datetime.fromtimestamp(x) for x in t], name='date_time')
+        return pd.DataFrame({'predicted_wl': v.astype(float),
+                             'hi_lo': np.where(h, 'H', 'L')}, index=index)
+
+    def curve(self, start, end):
+        """(times, levels) of the 6-minute predictions between two epoch times."""
+        i0 = max(0, int(np.ceil((start - self.curve_t0) / CURVE_STEP)))
+        i1 = min(len(self.curve_v), int((end - self.curve_t0) // CURVE_STEP) + 1)
+        times = self.curve_t0 + np.arange(i0, i1, dtype=np.int64) * CURVE_STEP
+        return times, self.curve_v[i0:i1]
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.stderr.write('usage: tide_prefetch.py STATION_ID [YEAR]\n')
+        sys.exit(2)
+    station_id = sys.argv[1]
+    year = int(sys.argv[2]) if len(sys.argv) > 2 else date.today().year
+    client = get_client(station_id)
+    path = prefetch(client, year)
+    print('Wrote %s (%d requests, %d bytes downloaded, %d bytes on disk)' % (
+        path, client.requests, client.bytes_received, os.path.getsize(path)))
+
+
+if __name__ == '__main__':
+    main()
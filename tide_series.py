@@ -0,0 +1,145 @@
+"""Incremental store for the observed water level series.
+
+`past24` used to download the full previous 24 hours of 6-minute
+`water_level` data every cycle, although only the last sample or two were
+new. TideSeries keeps the window in a fixed-size NumPy ring buffer, fills
+it once, then tops it up with `begin_date` set to the last stored sample.
+The buffer is persisted to disk so a restart doesn't refetch the window.
+
+Times are stored as UTC epoch seconds (requests use `time_zone=gmt`, which
+has no DST gaps or repeats); `as_frame()` converts back to local time.
+"""
+import calendar
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+import config
+from tide_client import CACHE_DIR
+
+SAMPLE_INTERVAL = 360   # CO-OPS water_level is published every 6 minutes
+WINDOW = getattr(config, 'TIDE_WINDOW_HOURS', 24) * 3600
+
+GMT_FORMAT = '%Y%m%d %H:%M'
+
+
+class TideSeries:
+    """Ring buffer of (time, water level) covering the last `window` seconds."""
+
+    def __init__(self, station_id, window=WINDOW, path=None):
+        self.station_id = station_id
+        self.window = window
+        self.capacity = window // SAMPLE_INTERVAL + 1
+        self.path = path or os.path.join(
+            CACHE_DIR, '%s_water_level_%dh.npz' % (station_id, window // 3600))
+        self.times = np.zeros(self.capacity, dtype=np.int64)
+        self.levels = np.full(self.capacity, np.nan, dtype=np.float32)
+        self.head = 0     # index the next sample is written to
+        self.count = 0
+        # Request accounting for the current UTC day
+        self.day = None
+        self.requests_today = 0
+        self.bytes_today = 0
+
+    # -- Buffer -------------------------------------------------------------
+
+    def last_time(self):
+        return int(self.times[(self.head - 1) % self.capacity]) if self.count else None
+
+    def append(self, ts, level):
+        """Add one sample; samples at or before the last stored time are ignored."""
+        last = self.last_time()
+        if last is not None and ts <= last:
+            return False
+        self.times[self.head] = ts
+        self.levels[self.head] = level
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def ordered(self, now=None):
+        """(times, levels) oldest first, limited to the window ending at `now`."""
+        start = (self.head - self.count) % self.capacity
+        idx = (np.arange(self.count) + start) % self.capacity
+        times, levels = self.times[idx], self.levels[idx]
+        if now is not None:
+            keep = times > now - self.window
+            times, levels = times[keep], levels[keep]
+        return times, levels
+
+    def as_frame(self, now=None):
+        """DataFrame with a local-time index and a `water_level` column, as past24 returned."""
+        import pandas as pd
+        times, levels = self.ordered(now)
+        index = pd.DatetimeIndex([datetime.fromtimestamp(t) for t in times], name='date_time')
+        return pd.DataFrame({'water_level': levels.astype(float)}, index=index)
+
+    # -- Fetching -----------------------------------------------------------
+
+    def refresh(self, client, now=None):
+        """Top up the buffer from CO-OPS; return the number of new samples.
+
+        Does nothing until the next 6-minute sample is due. An empty or stale
+        buffer is filled with the whole window in one request.
+        """
+        now = int(time.time() if now is None else now)
+        last = self.last_time()
+        if last is not None and now - last < SAMPLE_INTERVAL:
+            return 0
+        if last is None or now - last >= self.window:
+            begin = now - self.window
+        else:
+            begin = last
+        requests_before, bytes_before = client.requests, client.bytes_received
+        records = client.get_records(
+            begin_date=time.strftime(GMT_FORMAT, time.gmtime(begin)),
+            end_date=time.strftime(GMT_FORMAT, time.gmtime(now)),
+            product='water_level', datum='MLLW', time_zone='gmt')
+        self._account(now, client.requests - requests_before,
+                      client.bytes_received - bytes_before)
+
+        added = 0
+        for r in records:
+            try:
+                level = float(r['v'])
+            except (KeyError, ValueError):
+                continue   # CO-OPS leaves 'v' blank for missing samples
+            ts = calendar.timegm(time.strptime(r['t'], '%Y-%m-%d %H:%M'))
+            added += self.append(ts, level)
+        if added:
+            self.save()
+        return added
+
+    def _account(self, now, requests, nbytes):
+        day = time.strftime('%Y-%m-%d', time.gmtime(now))
+        if day != self.day:
+            self.day, self.requests_today, self.bytes_today = day, 0, 0
+        self.requests_today += requests
+        self.bytes_today += nbytes
+
+    # -- Persistence --------------------------------------------------------
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp.npz'
+        np.savez(tmp, times=self.times, levels=self.levels,
+                 state=np.array([self.head, self.count, self.window], dtype=np.int64))
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """Restore the buffer saved by a previous run; False if there is none."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as data:
+                head, count, window = (int(x) for x in data['state'])
+                if window != self.window or len(data['times']) != self.capacity:
+                    return False
+                self.times = data['times'].copy()
+                self.levels = data['levels'].copy()
+                self.head, self.count = head, count
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
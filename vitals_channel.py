@@ -0,0 +1,134 @@
+"""Local publish/subscribe channel for Owlet vitals samples.
+
+`owlet_monitor` publishes every sample it records as a JSON datagram over
+Unix-domain sockets; display processes subscribe and receive new readings
+within milliseconds instead of re-reading the CSV.
+
+Each subscriber binds its own datagram socket inside CHANNEL_DIR and the
+publisher fans a sample out to every socket it finds there. There is no
+broker: a publisher with no subscribers costs one directory listing, and
+subscribers that went away are cleaned up on the next publish.
+"""
+import json
+import os
+import socket
+import tempfile
+import time
+
+CHANNEL_DIR = os.environ.get(
+    'VITALS_CHANNEL_DIR', os.path.join(tempfile.gettempdir(), 'owlet_vitals'))
+
+# Anything bigger than this is not a vitals sample.
+MAX_DATAGRAM = 8192
+
+
+class VitalsPublisher:
+    """Fan each published sample out to every live subscriber socket."""
+
+    def __init__(self, channel_dir=None):
+        self.channel_dir = channel_dir or CHANNEL_DIR
+        os.makedirs(self.channel_dir, exist_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def publish(self, sample):
+        """Send `sample` (a JSON-serialisable dict) and return the number of
+        subscribers it was delivered to."""
+        payload = json.dumps(sample).encode()
+        delivered = 0
+        try:
+            names = os.listdir(self.channel_dir)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if not name.endswith('.sock'):
+                continue
+            path = os.path.join(self.channel_dir, name)
+            try:
+                self.sock.sendto(payload, path)
+                delivered += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Subscriber exited without unlinking its socket.
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                # Subscriber's receive queue is full; it will catch up on the
+                # next sample, never stall the publisher.
+                pass
+        return delivered
+
+    def close(self):
+        self.sock.close()
+
+
+class VitalsSubscriber:
+    """Receive vitals samples and remember the most recent one.
+
+    `last_sample` and `last_timestamp` are updated on every receive, so
+    freshness checks are O(1) and never touch the disk.
+    """
+
+    def __init__(self, channel_dir=None, name=None):
+        self.channel_dir = channel_dir or CHANNEL_DIR
+        os.makedirs(self.channel_dir, exist_ok=True)
+        self.path = os.path.join(self.channel_dir, '%s.sock' % (name or os.getpid()))
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.last_sample = None
+        self.last_timestamp = 0.0
+        self.malformed = 0
+
+    def recv(self, timeout=None):
+        """Wait up to `timeout` seconds for the next sample.
+
+        Returns the sample dict, or None if nothing arrived in time.
+        `timeout=0` polls without blocking. Datagrams that are not a JSON
+        object are skipped and counted in `malformed`, so one bad packet
+        doesn't read as an empty queue.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            self.sock.settimeout(remaining)
+            try:
+                data = self.sock.recv(MAX_DATAGRAM)
+            except (socket.timeout, BlockingIOError):
+                return None
+            try:
+                sample = json.loads(data)
+            except ValueError:
+                sample = None
+            if not isinstance(sample, dict):
+                self.malformed += 1
+                continue
+            self.last_sample = sample
+            self.last_timestamp = sample.get('ts', time.time())
+            return sample
+
+    def drain(self):
+        """Consume every queued sample without blocking; return them in order.
+
+        Malformed datagrams are skipped, not taken as the end of the queue.
+        """
+        samples = []
+        while True:
+            sample = self.recv(timeout=0)
+            if sample is None:
+                return samples
+            samples.append(sample)
+
+    def is_transmitting(self, max_age, now=None):
+        """True if the most recent sample is younger than `max_age` seconds."""
+        now = time.time() if now is None else now
+        return self.last_timestamp > 0 and now - self.last_timestamp < max_age
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,231 @@
+"""Tiered retention and rollups for long-term Owlet vitals history.
+
+Raw samples live in `owlet_data_<DSN>.csv` (one row per 10 s, written by
+owlet_monitor). `compact()` moves samples older than RAW_RETENTION into
+per-minute rollups, minute rollups older than MINUTE_RETENTION into
+per-hour rollups, and drops hour rollups older than HOUR_RETENTION, so the
+disk footprint stays bounded. Rollup rows hold count/min/max/mean per field.
+
+`query()` answers any time range from the coarsest tier it needs and
+re-buckets finer, not-yet-compacted data to the same resolution, so callers
+always get one uniform series.
+"""
+import csv
+import os
+import time
+
+import config
+from vitals_stats import FIELDS, sample_time
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+# Retention per tier in seconds. HOUR_RETENTION = None keeps hourly
+# rollups forever.
+RAW_RETENTION = getattr(config, 'OWLET_RAW_RETENTION', 2 * DAY)
+MINUTE_RETENTION = getattr(config, 'OWLET_MINUTE_RETENTION', 30 * DAY)
+HOUR_RETENTION = getattr(config, 'OWLET_HOUR_RETENTION', 365 * DAY)
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+ROLLUP_FIELDS = ['timestamp', 'count'] + [
+    '%s_%s' % (field, stat) for field in FIELDS for stat in ('min', 'max', 'mean')]
+
+
+def raw_path(dsn, directory='.'):
+    return os.path.join(directory, 'owlet_data_%s.csv' % dsn)
+
+
+def rollup_path(dsn, tier, directory='.'):
+    return os.path.join(directory, 'owlet_rollup_%s_%s.csv' % (dsn, tier))
+
+
+# ---------------------------------------------------------------------------
+# Buckets
+# ---------------------------------------------------------------------------
+
+def _from_sample(row):
+    """A raw CSV row as a one-sample bucket."""
+    bucket = {'ts': sample_time(row), 'count': 1}
+    for field in FIELDS:
+        value = float(row[field])
+        bucket[field + '_min'] = bucket[field + '_max'] = bucket[field + '_mean'] = value
+    return bucket
+
+
+def _from_rollup(row):
+    bucket = {'ts': sample_time(row), 'count': int(row['count'])}
+    for name in ROLLUP_FIELDS[2:]:
+        bucket[name] = float(row[name])
+    return bucket
+
+
+def _to_row(bucket):
+    row = {'timestamp': time.strftime(TIME_FORMAT, time.localtime(bucket['ts'])),
+           'count': bucket['count']}
+    for name in ROLLUP_FIELDS[2:]:
+        row[name] = round(bucket[name], 3)
+    return row
+
+
+def rebucket(buckets, width):
+    """Merge time-ordered buckets into `width`-second buckets."""
+    merged = []
+    current = None
+    for b in buckets:
+        start = int(b['ts'] // width) * width
+        if current is None or current['ts'] != start:
+            current = dict(b, ts=start)
+            merged.append(current)
+            continue
+        n = current['count'] + b['count']
+        for field in FIELDS:
+            current[field + '_min'] = min(current[field + '_min'], b[field + '_min'])
+            current[field + '_max'] = max(current[field + '_max'], b[field + '_max'])
+            current[field + '_mean'] = (current[field + '_mean'] * current['count']
+                                        + b[field + '_mean'] * b['count']) / n
+        current['count'] = n
+    return merged
+
+
+# ---------------------------------------------------------------------------
+# File helpers
+# ---------------------------------------------------------------------------
+
+def _read(path):
+    if not os.path.isfile(path):
+        return None, []
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, list(reader)
+
+
+def _rewrite(path, fieldnames, rows):
+    """Atomically replace `path` with `rows`."""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def _append_rollups(path, buckets):
+    if not buckets:
+        return
+    file_exists = os.path.isfile(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=ROLLUP_FIELDS)
+        if not file_exists:
+            writer.writeheader()
+        writer.writerows(_to_row(b) for b in buckets)
+
+
+def _split(rows, parse, cutoff):
+    """Split rows into (older than cutoff as buckets, rows to keep)."""
+    old, keep = [], []
+    for row in rows:
+        try:
+            bucket = parse(row)
+        except (KeyError, ValueError):
+            continue
+        if bucket['ts'] < cutoff:
+            old.append(bucket)
+        else:
+            keep.append(row)
+    return old, keep
+
+
+# ---------------------------------------------------------------------------
+# Compaction
+# ---------------------------------------------------------------------------
+
+def compact(dsn, now=None, directory='.', raw_retention=None,
+            minute_retention=None, hour_retention=None):
+    """Roll up and expire one device's history; return rows moved per tier.
+
+    Must run in the same thread that appends to the raw CSV (owlet_monitor's
+    loop), since the raw file is rewritten in place.
+    """
+    now = time.time() if now is None else now
+    raw_retention = RAW_RETENTION if raw_retention is None else raw_retention
+    minute_retention = MINUTE_RETENTION if minute_retention is None else minute_retention
+    hour_retention = HOUR_RETENTION if hour_retention is None else hour_retention
+    moved = {'raw': 0, 'minute': 0, 'hour': 0}
+
+    # Raw -> minute. Cutoffs are aligned to bucket boundaries so a bucket is
+    # only ever written once, from complete data.
+    path = raw_path(dsn, directory)
+    fieldnames, rows = _read(path)
+    cutoff = int((now - raw_retention) // MINUTE) * MINUTE
+    old, keep = _split(rows, _from_sample, cutoff)
+    if old:
+        _append_rollups(rollup_path(dsn, 'minute', directory), rebucket(old, MINUTE))
+        _rewrite(path, fieldnames, keep)
+        moved['raw'] = len(old)
+
+    # Minute -> hour
+    path = rollup_path(dsn, 'minute', directory)
+    _, rows = _read(path)
+    cutoff = int((now - minute_retention) // HOUR) * HOUR
+    old, keep = _split(rows, _from_rollup, cutoff)
+    if old:
+        _append_rollups(rollup_path(dsn, 'hour', directory), rebucket(old, HOUR))
+        _rewrite(path, ROLLUP_FIELDS, keep)
+        moved['minute'] = len(old)
+
+    # Hour rollups expire
+    if hour_retention is not None:
+        path = rollup_path(dsn, 'hour', directory)
+        _, rows = _read(path)
+        old, keep = _split(rows, _from_rollup, now - hour_retention)
+        if old:
+            _rewrite(path, ROLLUP_FIELDS, keep)
+            moved['hour'] = len(old)
+
+    return moved
+
+
+# ---------------------------------------------------------------------------
+# Query
+# ---------------------------------------------------------------------------
+
+def pick_tier(start, now=None, raw_retention=None, minute_retention=None):
+    """Finest tier whose retention still covers `start`."""
+    now = time.time() if now is None else now
+    raw_retention = RAW_RETENTION if raw_retention is None else raw_retention
+    minute_retention = MINUTE_RETENTION if minute_retention is None else minute_retention
+    if start >= now - raw_retention:
+        return 'raw'
+    if start >= now - minute_retention:
+        return 'minute'
+    return 'hour'
+
+
+def query(dsn, start, end, now=None, directory='.', tier=None, **retention):
+    """Return (tier, buckets) covering [start, end) at one resolution.
+
+    Buckets are dicts with `ts` (epoch start), `count` and `<field>_min/max/mean`.
+    Raw samples are returned as one-sample buckets.
+    """
+    tier = tier or pick_tier(start, now=now, **retention)
+    sources = [
+        ('hour', rollup_path(dsn, 'hour', directory), _from_rollup),
+        ('minute', rollup_path(dsn, 'minute', directory), _from_rollup),
+        ('raw', raw_path(dsn, directory), _from_sample),
+    ]
+    names = [name for name, _, _ in sources]
+    buckets = []
+    # The chosen tier plus every finer tier holding not-yet-compacted data
+    for _, path, parse in sources[names.index(tier):]:
+        _, rows = _read(path)
+        for row in rows:
+            try:
+                bucket = parse(row)
+            except (KeyError, ValueError):
+                continue
+            if start <= bucket['ts'] < end:
+                buckets.append(bucket)
+    buckets.sort(key=lambda b: b['ts'])
+    width = {'hour': HOUR, 'minute': MINUTE}.get(tier)
+    return tier, rebucket(buckets, width) if width else buckets
@@ -0,0 +1,234 @@
+"""Incremental rolling statistics over the Owlet vitals stream.
+
+Every sample updates each window in O(1) amortised time, so summaries
+(mean, min, max, percentiles) never require rescanning the session:
+
+- mean uses a running sum,
+- min/max use monotonic deques,
+- percentiles use a fixed-bin histogram sketch. Vitals are small
+  integers (hr and ox are whole numbers, mv is a small count), so one bin per
+  integer gives exact percentiles and supports removal when a sample
+  leaves the window.
+
+`VitalsAggregator` also keeps a per-minute downsampled series of the
+last SERIES_SPAN of the current session for plotting. Summaries are taken
+at the current time: once the Owlet stops sending, samples leave the 5m
+and 1h windows as they age, and the session ends after SESSION_GAP, so
+nothing stale is reported.
+"""
+import csv
+import threading
+import time
+from collections import deque
+
+FIELDS = ('hr', 'ox', 'mv')
+
+# Window name -> span in seconds; None means the whole session.
+WINDOWS = {'5m': 300, '1h': 3600, 'session': None}
+
+# A gap of at least this long between samples starts a new session
+# (the same rule plotOwletData used to find the session start).
+SESSION_GAP = 3600
+
+# Span of the per-minute series kept for the plot.
+SERIES_SPAN = 24 * 3600
+
+# Histogram sketch range; values outside it are clamped.
+HIST_MAX = 255
+
+
+class RollingStat:
+    """Mean/min/max/percentiles of one field over a sliding time window."""
+
+    def __init__(self, span=None):
+        self.span = span
+        self.samples = deque()   # (ts, value), only kept for bounded windows
+        self.min_q = deque()     # increasing values: front is the minimum
+        self.max_q = deque()     # decreasing values: front is the maximum
+        self.hist = [0] * (HIST_MAX + 1)
+        self.total = 0.0
+        self.count = 0
+        self._min = None
+        self._max = None
+
+    def add(self, ts, value):
+        self.total += value
+        self.count += 1
+        self.hist[min(max(int(round(value)), 0), HIST_MAX)] += 1
+        if self.span is None:
+            self._min = value if self._min is None else min(self._min, value)
+            self._max = value if self._max is None else max(self._max, value)
+            return
+        self.samples.append((ts, value))
+        while self.min_q and self.min_q[-1][1] > value:
+            self.min_q.pop()
+        self.min_q.append((ts, value))
+        while self.max_q and self.max_q[-1][1] < value:
+            self.max_q.pop()
+        self.max_q.append((ts, value))
+        self._evict(ts)
+
+    def _evict(self, now):
+        cutoff = now - self.span
+        while self.samples and self.samples[0][0] <= cutoff:
+            ts, value = self.samples.popleft()
+            self.total -= value
+            self.count -= 1
+            self.hist[min(max(int(round(value)), 0), HIST_MAX)] -= 1
+        while self.min_q and self.min_q[0][0] <= cutoff:
+            self.min_q.popleft()
+        while self.max_q and self.max_q[0][0] <= cutoff:
+            self.max_q.popleft()
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def min(self):
+        if self.span is None:
+            return self._min
+        return self.min_q[0][1] if self.min_q else None
+
+    def max(self):
+        if self.span is None:
+            return self._max
+        return self.max_q[0][1] if self.max_q else None
+
+    def percentile(self, q):
+        """Value below which `q` percent of the window's samples fall."""
+        if not self.count:
+            return None
+        rank = max(1, int(round(q / 100.0 * self.count)))
+        seen = 0
+        for value, n in enumerate(self.hist):
+            seen += n
+            if seen >= rank:
+                return value
+        return HIST_MAX
+
+    def summary(self, now=None):
+        """Stats of the window ending at `now` (default: the newest sample)."""
+        if now is not None and self.span is not None:
+            self._evict(now)
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'min': self.min(),
+            'max': self.max(),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+        }
+
+
+class VitalsAggregator:
+    """Rolling statistics for hr/ox/mv across several windows at once.
+
+    Safe to share between threads: TideTracker feeds it from the Owlet
+    poller while the plot reads it.
+    """
+
+    def __init__(self, windows=None, session_gap=SESSION_GAP, series_span=SERIES_SPAN):
+        self.windows = dict(WINDOWS if windows is None else windows)
+        self.session_gap = session_gap
+        self.series_span = series_span
+        # Reentrant: summary() and series() call expire(), which may reset()
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.stats = {
+            name: {field: RollingStat(span) for field in FIELDS}
+            for name, span in self.windows.items()
+        }
+        self.session_start = None
+        self.last_ts = None
+        self.minutes = deque()   # [(minute_ts, {field: mean})], last series_span
+        self._minute = None
+        self._minute_sums = None
+
+    def add(self, sample):
+        """Feed one vitals sample (a dict with hr/ox/mv and ts or timestamp)."""
+        ts = sample_time(sample)
+        values = {f: float(sample[f]) for f in FIELDS}
+        with self._lock:
+            if self.last_ts is not None and ts - self.last_ts >= self.session_gap:
+                self._reset()
+            if self.session_start is None:
+                self.session_start = ts
+            self.last_ts = ts
+
+            for window in self.stats.values():
+                for field, stat in window.items():
+                    stat.add(ts, values[field])
+            self._add_minute(ts, values)
+
+    def _add_minute(self, ts, values):
+        minute = int(ts // 60) * 60
+        if minute != self._minute:
+            self._flush_minute()
+            while self.minutes and self.minutes[0][0] <= minute - self.series_span:
+                self.minutes.popleft()
+            self._minute = minute
+            self._minute_sums = dict.fromkeys(FIELDS, 0.0)
+            self._minute_sums['n'] = 0
+        for field in FIELDS:
+            self._minute_sums[field] += values[field]
+        self._minute_sums['n'] += 1
+
+    def _flush_minute(self):
+        if self._minute is None:
+            return
+        n = self._minute_sums['n']
+        self.minutes.append(
+            (self._minute, {f: self._minute_sums[f] / n for f in FIELDS}))
+
+    def expire(self, now=None):
+        """End the session if nothing has arrived for `session_gap` seconds."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.last_ts is not None and now - self.last_ts >= self.session_gap:
+                self._reset()
+        return now
+
+    def series(self, now=None):
+        """Per-minute means for the session's last series_span, including the
+        open minute; empty once the session has ended at `now`."""
+        with self._lock:
+            self.expire(now)
+            points = list(self.minutes)
+            if self._minute is not None:
+                n = self._minute_sums['n']
+                points.append((self._minute, {f: self._minute_sums[f] / n for f in FIELDS}))
+            return points
+
+    def summary(self, window=None, now=None):
+        """Stats for one window, or {window: {field: stats}} for all of them,
+        as of `now` (default: the current time). A window with no samples
+        left has count 0 and None for the rest."""
+        with self._lock:
+            now = self.expire(now)
+            if window is not None:
+                return {field: stat.summary(now) for field, stat in self.stats[window].items()}
+            return {name: self.summary(name, now) for name in self.stats}
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        """Build an aggregator from an owlet_data_<DSN>.csv file in one pass."""
+        agg = cls(**kwargs)
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    agg.add(row)
+                except (KeyError, ValueError):
+                    continue
+        return agg
+
+
+def sample_time(sample):
+    """Epoch seconds of a sample from the channel (`ts`) or the CSV (`timestamp`)."""
+    if 'ts' in sample and sample['ts'] not in (None, ''):
+        return float(sample['ts'])
+    return time.mktime(time.strptime(sample['timestamp'], '%Y-%m-%d %H:%M:%S'))
@@ -1,20 +1,32 @@
 import os
 import sys
-import time
+import functools
 import hashlib
 import logging
-import requests
+import threading
+import time
 from datetime import datetime, timedelta
 from PIL import Image, ImageDraw, ImageFont
 
 sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
 import config
+import diagnostics
+import metrics
+import refresh_policy
+import resilience
+import weather_providers
+from layout import Icon, Line, Repeat, Text, compile_layout
+from text_cache import TextCache
+from display_pipeline import DisplayPipeline
+from fetch_profile import FetchProfile, WeatherFetcher, derive
+from fetch_scheduler import FetchScheduler
+from prerender import PrerenderQueue
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
 EPD_AVAILABLE = False
 try:
-    from lib.waveshare_epd import epd7in5_V2
+    from lib.waveshare_epd import epd7in5_V2, epdconfig
     EPD_AVAILABLE = True
 except Exception:
     pass
@@ -24,11 +36,22 @@ PICDIR = os.path.join(BASE_DIR, 'images')
 ICONDIR = os.path.join(PICDIR, 'icon')
 FONTDIR = os.path.join(BASE_DIR, 'font')
 
+RETRY_INTERVAL = 300        # longest backoff between failed fetches
+# With MINUTE_CLOCK the header clock advances every minute and frames are
+# rendered ahead per minute rather than per hour
+MINUTE_CLOCK = getattr(config, 'MINUTE_CLOCK', False)
+PRERENDER_FRAMES = getattr(config, 'PRERENDER_FRAMES', 30 if MINUTE_CLOCK else 6)
+# 'layout': request only what the panel shows, the daily block every
+# DAILY_REFRESH seconds; 'full': the whole 7-day forecast on every fetch
+FETCH_PROFILE = getattr(config, 'FETCH_PROFILE', 'layout')
+DAILY_REFRESH = getattr(config, 'DAILY_REFRESH', 6 * 3600)
+
 
 # ---------------------------------------------------------------------------
 # Weather parsing
 # ---------------------------------------------------------------------------
 
+@metrics.timed('parse_weather')
 def parse_weather(raw, now=None):
     """Parse Open-Meteo API JSON into a structured display dict.
 
@@ -45,6 +68,13 @@ def parse_weather(raw, now=None):
     hourly_raw = raw['hourly']
     daily_raw = raw['daily']
 
+    # Variables a fetch profile left out of the request parse as None
+    def hourly_value(name, i):
+        return hourly_raw[name][i] if name in hourly_raw else None
+
+    def daily_value(name, i):
+        return daily_raw[name][i] if name in daily_raw else None
+
     # Find current-hour index from wall clock now (not API current.time, which
     # represents the most recent observation interval and lags 0-59 minutes).
     current_hour_str = now.strftime('%Y-%m-%dT%H:00')
@@ -64,10 +94,10 @@ def parse_weather(raw, now=None):
         t = datetime.fromisoformat(hourly_raw['time'][i])
         hourly.append({
             'time': t.strftime('%I %p').lstrip('0'),
-            'temp': hourly_raw['temperature_2m'][i],
-            'weather_code': hourly_raw['weather_code'][i],
-            'precip_pct': hourly_raw['precipitation_probability'][i],
-            'wind_speed': hourly_raw['wind_speed_10m'][i],
+            'temp': hourly_value('temperature_2m', i),
+            'weather_code': hourly_value('weather_code', i),
+            'precip_pct': hourly_value('precipitation_probability', i),
+            'wind_speed': hourly_value('wind_speed_10m', i),
         })
 
     # 7-day daily forecast
@@ -76,40 +106,43 @@ def parse_weather(raw, now=None):
         d = datetime.fromisoformat(daily_raw['time'][i])
         daily.append({
             'day': d.strftime('%a'),
-            'weather_code': daily_raw['weather_code'][i],
-            'high': daily_raw['temperature_2m_max'][i],
-            'low': daily_raw['temperature_2m_min'][i],
-            'precip_pct': daily_raw['precipitation_probability_max'][i],
+            'weather_code': daily_value('weather_code', i),
+            'high': daily_value('temperature_2m_max', i),
+            'low': daily_value('temperature_2m_min', i),
+            'precip_pct': daily_value('precipitation_probability_max', i),
             'is_today': i == 0,
         })
 
-    sunrise_dt = datetime.fromisoformat(daily_raw['sunrise'][0])
-    sunset_dt = datetime.fromisoformat(daily_raw['sunset'][0])
+    sunrise = daily_value('sunrise', 0)
+    sunset = daily_value('sunset', 0)
     # Visibility: Open-Meteo returns meters, convert to miles
-    visibility_mi = current_raw['visibility'] / 1609.34
+    visibility = current_raw.get('visibility')
+    visibility_mi = visibility / 1609.34 if visibility is not None else None
     # display_time is the actual wall clock now (computed from UTC + API offset),
     # not the API's observation hour, so the header reflects "right now".
     display_time = now
 
     return {
         'current': {
-            'temperature': current_raw['temperature_2m'],
-            'feels_like': current_raw['apparent_temperature'],
-            'humidity': current_raw['relative_humidity_2m'],
-            'wind_speed': current_raw['wind_speed_10m'],
+            'temperature': current_raw.get('temperature_2m'),
+            'feels_like': current_raw.get('apparent_temperature'),
+            'humidity': current_raw.get('relative_humidity_2m'),
+            'wind_speed': current_raw.get('wind_speed_10m'),
             'wind_direction': current_raw.get('wind_direction_10m', 0),
-            'weather_code': current_raw['weather_code'],
-            'is_day': current_raw['is_day'],
-            'uv_index': current_raw['uv_index'],
+            'weather_code': current_raw.get('weather_code'),
+            'is_day': current_raw.get('is_day', 1),
+            'uv_index': current_raw.get('uv_index'),
             'visibility_mi': visibility_mi,
-            'dew_point': current_raw['dew_point_2m'],
+            'dew_point': current_raw.get('dew_point_2m'),
         },
         'today': {
-            'high': daily_raw['temperature_2m_max'][0],
-            'low': daily_raw['temperature_2m_min'][0],
-            'precip_pct': daily_raw['precipitation_probability_max'][0],
-            'sunrise': sunrise_dt.strftime('%I:%M %p').lstrip('0'),
-            'sunset': sunset_dt.strftime('%I:%M %p').lstrip('0'),
+            'high': daily_value('temperature_2m_max', 0),
+            'low': daily_value('temperature_2m_min', 0),
+            'precip_pct': daily_value('precipitation_probability_max', 0),
+            'sunrise': datetime.fromisoformat(sunrise).strftime('%I:%M %p').lstrip('0')
+                       if sunrise else None,
+            'sunset': datetime.fromisoformat(sunset).strftime('%I:%M %p').lstrip('0')
+                      if sunset else None,
         },
         'display_time': display_time,
         'hourly': hourly,
@@ -202,30 +235,107 @@ def compute_fingerprint(weather):
 BASE_URL = 'https://api.open-meteo.com/v1/forecast'
 
 
-def fetch_weather():
-    """Fetch current, hourly, and daily weather from Open-Meteo."""
+# Everything the panel has ever used: what fetch_weather() asks for by default
+FULL_PROFILE = FetchProfile(
+    current=['temperature_2m', 'apparent_temperature', 'relative_humidity_2m',
+             'wind_speed_10m', 'wind_direction_10m',
+             'weather_code', 'is_day', 'uv_index', 'visibility', 'dew_point_2m'],
+    hourly=['temperature_2m', 'weather_code', 'precipitation_probability', 'wind_speed_10m'],
+    daily=['temperature_2m_max', 'temperature_2m_min', 'weather_code',
+           'precipitation_probability_max', 'sunrise', 'sunset'],
+    forecast_days=7)
+
+# The API variable each parse_weather() field comes from, for fetch_profile.derive
+SOURCES = {
+    ('current', 'temperature'): ('current', 'temperature_2m'),
+    ('current', 'feels_like'): ('current', 'apparent_temperature'),
+    ('current', 'humidity'): ('current', 'relative_humidity_2m'),
+    ('current', 'wind_speed'): ('current', 'wind_speed_10m'),
+    ('current', 'wind_direction'): ('current', 'wind_direction_10m'),
+    ('current', 'weather_code'): ('current', 'weather_code'),
+    ('current', 'is_day'): ('current', 'is_day'),
+    ('current', 'uv_index'): ('current', 'uv_index'),
+    ('current', 'visibility_mi'): ('current', 'visibility'),
+    ('current', 'dew_point'): ('current', 'dew_point_2m'),
+    ('today', 'high'): ('daily', 'temperature_2m_max'),
+    ('today', 'low'): ('daily', 'temperature_2m_min'),
+    ('today', 'precip_pct'): ('daily', 'precipitation_probability_max'),
+    ('today', 'sunrise'): ('daily', 'sunrise'),
+    ('today', 'sunset'): ('daily', 'sunset'),
+    ('hourly', '*', 'temp'): ('hourly', 'temperature_2m'),
+    ('hourly', '*', 'weather_code'): ('hourly', 'weather_code'),
+    ('hourly', '*', 'precip_pct'): ('hourly', 'precipitation_probability'),
+    ('hourly', '*', 'wind_speed'): ('hourly', 'wind_speed_10m'),
+    ('daily', '*', 'weather_code'): ('daily', 'weather_code'),
+    ('daily', '*', 'high'): ('daily', 'temperature_2m_max'),
+    ('daily', '*', 'low'): ('daily', 'temperature_2m_min'),
+    ('daily', '*', 'precip_pct'): ('daily', 'precipitation_probability_max'),
+}
+
+
+def sample_weather():
+    """parse_weather()-shaped data with every field set, for tracing layouts."""
+    hour = {'time': '1 PM', 'temp': 60.0, 'weather_code': 0, 'precip_pct': 0,
+            'wind_speed': 5.0}
+    day = {'day': 'Sat', 'weather_code': 0, 'high': 70.0, 'low': 50.0, 'precip_pct': 0,
+           'is_today': False}
+    return {
+        'current': {'temperature': 60.0, 'feels_like': 60.0, 'humidity': 50,
+                    'wind_speed': 5.0, 'wind_direction': 0, 'weather_code': 0, 'is_day': 1,
+                    'uv_index': 0.0, 'visibility_mi': 10.0, 'dew_point': 40.0},
+        'today': {'high': 70.0, 'low': 50.0, 'precip_pct': 0, 'sunrise': '6:00 AM',
+                  'sunset': '7:30 PM'},
+        'display_time': datetime(2024, 4, 27, 12, 0),
+        'hourly': [dict(hour) for _ in range(8)],
+        'daily': [dict(day) for _ in range(7)],
+    }
+
+
+def layout_profile(spec=None):
+    """The minimal FetchProfile for the panel layout, with hourly rows for
+    every frame PrerenderQueue renders ahead from one response."""
+    ahead = PRERENDER_FRAMES * (60 if MINUTE_CLOCK else 3600)
+    return derive(spec or weather_layout(), sample_weather(), SOURCES,
+                  extra_hours=-(-ahead // 3600))
+
+
+def fetch_weather(profile=None, part='full', validators=None, location=None):
+    """Fetch current, hourly, and daily weather from Open-Meteo.
+
+    `profile` picks the variables and window (FULL_PROFILE by default);
+    part='delta' leaves out the daily block. With a `validators` dict the
+    request is conditional on the ETag / Last-Modified kept in it from the
+    last response, and None is returned if nothing changed (304).
+    `location` is (latitude, longitude), config's by default.
+    """
+    latitude, longitude = location or (config.LATITUDE, config.LONGITUDE)
     params = {
-        'latitude': config.LATITUDE,
-        'longitude': config.LONGITUDE,
-        'current': (
-            'temperature_2m,apparent_temperature,relative_humidity_2m,'
-            'wind_speed_10m,wind_direction_10m,'
-            'weather_code,is_day,uv_index,visibility,dew_point_2m'
-        ),
-        'hourly': 'temperature_2m,weather_code,precipitation_probability,wind_speed_10m',
-        'daily': (
-            'temperature_2m_max,temperature_2m_min,weather_code,'
-            'precipitation_probability_max,sunrise,sunset'
-        ),
+        'latitude': latitude,
+        'longitude': longitude,
+        **(profile or FULL_PROFILE).params(part),
         'temperature_unit': 'fahrenheit',
         'wind_speed_unit': 'mph',
         'precipitation_unit': 'inch',
         'timezone': 'America/New_York',
-        'forecast_days': 7,
     }
-    resp = requests.get(BASE_URL, params=params, timeout=10)
-    resp.raise_for_status()
-    return resp.json()
+    conditional = {}
+    if validators:
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        conditional['headers'] = headers
+    with metrics.span('fetch'):
+        resp = metrics.get(BASE_URL, params=params, timeout=10, **conditional)
+        if resp.status_code == 304:
+            return None
+        resp.raise_for_status()
+        if validators is not None:
+            validators.clear()
+            validators.update(etag=resp.headers.get('ETag'),
+                              last_modified=resp.headers.get('Last-Modified'))
+        return resp.json()
 
 
 # ---------------------------------------------------------------------------
@@ -235,7 +345,11 @@ def fetch_weather():
 BLACK = 0
 WHITE = 255
 
+# Rasterized labels and values, reused across frames
+TEXT_CACHE = TextCache()
+
 
+@functools.lru_cache(maxsize=4)
 def _load_fonts(fontdir):
     path = os.path.join(fontdir, 'Font.ttc')
     return {
@@ -249,149 +363,169 @@ def _load_fonts(fontdir):
     }
 
 
-def _center_text(draw, cx, y, text, font):
-    bbox = font.getbbox(text)
-    w = bbox[2] - bbox[0]
-    draw.text((cx - w // 2, y), text, font=font, fill=BLACK)
-
-
-def _paste_icon(img, icon_path, cx, y, size):
-    """Paste an icon (size×size) centered horizontally at cx, top at y."""
-    if icon_path is None:
-        return
-    icon = Image.open(icon_path).resize((size, size)).convert('1')
-    img.paste(icon, (cx - size // 2, y))
-
+def _short_time(t):
+    # Compact AM/PM as 'a'/'p' to fit within the panel.
+    return t.replace(' AM', 'a').replace(' PM', 'p')
 
-def _draw_left_panel(draw, img, weather, icondir, fonts):
-    c = weather['current']
-    t = weather['today']
-    dt = weather['display_time']  # Eastern time from API
 
+def weather_layout():
+    """The 800x480 panel: current conditions, next 6 hours, 7-day forecast."""
     x_label = 12
     x_value = 145
-
-    # Header line 1: location (large) + date (right-aligned, small)
-    draw.text((x_label, 8), config.LOCATION, font=fonts[22], fill=BLACK)
-    date_str = dt.strftime('%a, %b %d').replace(' 0', ' ')
-    bbox = fonts[15].getbbox(date_str)
-    draw.text((300 - (bbox[2] - bbox[0]) - 6, 16), date_str, font=fonts[15], fill=BLACK)
-
-    # Header line 2: condition (left) + time (right-aligned)
-    desc = wmo_description(c['weather_code'])
-    draw.text((x_label, 38), desc, font=fonts[15], fill=BLACK)
-    time_str = dt.strftime('%I:%M %p').lstrip('0')
-    bbox = fonts[15].getbbox(time_str)
-    draw.text((300 - (bbox[2] - bbox[0]) - 6, 38), time_str, font=fonts[15], fill=BLACK)
-
-    # Icon + big temperature
-    icon_path = get_icon_path(c['weather_code'], c['is_day'], icondir)
-    _paste_icon(img, icon_path, cx=58, y=60, size=85)
-    draw.text((125, 65), f'{round(c["temperature"])}°F', font=fonts[60], fill=BLACK)
-
     # Details — font18, 22px line height, sun row combined.
-    # Compact AM/PM as 'a'/'p' to fit within the panel.
-    sunrise_short = t['sunrise'].replace(' AM', 'a').replace(' PM', 'p')
-    sunset_short  = t['sunset'].replace(' AM', 'a').replace(' PM', 'p')
-    wind_str = f'{round(c["wind_speed"])} mph {compass_direction(c["wind_direction"])}'
-    pairs = [
-        ('Feels like', f'{round(c["feels_like"])}°F'),
-        ('Wind',       wind_str),
-        ('Humidity',   f'{c["humidity"]}%'),
-        ('High / Low', f'{round(t["high"])}° / {round(t["low"])}°'),
-        ('Precip',     f'{t["precip_pct"]}%'),
-        ('Sun',        f'↑ {sunrise_short}  ↓ {sunset_short}'),
+    details = [
+        ('Feels like', lambda w: f'{round(w["current"]["feels_like"])}°F'),
+        ('Wind',       lambda w: f'{round(w["current"]["wind_speed"])} mph '
+                                 f'{compass_direction(w["current"]["wind_direction"])}'),
+        ('Humidity',   lambda w: f'{w["current"]["humidity"]}%'),
+        ('High / Low', lambda w: f'{round(w["today"]["high"])}° / {round(w["today"]["low"])}°'),
+        ('Precip',     lambda w: f'{w["today"]["precip_pct"]}%'),
+        ('Sun',        lambda w: f'↑ {_short_time(w["today"]["sunrise"])}  '
+                                 f'↓ {_short_time(w["today"]["sunset"])}'),
+    ]
+    return [
+        # Structural dividers
+        Line([(305, 0), (305, 293)], width=2),    # vertical
+        Line([(0, 293), (800, 293)], width=2),    # horizontal main
+
+        # Left panel — header: location (large) + date (right-aligned, small),
+        # then condition (left) + time (right-aligned)
+        Text((x_label, 8), config.LOCATION, 22),
+        Text((294, 16), lambda w: w['display_time'].strftime('%a, %b %d').replace(' 0', ' '),
+             15, align='right'),
+        Text((x_label, 38), lambda w: wmo_description(w['current']['weather_code']), 15),
+        Text((294, 38), lambda w: w['display_time'].strftime('%I:%M %p').lstrip('0'),
+             15, align='right'),
+        # Icon + big temperature
+        Icon(58, 60, 85, lambda w, icondir: get_icon_path(
+            w['current']['weather_code'], w['current']['is_day'], icondir)),
+        Text((125, 65), lambda w: f'{round(w["current"]["temperature"])}°F', 60),
+        *[element
+          for i, (label, value) in enumerate(details)
+          for element in (Text((x_label, 158 + i * 22), label, 18),
+                          Text((x_value, 158 + i * 22), value, 18))],
+
+        # Right panel — 6 hourly columns, ~82px each across the 493px panel
+        Text((315, 8), 'NEXT 6 HOURS', 15),
+        Repeat(lambda w: w['hourly'][:6], 6, (82, 0), [
+            Text((348, 32), lambda h: h['time'], 22, align='center'),
+            Icon(348, 62, 75, lambda h, icondir: get_icon_path(
+                h['weather_code'], is_day=h.get('is_day', 1), icon_dir=icondir)),
+            # Temperature (font40 — the dominant hourly datum)
+            Text((348, 148), lambda h: f'{round(h["temp"])}°', 40, align='center'),
+            Text((348, 213), lambda h: f'{h["precip_pct"]}%', 22, align='center'),
+            Text((348, 245), lambda h: f'{round(h["wind_speed"])} mph', 18, align='center'),
+        ]),
+
+        # Bottom — 7-day forecast, today underlined
+        Text((12, 298), '7-DAY FORECAST', 15),
+        Repeat(lambda w: w['daily'], 7, (114, 0), [
+            Text((57, 316), lambda d: d['day'], 20, align='center',
+                 underline=(339, lambda d: d['is_today'])),
+            Icon(57, 343, 60, lambda d, icondir: get_icon_path(
+                d['weather_code'], is_day=1, icon_dir=icondir)),
+            # Temps and precip — tightened vertical spacing so precip fits in 480
+            Text((57, 408), lambda d: f'{round(d["high"])}°', 24, align='center'),
+            Text((57, 437), lambda d: f'{round(d["low"])}°', 18, align='center'),
+            Text((57, 459), lambda d: f'{d["precip_pct"]}%', 15, align='center'),
+        ]),
     ]
-    y = 158
-    for label, value in pairs:
-        draw.text((x_label, y), label, font=fonts[18], fill=BLACK)
-        draw.text((x_value, y), value, font=fonts[18], fill=BLACK)
-        y += 22
-
-
-def _draw_hourly_panel(draw, img, weather, icondir, fonts):
-    """Right panel — 6 hourly columns, full available height."""
-    draw.text((315, 8), 'NEXT 6 HOURS', font=fonts[15], fill=BLACK)
-
-    # 6 columns across 493px wide right panel = ~82px each
-    # cx = 307 + 41 + i*82 -> 348, 430, 512, 594, 676, 758
-    hours = weather['hourly'][:6]
-    for i, h in enumerate(hours):
-        cx = 348 + i * 82
-
-        # Time label (font22)
-        _center_text(draw, cx, 32, h['time'], fonts[22])
-
-        # Icon (75×75)
-        icon_path = get_icon_path(h['weather_code'], is_day=h.get('is_day', 1), icon_dir=icondir)
-        _paste_icon(img, icon_path, cx=cx, y=62, size=75)
-
-        # Temperature (font40 — the dominant hourly datum)
-        _center_text(draw, cx, 148, f'{round(h["temp"])}°', fonts[40])
-
-        # Precipitation %
-        _center_text(draw, cx, 213, f'{h["precip_pct"]}%', fonts[22])
-
-        # Wind speed
-        _center_text(draw, cx, 245, f'{round(h["wind_speed"])} mph', fonts[18])
 
 
+def half_layout():
+    """An 800x240 half panel (the compositor's weather region): current
+    conditions and the next 6 hours, without the 7-day forecast."""
+    x_label = 12
+    x_value = 110
+    details = [
+        ('Feels like', lambda w: f'{round(w["current"]["feels_like"])}°F'),
+        ('Wind',       lambda w: f'{round(w["current"]["wind_speed"])} mph '
+                                 f'{compass_direction(w["current"]["wind_direction"])}'),
+        ('High / Low', lambda w: f'{round(w["today"]["high"])}° / {round(w["today"]["low"])}°'),
+        ('Precip',     lambda w: f'{w["today"]["precip_pct"]}%'),
+        ('Sun',        lambda w: f'↑ {_short_time(w["today"]["sunrise"])}  '
+                                 f'↓ {_short_time(w["today"]["sunset"])}'),
+    ]
+    return [
+        Line([(305, 0), (305, 232)], width=2),
+
+        # Left panel — header, icon + big temperature, details at font15
+        Text((x_label, 6), config.LOCATION, 22),
+        Text((294, 12), lambda w: w['display_time'].strftime('%a, %b %d').replace(' 0', ' '),
+             15, align='right'),
+        Text((x_label, 34), lambda w: wmo_description(w['current']['weather_code']), 15),
+        Text((294, 34), lambda w: w['display_time'].strftime('%I:%M %p').lstrip('0'),
+             15, align='right'),
+        Icon(50, 56, 70, lambda w, icondir: get_icon_path(
+            w['current']['weather_code'], w['current']['is_day'], icondir)),
+        Text((110, 58), lambda w: f'{round(w["current"]["temperature"])}°F', 60),
+        *[element
+          for i, (label, value) in enumerate(details)
+          for element in (Text((x_label, 136 + i * 19), label, 15),
+                          Text((x_value, 136 + i * 19), value, 15))],
+
+        # Right panel — 6 hourly columns, as on the full panel but shorter
+        Text((315, 6), 'NEXT 6 HOURS', 15),
+        Repeat(lambda w: w['hourly'][:6], 6, (82, 0), [
+            Text((348, 28), lambda h: h['time'], 20, align='center'),
+            Icon(348, 54, 60, lambda h, icondir: get_icon_path(
+                h['weather_code'], is_day=h.get('is_day', 1), icon_dir=icondir)),
+            Text((348, 118), lambda h: f'{round(h["temp"])}°', 40, align='center'),
+            Text((348, 170), lambda h: f'{h["precip_pct"]}%', 20, align='center'),
+            Text((348, 198), lambda h: f'{round(h["wind_speed"])} mph', 18, align='center'),
+        ]),
+    ]
 
-def _draw_daily_panel(draw, img, weather, icondir, fonts):
-    draw.text((12, 298), '7-DAY FORECAST', font=fonts[15], fill=BLACK)
 
-    for i, d in enumerate(weather['daily']):
-        cx = 57 + i * 114
+# Layouts by the size they fill: the whole panel, or a compositor region
+LAYOUTS = {(800, 480): weather_layout, (800, 240): half_layout}
 
-        # Day name (font20), underline today
-        day_str = d['day']
-        bbox = fonts[20].getbbox(day_str)
-        w = bbox[2] - bbox[0]
-        x = cx - w // 2
-        draw.text((x, 316), day_str, font=fonts[20], fill=BLACK)
-        if d['is_today']:
-            draw.line([(x, 339), (x + w, 339)], fill=BLACK, width=1)
 
-        # Icon (60×60)
-        icon_path = get_icon_path(d['weather_code'], is_day=1, icon_dir=icondir)
-        _paste_icon(img, icon_path, cx=cx, y=343, size=60)
+def layout_for(size):
+    """The layout function for a `size` (width, height) image."""
+    try:
+        return LAYOUTS[tuple(size)]
+    except KeyError:
+        raise ValueError(f'no weather layout for {size[0]}x{size[1]}') from None
 
-        # Temps and precip — tightened vertical spacing so precip fits in 480
-        _center_text(draw, cx, 408, f'{round(d["high"])}°', fonts[24])
-        _center_text(draw, cx, 437, f'{round(d["low"])}°',  fonts[18])
-        _center_text(draw, cx, 459, f'{d["precip_pct"]}%',  fonts[15])
 
+@functools.lru_cache(maxsize=4)
+def _compiled_layout(fontdir, size=(800, 480)):
+    return compile_layout(layout_for(size)(), _load_fonts(fontdir), size=size,
+                          text_cache=TEXT_CACHE)
 
-def render(weather, picdir, icondir, fontdir):
-    """Render weather data to an 800×480 1-bit PIL Image."""
-    img = Image.new('1', (800, 480), WHITE)
-    draw = ImageDraw.Draw(img)
-    fonts = _load_fonts(fontdir)
 
-    # Structural dividers
-    draw.line([(305, 0),   (305, 293)], fill=BLACK, width=2)  # vertical
-    draw.line([(0,   293), (800, 293)], fill=BLACK, width=2)  # horizontal main
+@metrics.timed('render')
+def render(weather, picdir, icondir, fontdir, size=(800, 480)):
+    """Render weather data to a `size` (800×480 or 800×240) 1-bit PIL Image."""
+    return _compiled_layout(fontdir, tuple(size)).render(weather, icondir, text_cache=TEXT_CACHE)
 
-    _draw_left_panel(draw, img, weather, icondir, fonts)
-    _draw_hourly_panel(draw, img, weather, icondir, fonts)
-    _draw_daily_panel(draw, img, weather, icondir, fonts)
 
-    return img
+def render_at(raw, when, size=(800, 480)):
+    """Render API data `raw` as the panel should look at epoch time `when`."""
+    offset = raw.get('utc_offset_seconds', 0)
+    now = datetime(1970, 1, 1) + timedelta(seconds=when + offset)
+    return render(parse_weather(raw, now=now), PICDIR, ICONDIR, FONTDIR, size=size)
 
 
 # ---------------------------------------------------------------------------
 # Display output
 # ---------------------------------------------------------------------------
 
-def write_to_display(image, epd=None, picdir=None):
-    """Write image to e-ink, or save PNG in dev mode when epd is None."""
+def write_to_display(image, epd=None, picdir=None, buffer=None):
+    """Write image to e-ink, or save PNG in dev mode when epd is None.
+
+    `buffer` is the image already packed with epd.getbuffer(), if available.
+    """
     if epd is None:
         path = os.path.join(picdir or PICDIR, 'screen_output.png')
         image.save(path)
         logging.info(f'Dev mode: saved to {path}')
         return
+    if buffer is None:
+        buffer = epd.getbuffer(image)
     epd.init()
-    epd.display(epd.getbuffer(image))
+    epd.display(buffer)
     epd.sleep()
 
 
@@ -399,45 +533,129 @@ def write_to_display(image, epd=None, picdir=None):
 # Main loop
 # ---------------------------------------------------------------------------
 
+def fetch_loop(fetch, frames, scheduler, policy, stop, clock=time.time):
+    """Fetch when `scheduler` and `policy` say so until `stop` is set.
+
+    Renders and packs a frame for now and for each upcoming boundary, so
+    the display path only ever takes ready buffers. A changed response is
+    rendered at once; otherwise the last one is re-rendered, without
+    fetching, whenever the queued frames run low.
+    """
+    backoff = resilience.Backoff(cap=RETRY_INTERVAL)
+    raw, shown = None, []
+    next_fetch = retry_render = clock()
+    while not stop.is_set():
+        changed = False
+        if clock() >= next_fetch:
+            try:
+                raw = fetch()
+            except Exception as exc:
+                now = clock()
+                wait = policy.next_run('open-meteo', now,
+                                       due=now + resilience.wait_time(exc, backoff)) - now
+                logging.error(f'Fetch failed: {exc} — retrying in {wait:.0f} s.')
+            else:
+                backoff.reset()
+                changed = scheduler.record(raw)
+                now = clock()
+                policy.record('open-meteo', now, changed=changed)
+                policy.set_daylight(refresh_policy.daylight(raw))
+                wait = policy.next_run('open-meteo', now, due=scheduler.next_fetch()) - now
+                logging.info('Fetched weather (%s); next fetch in %d s.',
+                             'changed' if changed else 'unchanged', wait)
+            next_fetch = now + max(0, wait)
+        now = clock()
+        messages = resilience.HEALTH.messages()
+        running_low = now >= max(frames.refill_due(), retry_render)
+        if raw is not None and (changed or messages != shown or running_low):
+            try:
+                frames.refill(raw)
+                shown = messages
+            except Exception as exc:
+                logging.error(f'Render failed: {exc}')
+                retry_render = now + RETRY_INTERVAL
+        wake = next_fetch
+        if raw is not None:
+            wake = min(wake, max(frames.refill_due(), retry_render))
+        stop.wait(max(0, wake - clock()))
+
+
 def main():
     logging.info('WeatherDisplay starting.')
+    diagnostics.start('weather')
+
+    # With COMPOSITOR, compositor.py owns the panel and this draws one region
+    region = None
+    if getattr(config, 'COMPOSITOR', False):
+        import compositor
+        try:
+            region = compositor.connect('weather')
+        except (OSError, KeyError, ValueError) as exc:
+            logging.info(f'No compositor ({exc}) — driving the panel directly.')
 
     epd = None
-    if EPD_AVAILABLE:
-        epd = epd7in5_V2.EPD()
-        epd.init()
-        epd.Clear()
-        logging.info('E-ink display initialized and cleared.')
+    if region is not None:
+        logging.info('Drawing into the compositor\'s weather region.')
+    elif EPD_AVAILABLE:
+        # The hardware backend is only constructed here, on first use;
+        # config.EPD_BACKEND (or $EPD_BACKEND) can pick e.g. 'null'
+        try:
+            epdconfig.set_backend(getattr(config, 'EPD_BACKEND', None))
+            epd = metrics.instrument_epd(epd7in5_V2.EPD())
+            epd.init()
+            epd.Clear()
+            logging.info('E-ink display initialized and cleared.')
+        except (ImportError, RuntimeError, OSError) as exc:
+            logging.info(f'No e-ink hardware ({exc}) — running in dev mode (saves PNG).')
+            epd = None
     else:
         logging.info('No e-ink module — running in dev mode (saves PNG).')
 
-    last_fingerprint = None
-    retry_delay = 1800
-
-    while True:
-        try:
-            raw = fetch_weather()
-            weather = parse_weather(raw)
-            fingerprint = compute_fingerprint(weather)
-
-            changed = fingerprint != last_fingerprint
-            logging.info('Refreshing display (weather %s).',
-                         'changed' if changed else 'unchanged')
-            image = render(weather, PICDIR, ICONDIR, FONTDIR)
-            write_to_display(image, epd=epd, picdir=PICDIR)
-            last_fingerprint = fingerprint
-
-            retry_delay = 1800
-
-        except requests.RequestException as exc:
-            logging.error(f'API error: {exc} — retrying in 5 minutes.')
-            retry_delay = 300
-
-        except Exception as exc:
-            logging.error(f'Unexpected error: {exc} — retrying in 5 minutes.')
-            retry_delay = 300
-
-        time.sleep(retry_delay)
+    # The compositor's region is drawn at its own size, never scaled
+    size = region.size if region is not None else (800, 480)
+
+    def render_frame(raw, when):
+        # Upstreams that are failing are noted over the last good data
+        return resilience.overlay(render_at(raw, when, size), resilience.HEALTH.messages())
+
+    frames = PrerenderQueue(render_frame, pack=epd.getbuffer if epd else None,
+                            horizon=PRERENDER_FRAMES, step=60 if MINUTE_CLOCK else 3600)
+    stop = threading.Event()
+    scheduler = FetchScheduler()
+    # Defers fetches and frames through quiet hours and within any budget
+    policy = refresh_policy.from_config(('open-meteo', 'weather'))
+
+    # Open-Meteo unless config's WEATHER_PROVIDERS adds a hedge; each
+    # provider goes through its own circuit breaker
+    providers = weather_providers.from_config(
+        ('open-meteo',),
+        profile=None if FETCH_PROFILE == 'full' else layout_profile(layout_for(size)()))
+    if FETCH_PROFILE == 'full':
+        fetch = providers
+    else:
+        fetch = WeatherFetcher(providers, daily_every=DAILY_REFRESH)
+
+    def write(frame):
+        now = time.time()
+        if policy.next_run('weather', now, due=now) > now:
+            logging.info('Skipping a frame: quiet hours or refresh budget.')
+            return
+        policy.record('weather', now)
+        if region is not None:
+            region.write(frame.image)
+        else:
+            write_to_display(frame.image, epd=epd, picdir=PICDIR, buffer=frame.buffer)
+        metrics.export(frames_rendered=frames.rendered, frames_on_time=frames.on_time,
+                       upstreams=resilience.HEALTH.status())
+
+    threading.Thread(target=fetch_loop, args=(fetch, frames, scheduler, policy, stop),
+                     daemon=True).start()
+    # Push each frame as it falls due while the next ones are prepared
+    pipeline = DisplayPipeline(lambda: frames.wait_frame(timeout=60), write, interval=0)
+    try:
+        pipeline.run()
+    finally:
+        stop.set()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,356 @@
+"""Weather from more than one provider, behind Open-Meteo's response format.
+
+TideTracker read OpenWeatherMap's One Call response and weather_display
+Open-Meteo's, each with its own parsing. A provider here returns the
+forecast shaped like an Open-Meteo response (current / hourly / daily
+blocks, local ISO times, utc_offset_seconds, imperial units), so
+weather_display.parse_weather() turns either into the same structure and
+everything downstream (FetchScheduler, refresh_policy.daylight, the
+renderers) works unchanged:
+
+    fetch = weather_providers.from_config(('open-meteo',))
+    raw = fetch('full')                     # or 'delta'; None if not modified
+    weather = weather_display.parse_weather(raw)
+
+With more than one provider (config.py WEATHER_PROVIDERS, e.g.
+('open-meteo', 'owm')) a fetch is hedged: it asks the primary, and if no
+answer has come within the hedge delay, or the primary failed, it asks
+the next one as well, and takes whichever answers first. The primary is
+the provider with the lowest median latency over its last WINDOW
+requests, failures counted as FAILURE_SECONDS; a provider not asked yet
+keeps its configured place, after those that have been, and one whose
+circuit is open goes last. The hedge delay is HEDGE_AFTER if config.py
+sets one, else the primary's 90th percentile latency, within MIN_HEDGE
+and MAX_HEDGE. A late answer still counts towards its provider's latency
+but is otherwise dropped.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import metrics
+import resilience
+
+WINDOW = 20                 # latencies kept per provider
+FAILURE_SECONDS = 10.0      # a failed request counts as this slow (the request timeout)
+DEFAULT_HEDGE = 2.0         # hedge delay before a primary has any history, in seconds
+MIN_HEDGE = 0.5
+MAX_HEDGE = 5.0
+
+ONECALL_URL = 'https://api.openweathermap.org/data/2.5/onecall'
+
+# OpenWeatherMap condition ids (https://openweathermap.org/weather-conditions)
+# to WMO weather codes; ids not listed map by their group
+OWM_TO_WMO = {
+    300: 51, 301: 53, 302: 55, 310: 51, 311: 53, 312: 55, 313: 53, 314: 55, 321: 53,
+    500: 61, 501: 63, 502: 65, 503: 65, 504: 65, 511: 66,
+    520: 80, 521: 81, 522: 82, 531: 82,
+    600: 71, 601: 73, 602: 75, 611: 77, 612: 77, 613: 77, 615: 85, 616: 85,
+    620: 85, 621: 85, 622: 86,
+    741: 45, 800: 0, 801: 1, 802: 2, 803: 3, 804: 3,
+}
+OWM_GROUPS = {2: 95, 3: 53, 5: 63, 6: 73, 7: 45, 8: 3}
+
+
+def _config(name, default):
+    try:
+        import config
+    except ImportError:
+        return default
+    return getattr(config, name, default)
+
+
+def wmo_code(owm_id):
+    """The WMO weather code for an OpenWeatherMap condition id, or None."""
+    if owm_id is None:
+        return None
+    return OWM_TO_WMO.get(owm_id, OWM_GROUPS.get(owm_id // 100))
+
+
+def _local(epoch, offset, fmt='%Y-%m-%dT%H:%M'):
+    return (datetime(1970, 1, 1) + timedelta(seconds=epoch + offset)).strftime(fmt)
+
+
+def from_onecall(data):
+    """An OpenWeatherMap One Call response (imperial units) as Open-Meteo's."""
+    offset = data.get('timezone_offset', 0)
+    current = data['current']
+    hourly = data.get('hourly') or []
+    daily = data.get('daily') or []
+
+    def condition(entry):
+        return wmo_code((entry.get('weather') or [{}])[0].get('id'))
+
+    def percent(entry):
+        pop = entry.get('pop')
+        return round(pop * 100) if pop is not None else None
+
+    sunrise, sunset = current.get('sunrise'), current.get('sunset')
+    return {
+        'utc_offset_seconds': offset,
+        'current': {
+            # Open-Meteo reports the current 15-minute interval
+            'time': _local(current['dt'] - current['dt'] % 900, offset),
+            'interval': 900,
+            'temperature_2m': current.get('temp'),
+            'apparent_temperature': current.get('feels_like'),
+            'relative_humidity_2m': current.get('humidity'),
+            'wind_speed_10m': current.get('wind_speed'),
+            'wind_direction_10m': current.get('wind_deg', 0),
+            'weather_code': condition(current),
+            'is_day': int(sunrise is None or sunrise <= current['dt'] < sunset),
+            'uv_index': current.get('uvi'),
+            'visibility': current.get('visibility'),
+            'dew_point_2m': current.get('dew_point'),
+        },
+        'hourly': {
+            'time': [_local(hour['dt'], offset) for hour in hourly],
+            'temperature_2m': [hour.get('temp') for hour in hourly],
+            'weather_code': [condition(hour) for hour in hourly],
+            'precipitation_probability': [percent(hour) for hour in hourly],
+            'wind_speed_10m': [hour.get('wind_speed') for hour in hourly],
+        },
+        'daily': {
+            'time': [_local(day['dt'], offset, '%Y-%m-%d') for day in daily],
+            'temperature_2m_max': [day['temp']['max'] for day in daily],
+            'temperature_2m_min': [day['temp']['min'] for day in daily],
+            'weather_code': [condition(day) for day in daily],
+            'precipitation_probability_max': [percent(day) for day in daily],
+            'sunrise': [_local(day['sunrise'], offset) for day in daily],
+            'sunset': [_local(day['sunset'], offset) for day in daily],
+        },
+    }
+
+
+class OpenMeteo:
+    """Open-Meteo through weather_display.fetch_weather, already in shape.
+
+    `profile` and `location` ((latitude, longitude), default config's) are
+    passed on; with `conditional`, requests carry the last response's
+    validators and an unchanged forecast returns None.
+    """
+
+    name = 'Open-Meteo'
+
+    def __init__(self, profile=None, location=None, conditional=False):
+        self.profile = profile
+        self.location = location
+        self.validators = {} if conditional else None
+
+    def fetch(self, part='full'):
+        import weather_display
+        validators = None
+        if self.validators is not None:
+            validators = self.validators.setdefault(part, {})
+        return resilience.breaker(self.name).call(
+            weather_display.fetch_weather, self.profile, part, validators, location=self.location)
+
+    def discard(self):
+        # A response that wasn't used must not make the next one conditional
+        if self.validators is not None:
+            self.validators.clear()
+
+
+def onecall_url(api_key, location=None):
+    latitude, longitude = location or (_config('LATITUDE', None), _config('LONGITUDE', None))
+    return '%s?lat=%s&lon=%s&units=imperial&appid=%s' % (
+        ONECALL_URL, latitude, longitude, api_key)
+
+
+def _owm_get(url):
+    def request():
+        with metrics.span('owm_fetch'):
+            response = metrics.get(url, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    return resilience.breaker('OWM').call(request)
+
+
+class OpenWeatherMap:
+    """OpenWeatherMap One Call, normalised with from_onecall().
+
+    `get(url)` returns the decoded response (through the 'OWM' circuit
+    breaker by default); One Call has no partial request, so every part is
+    the full forecast.
+    """
+
+    name = 'OWM'
+
+    def __init__(self, url, get=None):
+        self.url = url
+        self.get = get or _owm_get
+
+    def fetch(self, part='full'):
+        return from_onecall(self.get(self.url))
+
+    def discard(self):
+        pass
+
+
+class Latency:
+    """A provider's recent request times, in seconds."""
+
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.wins = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, ok=True):
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.failures += 1
+                seconds = max(seconds, FAILURE_SECONDS)
+            self.samples.append(seconds)
+
+    def quantile(self, q):
+        """The q-th quantile of the recent samples, or None without any."""
+        with self._lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def as_dict(self):
+        return {'requests': self.requests, 'failures': self.failures, 'wins': self.wins,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9)}
+
+
+class HedgedFetch:
+    """Call `providers` (each with name, fetch(part) and discard()) as one
+    fetch(part), hedging slow answers with the next provider.
+
+    `hedge_after` fixes the hedge delay in seconds (None: learned per
+    primary). `stats` maps each provider's name to its Latency.
+    """
+
+    def __init__(self, providers, hedge_after=None, clock=time.monotonic):
+        if not providers:
+            raise ValueError('no weather providers')
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.clock = clock
+        self.stats = {provider.name: Latency() for provider in self.providers}
+        self.hedges = 0             # fetches that asked a second provider
+        self.last_provider = None   # name of the provider last answering
+        self._pool = None
+
+    def ranked(self):
+        """Providers, the one to ask first first."""
+        def key(item):
+            index, provider = item
+            median = self.stats[provider.name].quantile(0.5)
+            is_open = resilience.breaker(provider.name).state == 'open'
+            # Untried providers wait their turn: asked only as a hedge, they
+            # cost no requests (OWM's are metered) until the primary is slow
+            return (is_open, median if median is not None else float('inf'), index)
+        return [provider for _, provider in sorted(enumerate(self.providers), key=key)]
+
+    @property
+    def primary(self):
+        return self.ranked()[0]
+
+    def delay(self, provider):
+        """Seconds to wait for `provider` before asking the next one too."""
+        if self.hedge_after is not None:
+            return self.hedge_after
+        p90 = self.stats[provider.name].quantile(0.9)
+        if p90 is None:
+            return DEFAULT_HEDGE
+        return min(MAX_HEDGE, max(MIN_HEDGE, p90))
+
+    def _timed(self, provider, part):
+        started = self.clock()
+        try:
+            result = provider.fetch(part)
+        except Exception:
+            self._observe(provider, self.clock() - started, ok=False)
+            raise
+        self._observe(provider, self.clock() - started, ok=True)
+        return result
+
+    def _observe(self, provider, seconds, ok):
+        self.stats[provider.name].observe(seconds, ok)
+        metrics.observe('weather_provider', seconds, provider=provider.name,
+                        outcome='ok' if ok else 'error')
+
+    def __call__(self, part='full'):
+        ranked = self.ranked()
+        if len(ranked) == 1:
+            result = self._timed(ranked[0], part)
+            self._won(ranked[0])
+            return result
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=2 * len(ranked),
+                                            thread_name_prefix='weather')
+        waiting = list(ranked)
+        running = {}
+        errors = []
+
+        def ask():
+            provider = waiting.pop(0)
+            running[self._pool.submit(self._timed, provider, part)] = provider
+            return self.clock() + self.delay(provider)
+
+        hedge_at = ask()
+        while running:
+            timeout = max(0.0, hedge_at - self.clock()) if waiting else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = running.pop(future)
+                exc = future.exception()
+                if exc is None:
+                    self._drop(running)
+                    self._won(provider)
+                    return future.result()
+                logging.info('%s failed: %s', provider.name, exc)
+                errors.append(exc)
+            if waiting and (not running or self.clock() >= hedge_at):
+                if running:
+                    self.hedges += 1
+                hedge_at = ask()
+        raise errors[0]
+
+    def _won(self, provider):
+        self.stats[provider.name].wins += 1
+        if provider.name != self.last_provider and self.last_provider is not None:
+            logging.info('Weather now from %s.', provider.name)
+        self.last_provider = provider.name
+
+    def _drop(self, running):
+        # Answers still on their way are timed, then thrown away
+        def discard(future, provider):
+            if future.exception() is None:
+                provider.discard()
+        for future, provider in running.items():
+            future.add_done_callback(lambda future, provider=provider: discard(future, provider))
+
+    def status(self):
+        return {name: latency.as_dict() for name, latency in self.stats.items()}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+def from_config(default, profile=None, location=None, owm=None):
+    """A HedgedFetch over config.py's WEATHER_PROVIDERS, else `default`
+    (names: 'open-meteo', 'owm').
+
+    `profile` and `location` configure Open-Meteo; `owm` replaces the
+    OpenWeatherMap provider built from config's API_KEY.
+    """
+    providers = []
+    for name in _config('WEATHER_PROVIDERS', default):
+        if name == 'open-meteo':
+            providers.append(OpenMeteo(profile, location))
+        elif name == 'owm':
+            providers.append(owm or OpenWeatherMap(onecall_url(_config('API_KEY', ''), location)))
+        else:
+            raise ValueError(f'unknown weather provider {name!r}')
+    return HedgedFetch(providers, hedge_after=_config('HEDGE_AFTER', None))